@@ -48,8 +48,8 @@ import { useWebSocketNotifications } from './hooks/useWebSocketNotifications'
 function AppWithWebSocket() {
   const { user, owner, admin } = useAuth();
   
-  // Get the currently logged in user's ID
-  const userId = user?.userId || owner?.userId || admin?.userId;
+  // Notifications are addressed by the auth user ID (not the profile ID)
+  const userId = user?.authUserId || owner?.authUserId || admin?.authUserId;
   
   // Initialize WebSocket notifications - always call, hook handles null userId
   useWebSocketNotifications(userId);
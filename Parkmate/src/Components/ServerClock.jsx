@@ -3,7 +3,7 @@
  * Displays real-time server time synchronized via WebSocket
  * 
  * Features:
- * - Live updating clock (updates every second)
+ * - Live updating clock (ticks locally every second between server syncs)
  * - Connection status indicator
  * - Smooth pulse animation on updates
  * - Tooltip with additional info
@@ -17,7 +17,7 @@ import React, { useState, useEffect } from 'react'
 import { useServerTime } from '../contexts/TimeContext'
 
 const ServerClock = ({ className = '', showDate = true, showTime = true, compact = false }) => {
-  const { timeData, isConnected } = useServerTime()
+  const { timeData, isConnected, roundTripMs } = useServerTime()
   const [pulse, setPulse] = useState(false)
 
   // Trigger pulse animation on time update
@@ -69,6 +69,7 @@ const ServerClock = ({ className = '', showDate = true, showTime = true, compact
             <div className="text-gray-400 text-xs">
               <p>Timezone: {timeData.timezone || 'UTC'}</p>
               <p>Timestamp: {timeData.timestamp || 'N/A'}</p>
+              {roundTripMs !== null && <p>Sync round trip: {roundTripMs} ms</p>}
             </div>
             {/* Arrow */}
             <div className="absolute top-full right-4 -mt-1 border-4 border-transparent border-t-gray-900" />
@@ -23,6 +23,7 @@ export const AuthProvider = ({ children }) => {
                 const userData = {
                     token: currentUser.token,
                     userId: currentUser.userId,
+                    authUserId: currentUser.authUserId,
                     username: currentUser.username,
                     role: currentUser.role
                 };
@@ -153,6 +154,7 @@ export const AuthProvider = ({ children }) => {
                 const userData = {
                     token: response.token,
                     userId: response.profile_id,
+                    authUserId: response.user_id,
                     username: response.username,
                     role: response.role
                 };
@@ -209,6 +211,7 @@ export const AuthProvider = ({ children }) => {
                 const ownerData = {
                     token: response.token,
                     userId: response.profile_id,
+                    authUserId: response.user_id,
                     username: response.username,
                     role: response.role
                 };
@@ -272,6 +275,7 @@ export const AuthProvider = ({ children }) => {
                 const adminData = {
                     token: response.token,
                     userId: response.profile_id,
+                    authUserId: response.user_id,
                     username: response.username,
                     role: response.role
                 };
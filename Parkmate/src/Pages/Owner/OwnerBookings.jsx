@@ -2,6 +2,7 @@ import React, { useState, useEffect, useRef, useMemo } from 'react'
 import { useAuth } from '../../Context/AuthContext'
 import parkingService from '../../services/parkingService'
 import { notify } from '../../utils/notify.jsx'
+import { useOwnerEvents } from '../../hooks/useOwnerEvents'
 import './Owner.scss'
 
 const OwnerBookings = () => {
@@ -77,19 +78,34 @@ const OwnerBookings = () => {
             fetchOwnerLots()
             loadBookings()
 
-            // Set up auto-refresh every 10 seconds to check for expired bookings
+            // Bookings only expire when something checks for them, so look once a minute
             refreshIntervalRef.current = setInterval(() => {
                 console.log('🔄 Auto-refreshing bookings...')
                 loadBookings()
-            }, 10000)
+            }, 60000)
+
+            return () => clearInterval(refreshIntervalRef.current)
         }
+    }, [owner])
 
-        return () => {
-            if (refreshIntervalRef.current) {
-                clearInterval(refreshIntervalRef.current)
+    // Apply the owner event stream instead of re-downloading on a timer
+    useOwnerEvents(owner?.role === 'Owner', (events) => {
+        let reload = false
+        events.forEach(({ kind, data }) => {
+            if (kind === 'booking_status' && bookings.some(b => b.booking_id === data.booking_id)) {
+                console.log(`📬 Booking ${data.booking_id}: ${data.previous} → ${data.status}`)
+                setBookings(prev => prev.map(b => (b.booking_id === data.booking_id ? { ...b, status: data.status } : b)))
+            } else if (kind === 'booking_created' || kind === 'booking_status'
+                || ((kind === 'payment_pending' || kind === 'payment_status') && data.booking_id)) {
+                // New rows (and pending cash payments, which come with the bookings) need the full list
+                reload = true
             }
+        })
+        if (reload) {
+            console.log('🔄 Refreshing bookings after owner events...')
+            loadBookings()
         }
-    }, [owner])
+    })
 
     const filteredBookings = useMemo(() => {
         let filtered = bookings.filter(b => {
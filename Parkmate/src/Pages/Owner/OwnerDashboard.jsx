@@ -1,6 +1,7 @@
 import React, { useEffect, useState } from 'react'
 import { useAuth } from '../../Context/AuthContext'
 import parkingService from '../../services/parkingService'
+import { onNotification } from '../../hooks/useWebSocketNotifications'
 
 const OwnerDashboard = () => {
     const { owner } = useAuth()  // Changed from user to owner
@@ -114,13 +115,11 @@ const OwnerDashboard = () => {
             console.log('👤 Owner detected, loading dashboard...')
             loadDashboardData()
             
-            // Refresh dashboard every 30 seconds to show new lots/bookings
-            const interval = setInterval(() => {
-                console.log('🔄 Auto-refreshing dashboard...')
+            // Refresh when a notification (e.g. a new booking) arrives, live or replayed
+            return onNotification(() => {
+                console.log('🔄 Refreshing dashboard after notification...')
                 loadDashboardData()
-            }, 30000)
-            
-            return () => clearInterval(interval)
+            })
         } else {
             console.log('❌ User is not an Owner:', owner?.role)
             setLoading(false)
@@ -1,7 +1,8 @@
-import React, { useState, useEffect, useRef, useMemo } from 'react'
+import React, { useState, useEffect, useMemo } from 'react'
 import { useAuth } from '../../Context/AuthContext'
 import parkingService from '../../services/parkingService'
 import { notify } from '../../utils/notify.jsx'
+import { useOwnerEvents } from '../../hooks/useOwnerEvents'
 import './Owner.scss'
 
 const fontStyles = {
@@ -69,7 +70,6 @@ const OwnerPayments = () => {
     const [dateTo, setDateTo] = useState('')
     const [ownerLots, setOwnerLots] = useState([])
     const [filterLot, setFilterLot] = useState('')
-    const refreshIntervalRef = useRef(null)
 
     // Fetch owner's lots for filter dropdown
     const fetchOwnerLots = async () => {
@@ -125,20 +125,26 @@ const OwnerPayments = () => {
         if (owner?.role === 'Owner') {
             fetchOwnerLots()
             loadPayments()
-
-            // Set up auto-refresh every 15 seconds
-            refreshIntervalRef.current = setInterval(() => {
-                console.log('🔄 Auto-refreshing payments...')
-                loadPayments()
-            }, 15000)
         }
+    }, [owner, statusFilter, methodFilter])
 
-        return () => {
-            if (refreshIntervalRef.current) {
-                clearInterval(refreshIntervalRef.current)
+    // Apply the owner event stream instead of re-downloading on a timer
+    useOwnerEvents(owner?.role === 'Owner', (events) => {
+        let reload = false
+        events.forEach(({ kind, data }) => {
+            if (!data.pay_id) return  // car wash booking payments are not listed here
+            if (kind === 'payment_status' && statusFilter === 'all'
+                && payments.some(p => p.pay_id === data.pay_id)) {
+                setPayments(prev => prev.map(p => (p.pay_id === data.pay_id ? { ...p, status: data.status } : p)))
+            } else if (kind === 'payment_pending' || kind === 'payment_status') {
+                reload = true
             }
+        })
+        if (reload) {
+            console.log('🔄 Refreshing payments after owner events...')
+            loadPayments()
         }
-    }, [owner, statusFilter, methodFilter])
+    })
 
     const getStatusColor = (status) => {
         switch (status?.toUpperCase()) {
@@ -1,6 +1,7 @@
-import React, { useState, useEffect, useRef } from 'react'
+import React, { useState, useEffect } from 'react'
 import { useAuth } from '../../Context/AuthContext'
 import parkingService from '../../services/parkingService'
+import { useOwnerEvents } from '../../hooks/useOwnerEvents'
 import './Owner.scss'
 
 const OwnerServices = () => {
@@ -15,7 +16,6 @@ const OwnerServices = () => {
     const [filterLot, setFilterLot] = useState('')
     const [dateFrom, setDateFrom] = useState('')
     const [dateTo, setDateTo] = useState('')
-    const refreshIntervalRef = useRef(null)
 
     // Fetch owner's lots for filter dropdown
     const fetchOwnerLots = async () => {
@@ -76,20 +76,26 @@ const OwnerServices = () => {
         if (owner?.role === 'Owner') {
             fetchOwnerLots()
             loadOwnerServices()
-            
-            // Set up auto-refresh every 15 seconds
-            refreshIntervalRef.current = setInterval(() => {
-                console.log('🔄 Auto-refreshing owner services...')
-                loadOwnerServices()
-            }, 15000)
         }
+    }, [owner])
 
-        return () => {
-            if (refreshIntervalRef.current) {
-                clearInterval(refreshIntervalRef.current)
+    // Apply the owner event stream instead of re-downloading every 15 seconds
+    useOwnerEvents(owner?.role === 'Owner', (events) => {
+        let reload = false
+        events.forEach(({ kind, data }) => {
+            if (!data.carwash_id) return  // standalone car wash bookings are not listed here
+            if (kind === 'carwash_status' && carwashes.some(c => c.carwash_id === data.carwash_id)) {
+                setCarwashes(prev => prev.map(c => (c.carwash_id === data.carwash_id ? { ...c, status: data.status } : c)))
+            } else {
+                // A new car wash, or an employee change (the list shows the employee's details)
+                reload = true
             }
+        })
+        if (reload) {
+            console.log('🔄 Refreshing owner services after owner events...')
+            loadOwnerServices()
         }
-    }, [owner])
+    })
 
     const handleViewDetails = (service) => {
         console.log('📋 Viewing details for service:', service)
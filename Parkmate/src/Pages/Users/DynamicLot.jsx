@@ -3,6 +3,7 @@ import { Link, useParams, useNavigate } from 'react-router-dom';
 import { useAuth } from '../../Context/AuthContext';
 import parkingService from '../../services/parkingService';
 import PaymentModal from '../../Components/PaymentModal';
+import { useLotAvailability } from '../../hooks/useLotAvailability';
 import './Lot1.scss';
 
 const ONE_HOUR_MS = 60 * 60 * 1000;
@@ -16,6 +17,24 @@ function formatRemaining(ms) {
     return [h, m, s].map((n) => String(n).padStart(2, '0')).join(':');
 }
 
+// Slot from a ws/lots/ snapshot or delta, in the shape the grid uses
+function fromLiveSlot(live, previous = {}) {
+    const held = live.state !== 'available';
+    return {
+        ...previous,
+        id: live.id,
+        backendId: live.id,
+        slotNumber: live.id,
+        isAvailable: !held,
+        vehicleType: live.vehicle_type ?? previous.vehicleType,
+        price: live.price ?? previous.price,
+        booking: live.end_time
+            ? { start_time: live.start_time, end_time: live.end_time, status: live.state === 'scheduled' ? 'SCHEDULED' : 'ACTIVE' }
+            : null,
+        bookedAt: live.end_time ? new Date(live.end_time).getTime() - ONE_HOUR_MS : null
+    };
+}
+
 // Convert Date object to datetime-local format (YYYY-MM-DDTHH:mm)
 // This ensures the min/max values match the user's local timezone
 function formatDateTimeLocal(date) {
@@ -49,7 +68,6 @@ const DynamicLot = () => {
     const [showPaymentModal, setShowPaymentModal] = useState(false);
     const [isBooking, setIsBooking] = useState(false);
     const timeoutsRef = useRef({});
-    const refreshIntervalRef = useRef(null);
     const vehicleCheckTimeoutRef = useRef(null);
 
     // Function to check vehicle availability
@@ -186,19 +204,35 @@ const DynamicLot = () => {
         };
 
         loadLotData();
-
-        // Set up periodic refresh every 5 seconds (increased from 10) to catch expired bookings faster
-        refreshIntervalRef.current = setInterval(() => {
-            refreshSlots();
-        }, 5000);
-
-        return () => {
-            if (refreshIntervalRef.current) {
-                clearInterval(refreshIntervalRef.current);
-            }
-        };
     }, [lotId]);
 
+    // Live availability replaces polling: a snapshot on (re)connect, then
+    // deltas for the slots that change (expired bookings included)
+    useLotAvailability(lotId, (message) => {
+        const matchesFilter = (live) =>
+            selectedVehicleType === 'All' || !live.vehicle_type
+            || live.vehicle_type.toLowerCase() === selectedVehicleType.toLowerCase();
+
+        if (message.type === 'snapshot') {
+            setSlots(message.slots.filter(matchesFilter).map((live) => fromLiveSlot(live)));
+        } else if (message.type === 'delta') {
+            setSlots((prev) => {
+                let next = prev;
+                message.slots.forEach((live) => {
+                    if (live.state === 'removed') {
+                        next = next.filter((s) => s.id !== live.id);
+                    } else if (next.some((s) => s.id === live.id)) {
+                        next = next.map((s) => (s.id === live.id ? fromLiveSlot(live, s) : s));
+                    } else if (live.vehicle_type && matchesFilter(live)) {
+                        // A slot the owner just added
+                        next = [...next, fromLiveSlot(live)];
+                    }
+                });
+                return next;
+            });
+        }
+    });
+
     // Refresh slots when vehicle type filter changes
     useEffect(() => {
         if (lotInfo) { // Only refresh if lot data is loaded
@@ -237,10 +271,6 @@ const DynamicLot = () => {
         return () => {
             Object.values(timeoutsRef.current).forEach((id) => clearTimeout(id));
             timeoutsRef.current = {};
-            // Clean up refresh interval on unmount
-            if (refreshIntervalRef.current) {
-                clearInterval(refreshIntervalRef.current);
-            }
         };
         // eslint-disable-next-line react-hooks/exhaustive-deps
     }, [slots]);
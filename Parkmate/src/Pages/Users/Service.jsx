@@ -134,17 +134,14 @@ export default function Service() {
       console.log('💳 Processing car wash payment...', paymentData)
       
       // Call backend to process payment and create car wash booking
-      const response = await parkingService.api.post(
-        `/carwashes/pay_for_service/`,
-        {
-          booking_id: selectedBooking,
-          carwash_type_id: selectedService,
-          payment_method: paymentData.payment_method,
-          amount: paymentData.amount
-        }
-      )
+      const result = await parkingService.payForCarWashService({
+        booking_id: selectedBooking,
+        carwash_type_id: selectedService,
+        payment_method: paymentData.payment_method,
+        amount: paymentData.amount
+      })
       
-      console.log('✅ Car wash service booked successfully:', response.data)
+      console.log('✅ Car wash service booked successfully:', result)
       
       toast.success('✅ Car Wash Service booked successfully!', { autoClose: 3000 })
       
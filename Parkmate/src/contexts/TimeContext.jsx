@@ -1,6 +1,10 @@
 /**
  * TimeContext - Global time synchronization context
  * Provides real-time server time to all components via WebSocket
+ *
+ * Uses the compact protocol (/ws/time/?mode=compact): the server sends its
+ * epoch and UTC offset on connect and on request, and the clock ticks
+ * locally in between, re-syncing every few minutes.
  * 
  * Usage:
  *   import { useServerTime } from '@/contexts/TimeContext'
@@ -12,6 +16,46 @@ import { toast } from 'react-toastify'
 
 const TimeContext = createContext(null)
 
+const RESYNC_INTERVAL_MS = 5 * 60 * 1000
+const WEEKDAYS = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+const MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+  'August', 'September', 'October', 'November', 'December']
+const pad = (n) => String(n).padStart(2, '0')
+
+// Same fields the server's time_update carries, computed from an epoch in the server's timezone
+const buildTimeData = (epochMs, offsetSeconds, timezone) => {
+  // UTC getters on the shifted date give the server's wall clock
+  const wall = new Date(epochMs + offsetSeconds * 1000)
+  const year = wall.getUTCFullYear()
+  const month = wall.getUTCMonth() + 1
+  const day = wall.getUTCDate()
+  const hour = wall.getUTCHours()
+  const minute = wall.getUTCMinutes()
+  const second = wall.getUTCSeconds()
+  const weekday = WEEKDAYS[wall.getUTCDay()]
+  const time = `${pad(hour % 12 || 12)}:${pad(minute)}:${pad(second)} ${hour < 12 ? 'AM' : 'PM'}`
+  const date = `${year}-${pad(month)}-${pad(day)}`
+  const time24h = `${pad(hour)}:${pad(minute)}:${pad(second)}`
+  const sign = offsetSeconds < 0 ? '-' : '+'
+  const absOffset = Math.abs(offsetSeconds)
+  return {
+    datetime: `${date}T${time24h}${sign}${pad(Math.floor(absOffset / 3600))}:${pad(Math.floor(absOffset % 3600 / 60))}`,
+    formatted: `${weekday}, ${MONTHS[month - 1]} ${pad(day)} ${year}, ${time}`,
+    date,
+    time,
+    time_24h: time24h,
+    timestamp: Math.floor(epochMs / 1000),
+    year,
+    month,
+    day,
+    hour,
+    minute,
+    second,
+    weekday,
+    timezone
+  }
+}
+
 export const TimeProvider = ({ children }) => {
   const [serverTime, setServerTime] = useState(new Date())
   const [timeData, setTimeData] = useState({
@@ -23,13 +67,49 @@ export const TimeProvider = ({ children }) => {
     connected: false
   })
   const [isConnected, setIsConnected] = useState(false)
+  const [roundTripMs, setRoundTripMs] = useState(null)
   const reconnectAttemptsRef = useRef(0)
 
   useEffect(() => {
     let socket = null
     let reconnectTimeout = null
+    let resyncInterval = null
+    let tickTimeout = null
     let hasShownDisconnectWarning = false
     let isCleaningUp = false
+    // Set by each sync: local-to-server clock skew and the server's UTC offset
+    let clock = null
+
+    const requestSync = () => {
+      if (socket && socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify({ type: 'sync', client_ts: Date.now() }))
+      }
+    }
+
+    // Local tick, aligned to the server's second boundary
+    const tick = () => {
+      if (isCleaningUp || !clock) return
+      const serverNow = Date.now() + clock.skewMs
+      setServerTime(new Date(serverNow))
+      setTimeData({
+        ...buildTimeData(serverNow, clock.offsetSeconds, clock.timezone),
+        connected: !!socket && socket.readyState === WebSocket.OPEN
+      })
+      tickTimeout = setTimeout(tick, 1000 - (serverNow % 1000) + 5)
+    }
+
+    const applySync = (data) => {
+      const receivedAt = Date.now()
+      const rtt = data.client_ts ? Math.max(receivedAt - data.client_ts, 0) : 0
+      clock = {
+        skewMs: data.epoch_ms + rtt / 2 - receivedAt,
+        offsetSeconds: data.offset_seconds,
+        timezone: data.timezone
+      }
+      setRoundTripMs(data.client_ts ? rtt : null)
+      clearTimeout(tickTimeout)
+      tick()
+    }
 
     const connectWebSocket = () => {
       // Don't create new connection if cleaning up
@@ -49,7 +129,7 @@ export const TimeProvider = ({ children }) => {
           ? (window.location.port || (window.location.protocol === 'https:' ? 443 : 80))
           : 8000
         
-        const wsUrl = `${protocol}//${hostname}:${backendPort}/ws/time/`
+        const wsUrl = `${protocol}//${hostname}:${backendPort}/ws/time/?mode=compact`
 
         console.log('🕐 Connecting to time sync WebSocket:', wsUrl)
 
@@ -60,19 +140,35 @@ export const TimeProvider = ({ children }) => {
           setIsConnected(true)
           reconnectAttemptsRef.current = 0
           hasShownDisconnectWarning = false
+          // Refine the first sync with a round-trip measurement, then re-sync periodically
+          requestSync()
+          clearInterval(resyncInterval)
+          resyncInterval = setInterval(requestSync, RESYNC_INTERVAL_MS)
         }
 
         socket.onmessage = (event) => {
           try {
             const data = JSON.parse(event.data)
             
+            // Server heartbeat: silent sockets are closed after a minute
+            if (data.type === 'ping') {
+              socket.send(JSON.stringify({ type: 'pong' }))
+              return
+            }
+
             // Handle connection confirmation
             if (data.type === 'connected') {
               console.log('✅ Server time synchronization active')
               return
             }
 
-            // Handle time updates
+            // Compact protocol: server epoch + offset, ticked locally
+            if (data.type === 'sync') {
+              applySync(data)
+              return
+            }
+
+            // Handle time updates (servers without the compact protocol)
             if (data.type === 'time_update') {
               // Use timestamp to create Date object to avoid timezone conversion issues
               // The backend sends IST time, so we use the timestamp which is timezone-agnostic
@@ -110,6 +206,7 @@ export const TimeProvider = ({ children }) => {
 
         socket.onclose = (event) => {
           console.log('❌ Time sync WebSocket disconnected', event.code)
+          clearInterval(resyncInterval)
           setIsConnected(false)
           setTimeData(prev => ({ ...prev, connected: false }))
 
@@ -149,6 +246,8 @@ export const TimeProvider = ({ children }) => {
       if (reconnectTimeout) {
         clearTimeout(reconnectTimeout)
       }
+      clearTimeout(tickTimeout)
+      clearInterval(resyncInterval)
       if (socket && socket.readyState !== WebSocket.CLOSED) {
         socket.close()
       }
@@ -159,6 +258,7 @@ export const TimeProvider = ({ children }) => {
     serverTime,        // Date object for direct use
     timeData,          // Detailed time data with all formats
     isConnected,       // Connection status
+    roundTripMs,       // Round trip of the last sync request (null until measured)
     // Helper methods
     getServerDate: () => timeData.date,
     getServerTime: () => timeData.time,
@@ -0,0 +1,91 @@
+/**
+ * Custom React hook for the live slot grid of one lot
+ * Connects to the Django Channels endpoint ws/lots/{lotId}/
+ *
+ * Usage in component:
+ *   const { isConnected } = useLotAvailability(lotId, (message) => { ... });
+ *
+ * The handler receives a `snapshot` (every slot of the lot) on each
+ * (re)connect and a `delta` (only the slots that changed: id, state,
+ * end_time) whenever a booking is created, cancelled, renewed or expires.
+ * Slots in a delta may also be `state: 'removed'`; newly added slots carry
+ * vehicle_type and price as in the snapshot.
+ */
+
+/* global process */
+import { useEffect, useRef, useState } from 'react';
+
+export const useLotAvailability = (lotId, onMessage) => {
+  const socketRef = useRef(null);
+  const handlerRef = useRef(onMessage);
+  const [isConnected, setIsConnected] = useState(false);
+
+  // Always call the latest handler without reconnecting
+  useEffect(() => {
+    handlerRef.current = onMessage;
+  }, [onMessage]);
+
+  useEffect(() => {
+    if (!lotId) {
+      return;
+    }
+
+    let reconnectTimeout = null;
+    let closedByUs = false;
+
+    const connect = () => {
+      const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+      const hostname = window.location.hostname || 'localhost';
+      const backendPort = process.env.NODE_ENV === 'production'
+        ? (window.location.port || (window.location.protocol === 'https:' ? 443 : 80))
+        : 8000;
+      const wsUrl = `${protocol}//${hostname}:${backendPort}/ws/lots/${lotId}/`;
+
+      console.log(`🔌 Connecting to lot availability: ${wsUrl}`);
+      socketRef.current = new WebSocket(wsUrl);
+
+      socketRef.current.onopen = () => {
+        console.log(`✅ Lot ${lotId} availability connected`);
+        setIsConnected(true);
+      };
+
+      socketRef.current.onmessage = (event) => {
+        try {
+          const data = JSON.parse(event.data);
+          // Server heartbeat: silent sockets are closed after a minute
+          if (data.type === 'ping') {
+            socketRef.current?.send(JSON.stringify({ type: 'pong' }));
+            return;
+          }
+          handlerRef.current?.(data);
+        } catch (error) {
+          console.error('❌ Error handling lot availability message:', error);
+        }
+      };
+
+      socketRef.current.onclose = (event) => {
+        setIsConnected(false);
+        if (closedByUs || event.code === 4404) {
+          return;
+        }
+        // The snapshot sent on reconnect brings the grid up to date
+        console.log('🔄 Lot availability reconnecting in 3 seconds...');
+        reconnectTimeout = setTimeout(connect, 3000);
+      };
+    };
+
+    connect();
+
+    return () => {
+      closedByUs = true;
+      if (reconnectTimeout) {
+        clearTimeout(reconnectTimeout);
+      }
+      if (socketRef.current) {
+        socketRef.current.close();
+      }
+    };
+  }, [lotId]);
+
+  return { isConnected };
+};
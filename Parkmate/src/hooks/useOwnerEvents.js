@@ -0,0 +1,118 @@
+/**
+ * Custom React hook for the owner's operations event stream
+ * Connects to ws/owner/events/ (long-polls /api/owner/events/ if the
+ * socket keeps failing)
+ *
+ * Usage in component:
+ *   useOwnerEvents(owner?.role === 'Owner', (events) => { ... });
+ *
+ * Events arrive in `seq` order, each exactly once per mount:
+ *   { seq, kind, data, created_at }
+ * kind is booking_created, booking_status, payment_pending, payment_status,
+ * carwash_status or employee_assignment. Pages load their lists once and
+ * apply these instead of re-downloading them on a timer.
+ */
+
+/* global process */
+import { useEffect, useRef } from 'react';
+import parkingService from '../services/parkingService';
+
+const SOCKET_FAILURES_BEFORE_LONG_POLL = 3;
+
+export const useOwnerEvents = (enabled, onEvents) => {
+  const handlerRef = useRef(onEvents);
+
+  // Always call the latest handler without reconnecting
+  useEffect(() => {
+    handlerRef.current = onEvents;
+  }, [onEvents]);
+
+  useEffect(() => {
+    const token = localStorage.getItem('authToken');
+    if (!enabled || !token) {
+      return;
+    }
+
+    let cursor = null; // last seq applied; null until the server tells us where "now" is
+    let socket = null;
+    let stopped = false;
+    let failures = 0;
+    let reconnectTimeout = null;
+
+    const apply = (events) => {
+      const fresh = events.filter((event) => cursor === null || event.seq > cursor);
+      if (fresh.length === 0) return;
+      cursor = fresh[fresh.length - 1].seq;
+      try {
+        handlerRef.current?.(fresh);
+      } catch (error) {
+        console.error('❌ Error applying owner events:', error);
+      }
+    };
+
+    const longPoll = async () => {
+      while (!stopped) {
+        try {
+          const params = cursor === null ? {} : { since: cursor, timeout: 25 };
+          const response = await parkingService.api.get('/owner/events/', { params, timeout: 35000 });
+          if (cursor === null) {
+            cursor = response.data.latest_seq;
+          }
+          apply(response.data.events);
+        } catch (error) {
+          console.error('❌ Owner event long poll failed:', error);
+          await new Promise((resolve) => setTimeout(resolve, 5000));
+        }
+      }
+    };
+
+    const connect = () => {
+      const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+      const hostname = window.location.hostname || 'localhost';
+      const backendPort = process.env.NODE_ENV === 'production'
+        ? (window.location.port || (window.location.protocol === 'https:' ? 443 : 80))
+        : 8000;
+      const since = cursor === null ? '' : `&since=${cursor}`;
+      socket = new WebSocket(`${protocol}//${hostname}:${backendPort}/ws/owner/events/?token=${token}${since}`);
+      let opened = false;
+
+      socket.onopen = () => {
+        opened = true;
+        failures = 0;
+        console.log('✅ Owner event stream connected');
+      };
+
+      socket.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        if (data.type === 'ping') {
+          // Server heartbeat: silent sockets are closed after a minute
+          socket.send(JSON.stringify({ type: 'pong' }));
+        } else if (data.type === 'connected') {
+          if (cursor === null) cursor = data.seq;
+        } else if (data.type === 'events') {
+          apply(data.events);
+        }
+      };
+
+      socket.onclose = (event) => {
+        // 4401: not an owner; 4429: a newer tab took this socket's place
+        if (stopped || event.code === 4401 || event.code === 4429) return;
+        failures = opened ? 0 : failures + 1;
+        if (failures >= SOCKET_FAILURES_BEFORE_LONG_POLL) {
+          console.log('🔄 Owner event socket unavailable, switching to long polling');
+          longPoll();
+          return;
+        }
+        reconnectTimeout = setTimeout(connect, 3000);
+      };
+    };
+
+    connect();
+
+    return () => {
+      stopped = true;
+      if (reconnectTimeout) clearTimeout(reconnectTimeout);
+      if (socket) socket.close();
+    };
+  }, [enabled]);
+};
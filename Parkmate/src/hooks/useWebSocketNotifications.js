@@ -3,13 +3,43 @@
  * Connects to Django Channels WebSocket endpoint
  * 
  * Usage in component:
- *   const { isConnected } = useWebSocketNotifications(userId);
+ *   const { isConnected } = useWebSocketNotifications(authUserId);
+ *
+ * The socket authenticates with the DRF token from localStorage
+ * ('authToken'); the server only lets a user subscribe to their own id.
+ *
+ * Every stored notification carries a per-user `seq`. The last one seen is
+ * kept in localStorage and sent as `?since=` on (re)connect, so the server
+ * replays whatever arrived while the socket was down. Each new notification
+ * is also dispatched as a `parkmate:notification` window event, which pages
+ * listen to instead of polling to catch up:
+ *
+ *   useEffect(() => onNotification(() => reload()), [])
  */
 
 /* global process */
 import { useEffect, useRef, useState } from 'react';
 import { toast } from 'react-toastify';
 
+export const NOTIFICATION_EVENT = 'parkmate:notification';
+
+const cursorKey = (userId) => `parkmate:notifications:lastSeq:${userId}`;
+
+const readCursor = (userId) => {
+  const value = parseInt(localStorage.getItem(cursorKey(userId)), 10);
+  return Number.isNaN(value) ? null : value;
+};
+
+/**
+ * Subscribe to notifications delivered by useWebSocketNotifications
+ * (live or replayed after a reconnect). Returns the unsubscribe function.
+ */
+export const onNotification = (handler) => {
+  const listener = (event) => handler(event.detail);
+  window.addEventListener(NOTIFICATION_EVENT, listener);
+  return () => window.removeEventListener(NOTIFICATION_EVENT, listener);
+};
+
 export const useWebSocketNotifications = (userId) => {
   const socketRef = useRef(null);
   const [isConnected, setIsConnected] = useState(false);
@@ -33,10 +63,15 @@ export const useWebSocketNotifications = (userId) => {
           ? (window.location.port || (window.location.protocol === 'https:' ? 443 : 80))
           : 8000;
         
-        const wsUrl = `${protocol}//${hostname}:${backendPort}/ws/notifications/${userId}/`;
+        // Ask for everything after the last notification this browser saw
+        const lastSeq = readCursor(userId);
+        const token = localStorage.getItem('authToken') || '';
+        const query = `?token=${token}` + (lastSeq === null ? '' : `&since=${lastSeq}`);
+        const endpoint = `${protocol}//${hostname}:${backendPort}/ws/notifications/${userId}/`;
+        const wsUrl = `${endpoint}${query}`;
 
         console.log(`🔌 Connecting to WebSocket`);
-        console.log(`   URL: ${wsUrl}`);
+        console.log(`   URL: ${endpoint}`);  // without the token
         console.log(`   Environment: ${process.env.NODE_ENV}`);
         console.log(`   Frontend: ${window.location.host}`);
         console.log(`   Backend: ${hostname}:${backendPort}`);
@@ -51,14 +86,34 @@ export const useWebSocketNotifications = (userId) => {
         socketRef.current.onmessage = (event) => {
           try {
             const data = JSON.parse(event.data);
+
+            // Server heartbeat: silent sockets are closed after a minute
+            if (data.type === 'ping') {
+              socketRef.current?.send(JSON.stringify({ type: 'pong' }));
+              return;
+            }
             console.log('📬 WebSocket message received:', data);
 
             // Check if connection confirmation message
             if (data.connected === true) {
               console.log('✅ Real-time notifications active');
+              // First connection from this browser: start from the latest, don't replay history
+              if (readCursor(userId) === null && typeof data.seq === 'number') {
+                localStorage.setItem(cursorKey(userId), String(data.seq));
+              }
               return;
             }
 
+            if (typeof data.seq === 'number') {
+              // Skip anything already shown (replay and live delivery can overlap)
+              const lastSeen = readCursor(userId);
+              if (lastSeen !== null && data.seq <= lastSeen) {
+                return;
+              }
+              localStorage.setItem(cursorKey(userId), String(data.seq));
+            }
+            window.dispatchEvent(new CustomEvent(NOTIFICATION_EVENT, { detail: data }));
+
             // Handle car wash completion notification
             if (data.type === 'carwash_completed') {
               console.log('🚗 Car wash completion notification:', data);
@@ -100,7 +155,7 @@ export const useWebSocketNotifications = (userId) => {
 
         socketRef.current.onerror = (error) => {
           console.error('❌ WebSocket error:', error);
-          console.error('   WebSocket URL:', wsUrl);
+          console.error('   WebSocket URL:', endpoint);
           console.error('   ReadyState:', socketRef.current?.readyState);
           console.error('   User ID:', userId);
           setIsConnected(false);
@@ -110,6 +165,11 @@ export const useWebSocketNotifications = (userId) => {
           console.log('❌ WebSocket disconnected', event.code);
           setIsConnected(false);
 
+          // 4401: not signed in as this user; 4429: a newer tab took this socket's place
+          if (event.code === 4401 || event.code === 4429) {
+            return;
+          }
+
           // Auto-reconnect after 5 seconds
           console.log('🔄 Reconnecting in 5 seconds...');
           reconnectTimeoutRef.current = setTimeout(() => {
@@ -47,6 +47,7 @@ api.interceptors.response.use(
       localStorage.removeItem('authToken');
       localStorage.removeItem('userRole');
       localStorage.removeItem('userId');
+      localStorage.removeItem('authUserId');
       localStorage.removeItem('username');
       
       // Only redirect if user was previously authenticated (not just missing token)
@@ -30,12 +30,13 @@ const authService = {
   // Login
   login: async (credentials) => {
     const response = await api.post('/auth/login/', credentials);
-    const { token, role, profile_id, username } = response.data;
+    const { token, role, profile_id, user_id, username } = response.data;
     
     // Store auth data
     localStorage.setItem('authToken', token);
     localStorage.setItem('userRole', role);
     localStorage.setItem('userId', profile_id);
+    localStorage.setItem('authUserId', user_id);  // notifications are addressed by it
     localStorage.setItem('username', username);
     
     return response.data;
@@ -51,6 +52,7 @@ const authService = {
       localStorage.removeItem('authToken');
       localStorage.removeItem('userRole');
       localStorage.removeItem('userId');
+      localStorage.removeItem('authUserId');
       localStorage.removeItem('username');
     }
   },
@@ -61,6 +63,7 @@ const authService = {
       token: localStorage.getItem('authToken'),
       role: localStorage.getItem('userRole'),
       userId: localStorage.getItem('userId'),
+      authUserId: localStorage.getItem('authUserId'),
       username: localStorage.getItem('username'),
     };
   },
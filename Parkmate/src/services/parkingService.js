@@ -1,5 +1,16 @@
 import api from './api';
 
+// Booking and payment POSTs carry an Idempotency-Key, one per attempt, so a
+// request the network retries is answered once by the backend. Pass the same
+// key again to retry an attempt explicitly.
+const newIdempotencyKey = () =>
+  globalThis.crypto?.randomUUID?.() ||
+  `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}${Math.random().toString(36).slice(2)}`;
+
+const idempotent = (idempotencyKey) => ({
+  headers: { 'Idempotency-Key': idempotencyKey || newIdempotencyKey() },
+});
+
 const parkingService = {
   // ===== USER PROFILES =====
   getUserProfile: async () => {
@@ -106,8 +117,8 @@ const parkingService = {
     return response.data;
   },
 
-  createBooking: async (bookingData) => {
-    const response = await api.post('/bookings/', bookingData);
+  createBooking: async (bookingData, idempotencyKey) => {
+    const response = await api.post('/bookings/', bookingData, idempotent(idempotencyKey));
     return response.data;
   },
 
@@ -126,8 +137,8 @@ const parkingService = {
     return response.data;
   },
 
-  renewBooking: async (id, paymentData) => {
-    const response = await api.post(`/bookings/${id}/renew/`, paymentData || {});
+  renewBooking: async (id, paymentData, idempotencyKey) => {
+    const response = await api.post(`/bookings/${id}/renew/`, paymentData || {}, idempotent(idempotencyKey));
     return response.data;
   },
 
@@ -232,8 +243,13 @@ const parkingService = {
   },
 
   // ===== CAR WASH BOOKINGS =====
-  createCarWashBooking: async (bookingData) => {
-    const response = await api.post('/carwash-bookings/', bookingData);
+  createCarWashBooking: async (bookingData, idempotencyKey) => {
+    const response = await api.post('/carwash-bookings/', bookingData, idempotent(idempotencyKey));
+    return response.data;
+  },
+
+  payForCarWashService: async (paymentData, idempotencyKey) => {
+    const response = await api.post('/carwashes/pay_for_service/', paymentData, idempotent(idempotencyKey));
     return response.data;
   },
 
@@ -300,6 +316,12 @@ const parkingService = {
     return response.data;
   },
 
+  // Notifications missed since a seq (REST fallback for the WebSocket replay)
+  getNotifications: async (since = 0) => {
+    const response = await api.get('/notifications/', { params: { since } });
+    return response.data;
+  },
+
   // Export api for direct use if needed
   api: api,
 };
@@ -11,8 +11,8 @@ import os
 import logging
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 from parking.routing import websocket_urlpatterns
+from parking.ws_auth import TokenAuthMiddlewareStack
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -24,7 +24,8 @@ django_asgi_app = get_asgi_application()
 # ASGI application using Channels ProtocolTypeRouter (recommended approach)
 application = ProtocolTypeRouter({
     'http': django_asgi_app,
-    'websocket': AuthMiddlewareStack(
+    # DRF tokens (?token=) or the session cookie; see parking/ws_auth.py
+    'websocket': TokenAuthMiddlewareStack(
         URLRouter(
             websocket_urlpatterns
         )
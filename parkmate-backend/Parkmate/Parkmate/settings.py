@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -53,6 +54,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'parking.db_router.ReplicaRoutingMiddleware',
+    'parking.idempotency.IdempotencyMiddleware',
 ]
 
 ROOT_URLCONF = 'Parkmate.urls'
@@ -78,13 +81,33 @@ WSGI_APPLICATION = 'Parkmate.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# PARKMATE_DB points the app at another SQLite file (bench_ws_connections.py)
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'NAME': os.environ.get('PARKMATE_DB', BASE_DIR / 'db.sqlite3'),
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    },
+    # Read replica for read-heavy GETs. Until PARKMATE_REPLICA_DB points at a
+    # real replica it is the primary file, so routing is transparent.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('PARKMATE_REPLICA_DB', os.environ.get('PARKMATE_DB', BASE_DIR / 'db.sqlite3')),
+        'TEST': {'NAME': BASE_DIR / 'test_db_replica.sqlite3'},
+    },
 }
 
+DATABASE_ROUTERS = ['parking.db_router.PrimaryReplicaRouter']
+DATABASE_REPLICA_ALIAS = 'replica'
+DATABASE_REPLICA_VIEWSETS = (
+    'P_LotVIewSet',
+    'ReviewViewSet',
+    'CarWashServiceViewSet',
+    'P_SlotViewSet',
+)
+# Seconds a user's reads stay on the primary after they write
+DATABASE_STICKY_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -160,6 +183,7 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'idempotency-key',
 ]
 
 # Add CSRF trusted origins for Django 4.0+
@@ -177,8 +201,166 @@ CSRF_COOKIE_SAMESITE = 'Lax'
 
 # ===== DJANGO CHANNELS CONFIGURATION =====
 ASGI_APPLICATION = 'Parkmate.asgi.application'
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer'
+# The layer must reach every worker process, or notifications sent from one
+# daphne worker miss sockets held by another:
+#   REDIS_URL set           -> channels_redis (pip install channels-redis)
+#   CHANNEL_LAYER=memory    -> single-process InMemoryChannelLayer
+#   otherwise               -> parking.channel_layers.SQLiteChannelLayer, a
+#                              shared SQLite file for all workers on this host
+if os.environ.get('REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.environ['REDIS_URL']]},
+        }
+    }
+elif os.environ.get('CHANNEL_LAYER') == 'memory':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer'
+        }
     }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'parking.channel_layers.SQLiteChannelLayer',
+            'CONFIG': {'path': os.environ.get('CHANNEL_LAYER_PATH', str(BASE_DIR / 'channel_layer.sqlite3'))},
+        }
+    }
+
+# ===== CACHE =====
+# The sticky read-your-writes window (parking/db_router.py), the car wash
+# calendar and the reviewable lots cache must be shared by every worker
+# process, or a write on one worker is not seen by the next request on another:
+#   REDIS_URL set     -> Django's RedisCache (redis-py, installed with channels-redis)
+#   CACHE=memory      -> single-process LocMemCache
+#   otherwise         -> FileBasedCache in CACHE_PATH, shared by all workers on this host
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+elif os.environ.get('CACHE') == 'memory':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_PATH', str(BASE_DIR / 'django_cache')),
+        }
+    }
+
+# ===== WEBSOCKET HEARTBEAT =====
+# The server pings every socket; clients silent for WS_HEARTBEAT_TIMEOUT
+# seconds are closed (4408) and removed from their groups. A user's oldest
+# sockets of one kind beyond WS_MAX_SOCKETS_PER_USER are closed (4429)
+WS_HEARTBEAT_INTERVAL = 25
+WS_HEARTBEAT_TIMEOUT = 60
+WS_MAX_SOCKETS_PER_USER = 5
+
+# ===== WEBSOCKET AUTH =====
+# Sockets authenticate with the DRF token (?token=); resolved tokens are
+# cached per process, unknown ones for a shorter time (parking/ws_auth.py)
+WS_TOKEN_CACHE_TTL = 60
+WS_TOKEN_CACHE_NEGATIVE_TTL = 5
+WS_TOKEN_CACHE_SIZE = 10000
+
+# ===== NOTIFICATION OUTBOX =====
+# Notifications are sent after commit by a background dispatcher; events to
+# the same user within this window go out as one coalesced batch
+NOTIFICATION_COALESCE_SECONDS = 0.5
+
+# ===== NOTIFICATION INBOX =====
+# Delivered notifications are stored with per-user sequence numbers so
+# reconnecting clients can replay them (?since=<seq>, /api/notifications/);
+# rows older than this are removed by `python manage.py prune_notifications`
+NOTIFICATION_TTL = 7 * 24 * 60 * 60
+NOTIFICATION_REPLAY_LIMIT = 200
+
+# ===== OWNER EVENT STREAM =====
+# Owner pages follow ws/owner/events/ or long-poll /api/owner/events/;
+# events older than this are removed by `python manage.py prune_owner_events`
+OWNER_EVENT_TTL = 7 * 24 * 60 * 60
+OWNER_EVENT_PAGE_SIZE = 200
+OWNER_EVENT_LONG_POLL_MAX = 30
+
+# ===== BOOKING ARCHIVE =====
+# Completed/cancelled bookings older than this move to the *_ARCHIVE tables
+# (run `python manage.py archive_bookings` periodically)
+BOOKING_ARCHIVE_AFTER_DAYS = 30
+# Newest archived bookings appended to a user's /api/bookings/ list; older
+# ones are read through /api/bookings/history/
+BOOKING_LIST_ARCHIVED_LIMIT = 20
+
+# ===== LOT SEARCH =====
+# 'auto' uses the LOT_SEARCH FTS5 table when SQLite provides it, else an
+# in-process index; 'fts5' / 'memory' force one backend
+# (rebuild with `python manage.py rebuild_lot_search_index`)
+LOT_SEARCH_BACKEND = 'auto'
+
+# ===== NEARBY LOTS =====
+# 'grid' answers /api/lots/nearby/ from an in-process grid index of approved
+# lots; 'sql' uses a bounding-box query instead
+LOT_GEO_BACKEND = 'grid'
+LOT_GEO_CELL_DEGREES = 0.02
+LOT_GEO_INDEX_TTL = 300
+
+# ===== MAP TILES =====
+# Lot pin clusters for /api/lots/tiles/ are precomputed for zoom 0..LOT_TILE_MAX_ZOOM
+LOT_TILE_MAX_ZOOM = 16
+LOT_TILE_INDEX_TTL = 300
+
+# ===== CAR WASH DISPATCH =====
+# Employees are dispatched nearest-first to the lot and hold at most
+# CARWASH_MAX_ASSIGNMENTS active car washes at a time
+CARWASH_MAX_ASSIGNMENTS = 3
+EMPLOYEE_DISPATCH_INDEX_TTL = 60
+
+# ===== CAR WASH ROSTER =====
+# Scheduled car washes occupy [scheduled_time, + service estimated_duration)
+# on an employee's roster; utilisation is measured against this workday
+CARWASH_WORKDAY_HOURS = (9, 21)
+CARWASH_ROSTER_INDEX_TTL = 60
+
+# ===== CONSISTENCY AUDIT =====
+# Saves journal the touched lots/slots/employees/bookings/payments so
+# `python manage.py audit_consistency --incremental` only re-checks those
+CONSISTENCY_JOURNAL = True
+
+# ===== CAR WASH CALENDAR =====
+# /api/carwash-bookings/calendar/ hourly slots take CARWASH_SLOT_CAPACITY
+# bookings each; per-(lot, day) grids are cached and dropped on booking changes
+CARWASH_SLOT_CAPACITY = 2
+CARWASH_CALENDAR_CACHE_TTL = 300
+
+# ===== REVIEWABLE LOTS =====
+# /api/user-booked-lots/ is cached per user and dropped when one of the
+# user's bookings completes; lot availability/ratings in it lag by at most this
+REVIEWABLE_LOTS_CACHE_TTL = 600
+
+# ===== CAR WASH SLOT CAPACITY =====
+# Bookings reserve a unit in the CARWASH_SLOT_CAPACITY ledger row of their
+# time slot (lots can override capacity and slot length)
+CARWASH_SLOT_MINUTES = 60
+
+# ===== SETTLEMENT LEDGER =====
+# Payment changes are appended to the settlement outbox and folded into the
+# ledger after commit; turn off to leave that to
+# `python manage.py drain_settlement_outbox` (e.g. from a scheduled job)
+SETTLEMENT_DRAIN_ON_COMMIT = True
+
+# ===== IDEMPOTENCY KEYS =====
+# POSTs to these actions with an Idempotency-Key header store their response;
+# retries with the same key replay it instead of writing again
+IDEMPOTENT_VIEWS = {
+    'BookingViewSet': ('create', 'renew'),
+    'CarwashViewSet': ('pay_for_service',),
+    'CarWashBookingViewSet': ('create',),
 }
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+Concurrency benchmark for car wash slot reservations.
+
+Many threads book the same few time slots at once, first with the old
+check-then-insert flow (COUNT the slot's bookings, then INSERT if below
+capacity) and then with the capacity ledger (one conditional UPDATE per
+reservation). Reports throughput and how many slots ended up overbooked.
+
+Runs against a throwaway SQLite database file, never the real one.
+
+Usage: python bench_carwash_capacity.py [threads] [requests_per_thread]
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Parkmate.settings')
+django.setup()
+
+from django.conf import settings
+from django.db import connection, connections
+from django.utils import timezone
+
+THREADS = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+REQUESTS_PER_THREAD = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+SLOTS = 8
+CAPACITY = 2
+
+
+def setup_database():
+    path = os.path.join(tempfile.mkdtemp(), 'bench_capacity.sqlite3')
+    settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = path
+    settings.DATABASES['default'].setdefault('OPTIONS', {})['timeout'] = 60
+    connection.settings_dict['OPTIONS']['timeout'] = 60
+    connection.creation.create_test_db(verbosity=0, serialize=False)
+    return path
+
+
+def make_fixtures():
+    from parking.models import AuthUser, OwnerProfile, P_Lot, UserProfile
+    owner_user = AuthUser.objects.create_user(username='bench_owner', password='pass12345', role='Owner')
+    owner = OwnerProfile.objects.create(
+        auth_user=owner_user, firstname='Bench', lastname='Owner', phone='9876543210',
+        streetname='MG Road', city='Kochi', state='Kerala', pincode='682001',
+        verification_status=OwnerProfile.STATUS_APPROVED,
+    )
+    lot = P_Lot.objects.create(owner=owner, lot_name='Bench Lot', streetname='Marine Drive', city='Kochi',
+                               state='Kerala', pincode='682031', total_slots=0, provides_carwash=True,
+                               carwash_slot_capacity=CAPACITY)
+    user = AuthUser.objects.create_user(username='bench_user', password='pass12345', role='User')
+    profile = UserProfile.objects.create(auth_user=user, firstname='Bench', lastname='User',
+                                         phone='9876543211', vehicle_number='KL07AB1234')
+    return lot, profile
+
+
+def slot_times(day_offset):
+    day = timezone.localdate() + timedelta(days=day_offset)
+    base = timezone.make_aware(datetime.combine(day, datetime.min.time())) + timedelta(hours=9)
+    return [base + timedelta(hours=hour) for hour in range(SLOTS)]
+
+
+def naive_reserve(lot, profile, scheduled):
+    from parking.models import CarWashBooking
+    slot_start = scheduled.replace(minute=0, second=0, microsecond=0)
+    booked = CarWashBooking.objects.filter(
+        lot=lot, scheduled_time__gte=slot_start, scheduled_time__lt=slot_start + timedelta(hours=1),
+        status__in=['pending', 'confirmed', 'in_progress'],
+    ).count()
+    if booked >= CAPACITY:
+        return False
+    CarWashBooking.objects.bulk_create([CarWashBooking(
+        user=profile, lot=lot, service_type='Exterior', price=300, payment_method='UPI', scheduled_time=scheduled,
+    )])
+    return True
+
+
+def ledger_reserve(lot, profile, scheduled):
+    from parking.carwash_capacity import reserve
+    return reserve(lot, scheduled)[1]
+
+
+def run(label, reserve_fn, lot, profile, times):
+    successes = [0]
+    errors = [0]
+    lock = threading.Lock()
+    barrier = threading.Barrier(THREADS)
+
+    def worker(seed):
+        rng = random.Random(seed)
+        barrier.wait()
+        for _ in range(REQUESTS_PER_THREAD):
+            try:
+                ok = reserve_fn(lot, profile, rng.choice(times))
+            except Exception as e:
+                ok = False
+                with lock:
+                    errors[0] += 1
+                    if errors[0] == 1:
+                        print(f"   first error: {type(e).__name__}: {e}")
+            if ok:
+                with lock:
+                    successes[0] += 1
+        connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(THREADS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    total = THREADS * REQUESTS_PER_THREAD
+    print(f"{label:<22} {total / elapsed:8.0f} req/s   {successes[0]:4d} reserved   {errors[0]:4d} errors")
+    return successes[0]
+
+
+def main():
+    from parking.models import CarWashBooking, CarWashSlotCapacity
+    path = setup_database()
+    lot, profile = make_fixtures()
+    print(f"\n🧼 Car wash slot reservation benchmark ({THREADS} threads x {REQUESTS_PER_THREAD} requests, "
+          f"{SLOTS} slots of capacity {CAPACITY})\n")
+
+    naive_times = slot_times(2)
+    run('COUNT then INSERT', naive_reserve, lot, profile, naive_times)
+    overbooked = 0
+    for scheduled in naive_times:
+        held = CarWashBooking.objects.filter(lot=lot, scheduled_time=scheduled).count()
+        overbooked += held > CAPACITY
+    print(f"{'':<22} {overbooked} of {SLOTS} slots overbooked\n")
+
+    ledger_times = slot_times(3)
+    reserved = run('capacity ledger', ledger_reserve, lot, profile, ledger_times)
+    rows = CarWashSlotCapacity.objects.filter(slot_start__in=ledger_times)
+    overbooked = sum(row.booked > row.capacity for row in rows)
+    booked = sum(row.booked for row in rows)
+    print(f"{'':<22} {overbooked} of {SLOTS} slots overbooked, ledger total {booked} = reserved {reserved}")
+
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""
+Cross-process benchmark for the channel layer.
+
+Starts WORKERS processes. Each one holds SOCKETS channels, and every channel
+joins a shared 'broadcast' group and its own 'user_<n>' group, like a
+NotificationConsumer. The parent process then:
+
+    broadcast      group_sends BROADCASTS messages to the shared group
+                   (every channel of every worker receives each one)
+    notifications  group_sends one message to each user group, the way
+                   send_ws_notification() does
+
+and reports send throughput, delivery throughput and the latency from
+group_send to receive() in the worker, across processes.
+
+Uses parking.channel_layers.SQLiteChannelLayer on a throwaway file, or
+channels_redis when REDIS_URL is set.
+
+Usage: python bench_channel_layer.py [workers] [sockets_per_worker] [broadcasts]
+"""
+import asyncio
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+WORKERS = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+SOCKETS = int(sys.argv[2]) if len(sys.argv) > 2 else 250
+BROADCASTS = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+
+def make_layer(path):
+    if os.environ.get('REDIS_URL'):
+        from channels_redis.core import RedisChannelLayer
+        return RedisChannelLayer(hosts=[os.environ['REDIS_URL']], capacity=BROADCASTS + 10)
+    from parking.channel_layers import SQLiteChannelLayer
+    return SQLiteChannelLayer(path=path, capacity=BROADCASTS + 10)
+
+
+async def worker_main(index, path, ready, results):
+    layer = make_layer(path)
+    channels = []
+    for n in range(SOCKETS):
+        channel = await layer.new_channel()
+        await layer.group_add('broadcast', channel)
+        await layer.group_add(f'user_{index * SOCKETS + n}', channel)
+        channels.append(channel)
+    ready.put(index)
+
+    latencies = {'broadcast': [], 'notification': []}
+
+    async def socket(channel):
+        # BROADCASTS broadcast messages, then the socket's own notification
+        for _ in range(BROADCASTS + 1):
+            message = await layer.receive(channel)
+            latencies[message['kind']].append(time.time() - message['sent_at'])
+
+    await asyncio.gather(*(socket(channel) for channel in channels))
+    results.put((latencies, time.time()))
+
+
+def run_worker(index, path, ready, results):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    asyncio.run(worker_main(index, path, ready, results))
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)] * 1000
+
+
+def describe(name, latencies, sent, send_seconds, delivered_by):
+    span = delivered_by - sent
+    print(f"{name}")
+    print(f"  deliveries     {len(latencies):8d}  ({len(latencies) / span:,.0f}/s end to end)")
+    print(f"  send phase     {send_seconds * 1000:8.1f} ms")
+    print(f"  latency (ms)   p50 {percentile(latencies, 50):.1f}  p95 {percentile(latencies, 95):.1f}  "
+          f"p99 {percentile(latencies, 99):.1f}  max {max(latencies) * 1000:.1f}  "
+          f"mean {statistics.mean(latencies) * 1000:.1f}")
+
+
+async def parent_main(path, results):
+    layer = make_layer(path)
+
+    start = time.time()
+    for _ in range(BROADCASTS):
+        await layer.group_send('broadcast', {'type': 'bench', 'kind': 'broadcast', 'sent_at': time.time()})
+        await asyncio.sleep(0.01)  # a notification storm, not a single burst
+    broadcast_seconds = time.time() - start
+
+    start_notify = time.time()
+    for user in range(WORKERS * SOCKETS):
+        await layer.group_send(f'user_{user}', {'type': 'bench', 'kind': 'notification', 'sent_at': time.time()})
+    notify_seconds = time.time() - start_notify
+
+    collected = {'broadcast': [], 'notification': []}
+    finished = []
+    for _ in range(WORKERS):
+        latencies, done_at = await asyncio.get_running_loop().run_in_executor(None, results.get)
+        for kind, values in latencies.items():
+            collected[kind].extend(values)
+        finished.append(done_at)
+    return start, broadcast_seconds, start_notify, notify_seconds, collected, max(finished)
+
+
+def main():
+    backend = 'channels_redis' if os.environ.get('REDIS_URL') else 'SQLiteChannelLayer'
+    path = os.path.join(tempfile.mkdtemp(), 'bench_layer.sqlite3')
+    print(f"{backend}: {WORKERS} worker processes x {SOCKETS} sockets, {BROADCASTS} broadcasts\n")
+
+    context = multiprocessing.get_context('spawn')
+    ready, results = context.Queue(), context.Queue()
+    workers = [context.Process(target=run_worker, args=(index, path, ready, results)) for index in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    for _ in workers:
+        ready.get()
+
+    start, broadcast_seconds, start_notify, notify_seconds, collected, done_at = asyncio.run(
+        parent_main(path, results))
+    for worker in workers:
+        worker.join()
+
+    describe('broadcast (every socket of every worker)', collected['broadcast'], start, broadcast_seconds,
+             done_at)
+    print(f"  fan-out        {WORKERS * SOCKETS} sockets per group_send\n")
+    describe('notifications (one group_send per user)', collected['notification'], start_notify,
+             notify_seconds, done_at)
+    print(f"  send rate      {WORKERS * SOCKETS / notify_seconds:,.0f} group_sends/s")
+
+
+if __name__ == '__main__':
+    main()
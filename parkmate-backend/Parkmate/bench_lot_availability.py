@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+"""
+Load test for the ws/lots/<lot_id>/ availability channel.
+
+Builds a throwaway test database with one lot of SLOTS slots (half of them
+booked), then compares:
+
+    slot list poll  what DynamicLot.jsx fetched every 5 seconds
+                    (P_SlotSerializer over the whole grid)
+    snapshot        what a socket gets once on subscribe
+    delta           what every subscriber gets when one booking changes
+
+and measures the fan-out of one booking write to SUBSCRIBERS connected
+LotAvailabilityConsumer sockets: time from the commit until the last
+socket has the delta. The channel layer is InMemoryChannelLayer (one
+process), so the fan-out is the layer plus consumer cost, not network.
+
+Usage: python bench_lot_availability.py [slots] [subscribers]
+"""
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Parkmate.settings')
+django.setup()
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+SLOTS = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+SUBSCRIBERS = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+POLL_SECONDS = 5
+
+
+def build_lot():
+    from parking.models import AuthUser, Booking, OwnerProfile, P_Lot, P_Slot, UserProfile
+    owner_user = AuthUser.objects.create_user(username='bench_owner', password='bench', role='Owner')
+    owner = OwnerProfile.objects.create(auth_user=owner_user, firstname='Bench', lastname='Owner', phone='9000000000',
+                                        streetname='MG Road', city='Kochi', state='Kerala', pincode='682001',
+                                        verification_status=OwnerProfile.STATUS_APPROVED)
+    lot = P_Lot.objects.create(owner=owner, lot_name='Bench Lot', streetname='Marine Drive', city='Kochi',
+                               state='Kerala', pincode='682031', total_slots=0)
+    user = UserProfile.objects.create(
+        auth_user=AuthUser.objects.create_user(username='bench_user', password='bench'),
+        firstname='Bench', lastname='User', phone='9000000001', vehicle_number='KL-07-AB-0001', vehicle_type='Sedan')
+    end_time = timezone.now() + timedelta(hours=1)
+    slots = [P_Slot.objects.create(lot=lot, vehicle_type='Sedan', price=40, is_available=n % 2 == 1)
+             for n in range(SLOTS)]
+    for slot in slots[::2]:
+        Booking.objects.create(user=user, slot=slot, lot=lot, booking_type='Instant', price=40, end_time=end_time)
+    return lot, user, slots
+
+
+def measure(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return result, statistics.median(timings) * 1000
+
+
+def message_sizes(lot):
+    from rest_framework.renderers import JSONRenderer
+    from parking.lot_availability import delta_message, snapshot
+    from parking.models import P_Slot
+    from parking.serializers import P_SlotSerializer
+
+    grid = P_Slot.objects.filter(lot=lot)
+    poll, poll_ms = measure(lambda: JSONRenderer().render(P_SlotSerializer(grid, many=True).data))
+    snap, snap_ms = measure(lambda: json.dumps(snapshot(lot.lot_id)))
+    slot_id = grid.first().slot_id
+    delta, delta_ms = measure(lambda: json.dumps(delta_message(lot.lot_id, [slot_id])))
+
+    print(f"{'message':<16} {'bytes':>9} {'build ms':>9}")
+    for name, body, ms in (('slot list poll', poll, poll_ms), ('snapshot', snap, snap_ms),
+                           ('delta', delta, delta_ms)):
+        print(f"{name:<16} {len(body):9d} {ms:9.2f}")
+    per_hour_polling = len(poll) * 3600 / POLL_SECONDS
+    print(f"\nper viewer and hour: polling {per_hour_polling / 1e6:.1f} MB; live {len(snap) / 1e3:.1f} kB "
+          f"+ {len(delta)} B per booking change\n")
+
+
+async def fan_out(lot, user, slots):
+    from channels.db import database_sync_to_async
+    from channels.routing import URLRouter
+    from channels.testing import WebsocketCommunicator
+    from parking.models import Booking
+    from parking.routing import websocket_urlpatterns
+
+    app = URLRouter(websocket_urlpatterns)
+    sockets = []
+    start = time.perf_counter()
+    for _ in range(SUBSCRIBERS):
+        socket = WebsocketCommunicator(app, f'/ws/lots/{lot.lot_id}/')
+        await socket.connect()
+        await socket.receive_from(timeout=30)  # snapshot
+        sockets.append(socket)
+    connect_seconds = time.perf_counter() - start
+
+    free = next(slot for slot in slots if slot.is_available)
+
+    def book():
+        with transaction.atomic():
+            Booking.objects.create(user=user, slot=free, lot=lot, booking_type='Instant', price=40,
+                                   end_time=timezone.now() + timedelta(hours=1))
+            free.is_available = False
+            free.save()
+        return time.perf_counter()
+
+    committed_at = await database_sync_to_async(book)()
+    arrivals = []
+    for socket in sockets:
+        await socket.receive_from(timeout=30)
+        arrivals.append(time.perf_counter() - committed_at)
+    for socket in sockets:
+        await socket.disconnect()
+
+    print(f"fan-out to {SUBSCRIBERS} sockets")
+    print(f"  subscribe      {connect_seconds * 1000 / SUBSCRIBERS:.2f} ms per socket (snapshot included)")
+    print(f"  delta latency  p50 {statistics.median(arrivals) * 1000:.1f} ms  max {max(arrivals) * 1000:.1f} ms "
+          f"(commit to last socket)")
+
+
+def main():
+    settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer',
+                                           'CONFIG': {'capacity': 10}}}
+    settings.DEBUG = False
+    import logging
+    logging.disable(logging.INFO)
+
+    test_db = connection.creation.create_test_db(verbosity=0, keepdb=False)
+    try:
+        print(f"{SLOTS} slots, {SUBSCRIBERS} subscribers (test database {test_db})\n")
+        lot, user, slots = build_lot()
+        message_sizes(lot)
+        asyncio.run(fan_out(lot, user, slots))
+    finally:
+        connection.creation.destroy_test_db(test_db, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
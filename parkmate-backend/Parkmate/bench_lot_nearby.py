@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Benchmark k-nearest lot queries on 100k synthetic lots spread over Kerala.
+
+Times the in-memory grid index against a brute-force scan of every lot
+(the cost of sorting the full lot list by distance). No database is used.
+
+Usage: python bench_lot_nearby.py [lot_count]
+"""
+import os
+import random
+import sys
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Parkmate.settings')
+django.setup()
+
+from parking.geo import LotGridIndex, haversine_km
+
+LOT_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+QUERY_COUNT = 2000
+K = 20
+RADIUS_KM = 10
+
+# Rough bounding box of Kerala
+MIN_LAT, MAX_LAT = 8.2, 12.8
+MIN_LNG, MAX_LNG = 74.8, 77.4
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def report(label, samples):
+    print(f"{label:<26} p50 {percentile(samples, 50) * 1e6:9.1f} µs   "
+          f"p95 {percentile(samples, 95) * 1e6:9.1f} µs   p99 {percentile(samples, 99) * 1e6:9.1f} µs")
+
+
+def main():
+    rng = random.Random(7)
+    points = [(lot_id, rng.uniform(MIN_LAT, MAX_LAT), rng.uniform(MIN_LNG, MAX_LNG))
+              for lot_id in range(1, LOT_COUNT + 1)]
+    queries = [(rng.uniform(MIN_LAT, MAX_LAT), rng.uniform(MIN_LNG, MAX_LNG)) for _ in range(QUERY_COUNT)]
+
+    print(f"\n🗺️ Nearby lot benchmark ({LOT_COUNT:,} lots, {QUERY_COUNT} queries, k={K})\n")
+    index = LotGridIndex(cell_degrees=0.02)
+    start = time.perf_counter()
+    index.load_points(points)
+    print(f"Grid built in {time.perf_counter() - start:.2f}s\n")
+
+    for label, radius in (('grid k-NN (no radius)', None), (f'grid k-NN ({RADIUS_KM} km)', RADIUS_KM)):
+        samples = []
+        for lat, lng in queries:
+            start = time.perf_counter()
+            index.nearest(lat, lng, k=K, radius_km=radius)
+            samples.append(time.perf_counter() - start)
+        report(label, samples)
+
+    # Brute force on a handful of queries only, it is orders of magnitude slower
+    samples = []
+    for lat, lng in queries[:20]:
+        start = time.perf_counter()
+        sorted((haversine_km(lat, lng, plat, plng), lot_id) for lot_id, plat, plng in points)[:K]
+        samples.append(time.perf_counter() - start)
+    report('brute-force sort', samples)
+
+    # Sanity check: the grid agrees with brute force
+    for lat, lng in queries[:50]:
+        expected = sorted((haversine_km(lat, lng, plat, plng), lot_id) for lot_id, plat, plng in points)[:K]
+        assert [lot_id for _, lot_id in index.nearest(lat, lng, k=K)] == [lot_id for _, lot_id in expected]
+    print("\n✅ Grid results match brute force\n")
+
+
+if __name__ == '__main__':
+    main()
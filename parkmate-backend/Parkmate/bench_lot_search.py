@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Benchmark lot search on 100k synthetic lots.
+
+Compares the old four-way icontains scan with the FTS5 index and the
+in-memory fallback index. Runs against a throwaway in-memory SQLite database,
+so it never touches db.sqlite3.
+
+Usage: python bench_lot_search.py [lot_count]
+"""
+import os
+import random
+import sqlite3
+import sys
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Parkmate.settings')
+django.setup()
+
+from parking.search import (FTS5_CREATE_SQL, FTS5_INSERT_SQL, FTS5_SEARCH_SQL, SEARCH_FIELDS,
+                            InMemoryLotSearchIndex, build_match_expression)
+
+LOT_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+QUERIES = ['mar', 'marine dri', 'kochi', 'mg road', 'lulu', 'thrissur round', '6820', 'kaloor stad']
+RUNS = 20
+
+CITIES = ['Kochi', 'Thrissur', 'Kozhikode', 'Trivandrum', 'Kannur', 'Kollam', 'Alappuzha', 'Palakkad']
+STREETS = ['Marine Drive', 'MG Road', 'Round North', 'Beach Road', 'Kaloor Stadium Road',
+           'Edappally Bypass', 'Palarivattom', 'Vyttila Hub', 'Statue Junction', 'Mavoor Road']
+NAMES = ['Lulu', 'Central', 'Metro', 'City', 'Plaza', 'Oberon', 'Gold Souk', 'Green', 'Harbour', 'Town']
+
+
+def qmark(sql):
+    """Django's %s placeholders -> sqlite3's ?"""
+    return sql.replace('%s', '?')
+
+
+def make_lots(count):
+    rng = random.Random(42)
+    for lot_id in range(1, count + 1):
+        yield lot_id, [
+            f"{rng.choice(NAMES)} {rng.choice(['Parking', 'Lot', 'Park & Ride'])} {lot_id}",
+            rng.choice(STREETS),
+            rng.choice(STREETS).split()[0],
+            rng.choice(CITIES),
+            'Kerala',
+            str(682000 + rng.randint(0, 999)),
+        ]
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def timed(label, run):
+    samples = []
+    for query in QUERIES:
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            run(query)
+            samples.append((time.perf_counter() - start) * 1000)
+    print(f"{label:<22} p50 {percentile(samples, 50):8.2f} ms   p95 {percentile(samples, 95):8.2f} ms   "
+          f"p99 {percentile(samples, 99):8.2f} ms")
+
+
+def main():
+    print(f"\n🔎 Lot search benchmark ({LOT_COUNT:,} lots, {len(QUERIES)} queries x {RUNS} runs)\n")
+    lots = list(make_lots(LOT_COUNT))
+    fields = [field for field, _ in SEARCH_FIELDS]
+
+    db = sqlite3.connect(':memory:')
+    db.execute(f"CREATE TABLE PARKING_LOT (lot_id INTEGER PRIMARY KEY, {', '.join(fields)})")
+    db.executemany(
+        f"INSERT INTO PARKING_LOT VALUES ({', '.join('?' * (len(fields) + 1))})",
+        [[lot_id] + values for lot_id, values in lots],
+    )
+
+    start = time.perf_counter()
+    db.execute(FTS5_CREATE_SQL)
+    db.executemany(qmark(FTS5_INSERT_SQL), [[lot_id] + values for lot_id, values in lots])
+    db.commit()
+    print(f"FTS5 index built in {time.perf_counter() - start:.2f}s")
+
+    memory_index = InMemoryLotSearchIndex()
+    start = time.perf_counter()
+    memory_index.load_documents(lots)
+    print(f"In-memory index built in {time.perf_counter() - start:.2f}s\n")
+
+    icontains_sql = (
+        "SELECT lot_id FROM PARKING_LOT WHERE lot_name LIKE ? OR streetname LIKE ? "
+        "OR locality LIKE ? OR city LIKE ?"
+    )
+
+    def icontains(query):
+        pattern = f"%{query}%"
+        db.execute(icontains_sql, [pattern] * 4).fetchall()
+
+    def fts5(query):
+        db.execute(qmark(FTS5_SEARCH_SQL), [build_match_expression(query), 500]).fetchall()
+
+    timed('icontains scan', icontains)
+    timed('FTS5 (bm25)', fts5)
+    timed('in-memory index', lambda query: memory_index.ranked_ids(query, limit=500))
+    print()
+
+
+if __name__ == '__main__':
+    main()
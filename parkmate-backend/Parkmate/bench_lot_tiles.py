@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Benchmark map tile clustering on 100k synthetic lots spread over Kerala.
+
+Reports grid build time, per-viewport query latency and JSON payload size
+at several zoom levels. No database is used.
+
+Usage: python bench_lot_tiles.py [lot_count]
+"""
+import json
+import os
+import random
+import sys
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Parkmate.settings')
+django.setup()
+
+from parking.tiles import LotTileGrid
+
+LOT_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+RUNS = 50
+
+# Rough bounding box of Kerala
+MIN_LAT, MAX_LAT = 8.2, 12.8
+MIN_LNG, MAX_LNG = 74.8, 77.4
+
+# (zoom, viewport width in degrees) - roughly a 1280x800 map window
+VIEWPORTS = [(5, 56.0), (7, 14.0), (9, 3.5), (11, 0.88), (13, 0.22), (15, 0.055)]
+
+
+def main():
+    rng = random.Random(11)
+    records = [(lot_id, rng.uniform(MIN_LAT, MAX_LAT), rng.uniform(MIN_LNG, MAX_LNG),
+                rng.randint(0, 40), rng.choice([30, 40, 50, 60, 80, 100]))
+               for lot_id in range(1, LOT_COUNT + 1)]
+
+    print(f"\n🗺️ Map tile benchmark ({LOT_COUNT:,} lots)\n")
+    grid = LotTileGrid(max_zoom=16)
+    start = time.perf_counter()
+    grid.load_records(records)
+    print(f"Grid built in {time.perf_counter() - start:.2f}s\n")
+
+    center_lat, center_lng = 9.97, 76.28  # Kochi
+    for zoom, width in VIEWPORTS:
+        height = width * 0.625
+        bbox = (center_lng - width / 2, center_lat - height / 2, center_lng + width / 2, center_lat + height / 2)
+        start = time.perf_counter()
+        for _ in range(RUNS):
+            _, clusters = grid.clusters(*bbox, zoom)
+        elapsed_ms = (time.perf_counter() - start) * 1000 / RUNS
+        payload = len(json.dumps({'zoom': zoom, 'clusters': clusters}))
+        lots = sum(cluster['count'] for cluster in clusters)
+        print(f"zoom {zoom:>2}: {len(clusters):>5} clusters, {lots:>6} lots, "
+              f"{payload / 1024:7.1f} KB, {elapsed_ms:7.2f} ms")
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+CPU benchmark for the /ws/time/ broadcast.
+
+Simulates one second of server clock traffic for N open sockets:
+
+    per-connection  every socket builds and serializes its own payload
+                    (the old TimeSyncConsumer.broadcast_time loop)
+    layer group     one payload per tick, fanned out with channel layer
+                    group_send (InMemoryChannelLayer); measured on at most
+                    LAYER_CONNECTIONS sockets, it grows faster than linearly
+    shared ticker   one payload per tick written to every subscriber by
+                    parking.time_broadcast.TimeBroadcaster
+    compact         nothing per tick; clients interpolate from their sync
+
+Reports CPU time per tick and per connection. The socket write itself is a
+no-op here (it is the same in every mode that ticks).
+
+Usage: python bench_time_sync.py [connections] [ticks]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Parkmate.settings')
+django.setup()
+
+from channels.layers import InMemoryChannelLayer
+
+from parking.time_broadcast import TimeBroadcaster, time_payload
+
+CONNECTIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+TICKS = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+LAYER_CONNECTIONS = min(CONNECTIONS, 1000)
+
+
+class FakeSocket:
+    async def send(self, text_data=None):
+        pass
+
+
+def per_connection_tick(sent):
+    for _ in range(CONNECTIONS):
+        sent.append(json.dumps(time_payload()))
+
+
+async def run_layer_group(connections):
+    layer = InMemoryChannelLayer(capacity=10)
+    channels = [await layer.new_channel() for _ in range(connections)]
+    for channel in channels:
+        await layer.group_add('bench_clock', channel)
+    start = time.process_time()
+    for _ in range(TICKS):
+        await layer.group_send('bench_clock', {'type': 'time.tick', 'text': json.dumps(time_payload())})
+        for channel in channels:
+            await layer.receive(channel)
+    return time.process_time() - start
+
+
+async def run_shared():
+    broadcaster = TimeBroadcaster()
+    broadcaster.members = {FakeSocket() for _ in range(CONNECTIONS)}
+    start = time.process_time()
+    for _ in range(TICKS):
+        broadcaster._latest = (None, None)  # a new second each tick
+        assert await broadcaster.tick() == CONNECTIONS
+    return time.process_time() - start
+
+
+def report(name, seconds, connections=CONNECTIONS):
+    per_tick = seconds / TICKS
+    print(f"{name:<16} {connections:6d} sockets {per_tick * 1000:10.2f} ms CPU/tick "
+          f"{per_tick / connections * 1e6:10.3f} µs/connection")
+
+
+def main():
+    print(f"{CONNECTIONS} connections, {TICKS} ticks\n")
+
+    start = time.process_time()
+    for _ in range(TICKS):
+        per_connection_tick([])
+    per_connection = time.process_time() - start
+    report('per-connection', per_connection)
+
+    report('layer group', asyncio.run(run_layer_group(LAYER_CONNECTIONS)), LAYER_CONNECTIONS)
+
+    shared = asyncio.run(run_shared())
+    report('shared ticker', shared)
+
+    # Compact clients cost one sync message on connect/resync and nothing per tick
+    report('compact', 0.0)
+    print(f"\nshared ticker uses {per_connection / max(shared, 1e-9):.1f}x less CPU per tick than per-connection loops")
+
+
+if __name__ == '__main__':
+    main()
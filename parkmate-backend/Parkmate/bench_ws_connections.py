@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+"""
+Load test for authenticated WebSocket connections against a local daphne.
+
+Builds a throwaway database with USERS users (each with a DRF token), starts
+daphne on it (Parkmate.asgi:application, so TokenAuthMiddlewareStack and the
+real consumers), then:
+
+    connect    opens SOCKETS concurrent ws/notifications/<id>/?token= sockets,
+               CONCURRENCY handshakes in flight at a time, and keeps them all
+               open; latency is from the TCP connect to the "connected" frame
+               (token check, group join, inbox read included)
+    memory     daphne's resident memory before and after, per connection
+    broadcast  one notification to every user group through the channel
+               layer, the way the notification dispatcher sends them; latency
+               is from the first group_send to each socket's frame
+
+Sockets outnumber users (two per user by default), so the token cache gets
+hits during the storm; the server's own gauge
+(/api/admin/websockets/metrics/) is printed at the end.
+
+The client uses autobahn (installed with daphne) and answers the server's
+heartbeat pings. Client and server share the machine, so on a small box
+the numbers include the client's CPU. Needs a cross-process channel layer:
+SQLiteChannelLayer on a throwaway file, or channels_redis when REDIS_URL is
+set.
+
+Usage: python bench_ws_connections.py [sockets] [users] [concurrency]
+"""
+import asyncio
+import json
+import os
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+SOCKETS = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+USERS = int(sys.argv[2]) if len(sys.argv) > 2 else max(SOCKETS // 2, 1)
+CONCURRENCY = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+HOST = '127.0.0.1'
+
+workdir = tempfile.mkdtemp(prefix='bench_ws_')
+DB_PATH = os.path.join(workdir, 'db.sqlite3')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Parkmate.settings')
+os.environ.setdefault('CHANNEL_LAYER_PATH', os.path.join(workdir, 'channel_layer.sqlite3'))
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.db import connection
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    if hard < SOCKETS + 1000:
+        sys.exit(f"Open file limit {hard} is too low for {SOCKETS} sockets (ulimit -n)")
+
+
+def build_users():
+    from django.contrib.auth.hashers import make_password
+    from rest_framework.authtoken.models import Token
+    from parking.models import AuthUser
+    password = make_password(None)
+    AuthUser.objects.bulk_create(
+        [AuthUser(username=f'bench_ws_{n}', password=password, role='User') for n in range(USERS)]
+        + [AuthUser(username='bench_ws_admin', password=password, role='Admin')], batch_size=1000)
+    users = list(AuthUser.objects.filter(username__startswith='bench_ws_').order_by('id'))
+    tokens = [Token(key=Token.generate_key(), user=user) for user in users]
+    Token.objects.bulk_create(tokens, batch_size=1000)
+    admin = tokens.pop()
+    return [(token.user_id, token.key) for token in tokens], admin.key
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind((HOST, 0))
+        return probe.getsockname()[1]
+
+
+def start_daphne(port):
+    env = dict(os.environ, PARKMATE_DB=DB_PATH)
+    server = subprocess.Popen([sys.executable, '-m', 'daphne', '-b', HOST, '-p', str(port), '-v', '0',
+                               'Parkmate.asgi:application'],
+                              cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    sys.exit("daphne did not start")
+
+
+def rss_mb(pid):
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return "n/a"
+    pick = lambda q: values[min(int(len(values) * q), len(values) - 1)] * 1000
+    return (f"p50 {statistics.median(values) * 1000:.1f} ms  p95 {pick(0.95):.1f} ms  "
+            f"p99 {pick(0.99):.1f} ms  max {values[-1] * 1000:.1f} ms")
+
+
+def client_class():
+    from autobahn.asyncio.websocket import WebSocketClientProtocol
+
+    class BenchClient(WebSocketClientProtocol):
+        """Answers pings, resolves `ready` on the connected frame, records broadcast arrivals"""
+
+        def onMessage(self, payload, isBinary):
+            data = json.loads(payload)
+            if data.get('type') == 'ping':
+                self.sendMessage(b'{"type": "pong"}')
+            elif data.get('connected'):
+                if not self.factory.ready.done():
+                    self.factory.ready.set_result(time.perf_counter())
+            elif data.get('message', '').startswith('bench broadcast'):
+                self.factory.arrivals.append(time.perf_counter())
+
+        def onClose(self, wasClean, code, reason):
+            if not self.factory.ready.done():
+                self.factory.ready.set_exception(ConnectionError(f"closed with {code}: {reason}"))
+
+    return BenchClient
+
+
+async def open_socket(port, user_id, token, gate, connects, arrivals):
+    from autobahn.asyncio.websocket import WebSocketClientFactory
+    factory = WebSocketClientFactory(f'ws://{HOST}:{port}/ws/notifications/{user_id}/?token={token}')
+    factory.protocol = client_class()
+    factory.ready = asyncio.get_running_loop().create_future()
+    factory.arrivals = arrivals
+    async with gate:
+        started = time.perf_counter()
+        transport, protocol = await asyncio.get_running_loop().create_connection(factory, HOST, port)
+        connects.append(await asyncio.wait_for(factory.ready, 60) - started)
+    return transport, protocol
+
+
+async def run(port, users, pid, admin_token):
+    from channels.layers import get_channel_layer
+
+    # Warm up imports, the app registry and the connection before the baseline
+    warm, _ = await open_socket(port, *users[0], asyncio.Semaphore(1), [], [])
+    warm.close()
+    await asyncio.sleep(1)
+    baseline = rss_mb(pid)
+
+    connects, arrivals = [], []
+    gate = asyncio.Semaphore(CONCURRENCY)
+    started = time.perf_counter()
+    opened = await asyncio.gather(*(open_socket(port, *users[n % len(users)], gate, connects, arrivals)
+                                    for n in range(SOCKETS)), return_exceptions=True)
+    storm_seconds = time.perf_counter() - started
+    sockets = [result for result in opened if not isinstance(result, BaseException)]
+    failures = [result for result in opened if isinstance(result, BaseException)]
+    await asyncio.sleep(2)
+    loaded = rss_mb(pid)
+
+    print(f"connect    {len(sockets)} open, {len(failures)} failed in {storm_seconds:.1f} s "
+          f"({len(sockets) / storm_seconds:.0f}/s, {CONCURRENCY} in flight)")
+    if failures:
+        print(f"           first failure: {failures[0]!r}")
+    print(f"           {percentiles(connects)}")
+    print(f"memory     daphne {baseline:.0f} MB -> {loaded:.0f} MB, "
+          f"{(loaded - baseline) * 1024 / max(len(sockets), 1):.1f} kB per connection")
+
+    layer = get_channel_layer()
+    message = {'type': 'send_notification_batch',
+               'notifications': [{'level': 'info', 'message': 'bench broadcast', 'count': 1}]}
+    sent_at = time.perf_counter()
+    for user_id, _ in users:
+        await layer.group_send(f'user_{user_id}', message)
+    send_seconds = time.perf_counter() - sent_at
+    deadline = time.perf_counter() + 60
+    while len(arrivals) < len(sockets) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    print(f"broadcast  {len(users)} group_sends in {send_seconds * 1000:.0f} ms, "
+          f"{len(arrivals)}/{len(sockets)} sockets reached")
+    print(f"           {percentiles([arrival - sent_at for arrival in arrivals])}")
+
+    gauge = server_gauge(port, admin_token)
+    cache = gauge['token_cache']
+    print(f"server     {gauge['sockets']} live sockets, {gauge['group_memberships']} group memberships, "
+          f"token cache {cache['misses']} misses / {cache['hits'] + cache['shared_lookups']} hits "
+          f"(hit ratio {cache['hit_ratio']})")
+
+    for transport, _ in sockets:
+        transport.close()
+
+
+def server_gauge(port, admin_token):
+    request = urllib.request.Request(f'http://{HOST}:{port}/api/admin/websockets/metrics/',
+                                     headers={'Authorization': f'Token {admin_token}'})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def main():
+    if settings.CHANNEL_LAYERS['default']['BACKEND'].endswith('InMemoryChannelLayer'):
+        sys.exit("The broadcast comes from this process: use the SQLite layer or REDIS_URL")
+    raise_fd_limit()
+    old_name = connection.settings_dict['NAME']
+    connection.settings_dict['TEST']['NAME'] = DB_PATH
+    connection.creation.create_test_db(verbosity=0, keepdb=False)
+    server = None
+    try:
+        users, admin_token = build_users()
+        connection.close()
+        port = free_port()
+        server = start_daphne(port)
+        print(f"{SOCKETS} sockets for {USERS} users against daphne pid {server.pid} on port {port} "
+              f"({settings.CHANNEL_LAYERS['default']['BACKEND'].rsplit('.', 1)[-1]})\n")
+        asyncio.run(run(port, users, server.pid, admin_token))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (AuthUser, UserProfile, OwnerProfile, P_Lot, P_Slot, Booking,
                     Payment, Employee, Carwash_type, Carwash, Tasks, 
-                    Review, CarWashBooking, CarWashService)
+                    Review, CarWashBooking, CarWashService,
+                    ArchivedBooking, ArchivedPayment, ArchivedCarwash)
 
 admin.site.register(AuthUser)
 admin.site.register(UserProfile)
@@ -17,3 +18,6 @@ admin.site.register(Employee)
 admin.site.register(Review)
 admin.site.register(CarWashService)
 admin.site.register(CarWashBooking)
+admin.site.register(ArchivedBooking)
+admin.site.register(ArchivedPayment)
+admin.site.register(ArchivedCarwash)
@@ -0,0 +1,228 @@
+"""
+Hot/cold archival for slot bookings.
+
+Every renewal creates a new Booking row, so the live BOOKING table only grows.
+Completed and cancelled bookings older than the archive horizon are moved,
+together with their Payment and add-on Carwash rows, into the *_ARCHIVE tables
+in chunked transactions. The live table then only holds recent and active rows.
+
+Reads that need full history go through the helpers below, which look in
+both places: `get_booking_history` (booking history view), `archived_bookings`
+(the user's booking list, which only shows the newest
+BOOKING_LIST_ARCHIVED_LIMIT of them; the history view has the rest),
+`get_payment_history` (owner payment receipts) and `archived_lot_ids` (lots a
+user can review).
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from parking.models import (Booking, Payment, Carwash, ArchivedBooking,
+                            ArchivedPayment, ArchivedCarwash)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE_AFTER_DAYS = 30
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_LIST_ARCHIVED_LIMIT = 20
+
+# Statuses are stored in both cases ('completed' / 'COMPLETED'), so match case-insensitively
+ARCHIVABLE_STATUS_Q = Q(status__iexact='completed') | Q(status__iexact='cancelled')
+
+
+def get_archive_horizon(days=None):
+    """Return the cutoff datetime; bookings that ended before it may be archived"""
+    if days is None:
+        days = getattr(settings, 'BOOKING_ARCHIVE_AFTER_DAYS', DEFAULT_ARCHIVE_AFTER_DAYS)
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable_bookings(horizon):
+    """Live bookings that are finished and older than the horizon"""
+    return Booking.objects.filter(ARCHIVABLE_STATUS_Q).filter(
+        Q(end_time__lt=horizon) | Q(end_time__isnull=True, booking_time__lt=horizon.date())
+    ).exclude(
+        # Tasks cascade from Booking and have no archive table; leave those rows live
+        tasks_assigned__isnull=False
+    )
+
+
+def _archive_chunk(booking_ids):
+    """Copy one chunk of bookings (plus payments and carwashes) to the archive and delete the originals"""
+    with transaction.atomic():
+        bookings = list(Booking.objects.select_for_update().filter(booking_id__in=booking_ids))
+        if not bookings:
+            return 0
+        ids = [booking.booking_id for booking in bookings]
+
+        ArchivedBooking.objects.bulk_create([
+            ArchivedBooking(
+                booking_id=booking.booking_id,
+                user_id=booking.user_id,
+                slot_id=booking.slot_id,
+                lot_id=booking.lot_id,
+                vehicle_number=booking.vehicle_number,
+                vehicle_type=booking.vehicle_type,
+                booking_type=booking.booking_type,
+                booking_time=booking.booking_time,
+                start_time=booking.start_time,
+                end_time=booking.end_time,
+                price=booking.price,
+                status=booking.status.lower(),
+            )
+            for booking in bookings
+        ], ignore_conflicts=True)
+
+        payments = Payment.objects.filter(booking_id__in=ids)
+        ArchivedPayment.objects.bulk_create([
+            ArchivedPayment(
+                pay_id=payment.pay_id,
+                booking_id=payment.booking_id,
+                user_id=payment.user_id,
+                payment_method=payment.payment_method,
+                amount=payment.amount,
+                status=payment.status,
+                service_type=payment.service_type,
+                transaction_id=payment.transaction_id,
+                is_renewal=payment.is_renewal,
+                created_at=payment.created_at,
+                verified_by_id=payment.verified_by_id,
+                verified_at=payment.verified_at,
+            )
+            for payment in payments
+        ], ignore_conflicts=True)
+
+        carwashes = Carwash.objects.filter(booking_id__in=ids)
+        ArchivedCarwash.objects.bulk_create([
+            ArchivedCarwash(
+                carwash_id=carwash.carwash_id,
+                booking_id=carwash.booking_id,
+                employee_id=carwash.employee_id,
+                carwash_type_id=carwash.carwash_type_id,
+                price=carwash.price,
+                status=carwash.status,
+            )
+            for carwash in carwashes
+        ], ignore_conflicts=True)
+
+        # Payments and carwashes cascade from the booking delete
+        Booking.objects.filter(booking_id__in=ids).delete()
+        return len(ids)
+
+
+def archive_bookings(days=None, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+    """
+    Move finished bookings older than `days` into the archive tables.
+    Each chunk is its own transaction, so a long run never holds locks for long
+    and can be interrupted safely. Returns the number of bookings archived
+    (or that would be archived, for a dry run).
+    """
+    horizon = get_archive_horizon(days)
+    candidates = archivable_bookings(horizon).order_by('booking_id')
+
+    if dry_run:
+        return candidates.count()
+
+    total = 0
+    last_id = 0
+    while True:
+        chunk_ids = list(
+            candidates.filter(booking_id__gt=last_id).values_list('booking_id', flat=True)[:chunk_size]
+        )
+        if not chunk_ids:
+            break
+        total += _archive_chunk(chunk_ids)
+        last_id = chunk_ids[-1]
+        logger.info(f"📦 Archived {total} bookings so far (up to booking {last_id})")
+
+    return total
+
+
+def get_list_archived_limit():
+    """Archived bookings shown at the end of a user's booking list"""
+    return getattr(settings, 'BOOKING_LIST_ARCHIVED_LIMIT', DEFAULT_LIST_ARCHIVED_LIMIT)
+
+
+def archived_bookings(user=None, lot=None):
+    """Archived bookings with their payments and car washes, newest first"""
+    archived = ArchivedBooking.objects.all()
+    if user is not None:
+        archived = archived.filter(user=user)
+    if lot is not None:
+        archived = archived.filter(lot=lot)
+    return archived.select_related('lot').prefetch_related('payments', 'carwashes').order_by('-start_time')
+
+
+def archived_lot_ids(user_id, status='completed'):
+    """Lot ids of a user's archived bookings in a status, as a values() queryset for UNIONs"""
+    return ArchivedBooking.objects.filter(user_id=user_id, status__iexact=status).order_by().values('lot_id')
+
+
+def get_booking_history(user=None, lot=None, limit=None):
+    """
+    Unified, newest-first booking history across the live and archive tables.
+    With a limit, each table is read for at most `limit` rows and the two
+    sorted lists are merged.
+    """
+    live = Booking.objects.all()
+    if user is not None:
+        live = live.filter(user=user)
+    if lot is not None:
+        live = live.filter(lot=lot)
+
+    live = live.select_related('lot', 'slot').order_by('-start_time')
+    archived = archived_bookings(user=user, lot=lot)
+
+    if limit is not None:
+        live = live[:limit]
+        archived = archived[:limit]
+
+    history = sorted(
+        list(live) + list(archived),
+        key=lambda booking: booking.start_time or timezone.now(),
+        reverse=True,
+    )
+    return history[:limit] if limit is not None else history
+
+
+def _first_payment_ids(model, booking_ids):
+    """pay_id of each booking's first payment (by created_at), for one payment table"""
+    first = {}
+    rows = model.objects.filter(booking_id__in=booking_ids).order_by('booking_id', 'created_at', 'pay_id')
+    for booking_id, pay_id in rows.values_list('booking_id', 'pay_id'):
+        first.setdefault(booking_id, pay_id)
+    return set(first.values())
+
+
+def get_payment_history(lot_ids=None, status=None, payment_method=None):
+    """
+    Payments of slot bookings across the live and archive tables, newest
+    first, with booking, user, lot and slot loaded. Returns
+    [(payment, is_first_payment_of_its_booking)]; lot_ids=None means all lots.
+    """
+    live = Payment.objects.filter(booking__isnull=False)
+    archived = ArchivedPayment.objects.all()
+    if lot_ids is not None:
+        live = live.filter(booking__lot_id__in=lot_ids)
+        archived = archived.filter(booking__lot_id__in=lot_ids)
+    if status:
+        live = live.filter(status=status)
+        archived = archived.filter(status=status)
+    if payment_method:
+        live = live.filter(payment_method=payment_method)
+        archived = archived.filter(payment_method=payment_method)
+    live = list(live.select_related('booking__user', 'booking__lot', 'booking__slot'))
+    archived = list(archived.select_related('booking__user', 'booking__lot', 'booking__slot'))
+
+    first = (_first_payment_ids(Payment, {payment.booking_id for payment in live})
+             | _first_payment_ids(ArchivedPayment, {payment.booking_id for payment in archived}))
+    history = sorted(
+        live + archived,
+        key=lambda payment: (payment.created_at or timezone.now(), payment.pay_id),
+        reverse=True,
+    )
+    return [(payment, payment.pay_id in first) for payment in history]
@@ -0,0 +1,258 @@
+"""
+Consistency audit for denormalized state.
+
+Each check finds drifted rows with one set-based query and, with repair=True,
+fixes them with set-based UPDATEs:
+
+    lot_total_slots      P_Lot.total_slots vs the number of slots
+    slot_availability    P_Slot.is_available vs whether an active booking holds the slot
+    duplicate_carwashes  more than one active/pending add-on car wash per booking
+                         (repair keeps the oldest and cancels the rest)
+    employee_workload    Employee.current_assignments vs active car washes
+                         (see parking.workload.reconcile_workloads)
+    orphaned_payments    payments linked to no booking, or to a booking that no
+                         longer exists (reported only, never deleted)
+    carwash_slot_capacity  CarWashSlotCapacity.booked vs the bookings holding the slot
+                           (always a full check; the ledger is small)
+
+Incremental runs only audit rows recorded in the ConsistencyMark journal by
+the signals in parking/signals.py. Every run that covers all the checks, full
+or incremental, repairing or not, deletes exactly the marks it read and
+records a ConsistencyAuditRun whose watermark is the newest of them, so the
+journal only ever holds marks no run has consumed. Marks are deleted by id
+rather than up to the watermark: on a database with concurrent writers a mark
+can commit after a run with an id below its watermark, and it is then read by
+the next run instead of being lost. Rows still wrong after the run (all
+issues of a report-only run, orphaned payments always) are marked again so
+they are not forgotten. Runs of only some checks read the journal but do not
+consume it. Run a full audit periodically as well, since bulk `.update()`
+calls bypass the journal.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, IntegerField, Min, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from parking.models import (Booking, Carwash, CarWashBooking, ConsistencyAuditRun, ConsistencyMark, P_Lot,
+                            P_Slot, Payment)
+from parking.workload import ADDON_ACTIVE_STATUSES, reconcile_workloads
+
+logger = logging.getLogger(__name__)
+
+CHECKS = ('lot_total_slots', 'slot_availability', 'duplicate_carwashes',
+          'employee_workload', 'orphaned_payments', 'carwash_slot_capacity')
+
+# Consumed marks are deleted this many ids per statement (SQLite's variable limit)
+DELETE_BATCH = 500
+
+# Journal scope of the ids each check reports (carwash_slot_capacity is never journaled)
+CHECK_SCOPES = {
+    'lot_total_slots': 'lot',
+    'slot_availability': 'slot',
+    'duplicate_carwashes': 'booking',
+    'employee_workload': 'employee',
+    'orphaned_payments': 'payment',
+}
+
+# Booking statuses are stored in both cases ('completed' / 'COMPLETED')
+INACTIVE_BOOKING_Q = (Q(status__iexact='completed') | Q(status__iexact='cancelled')
+                      | Q(status__iexact='cancelled_by_admin'))
+
+
+def _scoped(queryset, field, ids):
+    return queryset if ids is None else queryset.filter(**{f'{field}__in': ids})
+
+
+def audit_lot_total_slots(lot_ids=None, repair=False):
+    slot_count = Subquery(
+        P_Slot.objects.filter(lot=OuterRef('pk')).order_by().values('lot')
+        .annotate(n=Count('pk')).values('n'),
+        output_field=IntegerField(),
+    )
+    actual = Coalesce(slot_count, Value(0))
+    drifted = _scoped(P_Lot.objects.all(), 'lot_id', lot_ids).annotate(actual=actual).exclude(
+        total_slots=actual,
+    )
+    issues = [
+        {'id': lot_id, 'stored': stored, 'expected': expected}
+        for lot_id, stored, expected in drifted.values_list('lot_id', 'total_slots', 'actual')
+    ]
+    if repair and issues:
+        P_Lot.objects.filter(lot_id__in=[issue['id'] for issue in issues]).update(total_slots=actual)
+    return issues
+
+
+def audit_slot_availability(slot_ids=None, repair=False):
+    held = Exists(Booking.objects.filter(slot=OuterRef('pk')).exclude(INACTIVE_BOOKING_Q))
+    slots = _scoped(P_Slot.objects.all(), 'slot_id', slot_ids).annotate(held=held)
+    drifted = slots.filter(Q(is_available=True, held=True) | Q(is_available=False, held=False))
+    issues = [
+        {'id': slot_id, 'stored': available, 'expected': not is_held}
+        for slot_id, available, is_held in drifted.values_list('slot_id', 'is_available', 'held')
+    ]
+    if repair and issues:
+        freed = [issue['id'] for issue in issues if issue['expected']]
+        taken = [issue['id'] for issue in issues if not issue['expected']]
+        if freed:
+            P_Slot.objects.filter(slot_id__in=freed).update(is_available=True)
+        if taken:
+            P_Slot.objects.filter(slot_id__in=taken).update(is_available=False)
+    return issues
+
+
+def audit_duplicate_carwashes(booking_ids=None, repair=False):
+    active = _scoped(Carwash.objects.filter(status__in=ADDON_ACTIVE_STATUSES), 'booking_id', booking_ids)
+    duplicated = active.order_by().values('booking').annotate(
+        count=Count('pk'), keep=Min('carwash_id'),
+    ).filter(count__gt=1)
+    issues = [
+        {'id': row['booking'], 'stored': row['count'], 'expected': 1, 'keep': row['keep']}
+        for row in duplicated
+    ]
+    if repair and issues:
+        extra = active.filter(booking_id__in=[issue['id'] for issue in issues]).exclude(
+            carwash_id__in=[issue['keep'] for issue in issues],
+        )
+        # Bulk update bypasses the workload signals; the workload check runs afterwards
+        for issue in issues:
+            issue['released_employees'] = []
+        by_booking = {issue['id']: issue for issue in issues}
+        for booking_id, employee_id in extra.values_list('booking_id', 'employee_id'):
+            if employee_id is not None:
+                by_booking[booking_id]['released_employees'].append(employee_id)
+        extra.update(status='cancelled')
+    return issues
+
+
+def audit_employee_workload(employee_ids=None, repair=False):
+    return [
+        {'id': employee_id, 'stored': stored, 'expected': expected}
+        for employee_id, stored, expected in reconcile_workloads(
+            dry_run=not repair, employee_ids=employee_ids,
+        )
+    ]
+
+
+def audit_orphaned_payments(payment_ids=None, repair=False):
+    dangling = (
+        Q(booking_id__isnull=False) & ~Exists(Booking.objects.filter(pk=OuterRef('booking_id')))
+    ) | (
+        Q(carwash_booking_id__isnull=False)
+        & ~Exists(CarWashBooking.objects.filter(pk=OuterRef('carwash_booking_id')))
+    )
+    orphans = _scoped(Payment.objects.all(), 'pay_id', payment_ids).filter(
+        Q(booking_id__isnull=True, carwash_booking_id__isnull=True) | dangling,
+    )
+    return [
+        {'id': pay_id, 'booking_id': booking_id, 'carwash_booking_id': carwash_booking_id,
+         'amount': str(amount)}
+        for pay_id, booking_id, carwash_booking_id, amount in orphans.values_list(
+            'pay_id', 'booking_id', 'carwash_booking_id', 'amount',
+        )
+    ]
+
+
+def audit_carwash_slot_capacity(repair=False):
+    from parking.carwash_capacity import drifted_slots
+    return [
+        {'id': slot_id, 'stored': stored, 'expected': expected}
+        for slot_id, stored, expected in drifted_slots(repair=repair)
+    ]
+
+
+def last_watermark():
+    """Newest mark consumed by an earlier run (0 before the first one)"""
+    return ConsistencyAuditRun.objects.filter(watermark__isnull=False).order_by('-run_id').values_list(
+        'watermark', flat=True,
+    ).first() or 0
+
+
+def pending_marks():
+    """({scope: set(object_id)}, watermark, mark ids) for every mark no run has consumed yet"""
+    scopes = {scope: set() for scope, _ in ConsistencyMark.SCOPE_CHOICES}
+    mark_ids = []
+    rows = ConsistencyMark.objects.order_by().values_list('mark_id', 'scope', 'object_id')
+    for mark_id, scope, object_id in rows.iterator(chunk_size=5000):
+        scopes.setdefault(scope, set()).add(object_id)
+        mark_ids.append(mark_id)
+    return scopes, max(max(mark_ids, default=0), last_watermark()), mark_ids
+
+
+def finish_run(report, watermark, mark_ids, complete):
+    """Record the run; a run of every check advances the watermark and deletes the marks it read"""
+    with transaction.atomic():
+        if complete:
+            mark(*[
+                (CHECK_SCOPES[name], issue['id'])
+                for name, result in report['checks'].items() if name in CHECK_SCOPES
+                if not report['repair'] or name == 'orphaned_payments'
+                for issue in result['issues']
+            ])
+        ConsistencyAuditRun.objects.create(
+            mode=report['mode'], repair=report['repair'], watermark=watermark if complete else None,
+            issues=sum(result['count'] for result in report['checks'].values()),
+        )
+        if complete:
+            for offset in range(0, len(mark_ids), DELETE_BATCH):
+                ConsistencyMark.objects.filter(mark_id__in=mark_ids[offset:offset + DELETE_BATCH]).delete()
+
+
+def run_audit(repair=False, incremental=False, checks=CHECKS):
+    """
+    Run the consistency checks and return a JSON-serialisable report:
+    {'mode', 'repair', 'scope', 'checks': {name: {'issues', 'count', 'repaired'}}}
+    """
+    scopes, watermark, mark_ids = pending_marks()
+    if not incremental:
+        scopes = {scope: None for scope in scopes}
+
+    employee_ids = scopes['employee']
+    if employee_ids is not None and scopes['booking']:
+        # A slot booking's status decides whether its add-on car washes count
+        employee_ids |= set(Carwash.objects.filter(
+            booking_id__in=scopes['booking'], employee__isnull=False,
+        ).values_list('employee_id', flat=True))
+
+    runners = {
+        'lot_total_slots': lambda: audit_lot_total_slots(scopes['lot'], repair),
+        'slot_availability': lambda: audit_slot_availability(scopes['slot'], repair),
+        'duplicate_carwashes': lambda: audit_duplicate_carwashes(scopes['booking'], repair),
+        'employee_workload': lambda: audit_employee_workload(employee_ids, repair),
+        'orphaned_payments': lambda: audit_orphaned_payments(scopes['payment'], repair),
+        'carwash_slot_capacity': lambda: audit_carwash_slot_capacity(repair),
+    }
+    report = {
+        'mode': 'incremental' if incremental else 'full',
+        'repair': repair,
+        'scope': {scope: (len(ids) if ids is not None else 'all') for scope, ids in scopes.items()},
+        'checks': {},
+    }
+    for name in CHECKS:
+        if name not in checks:
+            continue
+        with transaction.atomic():
+            issues = runners[name]()
+        if name == 'duplicate_carwashes' and employee_ids is not None:
+            for issue in issues:
+                employee_ids.update(issue.get('released_employees', ()))
+        repaired = len(issues) if repair and name != 'orphaned_payments' else 0
+        report['checks'][name] = {'count': len(issues), 'repaired': repaired, 'issues': issues}
+        if issues:
+            logger.info(f"🔍 Consistency check {name}: {len(issues)} issue(s), {repaired} repaired")
+
+    finish_run(report, watermark, mark_ids, complete=set(checks) >= set(CHECKS))
+    return report
+
+
+def mark(*entries):
+    """Journal (scope, object_id) pairs for the next incremental audit (used by the signals)"""
+    if not getattr(settings, 'CONSISTENCY_JOURNAL', True):
+        return
+    marks = [ConsistencyMark(scope=scope, object_id=object_id)
+             for scope, object_id in entries if object_id is not None]
+    if marks:
+        # A savepoint, so a failed INSERT does not break the caller's transaction
+        with transaction.atomic():
+            ConsistencyMark.objects.bulk_create(marks)
@@ -0,0 +1,143 @@
+"""
+Car wash capacity calendar.
+
+A day has one slot per carwash_slot_minutes of CARWASH_WORKDAY_HOURS, the
+same slots reserve() in parking/carwash_capacity.py takes capacity from.
+Booked counts and capacities come from the CarWashSlotCapacity ledger rows
+of the window, plus active bookings not yet attached to a row (the ones
+get_slot() would seed a new row with), so the picker shows a slot as full
+exactly when a booking for it would get a 409. A window of days costs three
+queries (the lot's slot settings, the ledger rows, the loose bookings)
+instead of one COUNT per slot.
+
+Each (lot, day) grid is cached; the CarWashBooking signals in
+parking/signals.py delete the cached days a booking was and is scheduled on,
+and a lot's upcoming days are dropped when its slot settings change.
+`lot_id=None` means all lots together, in slots of CARWASH_SLOT_MINUTES.
+
+Settings:
+    CARWASH_WORKDAY_HOURS         - (first hour, end hour) of the slots (default (9, 21))
+    CARWASH_SLOT_MINUTES          - slot length in minutes (default 60, or the
+                                    lot's carwash_slot_minutes)
+    CARWASH_SLOT_CAPACITY         - bookings per slot (default 2, or the
+                                    lot's carwash_slot_capacity)
+    CARWASH_CALENDAR_CACHE_TTL    - seconds a cached day lives (default 300)
+"""
+import logging
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOURS = (9, 21)
+DEFAULT_CACHE_TTL = 300
+MAX_DAYS = 14
+
+ACTIVE_STATUSES = ('pending', 'confirmed', 'in_progress')
+
+
+def slot_layout(lot_id=None):
+    """(slot minutes, capacity) of a lot's car wash slots; the settings for all lots together"""
+    from parking.carwash_capacity import DEFAULT_CAPACITY, DEFAULT_SLOT_MINUTES, lot_capacity, lot_slot_minutes
+    from parking.models import P_Lot
+    lot = None
+    if lot_id is not None:
+        lot = P_Lot.objects.filter(lot_id=lot_id).only('carwash_slot_minutes', 'carwash_slot_capacity').first()
+    if lot is None:
+        return (getattr(settings, 'CARWASH_SLOT_MINUTES', DEFAULT_SLOT_MINUTES),
+                getattr(settings, 'CARWASH_SLOT_CAPACITY', DEFAULT_CAPACITY))
+    return lot_slot_minutes(lot), lot_capacity(lot)
+
+
+def _cache_key(lot_id, day):
+    return f"parking:carwash_calendar:{lot_id if lot_id is not None else 'all'}:{day.isoformat()}"
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def slot_counts(lot_id, first_day, days, minutes):
+    """
+    {slot_start: [booked, capacity or None]} for the window, as reserve() sees
+    it: ledger rows, plus active bookings that no row holds yet. Capacity is
+    None where the lot's setting applies (no row yet, or all lots together).
+    """
+    from parking.carwash_capacity import slot_start_of
+    from parking.models import CarWashBooking, CarWashSlotCapacity
+    window_start, window_end = _day_start(first_day), _day_start(first_day + timedelta(days=days))
+    ledger = CarWashSlotCapacity.objects.filter(slot_start__gte=window_start, slot_start__lt=window_end)
+    loose = CarWashBooking.objects.filter(
+        scheduled_time__gte=window_start, scheduled_time__lt=window_end,
+        status__in=ACTIVE_STATUSES, capacity_slot__isnull=True,
+    )
+    if lot_id is not None:
+        ledger = ledger.filter(lot_id=lot_id)
+        loose = loose.filter(lot_id=lot_id)
+
+    counts = {}
+    for slot_start, booked, capacity in ledger.values_list('slot_start', 'booked', 'capacity'):
+        # Rows opened before the lot's slot length changed fall into the slot they start in
+        entry = counts.setdefault(slot_start_of(slot_start, minutes), [0, None])
+        entry[0] += booked
+        if lot_id is not None and entry[1] is None:
+            entry[1] = capacity
+    for scheduled_time in loose.values_list('scheduled_time', flat=True):
+        counts.setdefault(slot_start_of(scheduled_time, minutes), [0, None])[0] += 1
+    return counts
+
+
+def _day_grid(day, counts, minutes, capacity, hours):
+    from parking.carwash_capacity import slot_start_of
+    slots = []
+    slot_datetime = slot_start_of(_day_start(day) + timedelta(hours=hours[0]), minutes)
+    day_end = _day_start(day) + timedelta(hours=hours[1])
+    while slot_datetime < day_end:
+        booked_count, slot_capacity = counts.get(slot_datetime, (0, None))
+        if slot_capacity is None:
+            slot_capacity = capacity
+        slots.append({
+            'time': timezone.localtime(slot_datetime).strftime('%H:%M'),
+            'available': booked_count < slot_capacity,
+            'booked_count': booked_count,
+            'capacity': slot_capacity,
+            'datetime': slot_datetime.isoformat(),
+        })
+        slot_datetime += timedelta(minutes=minutes)
+    return {'date': day.isoformat(), 'slots': slots}
+
+
+def calendar_days(lot_id, first_day, days):
+    """Capacity grids for `days` consecutive days, served from the cache where possible"""
+    all_days = [first_day + timedelta(days=offset) for offset in range(days)]
+    keys = {day: _cache_key(lot_id, day) for day in all_days}
+    cached = cache.get_many(list(keys.values()))
+    missing = [day for day in all_days if keys[day] not in cached]
+
+    if missing:
+        # One pass over the span of the uncached days
+        span = (missing[-1] - missing[0]).days + 1
+        minutes, capacity = slot_layout(lot_id)
+        counts = slot_counts(lot_id, missing[0], span, minutes)
+        hours = getattr(settings, 'CARWASH_WORKDAY_HOURS', DEFAULT_HOURS)
+        fresh = {keys[day]: _day_grid(day, counts, minutes, capacity, hours) for day in missing}
+        cache.set_many(fresh, timeout=getattr(settings, 'CARWASH_CALENDAR_CACHE_TTL', DEFAULT_CACHE_TTL))
+        cached.update(fresh)
+    return [cached[keys[day]] for day in all_days]
+
+
+def invalidate(lot_id, scheduled_time):
+    """Drop the cached days a booking scheduled at `scheduled_time` counts towards"""
+    if scheduled_time is None:
+        return
+    day = timezone.localtime(scheduled_time).date()
+    cache.delete_many([_cache_key(lot_id, day), _cache_key(None, day)])
+
+
+def invalidate_lot(lot_id):
+    """Drop a lot's cached upcoming days (its slot length or capacity changed)"""
+    today = timezone.localdate()
+    cache.delete_many([_cache_key(lot_id, today + timedelta(days=offset)) for offset in range(-1, MAX_DAYS + 1)])
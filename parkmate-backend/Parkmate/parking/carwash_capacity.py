@@ -0,0 +1,191 @@
+"""
+Capacity ledger for car wash time slots.
+
+Each (lot, slot_start) has one CarWashSlotCapacity row. A booking takes a
+unit of capacity with a single conditional UPDATE:
+
+    UPDATE CARWASH_SLOT_CAPACITY SET booked = booked + 1
+    WHERE slot_id = ? AND booked < capacity
+
+so two concurrent requests can never both take the last unit; the loser's
+UPDATE matches no row and it gets a 409. The row is created on first use,
+seeded with the active bookings already in the slot.
+
+A booking holding capacity points at its row (CarWashBooking.capacity_slot).
+The CarWashBooking signals in parking/signals.py give the unit back when the
+booking is cancelled, completed, deleted or moved to another slot; the release
+clears capacity_slot with a conditional UPDATE first, so it happens once.
+
+Slot length and capacity come from the lot (carwash_slot_minutes /
+carwash_slot_capacity) or the settings:
+    CARWASH_SLOT_CAPACITY   - car washes per slot (default 2)
+    CARWASH_SLOT_MINUTES    - slot length in minutes (default 60)
+"""
+import logging
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 2
+DEFAULT_SLOT_MINUTES = 60
+
+ACTIVE_STATUSES = ('pending', 'confirmed', 'in_progress')
+
+
+def lot_capacity(lot):
+    if lot.carwash_slot_capacity is not None:
+        return lot.carwash_slot_capacity
+    return getattr(settings, 'CARWASH_SLOT_CAPACITY', DEFAULT_CAPACITY)
+
+
+def lot_slot_minutes(lot):
+    return lot.carwash_slot_minutes or getattr(settings, 'CARWASH_SLOT_MINUTES', DEFAULT_SLOT_MINUTES)
+
+
+def slot_start_of(moment, minutes):
+    """Start of the `minutes`-long slot containing moment, slots aligned to local midnight"""
+    local = timezone.localtime(moment)
+    midnight = timezone.make_aware(datetime.combine(local.date(), time.min))
+    offset = (local - midnight) // timedelta(minutes=minutes) * minutes
+    return midnight + timedelta(minutes=offset)
+
+
+def slot_bounds(lot, scheduled_time):
+    """(slot_start, slot_end) of the lot's slot containing scheduled_time, aligned to local midnight"""
+    minutes = lot_slot_minutes(lot)
+    slot_start = slot_start_of(scheduled_time, minutes)
+    return slot_start, slot_start + timedelta(minutes=minutes)
+
+
+def get_slot(lot, scheduled_time):
+    """The ledger row for the slot containing scheduled_time, created (and seeded) on first use"""
+    from parking.models import CarWashBooking, CarWashSlotCapacity
+    slot_start, slot_end = slot_bounds(lot, scheduled_time)
+    slot = CarWashSlotCapacity.objects.filter(lot=lot, slot_start=slot_start).first()
+    if slot is not None:
+        return slot
+    # Bookings made before the ledger existed (or whose slot row was removed) still count
+    seeded = CarWashBooking.objects.filter(
+        lot=lot, scheduled_time__gte=slot_start, scheduled_time__lt=slot_end,
+        status__in=ACTIVE_STATUSES, capacity_slot__isnull=True,
+    )
+    try:
+        # Write first, so the transaction never has to upgrade a read lock
+        with transaction.atomic():
+            slot = CarWashSlotCapacity.objects.create(
+                lot=lot, slot_start=slot_start, slot_end=slot_end, capacity=lot_capacity(lot),
+            )
+            slot.booked = seeded.update(capacity_slot=slot)
+            if slot.booked:
+                CarWashSlotCapacity.objects.filter(slot_id=slot.slot_id).update(booked=slot.booked)
+            return slot
+    except IntegrityError:
+        # Another request opened the slot first
+        return CarWashSlotCapacity.objects.get(lot=lot, slot_start=slot_start)
+
+
+def reserve(lot, scheduled_time):
+    """
+    Take one unit of capacity in the slot containing scheduled_time.
+    Returns (CarWashSlotCapacity row, True) or (row as it stands, False) if the slot is full.
+    """
+    from parking.models import CarWashSlotCapacity
+    slot = get_slot(lot, scheduled_time)
+    taken = CarWashSlotCapacity.objects.filter(
+        slot_id=slot.slot_id, booked__lt=F('capacity'),
+    ).update(booked=F('booked') + 1)
+    if not taken:
+        slot.refresh_from_db()
+        return slot, False
+    slot.booked += 1
+    return slot, True
+
+
+def hold(booking):
+    """
+    Attach a booking that bypassed reserve() (e.g. reactivated or rescheduled)
+    to its slot. Capacity is not checked: the booking already exists.
+    """
+    from parking.models import CarWashBooking, CarWashSlotCapacity
+    slot = get_slot(booking.lot, booking.scheduled_time)
+    attached = CarWashBooking.objects.filter(
+        pk=booking.pk, capacity_slot__isnull=True,
+    ).update(capacity_slot=slot)
+    # Keep the instance in step so a later full save does not overwrite the hold
+    booking.capacity_slot_id = slot.slot_id
+    if not attached:
+        return  # already counted when get_slot() opened and seeded the slot
+    CarWashSlotCapacity.objects.filter(slot_id=slot.slot_id).update(booked=F('booked') + 1)
+    if slot.booked + 1 > slot.capacity:
+        logger.warning(f"⚠️ Car wash slot {slot.slot_id} is over capacity after booking {booking.pk} moved in")
+
+
+def release(booking_id, slot_id):
+    """Give back the unit a booking holds; safe to call more than once"""
+    from parking.models import CarWashBooking, CarWashSlotCapacity
+    if slot_id is None:
+        return False
+    detached = CarWashBooking.objects.filter(
+        pk=booking_id, capacity_slot_id=slot_id,
+    ).update(capacity_slot=None)
+    if detached:
+        CarWashSlotCapacity.objects.filter(slot_id=slot_id, booked__gt=0).update(booked=F('booked') - 1)
+    return bool(detached)
+
+
+def sync_booking(booking):
+    """Bring a saved booking's hold in line with its status, lot and scheduled time"""
+    from parking.models import CarWashSlotCapacity
+    active = booking.status in ACTIVE_STATUSES and booking.lot_id and booking.scheduled_time
+    slot_id = booking.capacity_slot_id
+    if slot_id is not None:
+        if active:
+            bounds = CarWashSlotCapacity.objects.filter(slot_id=slot_id).values_list(
+                'lot_id', 'slot_start', 'slot_end',
+            ).first()
+            if bounds and bounds[0] == booking.lot_id and bounds[1] <= booking.scheduled_time < bounds[2]:
+                return
+        if release(booking.pk, slot_id):
+            booking.capacity_slot_id = None
+        else:
+            return  # released concurrently
+    if active:
+        hold(booking)
+
+
+def release_deleted(slot_id):
+    """Give back the unit a deleted booking held"""
+    from parking.models import CarWashSlotCapacity
+    if slot_id is not None:
+        CarWashSlotCapacity.objects.filter(slot_id=slot_id, booked__gt=0).update(booked=F('booked') - 1)
+
+
+def apply_lot_capacity(lot):
+    """Apply a lot's capacity setting to its slots that have not started yet"""
+    from parking.models import CarWashSlotCapacity
+    CarWashSlotCapacity.objects.filter(lot=lot, slot_start__gte=timezone.now()).exclude(
+        capacity=lot_capacity(lot),
+    ).update(capacity=lot_capacity(lot))
+
+
+def drifted_slots(repair=False):
+    """
+    Ledger rows whose `booked` differs from the bookings pointing at them:
+    [(slot_id, booked, actual)]. With repair=True the rows are corrected.
+    """
+    from parking.models import CarWashBooking, CarWashSlotCapacity
+    holders = CarWashBooking.objects.filter(capacity_slot=OuterRef('pk')).order_by().values(
+        'capacity_slot',
+    ).annotate(n=Count('pk')).values('n')
+    actual = Coalesce(Subquery(holders), Value(0))
+    drifted = CarWashSlotCapacity.objects.annotate(actual=actual).filter(~Q(booked=F('actual')))
+    rows = list(drifted.values_list('slot_id', 'booked', 'actual'))
+    if repair and rows:
+        CarWashSlotCapacity.objects.filter(slot_id__in=[row[0] for row in rows]).update(booked=actual)
+    return rows
@@ -0,0 +1,258 @@
+"""
+Cross-process channel layer backed by a shared SQLite file.
+
+channels.layers.InMemoryChannelLayer only reaches sockets of its own process,
+so a send_ws_notification() from one daphne worker never gets to a user
+whose socket is held by another. SQLiteChannelLayer keeps messages and group
+memberships in one SQLite file (WAL mode) that every worker on the host
+opens:
+
+    send / group_send   one INSERT; a group fan-out is a single
+                        INSERT ... SELECT over the group's members
+    receive             every process runs one poller task that claims the
+                        rows addressed to its own channels (an indexed range
+                        on `route`) and hands them to per-channel queues
+
+The poller re-polls at once while there is traffic and backs off to
+`max_poll_interval` when idle, so delivery latency stays within a few
+milliseconds under load and ~max_poll_interval when quiet. An idle poll
+never takes SQLite's write lock: it first compares `PRAGMA data_version`
+(which moves when another connection commits) with the version of its last
+empty poll, then looks for rows with a plain read, and only claims them in a
+BEGIN IMMEDIATE transaction when there are some. Idle workers therefore do
+not serialize on the lock.
+bench_channel_layer.py measures fan-out throughput and latency across
+worker processes.
+
+Messages must be JSON-serializable (all Parkmate events are). Settings pick
+channels_redis instead when REDIS_URL is set; see CHANNEL_LAYERS in
+Parkmate/settings.py.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS layer_message (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    route TEXT NOT NULL,
+    expires REAL NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS layer_message_route ON layer_message (route, id);
+CREATE INDEX IF NOT EXISTS layer_message_channel ON layer_message (channel);
+CREATE TABLE IF NOT EXISTS layer_group (
+    group_name TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    route TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (group_name, channel)
+);
+"""
+
+CLEANUP_EVERY = 10.0  # seconds between expired-row sweeps
+POLL_BATCH = 1000
+
+
+def _route(channel):
+    """Process-local channels ('prefix.<client>!<id>') route to their client; others to themselves"""
+    if '!' in channel:
+        return channel.split('!', 1)[0].rsplit('.', 1)[-1]
+    return channel
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    extensions = ['groups', 'flush']
+
+    def __init__(self, path='channel_layer.sqlite3', expiry=60, group_expiry=86400, capacity=100,
+                 channel_capacity=None, poll_interval=0.002, max_poll_interval=0.02):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        self.path = str(path)
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.client_prefix = uuid.uuid4().hex[:12]
+        # One thread owns the connection, so SQLite calls never block the event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-channel-layer')
+        self._connection = None
+        self._queues = {}
+        self._poller = None
+        self._last_cleanup = 0.0
+        self._idle_versions = {}  # route -> data_version of its last empty poll
+        self._wrote = False       # this connection's own writes do not move data_version
+
+    # ---------------------------------------------------------------- storage
+
+    def _db(self):
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _insert(self, channel, body, capacity):
+        cursor = self._db().execute(
+            'INSERT INTO layer_message (channel, route, expires, body) SELECT ?, ?, ?, ? '
+            'WHERE (SELECT COUNT(*) FROM layer_message WHERE channel = ?) < ?',
+            (channel, _route(channel), time.time() + self.expiry, body, channel, capacity),
+        )
+        self._wrote = True
+        return cursor.rowcount
+
+    def _fan_out(self, group, body):
+        now = time.time()
+        cursor = self._db().execute(
+            'INSERT INTO layer_message (channel, route, expires, body) '
+            'SELECT g.channel, g.route, ?, ? FROM layer_group g WHERE g.group_name = ? AND g.expires > ? '
+            'AND (SELECT COUNT(*) FROM layer_message m WHERE m.channel = g.channel) < ?',
+            (now + self.expiry, body, group, now, self.capacity),
+        )
+        self._wrote = True
+        return cursor.rowcount
+
+    def _take(self, route, limit):
+        """Claim (delete and return) the oldest live rows of a route"""
+        db = self._db()
+        version = db.execute('PRAGMA data_version').fetchone()[0]
+        wrote, self._wrote = self._wrote, False
+        if wrote:
+            self._idle_versions.clear()
+        elif self._idle_versions.get(route) == version:
+            return []  # nobody committed anything since this route was last found empty
+        pending = db.execute(
+            'SELECT 1 FROM layer_message WHERE route = ? AND expires > ? LIMIT 1', (route, time.time()),
+        ).fetchone()
+        if pending is None:
+            self._idle_versions[route] = version
+            return []
+        self._idle_versions.pop(route, None)
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            rows = db.execute(
+                'SELECT id, channel, body FROM layer_message WHERE route = ? AND expires > ? ORDER BY id LIMIT ?',
+                (route, time.time(), limit),
+            ).fetchall()
+            if rows:
+                db.execute(f"DELETE FROM layer_message WHERE id IN ({','.join('?' * len(rows))})",
+                           [row[0] for row in rows])
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        return [(channel, body) for _, channel, body in rows]
+
+    def _cleanup(self):
+        now = time.time()
+        db = self._db()
+        db.execute('DELETE FROM layer_message WHERE expires <= ?', (now,))
+        db.execute('DELETE FROM layer_group WHERE expires <= ?', (now,))
+
+    # ---------------------------------------------------------------- channels
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_channel_name(channel)
+        if not await self._run(self._insert, channel, json.dumps(message), self.get_capacity(channel)):
+            raise ChannelFull(channel)
+
+    async def new_channel(self, prefix='specific'):
+        channel = f'{prefix}.{self.client_prefix}!{uuid.uuid4().hex}'
+        self._queues[channel] = asyncio.Queue()
+        return channel
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        if _route(channel) != self.client_prefix:
+            return await self._receive_shared(channel)
+
+        queue = self._queues.setdefault(channel, asyncio.Queue())
+        self._ensure_poller()
+        try:
+            return await queue.get()
+        except asyncio.CancelledError:
+            # The consumer went away; stop buffering for it
+            if queue.empty():
+                self._queues.pop(channel, None)
+            raise
+
+    async def _receive_shared(self, channel):
+        delay = self.poll_interval
+        while True:
+            rows = await self._run(self._take, channel, 1)
+            if rows:
+                return json.loads(rows[0][1])
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_poll_interval)
+
+    def _ensure_poller(self):
+        loop = asyncio.get_running_loop()
+        if self._poller is None or self._poller.done() or self._poller.get_loop() is not loop:
+            self._poller = loop.create_task(self._poll())
+
+    async def _poll(self):
+        delay = self.poll_interval
+        while self._queues:
+            try:
+                rows = await self._run(self._take, self.client_prefix, POLL_BATCH)
+                for channel, body in rows:
+                    queue = self._queues.get(channel)
+                    if queue is not None:
+                        queue.put_nowait(json.loads(body))
+                if time.time() - self._last_cleanup > CLEANUP_EVERY:
+                    self._last_cleanup = time.time()
+                    await self._run(self._cleanup)
+            except Exception as e:
+                logger.error(f"❌ Channel layer poll failed: {str(e)}")
+                rows = []
+            if rows:
+                delay = self.poll_interval
+                await asyncio.sleep(0)
+            else:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_poll_interval)
+
+    # ---------------------------------------------------------------- groups
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(lambda: self._db().execute(
+            'INSERT OR REPLACE INTO layer_group (group_name, channel, route, expires) VALUES (?, ?, ?, ?)',
+            (group, channel, _route(channel), time.time() + self.group_expiry),
+        ))
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(lambda: self._db().execute(
+            'DELETE FROM layer_group WHERE group_name = ? AND channel = ?', (group, channel),
+        ))
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_group_name(group)
+        await self._run(self._fan_out, group, json.dumps(message))
+
+    # ---------------------------------------------------------------- flush
+
+    async def flush(self):
+        def wipe():
+            self._db().execute('DELETE FROM layer_message')
+            self._db().execute('DELETE FROM layer_group')
+        await self._run(wipe)
+        self._queues.clear()
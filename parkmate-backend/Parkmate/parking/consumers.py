@@ -1,20 +1,27 @@
 """
-WebSocket consumers for real-time notifications and time synchronization
+WebSocket consumers for real-time notifications, time synchronization, lot availability and owner events
+
+Every consumer is pinged by the server and reaped when its client goes
+silent; see parking/socket_health.py.
 """
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 import json
-import asyncio
 import logging
-from django.utils import timezone
+
+from parking.socket_health import HeartbeatMixin
 
 logger = logging.getLogger(__name__)
 
 
-class NotificationConsumer(AsyncWebsocketConsumer):
+class NotificationConsumer(HeartbeatMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer for sending real-time notifications to users.
     
-    Connection URL: ws://localhost:8000/ws/notifications/{user_id}/
+    Connection URL: ws://localhost:8000/ws/notifications/{user_id}/?token={DRF token}
+    
+    {user_id} must be the signed-in user's auth user id - notifications are
+    addressed by it (parking/ws_auth.py); anything else is closed with 4401.
     
     Events Sent (via send_ws_notification):
     1. Timer < 5 min
@@ -27,38 +34,86 @@ class NotificationConsumer(AsyncWebsocketConsumer):
     8. New Booking Created
     9. Car Wash Completed
     10. Owner Assigned New Employee
+    
+    Every stored notification carries a per-user `seq`. Reconnect with
+    ws://localhost:8000/ws/notifications/{user_id}/?since={last seq seen}
+    and the missed ones are replayed (flagged "replayed": true) right after
+    the connection confirmation, which reports the latest `seq`.
     """
+    socket_kind = "notifications"
     
     async def connect(self):
         """Handle WebSocket connection"""
+        from urllib.parse import parse_qs
         self.user_id = self.scope["url_route"]["kwargs"]["user_id"]
         self.room_group_name = f"user_{self.user_id}"
-        
-        # Join room group
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+        self.last_seq = 0
         
         await self.accept()
+        user = self.scope.get("user")
+        if user is None or not user.is_authenticated or str(user.pk) != self.user_id:
+            logger.info(f"🔒 Refused notification WebSocket for user {self.user_id}")
+            await self.close(code=4401)
+            return
+        
+        # Join room group
+        await self.join_group(self.room_group_name)
+        await self.track_socket(f"user:{self.user_id}")
         logger.info(f"✅ WebSocket connected for user {self.user_id}")
         
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        try:
+            since = int(query.get("since", [""])[0])
+        except ValueError:
+            since = None
+        latest, missed = await self.load_inbox(since)
+        
         # Send connection confirmation
         await self.send(text_data=json.dumps({
             "type": "info",
             "message": "Connected to real-time notifications",
-            "connected": True
+            "connected": True,
+            "seq": latest,
         }))
+        
+        # Group messages are handled only after connect() returns, so anything
+        # stored meanwhile arrives live afterwards (duplicates are skipped by seq)
+        await self.send_frames(missed, replayed=True)
+        self.last_seq = max(self.last_seq, latest)
+        if missed:
+            logger.info(f"📬 Replayed {len(missed)} notification(s) to user {self.user_id} since #{since}")
+
+    @database_sync_to_async
+    def load_inbox(self, since):
+        """(latest seq, notifications after `since`) in one query each"""
+        from parking.notification_inbox import latest_seq, replay
+        latest = latest_seq(self.user_id)
+        if since is None or since >= latest:
+            return latest, []
+        return latest, replay(self.user_id, since)
+
+    async def send_frames(self, notifications, replayed=False):
+        from parking.notification_inbox import frame
+        sent = 0
+        for notification in notifications:
+            seq = notification.get("seq")
+            if seq is not None:
+                if seq <= self.last_seq:
+                    continue
+                self.last_seq = seq
+            data = frame(notification)
+            if replayed:
+                data["replayed"] = True
+            await self.send(text_data=json.dumps(data))
+            sent += 1
+        return sent
 
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
         logger.info(f"❌ WebSocket disconnected for user {self.user_id}")
         
         # Leave room group
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        await self.release_socket()
 
     async def send_notification(self, event):
         """
@@ -82,8 +137,21 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         
         logger.info(f"📢 Sent {level} notification to user {self.user_id}: {message}")
 
+    async def send_notification_batch(self, event):
+        """
+        Receive a batch from the notification dispatcher (parking/notification_outbox.py)
+        and send each notification as its own frame; coalesced duplicates carry a count.
+        
+        {
+            "type": "send_notification_batch",
+            "notifications": [{"level": "info", "message": "...", "count": 3, "seq": 17}]
+        }
+        """
+        sent = await self.send_frames(event.get("notifications", []))
+        logger.info(f"📢 Sent {sent} notification(s) to user {self.user_id}")
+
 
-class TimeSyncConsumer(AsyncWebsocketConsumer):
+class TimeSyncConsumer(HeartbeatMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer for broadcasting real-time server date & time.
     
@@ -94,79 +162,198 @@ class TimeSyncConsumer(AsyncWebsocketConsumer):
     - Formatted human-readable string
     - Unix timestamp
     
+    The per-second updates come from the process-wide ticker in
+    parking/time_broadcast.py, which serializes each update once and writes
+    it to all of the process's time sockets.
+    
+    Compact mode (ws://localhost:8000/ws/time/?mode=compact) sends no ticks:
+    the server epoch and UTC offset arrive on connect and in reply to
+    {"type": "sync", "client_ts": <ms>}, and the client runs the clock.
+    
     This ensures all frontend modules (slot booking, carwash, payments)
     are synchronized with the server's real-world time.
     """
+    socket_kind = "time"
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.broadcast_task = None
-        self.is_connected = False
+        self.subscribed = False
     
     async def connect(self):
-        """Accept WebSocket connection and start broadcasting time"""
+        """Accept WebSocket connection and subscribe to the shared ticker (or sync once)"""
+        from urllib.parse import parse_qs
+        from parking.time_broadcast import broadcaster, sync_payload
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        self.compact = query.get("mode", [""])[0] == "compact"
         await self.accept()
-        self.is_connected = True
-        logger.info("✅ Time sync WebSocket connected")
+        await self.track_socket()
+        logger.info(f"✅ Time sync WebSocket connected ({'compact' if self.compact else 'ticking'})")
         
         # Send initial connection confirmation
         await self.send(text_data=json.dumps({
             "type": "connected",
             "message": "Real-time server clock connected",
-            "connected": True
+            "connected": True,
+            "mode": "compact" if self.compact else "tick",
         }))
         
-        # Start background task for broadcasting time
-        self.broadcast_task = asyncio.create_task(self.broadcast_time())
+        if self.compact:
+            await self.send(text_data=json.dumps(sync_payload()))
+            return
+        await self.send(text_data=broadcaster.current_text())
+        broadcaster.subscribe(self)
+        self.subscribed = True
     
-    async def broadcast_time(self):
-        """Background task that broadcasts server time every second"""
+    async def receive(self, text_data=None, bytes_data=None):
+        """Answer {"type": "sync"} requests with a fresh sync message"""
+        from parking.time_broadcast import sync_payload
         try:
-            while self.is_connected:
-                current_time = timezone.localtime(timezone.now())
-                
-                # Prepare time data in multiple formats
-                time_data = {
-                    "type": "time_update",
-                    "datetime": current_time.isoformat(),  # ISO 8601 format
-                    "formatted": current_time.strftime("%A, %B %d %Y, %I:%M:%S %p"),  # Human readable
-                    "date": current_time.strftime("%Y-%m-%d"),  # Date only
-                    "time": current_time.strftime("%I:%M:%S %p"),  # Time only
-                    "time_24h": current_time.strftime("%H:%M:%S"),  # 24-hour format
-                    "timestamp": int(current_time.timestamp()),  # Unix timestamp
-                    "year": current_time.year,
-                    "month": current_time.month,
-                    "day": current_time.day,
-                    "hour": current_time.hour,
-                    "minute": current_time.minute,
-                    "second": current_time.second,
-                    "weekday": current_time.strftime("%A"),
-                    "timezone": str(current_time.tzinfo)
-                }
-                
-                # Send time update to client
-                await self.send(text_data=json.dumps(time_data))
-                
-                # Wait 1 second before next update
-                await asyncio.sleep(1)
-                
-        except asyncio.CancelledError:
-            # Task was cancelled (connection closing)
-            logger.info("⏹ Time broadcast task cancelled")
-        except Exception as e:
-            logger.error(f"❌ Error in time sync broadcast: {str(e)}")
+            data = json.loads(text_data or "{}")
+        except ValueError:
+            return
+        if isinstance(data, dict) and data.get("type") == "sync":
+            await self.send(text_data=json.dumps(sync_payload(data.get("client_ts"))))
     
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
-        self.is_connected = False
-        
-        # Cancel the broadcast task if it's running
-        if self.broadcast_task and not self.broadcast_task.done():
-            self.broadcast_task.cancel()
-            try:
-                await self.broadcast_task
-            except asyncio.CancelledError:
-                pass
+        from parking.time_broadcast import broadcaster
+        if self.subscribed:
+            self.subscribed = False
+            broadcaster.unsubscribe(self)
+        await self.release_socket()
         
         logger.info(f"❌ Time sync WebSocket disconnected with code {close_code}")
 
+
+class LotAvailabilityConsumer(HeartbeatMixin, AsyncWebsocketConsumer):
+    """
+    WebSocket consumer for the live slot grid of one lot.
+    
+    Connection URL: ws://localhost:8000/ws/lots/{lot_id}/
+    
+    Sends the lot's occupancy snapshot on connect, then a small delta
+    (slot id, state, end_time) whenever a booking is created, cancelled,
+    renewed or expires. See parking/lot_availability.py.
+    Closes with code 4404 if the lot does not exist.
+    """
+    socket_kind = "lots"
+    
+    async def connect(self):
+        """Join the lot's group and send the current snapshot"""
+        from parking.lot_availability import expiry_watcher, group_name
+        self.lot_id = int(self.scope["url_route"]["kwargs"]["lot_id"])
+        self.room_group_name = group_name(self.lot_id)
+        self.watching = False
+        
+        await self.join_group(self.room_group_name)
+        await self.accept()
+        await self.track_socket()
+        
+        snapshot, deadline = await self.load_snapshot()
+        if snapshot is None:
+            await self.close(code=4404)
+            return
+        await self.send(text_data=json.dumps(snapshot))
+        expiry_watcher.watch(self.lot_id, self, deadline)
+        self.watching = True
+        logger.info(f"✅ Lot availability WebSocket connected for lot {self.lot_id} ({len(snapshot['slots'])} slots)")
+
+    @database_sync_to_async
+    def load_snapshot(self):
+        """Expire ended bookings first (the slot list endpoint used to on every poll), then snapshot"""
+        from parking.lot_availability import expire_bookings, next_end_time, snapshot
+        expire_bookings(self.lot_id)
+        return snapshot(self.lot_id), next_end_time(self.lot_id)
+
+    async def lot_delta(self, event):
+        """Forward a delta published by parking/lot_availability.py (already serialized)"""
+        from django.utils.dateparse import parse_datetime
+        from parking.lot_availability import expiry_watcher
+        await self.send(text_data=event["text"])
+        for end_time in event.get("end_times", []):
+            expiry_watcher.arm(self.lot_id, parse_datetime(end_time))
+
+    async def disconnect(self, close_code):
+        """Handle WebSocket disconnection"""
+        from parking.lot_availability import expiry_watcher
+        if getattr(self, "watching", False):
+            self.watching = False
+            expiry_watcher.unwatch(self.lot_id, self)
+        await self.release_socket()
+        logger.info(f"❌ Lot availability WebSocket disconnected with code {close_code}")
+
+
+class OwnerEventConsumer(HeartbeatMixin, AsyncWebsocketConsumer):
+    """
+    WebSocket consumer for the signed-in owner's operations event stream.
+    
+    Connection URL: ws://localhost:8000/ws/owner/events/?token={DRF token}&since={seq}
+    (the token is resolved by parking/ws_auth.py)
+    
+    Sends {"type": "connected", "seq": latest} and then batches of events
+    after `since` (or after the latest, if omitted):
+    
+    {"type": "events", "events": [{"seq": 8, "kind": "booking_created", "data": {...}, "created_at": "..."}]}
+    
+    Events are read from the OwnerEvent table whenever the owner's group is
+    woken up; see parking/owner_events.py. Closes with 4401 when the caller
+    is not an owner.
+    """
+    socket_kind = "owner_events"
+    
+    async def connect(self):
+        """Authenticate the owner, then replay and follow their events"""
+        from urllib.parse import parse_qs
+        from parking.owner_events import group_name
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        await self.accept()
+        
+        self.owner_id = await self.resolve_owner()
+        if self.owner_id is None:
+            await self.close(code=4401)
+            return
+        self.room_group_name = group_name(self.owner_id)
+        await self.join_group(self.room_group_name)
+        await self.track_socket(f"owner:{self.owner_id}")
+        
+        latest = await database_sync_to_async(self.latest_seq)()
+        try:
+            self.cursor = int(query.get("since", [""])[0])
+        except ValueError:
+            self.cursor = latest
+        await self.send(text_data=json.dumps({"type": "connected", "connected": True, "seq": latest}))
+        await self.send_new_events()
+        logger.info(f"✅ Owner event stream connected for owner {self.owner_id} from #{self.cursor}")
+
+    @database_sync_to_async
+    def resolve_owner(self):
+        from parking.models import OwnerProfile
+        user = self.scope.get("user")
+        if user is None or not user.is_authenticated or getattr(user, "role", None) != "Owner":
+            return None
+        return OwnerProfile.objects.filter(auth_user=user).values_list("id", flat=True).first()
+
+    def latest_seq(self):
+        from parking.owner_events import latest_seq
+        return latest_seq(self.owner_id)
+
+    async def send_new_events(self):
+        """Send everything after the cursor, a page per frame"""
+        from parking.owner_events import events_since, get_page_size
+        while True:
+            events = await database_sync_to_async(events_since)(self.owner_id, self.cursor)
+            if not events:
+                return
+            self.cursor = events[-1]["seq"]
+            await self.send(text_data=json.dumps({"type": "events", "events": events}))
+            if len(events) < get_page_size():
+                return
+
+    async def owner_events_wake(self, event):
+        """New events were committed for this owner"""
+        await self.send_new_events()
+
+    async def disconnect(self, close_code):
+        """Handle WebSocket disconnection"""
+        await self.release_socket()
+        logger.info(f"❌ Owner event stream disconnected with code {close_code}")
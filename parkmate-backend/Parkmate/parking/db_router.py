@@ -0,0 +1,193 @@
+"""
+Primary/replica database routing for the parking app.
+
+GET requests on the read-heavy viewsets (lots, reviews, car wash services,
+slot grids) read from the replica alias; everything else stays on the primary.
+After any write, the writing user is pinned to the primary for a short sticky
+window so they always read their own writes (e.g. a fresh booking shows up in
+the slot grid immediately even if the replica is lagging). The window lives
+in the default cache, which settings.CACHES shares across worker processes.
+
+Settings:
+    DATABASE_REPLICA_ALIAS      - alias of the read replica (default 'replica')
+    DATABASE_REPLICA_VIEWSETS   - view class names whose GETs may use the replica
+    DATABASE_STICKY_SECONDS     - how long a user stays pinned after a write
+"""
+import contextvars
+import hashlib
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPLICA_VIEWSETS = (
+    'P_LotVIewSet',
+    'ReviewViewSet',
+    'CarWashServiceViewSet',
+    'P_SlotViewSet',
+)
+
+# Models that must always be read from the primary (auth state must never lag)
+PRIMARY_ONLY_MODELS = {'authuser'}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class _RoutingState:
+    """Per-request routing flags shared between the middleware and the router"""
+
+    def __init__(self):
+        self.use_replica = False
+        self.wrote = False
+        self.sticky_key = None
+
+
+_routing_state = contextvars.ContextVar('parking_db_routing_state', default=None)
+
+
+def get_replica_alias():
+    """Return the configured replica alias, or None if it isn't set up"""
+    alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', 'replica')
+    if alias and alias in settings.DATABASES and alias != DEFAULT_DB_ALIAS:
+        return alias
+    return None
+
+
+def get_sticky_seconds():
+    return getattr(settings, 'DATABASE_STICKY_SECONDS', 5)
+
+
+def _sticky_cache_key(identity):
+    digest = hashlib.sha1(identity.encode('utf-8')).hexdigest()
+    return f'parking:db_sticky:{digest}'
+
+
+def mark_sticky(identity):
+    """Pin an identity (token or user id) to the primary for the sticky window"""
+    cache.set(_sticky_cache_key(identity), True, timeout=get_sticky_seconds())
+
+
+def is_sticky(identity):
+    return bool(cache.get(_sticky_cache_key(identity)))
+
+
+def _request_identity(request):
+    """
+    Identify the caller without touching the database.
+    Token clients map 1:1 to users, so the token key is a per-user identity;
+    session clients (Django admin) fall back to the session user id.
+    """
+    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+    parts = auth_header.split()
+    if len(parts) == 2 and parts[0].lower() == 'token':
+        return f'token:{parts[1]}'
+
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return None
+
+
+class PrimaryReplicaRouter:
+    """
+    Route parking app reads to the replica when the current request allows it.
+    Writes (and select_for_update reads) always go to the primary.
+    """
+
+    def _is_routable(self, model):
+        return (
+            model._meta.app_label == 'parking'
+            and model._meta.model_name not in PRIMARY_ONLY_MODELS
+        )
+
+    def db_for_read(self, model, **hints):
+        state = _routing_state.get()
+        if state is None or not state.use_replica or state.wrote:
+            return None
+        if not self._is_routable(model):
+            return None
+        return get_replica_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _routing_state.get()
+        if state is not None:
+            # Read-your-writes: once this request writes, its reads go to the primary too
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        replica = get_replica_alias()
+        allowed = {DEFAULT_DB_ALIAS, replica} if replica else {DEFAULT_DB_ALIAS}
+        if obj1._state.db in allowed and obj2._state.db in allowed:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica carries the same schema as the primary
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Decide per request whether parking reads may use the replica, and pin the
+    caller to the primary for DATABASE_STICKY_SECONDS after any write.
+    Works in both sync and async chains (async views such as the owner event
+    long poll must not be forced onto a worker thread).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = _RoutingState()
+        token = _routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            if state.wrote and state.sticky_key:
+                mark_sticky(state.sticky_key)
+            _routing_state.reset(token)
+        return response
+
+    async def __acall__(self, request):
+        state = _RoutingState()
+        token = _routing_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            if state.wrote and state.sticky_key:
+                await sync_to_async(mark_sticky)(state.sticky_key)
+            _routing_state.reset(token)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _routing_state.get()
+        if state is None:
+            return None
+
+        state.sticky_key = _request_identity(request)
+
+        if request.method not in SAFE_METHODS or get_replica_alias() is None:
+            return None
+
+        view_class = getattr(view_func, 'cls', None)
+        replica_views = getattr(settings, 'DATABASE_REPLICA_VIEWSETS', DEFAULT_REPLICA_VIEWSETS)
+        if view_class is None or view_class.__name__ not in replica_views:
+            return None
+
+        if state.sticky_key and is_sticky(state.sticky_key):
+            logger.debug(f"📌 Sticky window active, reading {view_class.__name__} from primary")
+            return None
+
+        state.use_replica = True
+        return None
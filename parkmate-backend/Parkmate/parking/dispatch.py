@@ -0,0 +1,247 @@
+"""
+Proximity-aware employee dispatch for car wash assignments.
+
+Each owner's available employees are kept in an in-process spatial index
+(parking.geo.PointGridIndex). To dispatch, candidates are tried nearest-first
+to the lot (employees without coordinates, and every employee when the lot
+has no coordinates, are tried afterwards by lowest workload), and each
+candidate is claimed with a single conditional UPDATE:
+
+    UPDATE EMPLOYEE SET current_assignments = current_assignments + 1, ...
+    WHERE employee_id = ? AND availability_status = 'available'
+      AND current_assignments < CARWASH_MAX_ASSIGNMENTS
+
+Two concurrent bookings can therefore never both take an employee's last unit
+of capacity: the loser's UPDATE matches no row and it moves on to the next
+candidate. The index only decides the order; the UPDATE is the source of truth.
+
+The index is kept current by the Employee signals in parking/signals.py and
+each owner's entry is rebuilt every EMPLOYEE_DISPATCH_INDEX_TTL seconds to pick
+up changes made by other worker processes. Every decision is logged with its
+latency, and `dispatch_stats()` summarises recent latencies.
+
+Settings:
+    CARWASH_MAX_ASSIGNMENTS       - concurrent assignments per employee (default 3)
+    EMPLOYEE_DISPATCH_INDEX_TTL   - seconds before an owner's index is rebuilt (default 60)
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db.models import Case, F, Value, When
+
+from parking.geo import PointGridIndex
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ASSIGNMENTS = 3
+DEFAULT_INDEX_TTL = 60
+
+# Employee grids are tiny (one owner's staff), so use coarse ~11 km cells
+EMPLOYEE_CELL_DEGREES = 0.1
+
+# Recent decision latencies (ms) for dispatch_stats()
+_latencies = deque(maxlen=1000)
+
+
+def get_max_assignments():
+    return getattr(settings, 'CARWASH_MAX_ASSIGNMENTS', DEFAULT_MAX_ASSIGNMENTS)
+
+
+class DispatchDecision:
+    """Outcome of one dispatch: the claimed employee (or None) and how it was reached"""
+
+    def __init__(self, employee, distance_km, attempts, elapsed_ms):
+        self.employee = employee
+        self.distance_km = distance_km
+        self.attempts = attempts
+        self.elapsed_ms = elapsed_ms
+
+    def __bool__(self):
+        return self.employee is not None
+
+
+class _OwnerEntry:
+    def __init__(self):
+        self.grid = PointGridIndex(cell_degrees=EMPLOYEE_CELL_DEGREES)
+        self.unlocated = set()      # available employees without coordinates
+        self.built_at = None
+
+
+class EmployeeDispatchIndex:
+    """Per-owner spatial index of available employees"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._owners = {}           # owner_id -> _OwnerEntry
+
+    def _build(self, owner_id):
+        from parking.models import Employee
+        entry = _OwnerEntry()
+        located = []
+        rows = Employee.objects.filter(
+            owner_id=owner_id, availability_status='available',
+        ).values_list('employee_id', 'latitude', 'longitude')
+        for employee_id, lat, lng in rows:
+            if lat is None or lng is None:
+                entry.unlocated.add(employee_id)
+            else:
+                located.append((employee_id, lat, lng))
+        entry.grid.load_points(located)
+        entry.built_at = time.monotonic()
+        return entry
+
+    def _entry(self, owner_id):
+        ttl = getattr(settings, 'EMPLOYEE_DISPATCH_INDEX_TTL', DEFAULT_INDEX_TTL)
+        entry = self._owners.get(owner_id)
+        if entry is not None and (not ttl or time.monotonic() - entry.built_at < ttl):
+            return entry
+        with self._lock:
+            entry = self._build(owner_id)
+            self._owners[owner_id] = entry
+            return entry
+
+    def update_employee(self, employee):
+        """Add, move or drop an employee after a save"""
+        with self._lock:
+            for owner_id, entry in self._owners.items():
+                if owner_id != employee.owner_id:
+                    entry.grid.remove_point(employee.pk)
+                    entry.unlocated.discard(employee.pk)
+            entry = self._owners.get(employee.owner_id)
+            if entry is None:
+                return  # built lazily on the owner's next dispatch
+            entry.grid.remove_point(employee.pk)
+            entry.unlocated.discard(employee.pk)
+            if employee.availability_status != 'available':
+                return
+            if employee.latitude is None or employee.longitude is None:
+                entry.unlocated.add(employee.pk)
+            else:
+                entry.grid.set_point(employee.pk, employee.latitude, employee.longitude)
+
+    def remove_employee(self, employee_id):
+        with self._lock:
+            for entry in self._owners.values():
+                entry.grid.remove_point(employee_id)
+                entry.unlocated.discard(employee_id)
+
+    def distances(self, owner_id, lat, lng):
+        """{employee_id: km from (lat, lng)} for the owner's available located employees"""
+        entry = self._entry(owner_id)
+        if lat is None or lng is None or not len(entry.grid):
+            return {}
+        return {employee_id: distance_km for distance_km, employee_id
+                in entry.grid.nearest(float(lat), float(lng), k=len(entry.grid))}
+
+    def candidates(self, owner_id, lat=None, lng=None):
+        """
+        (distance_km or None, employee_id) pairs in the order they should be tried:
+        nearest located employees first, then the rest by workload.
+        """
+        from parking.models import Employee
+        entry = self._entry(owner_id)
+        ordered = []
+        if lat is not None and lng is not None:
+            ordered = entry.grid.nearest(float(lat), float(lng), k=max(len(entry.grid), 1))
+        located = {employee_id for _, employee_id in ordered}
+        remaining = list(entry.unlocated) + [
+            employee_id for employee_id in entry.grid.point_ids() if employee_id not in located
+        ]
+        if remaining:
+            by_load = Employee.objects.filter(employee_id__in=remaining).order_by(
+                'current_assignments', 'employee_id',
+            ).values_list('employee_id', flat=True)
+            ordered += [(None, employee_id) for employee_id in by_load]
+        return ordered
+
+
+_dispatch_index = EmployeeDispatchIndex()
+
+
+def get_dispatch_index():
+    return _dispatch_index
+
+
+def claim_employee(employee_id, owner_id=None):
+    """
+    Atomically take one unit of an employee's capacity.
+    Returns True if the claim succeeded, False if the employee is full,
+    unavailable or no longer belongs to the owner.
+    """
+    from parking.models import Employee
+    cap = get_max_assignments()
+    claims = Employee.objects.filter(
+        employee_id=employee_id, availability_status='available', current_assignments__lt=cap,
+    )
+    if owner_id is not None:
+        claims = claims.filter(owner_id=owner_id)
+    # SET expressions read the pre-update value, so "cap - 1" means "this claim fills it"
+    return claims.update(
+        current_assignments=F('current_assignments') + 1,
+        availability_status=Case(
+            When(current_assignments__gte=cap - 1, then=Value('busy')),
+            default=Value('available'),
+        ),
+    ) == 1
+
+
+def dispatch_employee(lot):
+    """
+    Claim the nearest employee of the lot's owner with spare capacity.
+    Returns a DispatchDecision; `decision.employee` is None when nobody is free.
+    """
+    from parking.models import Employee
+    started = time.perf_counter()
+    owner_id = lot.owner_id
+    index = get_dispatch_index()
+
+    attempts = 0
+    claimed_id, distance_km = None, None
+    for distance_km, employee_id in index.candidates(owner_id, lot.latitude, lot.longitude):
+        attempts += 1
+        if claim_employee(employee_id, owner_id=owner_id):
+            claimed_id = employee_id
+            break
+
+    if claimed_id is None:
+        # The index may lag behind other processes; fall back to the plain workload order
+        distance_km = None
+        fallback = Employee.objects.filter(
+            owner_id=owner_id, availability_status='available',
+            current_assignments__lt=get_max_assignments(),
+        ).order_by('current_assignments', 'employee_id').values_list('employee_id', flat=True)
+        for employee_id in fallback:
+            attempts += 1
+            if claim_employee(employee_id, owner_id=owner_id):
+                claimed_id = employee_id
+                break
+
+    employee = Employee.objects.get(pk=claimed_id) if claimed_id is not None else None
+    if employee is not None and employee.availability_status != 'available':
+        index.update_employee(employee)
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _latencies.append(elapsed_ms)
+    if employee is not None:
+        distance = f"{distance_km:.2f} km" if distance_km is not None else "distance unknown"
+        logger.info(f"🚗 Dispatched employee {employee.pk} to lot {lot.pk} ({distance}, "
+                    f"{attempts} attempt(s), {elapsed_ms:.2f} ms)")
+    else:
+        logger.info(f"⚠️ No employee free for lot {lot.pk} ({attempts} attempt(s), {elapsed_ms:.2f} ms)")
+    return DispatchDecision(employee, distance_km, attempts, elapsed_ms)
+
+
+def dispatch_stats():
+    """Count and p50/p95/max latency (ms) of recent dispatch decisions"""
+    samples = sorted(_latencies)
+    if not samples:
+        return {'count': 0, 'p50_ms': None, 'p95_ms': None, 'max_ms': None}
+    return {
+        'count': len(samples),
+        'p50_ms': round(samples[len(samples) // 2], 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        'max_ms': round(samples[-1], 3),
+    }
@@ -0,0 +1,304 @@
+"""
+Nearest-lot search over P_Lot latitude/longitude.
+
+Approved lots with coordinates are kept in an in-process uniform grid
+(LOT_GEO_CELL_DEGREES-sized cells keyed by integer cell coordinates). A k-NN
+query scans rings of cells outward from the query cell and stops as soon as
+no unvisited cell can hold anything closer than the current k-th best or
+inside the radius. The grid is kept current by the P_Lot / OwnerProfile
+signals in parking/signals.py and is fully rebuilt every LOT_GEO_INDEX_TTL
+seconds so changes made by other worker processes are picked up.
+
+With LOT_GEO_BACKEND = 'sql' (or if the grid cannot be built) queries fall
+back to a bounding-box prefilter in SQL plus exact distances in Python.
+
+Settings:
+    LOT_GEO_BACKEND       - 'grid' (default) or 'sql'
+    LOT_GEO_CELL_DEGREES  - grid cell size in degrees (default 0.02, ~2.2 km)
+    LOT_GEO_INDEX_TTL     - seconds before a full rebuild (default 300, 0 = never)
+"""
+import heapq
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.195
+
+DEFAULT_CELL_DEGREES = 0.02
+DEFAULT_INDEX_TTL = 300
+
+APPROVED_STATUS = 'APPROVED'
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in kilometres"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lng, radius_km):
+    """(min_lat, max_lat, min_lng, max_lng) enclosing a circle of radius_km"""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = math.cos(math.radians(min(abs(lat) + dlat, 89.9)))
+    dlng = min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+def _indexable(lot):
+    """(lat, lng) for an approved lot with coordinates, else None"""
+    if lot.latitude is None or lot.longitude is None:
+        return None
+    if lot.owner.verification_status != APPROVED_STATUS:
+        return None
+    return float(lot.latitude), float(lot.longitude)
+
+
+class PointGridIndex:
+    """
+    Uniform lat/lng grid of (id, lat, lng) points for k-nearest-neighbour queries.
+    Thread-safe; callers decide what the ids are (lots, employees).
+    """
+
+    def __init__(self, cell_degrees=None):
+        self._lock = threading.RLock()
+        self._cell_degrees = cell_degrees
+        self._cells = {}        # (ix, iy) -> {point_id: (lat, lng)}
+        self._points = {}       # point_id -> (lat, lng, cell)
+        self._bounds = None     # (min_ix, max_ix, min_iy, max_iy) of occupied cells, grow-only
+
+    @property
+    def cell_degrees(self):
+        if self._cell_degrees is None:
+            self._cell_degrees = getattr(settings, 'LOT_GEO_CELL_DEGREES', DEFAULT_CELL_DEGREES)
+        return self._cell_degrees
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, point_id):
+        return point_id in self._points
+
+    def point_ids(self):
+        with self._lock:
+            return list(self._points)
+
+    def _cell(self, lat, lng):
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lng / self.cell_degrees))
+
+    def _add(self, point_id, lat, lng):
+        cell = self._cell(lat, lng)
+        self._cells.setdefault(cell, {})[point_id] = (lat, lng)
+        self._points[point_id] = (lat, lng, cell)
+        if self._bounds is None:
+            self._bounds = (cell[0], cell[0], cell[1], cell[1])
+        else:
+            min_ix, max_ix, min_iy, max_iy = self._bounds
+            self._bounds = (min(min_ix, cell[0]), max(max_ix, cell[0]),
+                            min(min_iy, cell[1]), max(max_iy, cell[1]))
+
+    def _remove(self, point_id):
+        point = self._points.pop(point_id, None)
+        if point is None:
+            return
+        bucket = self._cells.get(point[2])
+        if bucket is not None:
+            bucket.pop(point_id, None)
+            if not bucket:
+                del self._cells[point[2]]
+
+    def load_points(self, points):
+        """Replace the index contents with (point_id, lat, lng) triples"""
+        with self._lock:
+            self._cells, self._points, self._bounds = {}, {}, None
+            for point_id, lat, lng in points:
+                self._add(point_id, float(lat), float(lng))
+
+    def set_point(self, point_id, lat, lng):
+        """Insert or move a point"""
+        with self._lock:
+            self._remove(point_id)
+            self._add(point_id, float(lat), float(lng))
+
+    def remove_point(self, point_id):
+        with self._lock:
+            self._remove(point_id)
+
+    def nearest(self, lat, lng, k=20, radius_km=None):
+        """
+        Up to k (distance_km, point_id) pairs nearest to (lat, lng), closest
+        first, optionally limited to radius_km.
+        """
+        size = self.cell_degrees
+        # Smallest ground distance one cell step can cover near the query point
+        cos_lat = max(math.cos(math.radians(min(abs(lat) + 1.0, 89.9))), 1e-6)
+        step_km = size * KM_PER_DEGREE_LAT * cos_lat
+        qx, qy = self._cell(lat, lng)
+
+        best = []  # max-heap of (-distance, point_id), at most k entries
+        with self._lock:
+            if not self._points:
+                return []
+            max_ring = None
+            if radius_km is not None:
+                max_ring = int(radius_km / step_km) + 1
+            # Past this ring every occupied cell has been visited
+            span_ring = self._span_ring(qx, qy)
+            ring = 0
+            while True:
+                for cell in self._ring_cells(qx, qy, ring):
+                    bucket = self._cells.get(cell)
+                    if not bucket:
+                        continue
+                    for point_id, (plat, plng) in bucket.items():
+                        distance = haversine_km(lat, lng, plat, plng)
+                        if radius_km is not None and distance > radius_km:
+                            continue
+                        if len(best) < k:
+                            heapq.heappush(best, (-distance, point_id))
+                        elif distance < -best[0][0]:
+                            heapq.heapreplace(best, (-distance, point_id))
+                # Anything in ring+1 or beyond is at least ring * step_km away
+                frontier_km = ring * step_km
+                if len(best) >= k and frontier_km > -best[0][0]:
+                    break
+                if max_ring is not None and ring >= max_ring:
+                    break
+                if ring >= span_ring:
+                    break
+                ring += 1
+        return sorted((-neg_distance, point_id) for neg_distance, point_id in best)
+
+    def _span_ring(self, qx, qy):
+        min_ix, max_ix, min_iy, max_iy = self._bounds
+        return max(abs(min_ix - qx), abs(max_ix - qx), abs(min_iy - qy), abs(max_iy - qy))
+
+    @staticmethod
+    def _ring_cells(qx, qy, ring):
+        if ring == 0:
+            yield qx, qy
+            return
+        for dx in range(-ring, ring + 1):
+            yield qx + dx, qy - ring
+            yield qx + dx, qy + ring
+        for dy in range(-ring + 1, ring):
+            yield qx - ring, qy + dy
+            yield qx + ring, qy + dy
+
+
+class LotGridIndex(PointGridIndex):
+    """Grid of approved lots, lazily built and periodically rebuilt from the database"""
+
+    def __init__(self, cell_degrees=None):
+        super().__init__(cell_degrees)
+        self._built_at = None
+
+    def load_points(self, points):
+        super().load_points(points)
+        self._built_at = time.monotonic()
+
+    def rebuild(self):
+        from parking.models import P_Lot
+        rows = P_Lot.objects.filter(
+            owner__verification_status=APPROVED_STATUS,
+            latitude__isnull=False, longitude__isnull=False,
+        ).values_list('lot_id', 'latitude', 'longitude')
+        self.load_points(rows.iterator(chunk_size=2000))
+        logger.info(f"🗺️ Built lot geo index ({len(self._points)} lots)")
+        return len(self._points)
+
+    def _ensure_fresh(self):
+        ttl = getattr(settings, 'LOT_GEO_INDEX_TTL', DEFAULT_INDEX_TTL)
+        built_at = self._built_at
+        if built_at is not None and (not ttl or time.monotonic() - built_at < ttl):
+            return
+        with self._lock:
+            if self._built_at == built_at:
+                self.rebuild()
+
+    def update_lot(self, lot):
+        """Insert, move or drop a lot after a save"""
+        if self._built_at is None:
+            return  # the lazy build will pick the lot up
+        position = _indexable(lot)
+        if position is None:
+            self.remove_point(lot.pk)
+        else:
+            self.set_point(lot.pk, *position)
+
+    def remove_lot(self, lot_id):
+        self.remove_point(lot_id)
+
+    def nearest(self, lat, lng, k=20, radius_km=None):
+        self._ensure_fresh()
+        return super().nearest(lat, lng, k=k, radius_km=radius_km)
+
+
+_grid_index = LotGridIndex()
+
+
+def get_lot_geo_index():
+    return _grid_index
+
+
+def nearest_lots_sql(lat, lng, k=20, radius_km=None):
+    """Bounding-box prefilter in SQL, exact haversine ordering in Python"""
+    from parking.models import P_Lot
+    queryset = P_Lot.objects.filter(
+        owner__verification_status=APPROVED_STATUS,
+        latitude__isnull=False, longitude__isnull=False,
+    )
+    if radius_km is not None:
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+        queryset = queryset.filter(latitude__gte=min_lat, latitude__lte=max_lat)
+        if min_lng >= -180 and max_lng <= 180:
+            queryset = queryset.filter(longitude__gte=min_lng, longitude__lte=max_lng)
+    candidates = []
+    for lot_id, plat, plng in queryset.values_list('lot_id', 'latitude', 'longitude').iterator():
+        distance = haversine_km(lat, lng, float(plat), float(plng))
+        if radius_km is None or distance <= radius_km:
+            candidates.append((distance, lot_id))
+    return heapq.nsmallest(k, candidates)
+
+
+def nearest_lot_ids(lat, lng, k=20, radius_km=None):
+    """(distance_km, lot_id) pairs for the k nearest approved lots, closest first"""
+    if getattr(settings, 'LOT_GEO_BACKEND', 'grid') == 'grid':
+        try:
+            return get_lot_geo_index().nearest(lat, lng, k=k, radius_km=radius_km)
+        except Exception as e:
+            logger.error(f"❌ Lot geo index query failed, using SQL fallback: {str(e)}")
+    return nearest_lots_sql(lat, lng, k=k, radius_km=radius_km)
+
+
+def nearby_lots(lat, lng, k=20, radius_km=None):
+    """
+    The k nearest approved lots as P_Lot instances, closest first, each with
+    `distance_km` and a live `available_slot_count` annotation.
+    """
+    from parking.models import P_Lot
+    hits = nearest_lot_ids(lat, lng, k=k, radius_km=radius_km)
+    if not hits:
+        return []
+    distances = {lot_id: distance for distance, lot_id in hits}
+    lots = P_Lot.objects.filter(
+        lot_id__in=distances, owner__verification_status=APPROVED_STATUS,
+    ).annotate(
+        available_slot_count=Count('slots', filter=Q(slots__is_available=True)),
+    )
+    results = []
+    for lot in lots:
+        lot.distance_km = round(distances[lot.lot_id], 3)
+        results.append(lot)
+    results.sort(key=lambda lot: (lot.distance_km, lot.lot_id))
+    return results
@@ -0,0 +1,207 @@
+"""
+Idempotency-Key handling for booking and payment POSTs.
+
+Clients on flaky networks retry POSTs. When a request to one of the
+IDEMPOTENT_VIEWS actions carries an `Idempotency-Key` header, the first
+request claims the key (one INSERT into IdempotencyKey, unique per caller)
+and its response is stored. A retry with the same key is answered from the
+stored row with one indexed SELECT and never reaches the view:
+
+    same key, same request, finished     → stored response replayed
+                                           (header Idempotent-Replayed: true)
+    same key, first request still running → 409, retry shortly
+    same key, different method/path/body → 422
+
+5xx responses and exceptions release the key, so the client can retry for
+real. The caller is identified by a hash of its token (no auth query); keys
+expire after IDEMPOTENCY_KEY_TTL seconds and are pruned by
+`python manage.py prune_idempotency_keys`.
+
+Settings:
+    IDEMPOTENT_VIEWS       - {view class name: (action, ...)} covered by the middleware
+    IDEMPOTENCY_KEY_TTL    - seconds a stored response stays replayable (default 24h)
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.http.request import RawPostDataException
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+DEFAULT_TTL = 24 * 60 * 60
+
+DEFAULT_IDEMPOTENT_VIEWS = {
+    'BookingViewSet': ('create', 'renew'),
+    'CarwashViewSet': ('pay_for_service',),
+    'CarWashBookingViewSet': ('create',),
+}
+
+
+def get_ttl():
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL', DEFAULT_TTL)
+
+
+def _sha256(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _caller_scope(request):
+    """Hash of the caller's credentials, without touching the database"""
+    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+    if auth_header:
+        return _sha256('auth', auth_header)
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return _sha256('user', str(user.pk))
+    return None
+
+
+def _is_covered(request, view_func):
+    if request.method != 'POST':
+        return False
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return False
+    covered = getattr(settings, 'IDEMPOTENT_VIEWS', DEFAULT_IDEMPOTENT_VIEWS).get(view_class.__name__)
+    if not covered:
+        return False
+    action = (getattr(view_func, 'actions', None) or {}).get('post')
+    return action in covered
+
+
+def _error(message, status_code):
+    return HttpResponse(json.dumps({'error': message}), status=status_code, content_type='application/json')
+
+
+def _replay(record):
+    response = HttpResponse(record.body, status=record.status_code,
+                            content_type=record.content_type or 'application/json')
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def prune_expired():
+    """Delete stored keys older than the TTL; returns the number deleted"""
+    from parking.models import IdempotencyKey
+    cutoff = timezone.now() - timedelta(seconds=get_ttl())
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
+
+
+class IdempotencyMiddleware:
+    """Claim, store and replay Idempotency-Key responses for IDEMPOTENT_VIEWS (sync or async chains)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request._idempotency_record = None
+        try:
+            response = self.get_response(request)
+        except Exception:
+            self._release(request)
+            raise
+        self._finish(request, response)
+        return response
+
+    async def __acall__(self, request):
+        request._idempotency_record = None
+        try:
+            response = await self.get_response(request)
+        except Exception:
+            await sync_to_async(self._release)(request)
+            raise
+        if request._idempotency_record is not None:
+            await sync_to_async(self._finish)(request, response)
+        return response
+
+    def _finish(self, request, response):
+        record = request._idempotency_record
+        if record is not None:
+            if response.status_code >= 500 or getattr(response, 'streaming', False):
+                self._release(request)
+            else:
+                self._store(record, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        key = request.META.get(HEADER)
+        if not key or not _is_covered(request, view_func):
+            return None
+        if len(key) > MAX_KEY_LENGTH:
+            return _error(f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters', 400)
+        scope = _caller_scope(request)
+        if scope is None:
+            return None  # the view rejects anonymous callers itself
+
+        from parking.models import IdempotencyKey
+        try:
+            body = request.body
+        except RawPostDataException:
+            body = b''  # already consumed as a multipart stream
+        fingerprint = _sha256(request.method, request.path, body)
+        record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+        if record is not None and record.created_at < timezone.now() - timedelta(seconds=get_ttl()):
+            IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at).delete()
+            record = None
+
+        if record is None:
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(scope=scope, key=key, fingerprint=fingerprint)
+            except IntegrityError:
+                # A concurrent retry claimed the key first
+                record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+                if record is None:
+                    return _error('Request with this Idempotency-Key failed, please retry', 409)
+            else:
+                request._idempotency_record = record
+                return None
+
+        if record.fingerprint != fingerprint:
+            return _error('Idempotency-Key was already used for a different request', 422)
+        if record.status_code is None:
+            response = _error('A request with this Idempotency-Key is still being processed', 409)
+            response['Retry-After'] = '1'
+            return response
+        logger.info(f"🔁 Replaying stored response for Idempotency-Key {key}")
+        return _replay(record)
+
+    def _store(self, record, response):
+        from parking.models import IdempotencyKey
+        try:
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status_code=response.status_code,
+                content_type=response.get('Content-Type', ''),
+                body=response.content.decode(response.charset or 'utf-8', errors='replace'),
+            )
+        except Exception as e:
+            logger.error(f"❌ Failed to store response for Idempotency-Key {record.key}: {str(e)}")
+
+    def _release(self, request):
+        record = getattr(request, '_idempotency_record', None)
+        if record is None:
+            return
+        from parking.models import IdempotencyKey
+        try:
+            IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True).delete()
+        except Exception as e:
+            logger.error(f"❌ Failed to release Idempotency-Key {record.key}: {str(e)}")
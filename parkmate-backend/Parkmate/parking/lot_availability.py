@@ -0,0 +1,254 @@
+"""
+Real-time slot availability for one lot (ws/lots/<lot_id>/).
+
+A socket gets the lot's occupancy snapshot when it subscribes, then small
+deltas on the `lot_<lot_id>` group:
+
+    {"type": "snapshot", "lot_id": 3, "slots": [
+        {"id": 12, "state": "booked", "end_time": "...", "vehicle_type": "Sedan", "price": "50.00"}, ...]}
+    {"type": "delta", "lot_id": 3, "slots": [{"id": 12, "state": "available", "end_time": null}]}
+
+`state` is available, booked or scheduled (an advance booking, which also
+carries its start_time).
+
+Every booking write path (create, cancel, renew, expiry, admin changes)
+saves the Booking and/or its P_Slot, so the signals call slot_changed()
+as the one publish point. Changes of a transaction are published together
+after it commits, as the slots' current state, and each delta is serialized
+once for all subscribers. New slots also carry vehicle_type and price;
+deleted slots are sent as {"id": .., "state": "removed"}.
+
+Nothing else flips a booked slot back when its time runs out: the slot
+list endpoint used to do it on every poll. While a lot has subscribers,
+this process wakes up at the lot's next end_time and runs expire_bookings()
+for it, which publishes the freed slots like any other change.
+
+bench_lot_availability.py measures message sizes against the slot list
+endpoint and the delta fan-out to many subscribers.
+"""
+import asyncio
+import json
+import logging
+import threading
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ['booked', 'BOOKED', 'ACTIVE', 'SCHEDULED']
+
+_pending = threading.local()
+
+
+def group_name(lot_id):
+    return f"lot_{lot_id}"
+
+
+def slot_states(lot_id, slot_ids=None):
+    """{slot_id: {'id', 'state', 'end_time', 'vehicle_type', 'price'}} in one query"""
+    from parking.models import Booking, P_Slot
+    # Same rule as P_SlotSerializer.get_booking: the newest active booking, unless it has ended
+    active = Booking.objects.filter(
+        slot=OuterRef('pk'), status__in=ACTIVE_STATUSES,
+    ).order_by('-booking_time')
+    slots = P_Slot.objects.filter(lot_id=lot_id).annotate(
+        active_status=Subquery(active.values('status')[:1]),
+        active_start=Subquery(active.values('start_time')[:1]),
+        active_end=Subquery(active.values('end_time')[:1]),
+    )
+    if slot_ids is not None:
+        slots = slots.filter(slot_id__in=slot_ids)
+    now = timezone.now()
+    states = {}
+    for slot_id, is_available, status, start_time, end_time, vehicle_type, price in slots.order_by(
+            'slot_id').values_list('slot_id', 'is_available', 'active_status', 'active_start', 'active_end',
+                                   'vehicle_type', 'price'):
+        if end_time is not None and end_time <= now:
+            status = end_time = None
+        state = {
+            'id': slot_id,
+            'state': 'available' if is_available else 'booked',
+            'end_time': end_time.isoformat() if end_time else None,
+            'vehicle_type': vehicle_type,
+            'price': str(price),
+        }
+        if status and status.upper() == 'SCHEDULED':
+            # Advance bookings show their start on the grid
+            state['state'] = 'scheduled'
+            state['start_time'] = start_time.isoformat() if start_time else None
+        elif end_time is not None:
+            state['state'] = 'booked'
+        states[slot_id] = state
+    return states
+
+
+def snapshot(lot_id):
+    """The subscribe-time message, or None if the lot does not exist"""
+    from parking.models import P_Lot
+    if not P_Lot.objects.filter(lot_id=lot_id).exists():
+        return None
+    return {'type': 'snapshot', 'lot_id': int(lot_id), 'slots': list(slot_states(lot_id).values())}
+
+
+def next_end_time(lot_id):
+    """Earliest future end_time of an active booking in the lot"""
+    from parking.models import Booking
+    return Booking.objects.filter(
+        lot_id=lot_id, status__in=ACTIVE_STATUSES, end_time__gt=timezone.now(),
+    ).order_by('end_time').values_list('end_time', flat=True).first()
+
+
+def delta_message(lot_id, slot_ids, created=()):
+    """Delta for the given slots as they are now; new slots include vehicle_type and price"""
+    states = slot_states(lot_id, slot_ids)
+    slots = []
+    for slot_id in sorted(slot_ids):
+        state = states.get(slot_id)
+        if state is None:
+            slots.append({'id': slot_id, 'state': 'removed'})
+        elif slot_id in created:
+            slots.append(state)
+        else:
+            slots.append({field: state[field] for field in ('id', 'state', 'end_time', 'start_time') if field in state})
+    return {'type': 'delta', 'lot_id': int(lot_id), 'slots': slots}
+
+
+def slot_changed(lot_id, slot_id, created=False):
+    """
+    The publish point: record that a slot of a lot may have changed. Published
+    (once per slot) after the surrounding transaction commits.
+    """
+    if lot_id is None or slot_id is None:
+        return
+    pending = getattr(_pending, 'lots', None)
+    if pending is None:
+        pending = _pending.lots = {}
+    slots = pending.setdefault(lot_id, {})
+    slots[slot_id] = slots.get(slot_id, False) or created
+    # Every change registers a callback; the first one to run publishes all of them.
+    # Changes of a rolled-back transaction go out with the next commit as the
+    # slots' unchanged state, which subscribers can apply harmlessly.
+    transaction.on_commit(publish_pending)
+
+
+def publish_pending():
+    pending = getattr(_pending, 'lots', None)
+    if not pending:
+        return
+    _pending.lots = {}
+    for lot_id, slots in pending.items():
+        try:
+            publish(lot_id, slots, created={slot_id for slot_id, new in slots.items() if new})
+        except Exception as e:
+            logger.error(f"❌ Failed to publish availability of lot {lot_id}: {str(e)}")
+
+
+def publish(lot_id, slot_ids, created=()):
+    """Send one delta for these slots to everyone watching the lot"""
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+    message = delta_message(lot_id, slot_ids, created)
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return message
+    async_to_sync(channel_layer.group_send)(group_name(lot_id), {
+        'type': 'lot_delta',
+        'text': json.dumps(message),
+        'end_times': [slot['end_time'] for slot in message['slots'] if slot.get('end_time')],
+    })
+    logger.info(f"📡 Published {len(message['slots'])} slot change(s) for lot {lot_id}")
+    return message
+
+
+def expire_bookings(lot_id=None):
+    """
+    Complete 'booked' bookings whose end_time has passed and free their slots,
+    and free slots still held by cancelled bookings. Returns the number of
+    bookings completed.
+    """
+    from parking.models import Booking
+    expired_bookings = Booking.objects.filter(status='booked', end_time__lt=timezone.now()).select_related('slot')
+    cancelled_bookings = Booking.objects.filter(status='cancelled', slot__is_available=False).select_related('slot')
+    if lot_id is not None:
+        expired_bookings = expired_bookings.filter(lot_id=lot_id)
+        cancelled_bookings = cancelled_bookings.filter(lot_id=lot_id)
+
+    completed = 0
+    for booking in expired_bookings:
+        logger.info(f"⏰ Auto-completing expired booking {booking.booking_id} (slot {booking.slot.slot_id})")
+        # One transaction per booking, so the freed slot goes out as one delta
+        with transaction.atomic():
+            booking.status = 'completed'
+
+            # Auto-clear carwash when booking completes; the workload signals
+            # release the assigned employee on delete
+            carwash_services = booking.booking_by_user.all()
+            if carwash_services.exists():
+                logger.info(f"🧼 Auto-clearing add-on carwash service(s) of booking {booking.booking_id}")
+                carwash_services.delete()
+
+            booking.save()
+
+            # Free up the slot
+            booking.slot.is_available = True
+            booking.slot.save()
+        completed += 1
+
+    for booking in cancelled_bookings:
+        logger.info(f"🗑️ Freeing slot {booking.slot.slot_id} of cancelled booking {booking.booking_id}")
+        booking.slot.is_available = True
+        booking.slot.save()
+    return completed
+
+
+class ExpiryWatcher:
+    """Process-wide timers running expire_bookings() for watched lots at their next end_time"""
+
+    def __init__(self):
+        self.watchers = {}  # lot_id -> set of consumers
+        self.timers = {}    # lot_id -> (deadline, task)
+
+    def watch(self, lot_id, consumer, deadline):
+        self.watchers.setdefault(lot_id, set()).add(consumer)
+        self.arm(lot_id, deadline)
+
+    def unwatch(self, lot_id, consumer):
+        members = self.watchers.get(lot_id)
+        if members is None:
+            return
+        members.discard(consumer)
+        if not members:
+            del self.watchers[lot_id]
+            _, task = self.timers.pop(lot_id, (None, None))
+            if task is not None:
+                task.cancel()
+
+    def arm(self, lot_id, deadline):
+        """Wake up at `deadline` (a datetime) unless an earlier wake-up is already due"""
+        if deadline is None or lot_id not in self.watchers:
+            return
+        current = self.timers.get(lot_id)
+        if current is not None and not current[1].done() and current[0] <= deadline:
+            return
+        if current is not None:
+            current[1].cancel()
+        task = asyncio.get_running_loop().create_task(self._expire_at(lot_id, deadline))
+        self.timers[lot_id] = (deadline, task)
+
+    async def _expire_at(self, lot_id, deadline):
+        from channels.db import database_sync_to_async
+        # A moment past end_time, so the booking counts as ended
+        await asyncio.sleep(max((deadline - timezone.now()).total_seconds(), 0) + 0.5)
+        self.timers.pop(lot_id, None)
+        try:
+            completed = await database_sync_to_async(expire_bookings)(lot_id)
+            if completed:
+                logger.info(f"⏰ Expired {completed} booking(s) in watched lot {lot_id}")
+            self.arm(lot_id, await database_sync_to_async(next_end_time)(lot_id))
+        except Exception as e:
+            logger.error(f"❌ Failed to expire bookings of lot {lot_id}: {str(e)}")
+
+
+expiry_watcher = ExpiryWatcher()
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from parking.archive import (archive_bookings, get_archive_horizon,
+                             DEFAULT_CHUNK_SIZE)
+from parking.models import Booking, ArchivedBooking
+
+
+class Command(BaseCommand):
+    help = 'Move completed/cancelled bookings older than the archive horizon (with payments and carwashes) to the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Archive bookings that ended more than this many days ago (default: BOOKING_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Bookings moved per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many bookings would be archived')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('\n=== BOOKING ARCHIVE ===\n'))
+        horizon = get_archive_horizon(options['days'])
+        self.stdout.write(f'Horizon: bookings that ended before {horizon:%Y-%m-%d %H:%M}')
+        self.stdout.write(f'Live bookings before: {Booking.objects.count()}')
+
+        count = archive_bookings(
+            days=options['days'],
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+        )
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Dry run: {count} bookings would be archived\n'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Archived {count} bookings'))
+        self.stdout.write(f'Live bookings after: {Booking.objects.count()}')
+        self.stdout.write(f'Archived bookings total: {ArchivedBooking.objects.count()}\n')
@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand
+from parking.audit import CHECKS, run_audit
+
+
+class Command(BaseCommand):
+    help = 'Check denormalized state (lot slot totals, slot availability, workloads, duplicate car washes, orphaned payments, car wash slot capacity)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help='Fix the drift that was found (orphaned payments are only reported)',
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only check rows changed since the last run of every check',
+        )
+        parser.add_argument(
+            '--check',
+            action='append',
+            choices=CHECKS,
+            help='Run only this check (repeatable)',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the report as JSON',
+        )
+
+    def handle(self, *args, **options):
+        report = run_audit(
+            repair=options['repair'],
+            incremental=options['incremental'],
+            checks=options['check'] or CHECKS,
+        )
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, default=str))
+            return
+
+        self.stdout.write(self.style.WARNING(
+            f"Consistency audit ({report['mode']}{', repair' if report['repair'] else ''})..."
+        ))
+        total = 0
+        for name, result in report['checks'].items():
+            total += result['count']
+            if not result['count']:
+                self.stdout.write(f'✓ {name}: consistent')
+                continue
+            self.stdout.write(self.style.ERROR(
+                f"❌ {name}: {result['count']} issue(s), {result['repaired']} repaired"
+            ))
+            for issue in result['issues'][:20]:
+                self.stdout.write(f'   {issue}')
+            if result['count'] > 20:
+                self.stdout.write(f"   ... and {result['count'] - 20} more")
+        if total:
+            self.stdout.write(self.style.WARNING(f'\n{total} issue(s) found'))
+        else:
+            self.stdout.write(self.style.SUCCESS('\n✅ All checks passed'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from parking.settlement import DEFAULT_CHUNK_SIZE, backfill
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the owner settlement ledger from live and archived payments in chunked passes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f'Payment ids per transaction (default: {DEFAULT_CHUNK_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('Rebuilding settlement ledger...'))
+
+        def progress(done, last, scanned):
+            self.stdout.write(f'   pay_id {done}/{last}: {scanned} payment(s) scanned')
+
+        scanned = backfill(chunk_size=options['chunk_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f'✅ Settlement ledger rebuilt from {scanned} payment(s)'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from parking.settlement import DRAIN_BATCH, drain
+
+
+class Command(BaseCommand):
+    help = 'Fold pending settlement outbox rows into the owner settlement ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DRAIN_BATCH,
+            help=f'Outbox rows applied per transaction (default: {DRAIN_BATCH})',
+        )
+
+    def handle(self, *args, **options):
+        applied = drain(limit=options['batch_size'])
+        if applied:
+            self.stdout.write(self.style.SUCCESS(f'✅ Applied {applied} settlement outbox row(s)'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Settlement outbox is empty'))
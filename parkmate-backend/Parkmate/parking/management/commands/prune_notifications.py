@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from parking.notification_inbox import get_ttl, prune_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete stored notifications older than NOTIFICATION_TTL'
+
+    def handle(self, *args, **options):
+        deleted = prune_expired()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Pruned {deleted} notification(s) older than {get_ttl() // 3600}h'
+        ))
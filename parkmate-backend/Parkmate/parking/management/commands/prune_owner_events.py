@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from parking.owner_events import get_ttl, prune_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete owner events older than OWNER_EVENT_TTL'
+
+    def handle(self, *args, **options):
+        deleted = prune_expired()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Pruned {deleted} owner event(s) older than {get_ttl() // 3600}h'
+        ))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from parking.search import get_lot_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the lot full-text search index from the PARKING_LOT table'
+
+    def handle(self, *args, **options):
+        index = get_lot_search_index()
+        self.stdout.write(self.style.WARNING(f'Rebuilding lot search index ({index.name} backend)...'))
+        count = index.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'✅ Indexed {count} lots'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from parking.revenue_rollup import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily owner revenue rollup from the car wash bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lot',
+            type=int,
+            action='append',
+            dest='lot_ids',
+            help='Only rebuild this lot (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('Rebuilding daily revenue rollup...'))
+        rows = rebuild(lot_ids=options['lot_ids'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Wrote {rows} daily revenue row(s)'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from parking.workload import reconcile_workloads
+
+
+class Command(BaseCommand):
+    help = 'Recount every employee\'s active car wash assignments and fix drifted workload counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show drifted counters without fixing them',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        fixes = reconcile_workloads(dry_run=dry_run)
+        for employee_id, old, new in fixes:
+            self.stdout.write(f'   Employee {employee_id}: {old} → {new}')
+        if not fixes:
+            self.stdout.write(self.style.SUCCESS('✅ All employee workloads are consistent'))
+        elif dry_run:
+            self.stdout.write(self.style.WARNING(f'DRY RUN: {len(fixes)} employee workload(s) drifted'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ Reconciled {len(fixes)} employee workload(s)'))
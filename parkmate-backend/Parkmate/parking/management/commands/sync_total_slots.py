@@ -1,35 +1,24 @@
 from django.core.management.base import BaseCommand
-from parking.models import P_Lot
+from parking.audit import audit_lot_total_slots
 
 class Command(BaseCommand):
     help = 'Sync total_slots field with actual slot count for all lots'
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.WARNING('Starting total_slots synchronization...'))
-        
-        lots = P_Lot.objects.all()
-        fixed_count = 0
-        
-        for lot in lots:
-            actual_count = lot.slots.count()
-            if lot.total_slots != actual_count:
-                old_value = lot.total_slots
-                lot.total_slots = actual_count
-                lot.save()
-                fixed_count += 1
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'✅ Fixed {lot.lot_name}: {old_value} → {actual_count} total_slots'
-                    )
-                )
-            else:
-                self.stdout.write(
-                    f'✓ {lot.lot_name}: Already correct ({actual_count} slots)'
+
+        # One grouped query finds the drifted lots, one UPDATE fixes them
+        fixed = audit_lot_total_slots(repair=True)
+        for issue in fixed:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"✅ Fixed lot {issue['id']}: {issue['stored']} → {issue['expected']} total_slots"
                 )
-        
-        if fixed_count > 0:
+            )
+
+        if fixed:
             self.stdout.write(
-                self.style.SUCCESS(f'\n🎉 Successfully fixed {fixed_count} lot(s)')
+                self.style.SUCCESS(f'\n🎉 Successfully fixed {len(fixed)} lot(s)')
             )
         else:
             self.stdout.write(
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0027_add_payment_is_renewal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('booking_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('vehicle_number', models.CharField(blank=True, max_length=100, null=True)),
+                ('vehicle_type', models.CharField(choices=[('Hatchback', 'Hatchback'), ('Sedan', 'Sedan'), ('Multi-Axle', 'Multi-Axle'), ('Three-Wheeler', 'Three-Wheeler'), ('Two-Wheeler', 'Two-Wheeler')], default='Sedan', max_length=50)),
+                ('booking_type', models.CharField(choices=[('Instant', 'Instant'), ('Advance', 'Advance')], max_length=100)),
+                ('booking_time', models.DateField()),
+                ('start_time', models.DateTimeField(blank=True, null=True)),
+                ('end_time', models.DateTimeField(blank=True, null=True)),
+                ('price', models.DecimalField(decimal_places=2, default=0.0, max_digits=5)),
+                ('status', models.CharField(choices=[('booked', 'Booked'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=10)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('lot', models.ForeignKey(db_column='lot_id', on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to='parking.p_lot')),
+                ('slot', models.ForeignKey(blank=True, db_column='slot_id', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_bookings', to='parking.p_slot')),
+                ('user', models.ForeignKey(db_column='user_id', on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to='parking.userprofile')),
+            ],
+            options={
+                'db_table': 'BOOKING_ARCHIVE',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedCarwash',
+            fields=[
+                ('carwash_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('price', models.DecimalField(decimal_places=2, default=0.0, max_digits=5)),
+                ('status', models.CharField(choices=[('pending', 'Pending Payment Verification'), ('active', 'Active'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('booking', models.ForeignKey(db_column='booking_id', on_delete=django.db.models.deletion.CASCADE, related_name='carwashes', to='parking.archivedbooking')),
+                ('carwash_type', models.ForeignKey(db_column='carwash_type', on_delete=django.db.models.deletion.CASCADE, related_name='archived_carwashes', to='parking.carwash_type')),
+                ('employee', models.ForeignKey(blank=True, db_column='emp_id', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_carwashes', to='parking.employee')),
+            ],
+            options={
+                'db_table': 'CARWASH_ARCHIVE',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedPayment',
+            fields=[
+                ('pay_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('payment_method', models.CharField(choices=[('CC', 'Credit Card'), ('Cash', 'Cash'), ('UPI', 'QR code')], max_length=100)),
+                ('amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=8)),
+                ('status', models.CharField(choices=[('SUCCESS', 'Success'), ('FAILED', 'Failed'), ('PENDING', 'Pending')], max_length=10)),
+                ('service_type', models.CharField(choices=[('slot_booking', 'Parking Slot Booking'), ('car_wash', 'Car Wash Service')], default='slot_booking', max_length=20)),
+                ('transaction_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('is_renewal', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(null=True)),
+                ('verified_at', models.DateTimeField(blank=True, null=True)),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='parking.archivedbooking')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_payments', to='parking.userprofile')),
+                ('verified_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_payments_verified', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'PAYEMENT_ARCHIVE',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['user', '-start_time'], name='booking_archive_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['lot', '-start_time'], name='booking_archive_lot_idx'),
+        ),
+    ]
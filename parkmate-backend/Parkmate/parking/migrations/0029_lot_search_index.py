@@ -0,0 +1,43 @@
+# Creates the LOT_SEARCH FTS5 table on SQLite builds that support it.
+# Other databases (or SQLite without FTS5) use the in-memory fallback index.
+
+from django.db import migrations, OperationalError
+
+
+def create_lot_search_table(apps, schema_editor):
+    from parking.search import FTS5_CREATE_SQL, FTS5_INSERT_SQL, SEARCH_FIELDS
+
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(FTS5_CREATE_SQL)
+        except OperationalError:
+            # SQLite compiled without FTS5
+            return
+
+        P_Lot = apps.get_model('parking', 'P_Lot')
+        fields = [field for field, _ in SEARCH_FIELDS]
+        for row in P_Lot.objects.using(connection.alias).values_list('lot_id', *fields).iterator():
+            cursor.execute(FTS5_INSERT_SQL, [row[0]] + [value or '' for value in row[1:]])
+
+
+def drop_lot_search_table(apps, schema_editor):
+    from parking.search import FTS5_DROP_SQL
+
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(FTS5_DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("parking", "0028_booking_archive"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_lot_search_table, drop_lot_search_table),
+    ]
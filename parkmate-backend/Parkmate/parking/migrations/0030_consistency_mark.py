@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0029_lot_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsistencyMark',
+            fields=[
+                ('mark_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('scope', models.CharField(choices=[('lot', 'Parking lot (total_slots)'), ('slot', 'Slot (is_available)'), ('employee', 'Employee (workload)'), ('booking', 'Slot booking (add-on car washes)'), ('payment', 'Payment (links)')], max_length=20)),
+                ('object_id', models.IntegerField()),
+                ('marked_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'CONSISTENCY_MARK',
+            },
+        ),
+    ]
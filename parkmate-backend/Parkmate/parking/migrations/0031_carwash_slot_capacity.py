@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0030_consistency_mark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='p_lot',
+            name='carwash_slot_capacity',
+            field=models.PositiveIntegerField(blank=True, help_text='Car washes per time slot (blank = CARWASH_SLOT_CAPACITY)', null=True),
+        ),
+        migrations.AddField(
+            model_name='p_lot',
+            name='carwash_slot_minutes',
+            field=models.PositiveIntegerField(blank=True, help_text='Car wash time slot length in minutes (blank = CARWASH_SLOT_MINUTES)', null=True),
+        ),
+        migrations.CreateModel(
+            name='CarWashSlotCapacity',
+            fields=[
+                ('slot_id', models.AutoField(primary_key=True, serialize=False)),
+                ('slot_start', models.DateTimeField(help_text='Start of the time slot')),
+                ('slot_end', models.DateTimeField(help_text='End of the time slot')),
+                ('capacity', models.PositiveIntegerField(help_text='Car washes this slot can take')),
+                ('booked', models.IntegerField(default=0, help_text='Car washes currently holding this slot')),
+                ('lot', models.ForeignKey(db_column='lot_id', on_delete=django.db.models.deletion.CASCADE, related_name='carwash_slots', to='parking.p_lot')),
+            ],
+            options={
+                'db_table': 'CARWASH_SLOT_CAPACITY',
+            },
+        ),
+        migrations.AddField(
+            model_name='carwashbooking',
+            name='capacity_slot',
+            field=models.ForeignKey(blank=True, db_column='capacity_slot_id', help_text='Time slot whose capacity this booking holds (cleared when released)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bookings', to='parking.carwashslotcapacity'),
+        ),
+        migrations.AddConstraint(
+            model_name='carwashslotcapacity',
+            constraint=models.UniqueConstraint(fields=('lot', 'slot_start'), name='unique_carwash_slot_per_lot'),
+        ),
+        migrations.AddConstraint(
+            model_name='carwashslotcapacity',
+            constraint=models.CheckConstraint(condition=models.Q(('booked__gte', 0)), name='carwash_slot_booked_non_negative'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0031_carwash_slot_capacity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOwnerRevenue',
+            fields=[
+                ('rollup_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('day', models.DateField(help_text='Local calendar day')),
+                ('bookings', models.IntegerField(default=0, help_text='Car wash bookings made on this day')),
+                ('completed', models.IntegerField(default=0, help_text='Car washes completed on this day')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, help_text='Verified revenue of the car washes completed on this day', max_digits=12)),
+                ('lot', models.ForeignKey(db_column='lot_id', on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='parking.p_lot')),
+            ],
+            options={
+                'db_table': 'DAILY_OWNER_REVENUE',
+                'constraints': [models.UniqueConstraint(fields=('lot', 'day'), name='unique_daily_revenue_per_lot')],
+            },
+        ),
+    ]
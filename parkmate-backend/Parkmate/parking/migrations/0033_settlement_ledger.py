@@ -0,0 +1,59 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0032_daily_owner_revenue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SettlementLedger',
+            fields=[
+                ('entry_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('day', models.DateField(help_text='Local day the payments were made')),
+                ('payment_method', models.CharField(max_length=100)),
+                ('success_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('success_count', models.IntegerField(default=0)),
+                ('pending_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('pending_count', models.IntegerField(default=0)),
+                ('failed_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('failed_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('lot', models.ForeignKey(db_column='lot_id', on_delete=django.db.models.deletion.CASCADE, related_name='settlements', to='parking.p_lot')),
+                ('owner', models.ForeignKey(db_column='owner_id', on_delete=django.db.models.deletion.CASCADE, related_name='settlements', to='parking.ownerprofile')),
+            ],
+            options={
+                'db_table': 'SETTLEMENT_LEDGER',
+                'indexes': [models.Index(fields=['owner', 'day'], name='settlement_owner_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('lot', 'day', 'payment_method'), name='unique_settlement_per_lot_day_method')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SettlementOutbox',
+            fields=[
+                ('event_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('payment_id', models.IntegerField(help_text='Payment the change came from (kept after archival)')),
+                ('day', models.DateField(help_text='Local day the payment was made')),
+                ('payment_method', models.CharField(max_length=100)),
+                ('success_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('success_count', models.IntegerField(default=0)),
+                ('pending_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('pending_count', models.IntegerField(default=0)),
+                ('failed_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('failed_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('applied_at', models.DateTimeField(blank=True, help_text='When the change was folded into the ledger', null=True)),
+                ('lot', models.ForeignKey(db_column='lot_id', on_delete=django.db.models.deletion.CASCADE, related_name='settlement_events', to='parking.p_lot')),
+                ('owner', models.ForeignKey(db_column='owner_id', on_delete=django.db.models.deletion.CASCADE, related_name='settlement_events', to='parking.ownerprofile')),
+            ],
+            options={
+                'db_table': 'SETTLEMENT_OUTBOX',
+                'indexes': [models.Index(fields=['applied_at', 'event_id'], name='settlement_outbox_pending_idx'), models.Index(fields=['payment_id'], name='settlement_outbox_payment_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def build_rating_summaries(apps, schema_editor):
+    Review = apps.get_model('parking', 'Review')
+    LotRatingSummary = apps.get_model('parking', 'LotRatingSummary')
+    rows = Review.objects.order_by().values('lot_id').annotate(
+        review_count=Count('pk'), rating_sum=Sum('rating'),
+        **{f'stars_{star}': Count('pk', filter=Q(rating=star)) for star in range(1, 6)},
+    )
+    LotRatingSummary.objects.bulk_create([LotRatingSummary(**row) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0034_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LotRatingSummary',
+            fields=[
+                ('lot', models.OneToOneField(db_column='lot_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to='parking.p_lot')),
+                ('review_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('stars_1', models.IntegerField(default=0)),
+                ('stars_2', models.IntegerField(default=0)),
+                ('stars_3', models.IntegerField(default=0)),
+                ('stars_4', models.IntegerField(default=0)),
+                ('stars_5', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'LOT_RATING_SUMMARY',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['lot', 'review_type', '-created_at'], name='review_lot_type_feed_idx'),
+        ),
+        migrations.RunPython(build_rating_summaries, migrations.RunPython.noop),
+    ]
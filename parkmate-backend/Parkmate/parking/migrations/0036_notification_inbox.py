@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0035_lot_rating_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationSequence',
+            fields=[
+                ('recipient', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('last_seq', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'NOTIFICATION_SEQUENCE',
+            },
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('notification_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('recipient', models.CharField(max_length=64)),
+                ('seq', models.PositiveBigIntegerField()),
+                ('level', models.CharField(default='info', max_length=20)),
+                ('message', models.TextField()),
+                ('count', models.PositiveIntegerField(default=1, help_text='Identical notifications coalesced into this one')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'NOTIFICATION',
+                'indexes': [models.Index(fields=['created_at'], name='notification_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('recipient', 'seq'), name='unique_notification_seq_per_recipient')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0036_notification_inbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OwnerEventSequence',
+            fields=[
+                ('owner', models.OneToOneField(db_column='owner_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='event_sequence', serialize=False, to='parking.ownerprofile')),
+                ('last_seq', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'OWNER_EVENT_SEQUENCE',
+            },
+        ),
+        migrations.CreateModel(
+            name='OwnerEvent',
+            fields=[
+                ('event_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('seq', models.PositiveBigIntegerField()),
+                ('kind', models.CharField(choices=[('booking_created', 'Booking created'), ('booking_status', 'Booking status changed'), ('payment_pending', 'Payment awaiting verification'), ('payment_status', 'Payment status changed'), ('carwash_status', 'Car wash status changed'), ('employee_assignment', 'Employee assignment changed')], max_length=32)),
+                ('data', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(db_column='owner_id', on_delete=django.db.models.deletion.CASCADE, related_name='events', to='parking.ownerprofile')),
+            ],
+            options={
+                'db_table': 'OWNER_EVENT',
+                'indexes': [models.Index(fields=['created_at'], name='owner_event_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'seq'), name='unique_owner_event_seq')],
+            },
+        ),
+    ]
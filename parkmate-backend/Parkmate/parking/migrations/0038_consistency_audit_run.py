@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0037_owner_event_stream'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsistencyAuditRun',
+            fields=[
+                ('run_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('mode', models.CharField(max_length=20)),
+                ('repair', models.BooleanField(default=False)),
+                ('watermark', models.BigIntegerField(blank=True, null=True)),
+                ('issues', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'CONSISTENCY_AUDIT_RUN',
+            },
+        ),
+    ]
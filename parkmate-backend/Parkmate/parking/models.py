@@ -119,6 +119,8 @@ class P_Lot(models.Model):
     total_slots=models.IntegerField()
     lot_image=models.ImageField(upload_to="lot_images/",null=True,blank=True,help_text="Image for the parking lot card")
     provides_carwash=models.BooleanField(default=False,help_text="True if this parking lot provides car wash services")
+    carwash_slot_capacity=models.PositiveIntegerField(null=True,blank=True,help_text="Car washes per time slot (blank = CARWASH_SLOT_CAPACITY)")
+    carwash_slot_minutes=models.PositiveIntegerField(null=True,blank=True,help_text="Car wash time slot length in minutes (blank = CARWASH_SLOT_MINUTES)")
     #available_slots=models.BooleanField(default=True,help_text="True if the parking lot has at least one free slot,False if full.")
     
     def available_slots(self):
@@ -340,6 +342,36 @@ class Review(models.Model):
     class Meta:
         db_table='REVIEW'
         ordering = ['-created_at']
+        indexes=[
+            models.Index(fields=['lot','review_type','-created_at'],name='review_lot_type_feed_idx'),
+        ]
+
+
+class LotRatingSummary(models.Model):
+    """
+    Review count, rating sum and star histogram of a lot, kept current by the
+    Review signals (see parking/review_summary.py) so lot pages never
+    aggregate the reviews table.
+    """
+    lot=models.OneToOneField(to=P_Lot,on_delete=models.CASCADE,primary_key=True,db_column='lot_id',related_name='rating_summary')
+    review_count=models.IntegerField(default=0)
+    rating_sum=models.IntegerField(default=0)
+    stars_1=models.IntegerField(default=0)
+    stars_2=models.IntegerField(default=0)
+    stars_3=models.IntegerField(default=0)
+    stars_4=models.IntegerField(default=0)
+    stars_5=models.IntegerField(default=0)
+    updated_at=models.DateTimeField(auto_now=True)
+
+    @property
+    def average(self):
+        return round(self.rating_sum / self.review_count, 1) if self.review_count else None
+
+    def __str__(self):
+        return f"Lot {self.lot_id}: {self.average} from {self.review_count} review(s)"
+
+    class Meta:
+        db_table='LOT_RATING_SUMMARY'
 
 
 class CarWashBooking(models.Model):
@@ -382,6 +414,7 @@ class CarWashBooking(models.Model):
     completed_time = models.DateTimeField(null=True, blank=True, help_text="When the car wash was completed")
     notes = models.TextField(blank=True, null=True, help_text="Additional notes or special requests")
     transaction_id = models.CharField(max_length=100, blank=True, null=True, help_text="Payment transaction ID for online payments")
+    capacity_slot = models.ForeignKey(to='CarWashSlotCapacity', on_delete=models.SET_NULL, null=True, blank=True, db_column='capacity_slot_id', related_name='bookings', help_text="Time slot whose capacity this booking holds (cleared when released)")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -393,6 +426,116 @@ class CarWashBooking(models.Model):
         ordering = ['-booking_time']
 
 
+class CarWashSlotCapacity(models.Model):
+    """
+    Capacity ledger for one car wash time slot of a lot.
+    `booked` only moves through conditional UPDATEs in parking/carwash_capacity.py.
+    """
+    slot_id = models.AutoField(primary_key=True)
+    lot = models.ForeignKey(to=P_Lot, on_delete=models.CASCADE, db_column='lot_id', related_name='carwash_slots')
+    slot_start = models.DateTimeField(help_text="Start of the time slot")
+    slot_end = models.DateTimeField(help_text="End of the time slot")
+    capacity = models.PositiveIntegerField(help_text="Car washes this slot can take")
+    booked = models.IntegerField(default=0, help_text="Car washes currently holding this slot")
+
+    def __str__(self):
+        return f"{self.lot_id} @ {self.slot_start}: {self.booked}/{self.capacity}"
+
+    class Meta:
+        db_table = 'CARWASH_SLOT_CAPACITY'
+        constraints = [
+            models.UniqueConstraint(fields=['lot', 'slot_start'], name='unique_carwash_slot_per_lot'),
+            models.CheckConstraint(condition=models.Q(booked__gte=0), name='carwash_slot_booked_non_negative'),
+        ]
+
+
+class DailyOwnerRevenue(models.Model):
+    """
+    Per-lot, per-day car wash rollup behind the owner revenue time series.
+    Kept up to date by the CarWashBooking signals (see parking/revenue_rollup.py).
+    """
+    rollup_id = models.BigAutoField(primary_key=True)
+    lot = models.ForeignKey(to=P_Lot, on_delete=models.CASCADE, db_column='lot_id', related_name='daily_revenue')
+    day = models.DateField(help_text="Local calendar day")
+    bookings = models.IntegerField(default=0, help_text="Car wash bookings made on this day")
+    completed = models.IntegerField(default=0, help_text="Car washes completed on this day")
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Verified revenue of the car washes completed on this day")
+
+    def __str__(self):
+        return f"{self.lot_id} {self.day}: {self.bookings} bookings, ₹{self.revenue}"
+
+    class Meta:
+        db_table = 'DAILY_OWNER_REVENUE'
+        constraints = [
+            models.UniqueConstraint(fields=['lot', 'day'], name='unique_daily_revenue_per_lot'),
+        ]
+
+
+class SettlementOutbox(models.Model):
+    """
+    Append-only journal of settlement changes, one row per payment transition,
+    written in the same transaction as the Payment change. Rows are folded
+    into SettlementLedger and kept (applied_at set) as the audit trail.
+    See parking/settlement.py.
+    """
+    event_id = models.BigAutoField(primary_key=True)
+    payment_id = models.IntegerField(help_text="Payment the change came from (kept after archival)")
+    owner = models.ForeignKey(to=OwnerProfile, on_delete=models.CASCADE, db_column='owner_id', related_name='settlement_events')
+    lot = models.ForeignKey(to=P_Lot, on_delete=models.CASCADE, db_column='lot_id', related_name='settlement_events')
+    day = models.DateField(help_text="Local day the payment was made")
+    payment_method = models.CharField(max_length=100)
+    success_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    success_count = models.IntegerField(default=0)
+    pending_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    pending_count = models.IntegerField(default=0)
+    failed_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    failed_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    applied_at = models.DateTimeField(null=True, blank=True, help_text="When the change was folded into the ledger")
+
+    def __str__(self):
+        return f"Settlement event {self.event_id} for payment {self.payment_id}"
+
+    class Meta:
+        db_table = 'SETTLEMENT_OUTBOX'
+        indexes = [
+            models.Index(fields=['applied_at', 'event_id'], name='settlement_outbox_pending_idx'),
+            models.Index(fields=['payment_id'], name='settlement_outbox_payment_idx'),
+        ]
+
+
+class SettlementLedger(models.Model):
+    """
+    Settlement totals per lot, day and payment method, by payment status.
+    Only ever incremented from SettlementOutbox (or rebuilt by the backfill);
+    owner statements read from here instead of the payments table.
+    """
+    entry_id = models.BigAutoField(primary_key=True)
+    owner = models.ForeignKey(to=OwnerProfile, on_delete=models.CASCADE, db_column='owner_id', related_name='settlements')
+    lot = models.ForeignKey(to=P_Lot, on_delete=models.CASCADE, db_column='lot_id', related_name='settlements')
+    day = models.DateField(help_text="Local day the payments were made")
+    payment_method = models.CharField(max_length=100)
+    success_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    success_count = models.IntegerField(default=0)
+    pending_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    pending_count = models.IntegerField(default=0)
+    failed_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    failed_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.lot_id} {self.day} {self.payment_method}: ₹{self.success_amount} settled"
+
+    class Meta:
+        db_table = 'SETTLEMENT_LEDGER'
+        constraints = [
+            models.UniqueConstraint(fields=['lot', 'day', 'payment_method'], name='unique_settlement_per_lot_day_method'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', 'day'], name='settlement_owner_day_idx'),
+        ]
+
+
 class CarWashService(models.Model):
     """
     Master data model for car wash service types.
@@ -417,6 +560,230 @@ class CarWashService(models.Model):
         db_table = 'CARWASH_SERVICE'
         ordering = ['service_name']
 
+class ArchivedBooking(models.Model):
+    """
+    Cold storage for completed/cancelled slot bookings past the archive horizon.
+    Rows keep their original booking_id so history links stay valid.
+    """
+    booking_id=models.IntegerField(primary_key=True)
+    user=models.ForeignKey(to=UserProfile,on_delete=models.CASCADE,db_column='user_id',related_name='archived_bookings')
+    slot=models.ForeignKey(to=P_Slot,on_delete=models.SET_NULL,null=True,blank=True,db_column='slot_id',related_name='archived_bookings')
+    lot=models.ForeignKey(to=P_Lot,on_delete=models.CASCADE,db_column='lot_id',related_name='archived_bookings')
+    vehicle_number=models.CharField(max_length=100,blank=True,null=True)
+    vehicle_type=models.CharField(max_length=50,choices=VEHICLE_CHOICES,default='Sedan')
+    booking_type=models.CharField(max_length=100,choices=BOOKING_CHOICES)
+    booking_time=models.DateField()
+    start_time=models.DateTimeField(null=True,blank=True)
+    end_time=models.DateTimeField(null=True,blank=True)
+    price=models.DecimalField(max_digits=5,decimal_places=2,default=0.00)
+    status=models.CharField(max_length=10,choices=Booking.STATUS_CHOICES)
+    archived_at=models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived Booking {self.booking_id} ({self.status})"
+
+    class Meta:
+        db_table='BOOKING_ARCHIVE'
+        indexes=[
+            models.Index(fields=['user','-start_time'],name='booking_archive_user_idx'),
+            models.Index(fields=['lot','-start_time'],name='booking_archive_lot_idx'),
+        ]
+
+
+class ArchivedPayment(models.Model):
+    """Payments moved to cold storage together with their archived booking"""
+    pay_id=models.IntegerField(primary_key=True)
+    booking=models.ForeignKey(to=ArchivedBooking,on_delete=models.CASCADE,related_name='payments')
+    user=models.ForeignKey(to=UserProfile,on_delete=models.CASCADE,related_name='archived_payments')
+    payment_method=models.CharField(max_length=100,choices=PAYMENT_CHOICES)
+    amount=models.DecimalField(max_digits=8,decimal_places=2,default=0.00)
+    status=models.CharField(max_length=10,choices=Payment.PAYMENT_STATUS_CHOICES)
+    service_type=models.CharField(max_length=20,choices=Payment.SERVICE_TYPE_CHOICES,default='slot_booking')
+    transaction_id=models.CharField(max_length=100,blank=True,null=True)
+    is_renewal=models.BooleanField(default=False)
+    created_at=models.DateTimeField(null=True)
+    verified_by=models.ForeignKey(to=AuthUser,on_delete=models.SET_NULL,null=True,blank=True,related_name='archived_payments_verified')
+    verified_at=models.DateTimeField(null=True,blank=True)
+
+    def __str__(self):
+        return f"Archived Payment {self.pay_id} for Booking {self.booking_id}"
+
+    class Meta:
+        db_table='PAYEMENT_ARCHIVE'
+
+
+class ArchivedCarwash(models.Model):
+    """Add-on car wash services moved to cold storage with their archived booking"""
+    carwash_id=models.IntegerField(primary_key=True)
+    booking=models.ForeignKey(to=ArchivedBooking,on_delete=models.CASCADE,db_column='booking_id',related_name='carwashes')
+    employee=models.ForeignKey(to=Employee,on_delete=models.SET_NULL,db_column='emp_id',related_name='archived_carwashes',null=True,blank=True)
+    carwash_type=models.ForeignKey(to=Carwash_type,on_delete=models.CASCADE,db_column='carwash_type',related_name='archived_carwashes')
+    price=models.DecimalField(max_digits=5,decimal_places=2,default=0.00)
+    status=models.CharField(max_length=20,choices=Carwash.STATUS_CHOICES)
+
+    def __str__(self):
+        return f"Archived Carwash {self.carwash_id} for booking {self.booking_id}"
+
+    class Meta:
+        db_table='CARWASH_ARCHIVE'
+
+
+class ConsistencyMark(models.Model):
+    """
+    Journal of rows touched since the last consistency audit run, so
+    `audit_consistency --incremental` only re-checks what may have drifted.
+    Written by the signals in parking/signals.py, consumed (and pruned) by
+    parking/audit.py.
+    """
+    SCOPE_CHOICES = [
+        ('lot', 'Parking lot (total_slots)'),
+        ('slot', 'Slot (is_available)'),
+        ('employee', 'Employee (workload)'),
+        ('booking', 'Slot booking (add-on car washes)'),
+        ('payment', 'Payment (links)'),
+    ]
+
+    mark_id=models.BigAutoField(primary_key=True)
+    scope=models.CharField(max_length=20,choices=SCOPE_CHOICES)
+    object_id=models.IntegerField()
+    marked_at=models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.scope} {self.object_id}"
+
+    class Meta:
+        db_table='CONSISTENCY_MARK'
+
+class ConsistencyAuditRun(models.Model):
+    """
+    One run of the consistency audit. `watermark` is the newest ConsistencyMark
+    the run consumed (empty for runs of only some checks, which consume none).
+    Runs delete the marks they consume, so the next incremental run reads
+    whatever is left in the journal.
+    """
+    run_id=models.BigAutoField(primary_key=True)
+    mode=models.CharField(max_length=20)
+    repair=models.BooleanField(default=False)
+    watermark=models.BigIntegerField(null=True,blank=True)
+    issues=models.PositiveIntegerField(default=0)
+    started_at=models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Consistency audit {self.run_id} ({self.mode}, {self.issues} issue(s))"
+
+    class Meta:
+        db_table='CONSISTENCY_AUDIT_RUN'
+
+class IdempotencyKey(models.Model):
+    """
+    Stored response for an Idempotency-Key header, so client retries of a
+    booking/payment POST replay the first response instead of writing again.
+    Written by parking.idempotency.IdempotencyMiddleware.
+    """
+    record_id=models.BigAutoField(primary_key=True)
+    scope=models.CharField(max_length=64,help_text="Hash of the caller's credentials")
+    key=models.CharField(max_length=255)
+    fingerprint=models.CharField(max_length=64,help_text="Hash of the method, path and body of the first request")
+    status_code=models.PositiveSmallIntegerField(null=True,blank=True,help_text="Empty while the first request is still running")
+    content_type=models.CharField(max_length=100,blank=True,default='')
+    body=models.TextField(blank=True,default='')
+    created_at=models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Idempotency key {self.key} ({self.status_code or 'in progress'})"
+
+    class Meta:
+        db_table='IDEMPOTENCY_KEY'
+        constraints=[
+            models.UniqueConstraint(fields=['scope','key'],name='unique_idempotency_key_per_caller'),
+        ]
+        indexes=[
+            models.Index(fields=['created_at'],name='idempotency_key_created_idx'),
+        ]
+
+class Notification(models.Model):
+    """
+    A delivered WebSocket notification, kept so clients that were offline or
+    reconnecting can replay what they missed (see parking/notification_inbox.py).
+    `recipient` is the id the socket joined as (ws/notifications/<id>/);
+    `seq` increases monotonically per recipient.
+    """
+    notification_id=models.BigAutoField(primary_key=True)
+    recipient=models.CharField(max_length=64)
+    seq=models.PositiveBigIntegerField()
+    level=models.CharField(max_length=20,default='info')
+    message=models.TextField()
+    count=models.PositiveIntegerField(default=1,help_text="Identical notifications coalesced into this one")
+    created_at=models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Notification #{self.seq} to {self.recipient}: {self.message}"
+
+    class Meta:
+        db_table='NOTIFICATION'
+        constraints=[
+            models.UniqueConstraint(fields=['recipient','seq'],name='unique_notification_seq_per_recipient'),
+        ]
+        indexes=[
+            models.Index(fields=['created_at'],name='notification_created_idx'),
+        ]
+
+class NotificationSequence(models.Model):
+    """Last notification sequence number handed out per recipient (survives pruning)"""
+    recipient=models.CharField(max_length=64,primary_key=True)
+    last_seq=models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.recipient}: {self.last_seq}"
+
+    class Meta:
+        db_table='NOTIFICATION_SEQUENCE'
+
+class OwnerEvent(models.Model):
+    """
+    Append-only stream of operations events for an owner (new bookings,
+    payments awaiting verification, car wash status and employee assignment
+    changes), numbered per owner. Written by the signals in the same
+    transaction as the change; read by parking/owner_events.py.
+    """
+    KIND_CHOICES=[
+        ('booking_created','Booking created'),
+        ('booking_status','Booking status changed'),
+        ('payment_pending','Payment awaiting verification'),
+        ('payment_status','Payment status changed'),
+        ('carwash_status','Car wash status changed'),
+        ('employee_assignment','Employee assignment changed'),
+    ]
+    event_id=models.BigAutoField(primary_key=True)
+    owner=models.ForeignKey(to=OwnerProfile,on_delete=models.CASCADE,db_column='owner_id',related_name='events')
+    seq=models.PositiveBigIntegerField()
+    kind=models.CharField(max_length=32,choices=KIND_CHOICES)
+    data=models.JSONField(default=dict)
+    created_at=models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Owner {self.owner_id} event #{self.seq}: {self.kind}"
+
+    class Meta:
+        db_table='OWNER_EVENT'
+        constraints=[
+            models.UniqueConstraint(fields=['owner','seq'],name='unique_owner_event_seq'),
+        ]
+        indexes=[
+            models.Index(fields=['created_at'],name='owner_event_created_idx'),
+        ]
+
+class OwnerEventSequence(models.Model):
+    """Last event sequence number handed out per owner (survives pruning)"""
+    owner=models.OneToOneField(to=OwnerProfile,on_delete=models.CASCADE,primary_key=True,db_column='owner_id',related_name='event_sequence')
+    last_seq=models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Owner {self.owner_id}: {self.last_seq}"
+
+    class Meta:
+        db_table='OWNER_EVENT_SEQUENCE'
+
 #class Login(models.Model):
     #login_id=models.AutoField(primary_key=True)
     #email=models.CharField(max_length=100)
@@ -0,0 +1,118 @@
+"""
+Persistent notification inbox with per-recipient sequence numbers.
+
+send_ws_notification() stores every notification here inside the
+transaction that caused it, numbering them per recipient (1, 2, 3, ...)
+from the NotificationSequence counter, before the dispatcher
+(parking/notification_outbox.py) group_sends it after the commit. The number travels in
+the WebSocket frame as `seq`, so a client knows the last notification it saw.
+
+A client that was offline or reconnecting asks for what it missed:
+
+    ws/notifications/<id>/?since=<seq>   replayed on connect, in one query
+    GET /api/notifications/?since=<seq>  REST fallback for the signed-in user
+
+and the frontend no longer has to poll other endpoints to catch up. Rows
+older than NOTIFICATION_TTL are removed by `python manage.py
+prune_notifications`; the counters are kept, so numbers never repeat.
+
+Settings:
+    NOTIFICATION_TTL           - seconds a notification stays replayable (default 7 days)
+    NOTIFICATION_REPLAY_LIMIT  - most notifications replayed at once (default 200)
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_REPLAY_LIMIT = 200
+
+
+def get_ttl():
+    return getattr(settings, 'NOTIFICATION_TTL', DEFAULT_TTL)
+
+
+def get_replay_limit():
+    return getattr(settings, 'NOTIFICATION_REPLAY_LIMIT', DEFAULT_REPLAY_LIMIT)
+
+
+def frame(notification):
+    """The WebSocket/REST shape of a notification dict ({'level', 'message', 'count', 'seq'})"""
+    count = notification.get('count', 1)
+    message = notification.get('message', '')
+    data = {
+        'type': notification.get('level', 'info'),
+        'message': message if count == 1 else f"{message} (×{count})",
+        'count': count,
+    }
+    if notification.get('seq') is not None:
+        data['seq'] = notification['seq']
+    return data
+
+
+def _allocate(recipient, n):
+    """Reserve n sequence numbers for a recipient; returns the last one"""
+    from parking.models import NotificationSequence
+    counter = NotificationSequence.objects.filter(recipient=recipient)
+    if not counter.update(last_seq=F('last_seq') + n):
+        try:
+            with transaction.atomic():
+                NotificationSequence.objects.create(recipient=recipient, last_seq=n)
+            return n
+        except IntegrityError:
+            # Another process numbered this recipient's first notification
+            counter.update(last_seq=F('last_seq') + n)
+    return counter.values_list('last_seq', flat=True).get()
+
+
+def store(by_user):
+    """
+    Persist notifications ({recipient: [{'level', 'message', 'count'}]}) and
+    set 'seq' on each notification in place.
+    """
+    from parking.models import Notification
+    rows = []
+    with transaction.atomic():
+        for recipient, notifications in by_user.items():
+            last = _allocate(recipient, len(notifications))
+            for seq, notification in enumerate(notifications, start=last - len(notifications) + 1):
+                notification['seq'] = seq
+                rows.append(Notification(recipient=recipient, seq=seq, level=notification['level'],
+                                         message=notification['message'], count=notification['count']))
+        Notification.objects.bulk_create(rows)
+    return len(rows)
+
+
+def latest_seq(recipient):
+    from parking.models import NotificationSequence
+    return NotificationSequence.objects.filter(recipient=str(recipient)).values_list(
+        'last_seq', flat=True).first() or 0
+
+
+def replay(recipient, since, limit=None):
+    """
+    Notifications of a recipient after `since`, oldest first. When more than
+    `limit` were missed only the newest `limit` are returned.
+    """
+    from parking.models import Notification
+    limit = limit or get_replay_limit()
+    rows = list(
+        Notification.objects.filter(recipient=str(recipient), seq__gt=since)
+        .order_by('-seq').values('seq', 'level', 'message', 'count', 'created_at')[:limit]
+    )
+    rows.reverse()
+    return rows
+
+
+def prune_expired():
+    """Delete notifications older than the TTL; returns the number deleted"""
+    from parking.models import Notification
+    cutoff = timezone.now() - timedelta(seconds=get_ttl())
+    deleted, _ = Notification.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,192 @@
+"""
+Notification outbox and batched async dispatcher.
+
+send_ws_notification() no longer talks to the channel layer inside the
+request or signal. It stores the notification in the inbox
+(parking/notification_inbox.py) inside the caller's transaction, which
+numbers it per user, and registers it with transaction.on_commit, so a
+rolled-back write neither keeps nor sends it. After the commit the numbered
+notification goes into this process's outbox and the call returns. A
+process that exits before delivering loses only the live push: the row is
+committed and is replayed when the client reconnects.
+
+A daemon thread drains the outbox with its own event loop:
+
+    1. after the first event it waits NOTIFICATION_COALESCE_SECONDS so a
+       burst can gather
+    2. identical (user, level, message) events in the batch are coalesced
+       into one with a count (ten "New booking received for Lot #3." to one
+       owner become one message, shown as "... (×10)") carrying the highest
+       seq of the group, in seq order
+    3. one group_send per user carries all of that user's notifications
+       (NotificationConsumer.send_notification_batch), and the group_sends
+       of the batch run concurrently
+
+`metrics()` reports the queue depth, counters and delivery lag (commit to
+group_send) of this process; admins read it at
+/api/admin/notifications/metrics/.
+
+Settings:
+    NOTIFICATION_COALESCE_SECONDS  - how long a burst may gather (default 0.5)
+    NOTIFICATION_MAX_BATCH         - events taken per batch (default 1000)
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COALESCE_SECONDS = 0.5
+DEFAULT_MAX_BATCH = 1000
+LAG_SAMPLES = 1000
+
+
+def coalesce(events):
+    """{user_id: [{'level', 'message', 'count', 'seq'}]} from [(enqueued_at, user_id, notification)], in seq order"""
+    merged = OrderedDict()
+    for _, user_id, notification in events:
+        key = (user_id, notification['level'], notification['message'])
+        if key in merged:
+            merged[key]['count'] += notification['count']
+            if notification.get('seq') is not None:
+                merged[key]['seq'] = notification['seq']
+            # A merged frame moves to its newest member: clients skip seqs below the last one seen
+            merged.move_to_end(key)
+        else:
+            merged[key] = dict(notification)
+    by_user = OrderedDict()
+    for (user_id, _, _), notification in merged.items():
+        by_user.setdefault(user_id, []).append(notification)
+    return by_user
+
+
+class NotificationDispatcher:
+    """Process-wide outbox drained by one background thread"""
+
+    def __init__(self):
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lags = deque(maxlen=LAG_SAMPLES)
+        self.counters = {'enqueued': 0, 'delivered': 0, 'coalesced': 0, 'failed': 0, 'batches': 0}
+        self.last_delivery_at = None
+
+    def enqueue(self, user_id, notification):
+        with self._lock:
+            self._pending.append((time.time(), str(user_id), notification))
+            self.counters['enqueued'] += 1
+        self._ensure_thread()
+        self._wakeup.set()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._serve, name='notification-dispatcher', daemon=True)
+                    self._thread.start()
+
+    def _take(self):
+        limit = getattr(settings, 'NOTIFICATION_MAX_BATCH', DEFAULT_MAX_BATCH)
+        with self._lock:
+            batch = [self._pending.popleft() for _ in range(min(limit, len(self._pending)))]
+            if self._pending:
+                self._wakeup.set()
+        return batch
+
+    async def _deliver(self, batch, by_user):
+        from channels.layers import get_channel_layer
+        channel_layer = get_channel_layer()
+        users = list(by_user)
+        results = await asyncio.gather(*(
+            channel_layer.group_send(f"user_{user_id}", {
+                "type": "send_notification_batch",
+                "notifications": by_user[user_id],
+            }) for user_id in users
+        ), return_exceptions=True)
+
+        delivered_at = time.time()
+        failed_users = set()
+        for user_id, result in zip(users, results):
+            if isinstance(result, Exception):
+                failed_users.add(user_id)
+                logger.error(f"❌ Failed to send notification to user {user_id}: {str(result)}")
+        with self._lock:
+            for enqueued_at, user_id, _ in batch:
+                if user_id in failed_users:
+                    self.counters['failed'] += 1
+                else:
+                    self.counters['delivered'] += 1
+                    self._lags.append(delivered_at - enqueued_at)
+            self.counters['coalesced'] += len(batch) - sum(len(items) for items in by_user.values())
+            self.counters['batches'] += 1
+            self.last_delivery_at = delivered_at
+        logger.info(f"📢 Delivered {len(batch)} notification(s) to {len(users)} user(s) in one batch")
+
+    def _serve(self):
+        loop = asyncio.new_event_loop()
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            # Let the burst gather
+            time.sleep(getattr(settings, 'NOTIFICATION_COALESCE_SECONDS', DEFAULT_COALESCE_SECONDS))
+            batch = self._take()
+            if not batch:
+                continue
+            try:
+                loop.run_until_complete(self._deliver(batch, coalesce(batch)))
+            except Exception as e:
+                logger.error(f"❌ Notification dispatch failed: {str(e)}")
+
+    def flush(self):
+        """Deliver everything pending now, in the calling thread (tests, shutdown)"""
+        from asgiref.sync import async_to_sync
+        delivered = 0
+        while True:
+            batch = self._take()
+            if not batch:
+                return delivered
+            async_to_sync(self._deliver)(batch, coalesce(batch))
+            delivered += len(batch)
+
+    def metrics(self):
+        with self._lock:
+            lags = sorted(self._lags)
+            depth = len(self._pending)
+            oldest = self._pending[0][0] if self._pending else None
+            counters = dict(self.counters)
+            last_delivery_at = self.last_delivery_at
+
+        def ms(value):
+            return round(value * 1000, 1)
+
+        now = time.time()
+        return {
+            'queue_depth': depth,
+            'oldest_pending_age_ms': ms(now - oldest) if oldest is not None else None,
+            **counters,
+            'lag_ms': {
+                'samples': len(lags),
+                'avg': ms(sum(lags) / len(lags)) if lags else None,
+                'p50': ms(lags[len(lags) // 2]) if lags else None,
+                'p95': ms(lags[min(int(len(lags) * 0.95), len(lags) - 1)]) if lags else None,
+                'max': ms(lags[-1]) if lags else None,
+            },
+            'last_delivery_age_ms': ms(now - last_delivery_at) if last_delivery_at else None,
+            'dispatcher_alive': bool(self._thread and self._thread.is_alive()),
+        }
+
+
+dispatcher = NotificationDispatcher()
+
+
+def enqueue(user_id, notification):
+    dispatcher.enqueue(user_id, notification)
+
+
+def metrics():
+    return dispatcher.metrics()
@@ -1,9 +1,13 @@
 """
 Utility functions for sending WebSocket notifications to users.
 Used by Django signals to trigger real-time notifications.
+
+Each notification is stored in the inbox (parking/notification_inbox.py)
+inside the caller's transaction, so it is kept or rolled back with the write
+that caused it. After the commit it is delivered in coalesced batches by
+parking/notification_outbox.py, so callers never wait on the channel layer.
 """
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from django.db import transaction
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,31 +18,34 @@ def send_ws_notification(user_id, level, message):
     Send a WebSocket notification to a specific user.
     
     Args:
-        user_id (int or str): The user ID to send notification to
+        user_id (int or str): The recipient's auth user ID (AuthUser.id, never a
+            profile id - sockets subscribe with their own auth user id)
         level (str): Notification type - 'success', 'warning', 'error', 'info'
         message (str): The notification message
     
     Example:
         send_ws_notification(user.id, 'success', 'Payment verified successfully!')
+    
+    Nothing is stored or sent if the surrounding transaction rolls back.
     """
+    from parking.notification_inbox import store
+    from parking.notification_outbox import enqueue
+    notification = {'level': level, 'message': message, 'count': 1}
+    try:
+        store({str(user_id): [notification]})
+    except Exception as e:
+        # Still deliver live; this notification just cannot be replayed
+        logger.error(f"❌ Failed to store notification to user {user_id}: {str(e)}")
     try:
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f"user_{user_id}",
-            {
-                "type": "send_notification",
-                "level": level,
-                "message": message
-            }
-        )
-        logger.info(f"📢 Sent {level} notification to user {user_id}")
+        transaction.on_commit(lambda: enqueue(user_id, notification))
+        logger.info(f"📢 Queued {level} notification to user {user_id}")
     except Exception as e:
-        logger.error(f"❌ Failed to send notification to user {user_id}: {str(e)}")
+        logger.error(f"❌ Failed to queue notification to user {user_id}: {str(e)}")
 
 
 def send_ws_notification_to_owner(owner_id, level, message):
     """
-    Send a WebSocket notification to an owner.
+    Send a WebSocket notification to an owner (by the owner's auth user ID).
     (Same as send_ws_notification, but with clearer intent)
     """
     send_ws_notification(owner_id, level, message)
@@ -46,7 +53,7 @@ def send_ws_notification_to_owner(owner_id, level, message):
 
 def send_ws_notification_to_admin(admin_id, level, message):
     """
-    Send a WebSocket notification to an admin user.
+    Send a WebSocket notification to an admin user (by auth user ID).
     (Same as send_ws_notification, but with clearer intent)
     """
     send_ws_notification(admin_id, level, message)
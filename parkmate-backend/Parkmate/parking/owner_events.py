@@ -0,0 +1,163 @@
+"""
+Per-owner operations event stream.
+
+The owner pages used to re-download their full booking, payment and car
+wash lists on a timer just to notice new activity. Instead, the signals
+append an OwnerEvent in the same transaction as the change:
+
+    booking_created      a booking in one of the owner's lots
+    booking_status       a booking changed status
+    payment_pending      a payment now waits for the owner's verification (Cash)
+    payment_status       a payment changed status
+    carwash_status       a car wash (add-on or booking) was created or changed status
+    employee_assignment  a car wash got another employee
+
+Events are numbered per owner (1, 2, 3, ...) from OwnerEventSequence. The
+counter row stays locked until the transaction commits, so an owner's
+events commit in seq order and a client reading "everything after N" never
+skips one. Readers only touch the indexed (owner, seq) range:
+
+    ws/owner/events/?since=<seq>          replay, then live
+    GET /api/owner/events/?since=<seq>    long poll: answers at once if there
+                                          is something after `since`, else
+                                          waits up to `timeout` seconds
+
+After commit, one group_send per owner wakes the sockets and long polls of
+that owner; they then read the table. The wake-up carries no data, so a
+lost or duplicated one costs at most a query.
+
+Settings:
+    OWNER_EVENT_TTL             - seconds events stay readable (default 7 days,
+                                  `python manage.py prune_owner_events`)
+    OWNER_EVENT_PAGE_SIZE       - most events returned at once (default 200)
+    OWNER_EVENT_LONG_POLL_MAX   - longest long poll in seconds (default 30)
+"""
+import asyncio
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_PAGE_SIZE = 200
+DEFAULT_LONG_POLL_MAX = 30
+
+
+def get_ttl():
+    return getattr(settings, 'OWNER_EVENT_TTL', DEFAULT_TTL)
+
+
+def get_page_size():
+    return getattr(settings, 'OWNER_EVENT_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+
+
+def get_long_poll_max():
+    return getattr(settings, 'OWNER_EVENT_LONG_POLL_MAX', DEFAULT_LONG_POLL_MAX)
+
+
+def group_name(owner_id):
+    return f"owner_events_{owner_id}"
+
+
+def _allocate(owner_id):
+    """Next sequence number of an owner (locks the owner's counter until commit)"""
+    from parking.models import OwnerEventSequence
+    counter = OwnerEventSequence.objects.filter(owner_id=owner_id)
+    if not counter.update(last_seq=F('last_seq') + 1):
+        try:
+            with transaction.atomic():
+                OwnerEventSequence.objects.create(owner_id=owner_id, last_seq=1)
+            return 1
+        except IntegrityError:
+            # Another transaction recorded this owner's first event
+            counter.update(last_seq=F('last_seq') + 1)
+    return counter.values_list('last_seq', flat=True).get()
+
+
+def record(owner_id, kind, **data):
+    """Append an event for an owner (inside the caller's transaction) and wake its readers after commit"""
+    from parking.models import OwnerEvent
+    if owner_id is None:
+        return None
+    with transaction.atomic():
+        event = OwnerEvent.objects.create(owner_id=owner_id, seq=_allocate(owner_id), kind=kind, data=data)
+    transaction.on_commit(lambda: wake(owner_id))
+    return event
+
+
+def wake(owner_id):
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(group_name(owner_id), {'type': 'owner_events_wake'})
+    except Exception as e:
+        logger.error(f"❌ Failed to wake event readers of owner {owner_id}: {str(e)}")
+
+
+def latest_seq(owner_id):
+    from parking.models import OwnerEventSequence
+    return OwnerEventSequence.objects.filter(owner_id=owner_id).values_list('last_seq', flat=True).first() or 0
+
+
+def events_since(owner_id, since, limit=None):
+    """An owner's events after `since`, oldest first (one indexed range query)"""
+    from parking.models import OwnerEvent
+    rows = OwnerEvent.objects.filter(owner_id=owner_id, seq__gt=since).order_by('seq').values(
+        'seq', 'kind', 'data', 'created_at')[:limit or get_page_size()]
+    return [
+        {'seq': row['seq'], 'kind': row['kind'], 'data': row['data'], 'created_at': row['created_at'].isoformat()}
+        for row in rows
+    ]
+
+
+async def wait_for_events(owner_id, since, timeout):
+    """
+    Events after `since`, waiting up to `timeout` seconds for the first one.
+    Subscribes to the owner's wake-ups before re-reading, so an event that
+    commits in between is never missed.
+    """
+    from channels.db import database_sync_to_async
+    from channels.layers import get_channel_layer
+    read = database_sync_to_async(events_since)
+    events = await read(owner_id, since)
+    channel_layer = get_channel_layer()
+    if events or timeout <= 0:
+        return events
+
+    if channel_layer is None:
+        # No channel layer: re-read once a second
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not events and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(1)
+            events = await read(owner_id, since)
+        return events
+
+    channel = await channel_layer.new_channel()
+    await channel_layer.group_add(group_name(owner_id), channel)
+    try:
+        events = await read(owner_id, since)
+        if not events:
+            try:
+                await asyncio.wait_for(channel_layer.receive(channel), timeout)
+            except asyncio.TimeoutError:
+                return []
+            events = await read(owner_id, since)
+    finally:
+        await channel_layer.group_discard(group_name(owner_id), channel)
+    return events
+
+
+def prune_expired():
+    """Delete events older than the TTL; returns the number deleted"""
+    from parking.models import OwnerEvent
+    cutoff = timezone.now() - timedelta(seconds=get_ttl())
+    deleted, _ = OwnerEvent.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
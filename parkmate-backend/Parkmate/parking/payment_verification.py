@@ -0,0 +1,165 @@
+"""
+Batch verification of cash payments by lot owners.
+
+`verify_cash_payments()` does for a whole list of payments what
+VerifyCashPaymentView does for one, with a fixed number of queries:
+
+    1. one joined SELECT loads every payment with its booking's lot owner,
+       user and whether it is the booking's first payment
+    2. one UPDATE flips the eligible PENDING cash payments to SUCCESS
+    3. one UPDATE marks bookings whose first (slot) payment was verified as
+       'booked' (only those not already booked)
+    4. one grouped SELECT + one UPDATE activate the pending add-on car wash
+       of bookings that now have more than one successful payment
+
+Bulk UPDATEs skip the model signals, so the workload deltas, audit journal
+entries, settlement outbox rows, owner events (payment_status, booking_status,
+carwash_status), slot availability updates and reviewable lots invalidations
+(for bookings re-opened from 'completed') they would have produced are
+written here directly. Each affected user gets one summary notification once
+the transaction commits.
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = 200
+
+
+def _first_payment_id():
+    from parking.models import Payment
+    return Subquery(
+        Payment.objects.filter(booking=OuterRef('booking')).order_by('created_at', 'pay_id').values('pay_id')[:1]
+    )
+
+
+def _settlement_snapshot(row, status):
+    """The payment as parking.settlement sees it (SNAPSHOT_FIELDS order)"""
+    return (status, row['amount'], row['payment_method'], row['booking_id'],
+            row['carwash_booking_id'], row['created_at'])
+
+
+def verify_cash_payments(owner, verified_by, payment_ids):
+    """
+    Verify the owner's pending cash payments among payment_ids.
+    Returns {'verified': [...], 'already_verified': [...], 'failed': [{'payment_id', 'error'}],
+             'bookings_activated': [...], 'carwashes_activated': [...], 'verified_at'}
+    """
+    from parking.audit import mark
+    from parking.lot_availability import slot_changed
+    from parking.models import Booking, Carwash, Payment
+    from parking.owner_events import record
+    from parking.notification_utils import send_ws_notification
+    from parking.reviewable_lots import invalidate as invalidate_reviewable_lots
+    from parking.settlement import record_changes
+    from parking.workload import ADDON_ACTIVE_STATUSES, apply_delta, booking_is_active
+
+    rows = Payment.objects.filter(pay_id__in=payment_ids).annotate(first_pay_id=_first_payment_id()).values(
+        'pay_id', 'status', 'payment_method', 'amount', 'booking_id', 'booking__status',
+        'booking__lot__owner_id', 'booking__lot_id', 'booking__slot_id', 'booking__user__auth_user_id',
+        'first_pay_id', 'created_at',
+        'carwash_booking_id',
+    )
+    found = {row['pay_id']: row for row in rows}
+
+    result = {'verified': [], 'already_verified': [], 'failed': [],
+              'bookings_activated': [], 'carwashes_activated': [], 'verified_at': None}
+    eligible = []
+    for pay_id in payment_ids:
+        row = found.get(pay_id)
+        if row is None:
+            result['failed'].append({'payment_id': pay_id, 'error': 'Payment not found'})
+        elif row['booking_id'] is None or row['booking__lot__owner_id'] != owner.id:
+            result['failed'].append({'payment_id': pay_id, 'error': 'You do not have permission to verify this payment'})
+        elif row['status'] == 'SUCCESS':
+            result['already_verified'].append(pay_id)
+        elif row['payment_method'] != 'Cash' or row['status'] != 'PENDING':
+            result['failed'].append({'payment_id': pay_id, 'error': 'Only pending cash payments can be verified'})
+        else:
+            eligible.append(pay_id)
+    if not eligible:
+        return result
+
+    verified_at = timezone.now()
+    with transaction.atomic():
+        flipped = Payment.objects.filter(pay_id__in=eligible, payment_method='Cash', status='PENDING').update(
+            status='SUCCESS', verified_by=verified_by, verified_at=verified_at,
+        )
+        if flipped < len(eligible):
+            # Some were verified concurrently by another request; keep only ours
+            ours = set(Payment.objects.filter(
+                pay_id__in=eligible, verified_by=verified_by, verified_at=verified_at,
+            ).values_list('pay_id', flat=True))
+            result['already_verified'].extend(pay_id for pay_id in eligible if pay_id not in ours)
+            eligible = [pay_id for pay_id in eligible if pay_id in ours]
+        verified = [found[pay_id] for pay_id in eligible]
+        booking_ids = {row['booking_id'] for row in verified}
+
+        # The first payment of a booking is its slot payment
+        reopened = [row['booking_id'] for row in verified
+                    if row['first_pay_id'] == row['pay_id'] and row['booking__status'] != 'booked']
+        if reopened:
+            Booking.objects.filter(booking_id__in=reopened).update(status='booked')
+            revived = [row['booking_id'] for row in verified
+                       if row['booking_id'] in reopened and not booking_is_active(row['booking__status'])]
+            assigned = Carwash.objects.filter(
+                booking_id__in=revived, employee__isnull=False, status__in=ADDON_ACTIVE_STATUSES,
+            ).values('employee').annotate(count=Count('pk'))
+            for row in assigned:
+                apply_delta(row['employee'], row['count'])
+
+        # A booking with another successful payment has a paid add-on car wash
+        paid_twice = Payment.objects.filter(booking_id__in=booking_ids, status='SUCCESS').values(
+            'booking_id',
+        ).annotate(count=Count('pk')).filter(count__gt=1).values('booking_id')
+        pending = Carwash.objects.filter(booking_id__in=Subquery(paid_twice), status='pending')
+        activated = list(pending.values_list('carwash_id', 'booking_id'))
+        carwash_ids = [carwash_id for carwash_id, _ in activated]
+        if carwash_ids:
+            # pending → active keeps the car wash counted; no workload change
+            Carwash.objects.filter(carwash_id__in=carwash_ids, status='pending').update(status='active')
+
+        uncompleted = set()
+        for row in verified:
+            record(owner.id, 'payment_status', previous='PENDING', pay_id=row['pay_id'],
+                   booking_id=row['booking_id'], carwash_booking_id=row['carwash_booking_id'],
+                   payment_method=row['payment_method'], amount=str(row['amount']), status='SUCCESS')
+            if row['booking_id'] in reopened and row['pay_id'] == row['first_pay_id']:
+                record(owner.id, 'booking_status', booking_id=row['booking_id'], lot_id=row['booking__lot_id'],
+                       status='booked', previous=row['booking__status'])
+                slot_changed(row['booking__lot_id'], row['booking__slot_id'])
+                if (row['booking__status'] or '').lower() == 'completed':
+                    uncompleted.add(row['booking__user__auth_user_id'])
+        for auth_user_id in uncompleted:
+            invalidate_reviewable_lots(auth_user_id)
+            # Again after commit, in case a reader re-cached the old list meanwhile
+            transaction.on_commit(lambda auth_user_id=auth_user_id: invalidate_reviewable_lots(auth_user_id))
+        for carwash_id, booking_id in activated:
+            record(owner.id, 'carwash_status', status='active', previous='pending',
+                   carwash_id=carwash_id, booking_id=booking_id)
+
+        record_changes([(row['pay_id'], _settlement_snapshot(row, 'PENDING'), _settlement_snapshot(row, 'SUCCESS'))
+                        for row in verified])
+        mark(*[('payment', row['pay_id']) for row in verified],
+             *[('booking', booking_id) for booking_id in booking_ids])
+
+        totals = defaultdict(lambda: [0, Decimal('0')])
+        for row in verified:
+            totals[row['booking__user__auth_user_id']][0] += 1
+            totals[row['booking__user__auth_user_id']][1] += row['amount']
+
+        for user_id, (count, amount) in totals.items():
+            noun = 'payment' if count == 1 else 'payments'
+            send_ws_notification(user_id, 'success',
+                                 f'{count} cash {noun} (₹{amount}) verified by the lot owner. Booking activated!')
+
+    result.update({'verified': eligible, 'bookings_activated': sorted(set(reopened)),
+                   'carwashes_activated': carwash_ids, 'verified_at': verified_at})
+    logger.info(f"💵 Owner {owner.id} verified {len(eligible)} cash payment(s) in one batch")
+    return result
@@ -0,0 +1,89 @@
+"""
+Per-lot rating summaries.
+
+LotRatingSummary keeps, for each lot, the review count, the rating sum and a
+1-5 star histogram. The Review signals in parking/signals.py remember each
+review's (lot, rating) as loaded and, after a save or delete, move the
+counters with one atomic F() UPDATE, so lot pages read one row instead of
+aggregating the reviews table.
+
+Bulk `.update()` calls bypass the signals; `rebuild()` recomputes the
+summaries with one grouped query.
+"""
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+STARS = range(1, 6)
+
+
+def _deltas(snapshot, sign):
+    if snapshot is None or snapshot[0] is None or snapshot[1] not in STARS:
+        return {}
+    lot_id, rating = snapshot
+    return {lot_id: {'review_count': sign, 'rating_sum': sign * rating, f'stars_{rating}': sign}}
+
+
+def _bump(lot_id, deltas):
+    from parking.models import LotRatingSummary
+    changes = {field: F(field) + value for field, value in deltas.items() if value}
+    if not changes:
+        return
+    changes['updated_at'] = timezone.now()
+    if LotRatingSummary.objects.filter(lot_id=lot_id).update(**changes):
+        return
+    if any(value < 0 for value in deltas.values()):
+        return  # nothing to take back from (lot deleted, or summary never built)
+    try:
+        with transaction.atomic():
+            LotRatingSummary.objects.create(lot_id=lot_id, **deltas)
+    except IntegrityError:
+        # Another review opened the summary first
+        LotRatingSummary.objects.filter(lot_id=lot_id).update(**changes)
+
+
+def apply_transition(old, new):
+    """Move the summaries from a review's old (lot_id, rating) to its new one"""
+    if old == new:
+        return
+    combined = _deltas(old, -1)
+    for lot_id, deltas in _deltas(new, 1).items():
+        merged = combined.setdefault(lot_id, {})
+        for field, value in deltas.items():
+            merged[field] = merged.get(field, 0) + value
+    for lot_id, deltas in combined.items():
+        _bump(lot_id, deltas)
+
+
+def rebuild(lot_ids=None):
+    """Recompute the summaries from the reviews; returns the number of lots written"""
+    from parking.models import LotRatingSummary, Review
+    reviews = Review.objects.order_by()
+    summaries = LotRatingSummary.objects.all()
+    if lot_ids is not None:
+        reviews = reviews.filter(lot_id__in=lot_ids)
+        summaries = summaries.filter(lot_id__in=lot_ids)
+    rows = reviews.values('lot_id').annotate(
+        review_count=Count('pk'), rating_sum=Sum('rating'),
+        **{f'stars_{star}': Count('pk', filter=Q(rating=star)) for star in STARS},
+    )
+    with transaction.atomic():
+        summaries.delete()
+        LotRatingSummary.objects.bulk_create([LotRatingSummary(**row) for row in rows], batch_size=1000)
+    logger.info(f"⭐ Rebuilt lot rating summaries: {len(rows)} lot(s)")
+    return len(rows)
+
+
+def summary_data(summary):
+    """API shape of a LotRatingSummary (or None for a lot without reviews)"""
+    if summary is None or not summary.review_count:
+        return {'count': 0, 'average': None, 'histogram': {str(star): 0 for star in STARS}}
+    return {
+        'count': summary.review_count,
+        'average': summary.average,
+        'histogram': {str(star): getattr(summary, f'stars_{star}') for star in STARS},
+    }
@@ -0,0 +1,65 @@
+"""
+Lots a user can review.
+
+A user may review the lots where they completed a slot booking (live or
+archived, see parking/archive.py) or a standalone car wash booking. On a
+cache miss `reviewable_lots()` looks up the user's profile and reads the lots
+with one query: the distinct lot ids come from a UNION over the booking
+tables, and the lots are joined to their
+rating summary and annotated with their free slot count, so P_LotSerializer
+needs no further queries.
+
+The serialized list is cached per user. The Booking and CarWashBooking
+signals in parking/signals.py drop it when one of the user's bookings moves
+into (or out of) 'completed'. Free slot counts and ratings in the cached
+list can lag by up to REVIEWABLE_LOTS_CACHE_TTL seconds (default 600); the
+review form only uses it as a picker.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_TTL = 600
+
+
+def _cache_key(auth_user_id):
+    return f"parking:reviewable_lots:{auth_user_id}"
+
+
+def reviewable_lot_ids(profile_id):
+    """Distinct lot ids of the user's completed slot and car wash bookings, as one UNION queryset"""
+    from parking.archive import archived_lot_ids
+    from parking.models import Booking, CarWashBooking
+    slot_lots = Booking.objects.filter(user_id=profile_id, status__iexact='completed').order_by().values('lot_id')
+    carwash_lots = CarWashBooking.objects.filter(
+        user_id=profile_id, status='completed', lot__isnull=False,
+    ).order_by().values('lot_id')
+    return slot_lots.union(carwash_lots, archived_lot_ids(profile_id))
+
+
+def reviewable_lots(auth_user_id):
+    """Serialized lots the user can review (None without a user profile), from the cache or one query"""
+    from parking.models import P_Lot, UserProfile
+    from parking.serializers import P_LotSerializer
+    key = _cache_key(auth_user_id)
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    profile_id = UserProfile.objects.filter(auth_user_id=auth_user_id).values_list('id', flat=True).first()
+    if profile_id is None:
+        return None
+    lots = P_Lot.objects.filter(lot_id__in=reviewable_lot_ids(profile_id)).annotate(
+        available_slot_count=Count('slots', filter=Q(slots__is_available=True)),
+    ).select_related('rating_summary').order_by('lot_id')
+    data = list(P_LotSerializer(lots, many=True).data)
+    cache.set(key, data, timeout=getattr(settings, 'REVIEWABLE_LOTS_CACHE_TTL', DEFAULT_CACHE_TTL))
+    return data
+
+
+def invalidate(auth_user_id):
+    cache.delete(_cache_key(auth_user_id))
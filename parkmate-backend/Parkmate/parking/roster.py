@@ -0,0 +1,483 @@
+"""
+Interval scheduling for car wash employee rosters.
+
+Every active CarWashBooking with a scheduled_time is treated as the interval
+[scheduled_time, scheduled_time + estimated_duration), where the duration comes
+from the CarWashService matching the booking's service_type. Each employee has
+a sorted interval list (EmployeeSchedule) with a running max of end times, so
+"is this employee free for [start, end)?" is a single bisect - O(log n) in the
+employee's bookings - and a free-employee query for a window costs
+O(E log n) for an owner with E employees.
+
+New bookings are assigned best-fit (the free employee whose previous job ends
+closest before the new start, the nearest to the lot among equal fits, as in
+parking/dispatch.py), and `rebalance_day` re-plans a whole day with
+the classic interval-partitioning greedy (bookings by start time, each to the
+employee that became free earliest). Assignment takes a row lock on the
+employee and re-checks overlaps in the database, so concurrent requests in
+different processes cannot double-book a washer, and then claims a unit of
+the employee's workload with the same conditional UPDATE as
+parking/dispatch.py, so CARWASH_MAX_ASSIGNMENTS and 'busy' still apply.
+
+The in-process index is updated from the CarWashBooking signals in
+parking/signals.py and rebuilt every CARWASH_ROSTER_INDEX_TTL seconds. It only
+holds active bookings from HISTORY_WINDOW ago onwards. Schedules and
+utilisation are read from the database instead, completed washes included, so
+a day's figures do not shrink as its washes complete; a page of employees
+costs one query.
+
+Settings:
+    CARWASH_WORKDAY_HOURS      - (start_hour, end_hour) used for utilisation (default (9, 21))
+    CARWASH_ROSTER_INDEX_TTL   - seconds before an owner's roster is rebuilt (default 60)
+"""
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DURATION_MINUTES = 30
+DEFAULT_WORKDAY_HOURS = (9, 21)
+DEFAULT_INDEX_TTL = 60
+
+# Bookings that occupy an employee's time
+ACTIVE_STATUSES = ('pending', 'confirmed', 'in_progress')
+
+# Bookings older than this are not loaded into the index
+HISTORY_WINDOW = timedelta(days=1)
+
+# Bookings that count towards an employee's schedule and utilisation
+WORKED_STATUSES = ACTIVE_STATUSES + ('completed',)
+
+
+def service_durations():
+    """Map of lowercased service name/type/first word -> estimated minutes"""
+    from parking.models import CarWashService
+    durations = {}
+    for name, service_type, minutes in CarWashService.objects.values_list(
+            'service_name', 'service_type', 'estimated_duration'):
+        for key in (name.lower(), service_type.lower(), name.lower().split()[0]):
+            durations.setdefault(key, minutes)
+    return durations
+
+
+def booking_duration(service_type, durations):
+    """Estimated minutes for a CarWashBooking.service_type ('Exterior', 'Full Service', ...)"""
+    key = (service_type or '').lower()
+    minutes = durations.get(key)
+    if minutes is None and key:
+        minutes = durations.get(key.split()[0])
+    return timedelta(minutes=minutes or DEFAULT_DURATION_MINUTES)
+
+
+def booking_interval(booking, durations=None):
+    """(start, end) of a booking, or None if it has no scheduled_time"""
+    if booking.scheduled_time is None:
+        return None
+    if durations is None:
+        durations = service_durations()
+    return booking.scheduled_time, booking.scheduled_time + booking_duration(booking.service_type, durations)
+
+
+class EmployeeSchedule:
+    """One employee's bookings as start-sorted intervals"""
+
+    def __init__(self):
+        self._starts = []
+        self._intervals = []      # (start, end, booking_id), sorted by start
+        self._max_end = []        # _max_end[i] = max end of _intervals[:i + 1]
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def __iter__(self):
+        return iter(self._intervals)
+
+    def _refresh_max_end(self, position):
+        running = self._max_end[position - 1] if position else None
+        del self._max_end[position:]
+        for _, end, _ in self._intervals[position:]:
+            running = end if running is None or end > running else running
+            self._max_end.append(running)
+
+    def add(self, start, end, booking_id):
+        position = bisect_right(self._starts, start)
+        self._starts.insert(position, start)
+        self._intervals.insert(position, (start, end, booking_id))
+        self._refresh_max_end(position)
+
+    def remove(self, booking_id):
+        for position, interval in enumerate(self._intervals):
+            if interval[2] == booking_id:
+                del self._starts[position]
+                del self._intervals[position]
+                self._refresh_max_end(position)
+                return True
+        return False
+
+    def is_free(self, start, end):
+        """No interval overlaps [start, end) - O(log n)"""
+        # Intervals that start before `end` are _intervals[:position]
+        position = bisect_left(self._starts, end)
+        return position == 0 or self._max_end[position - 1] <= start
+
+    def previous_end(self, start):
+        """Latest end among intervals starting at or before `start` (None if none)"""
+        position = bisect_right(self._starts, start)
+        return self._max_end[position - 1] if position else None
+
+    def busy_minutes(self, window_start, window_end):
+        """Minutes of [window_start, window_end) covered by this employee's bookings"""
+        total = timedelta()
+        covered_until = window_start
+        first = max(bisect_left(self._starts, window_start - timedelta(days=1)), 0)
+        last = bisect_left(self._starts, window_end)
+        for start, end, _ in self._intervals[first:last]:
+            start = max(start, covered_until)
+            end = min(end, window_end)
+            if end > start:
+                total += end - start
+                covered_until = end
+        return total.total_seconds() / 60
+
+
+class _OwnerRoster:
+    def __init__(self):
+        self.schedules = {}       # employee_id -> EmployeeSchedule
+        self.bookings = {}        # booking_id -> employee_id
+        self.built_at = None
+
+
+class RosterIndex:
+    """Per-owner employee schedules"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._owners = {}         # owner_id -> _OwnerRoster
+
+    def _build(self, owner_id):
+        from parking.models import CarWashBooking, Employee
+        roster = _OwnerRoster()
+        for employee_id in Employee.objects.filter(owner_id=owner_id).exclude(
+                availability_status='offline').values_list('employee_id', flat=True):
+            roster.schedules[employee_id] = EmployeeSchedule()
+        durations = service_durations()
+        rows = CarWashBooking.objects.filter(
+            employee__owner_id=owner_id, status__in=ACTIVE_STATUSES,
+            scheduled_time__gte=timezone.now() - HISTORY_WINDOW,
+        ).values_list('carwash_booking_id', 'employee_id', 'scheduled_time', 'service_type')
+        for booking_id, employee_id, scheduled, service_type in rows:
+            schedule = roster.schedules.get(employee_id)
+            if schedule is None:
+                continue  # offline employees are never rostered
+            schedule.add(scheduled, scheduled + booking_duration(service_type, durations), booking_id)
+            roster.bookings[booking_id] = employee_id
+        roster.built_at = time.monotonic()
+        return roster
+
+    def roster(self, owner_id):
+        ttl = getattr(settings, 'CARWASH_ROSTER_INDEX_TTL', DEFAULT_INDEX_TTL)
+        roster = self._owners.get(owner_id)
+        if roster is not None and (not ttl or time.monotonic() - roster.built_at < ttl):
+            return roster
+        with self._lock:
+            roster = self._build(owner_id)
+            self._owners[owner_id] = roster
+            return roster
+
+    def invalidate(self, owner_id=None):
+        with self._lock:
+            if owner_id is None:
+                self._owners.clear()
+            else:
+                self._owners.pop(owner_id, None)
+
+    def update_employee(self, employee):
+        """Drop cached rosters that an employee's owner/availability change makes stale"""
+        rosterable = employee.owner_id is not None and employee.availability_status != 'offline'
+        with self._lock:
+            for owner_id in list(self._owners):
+                listed = employee.pk in self._owners[owner_id].schedules
+                should_list = rosterable and owner_id == employee.owner_id
+                if listed != should_list:
+                    del self._owners[owner_id]
+
+    def remove_booking(self, booking_id):
+        with self._lock:
+            for roster in self._owners.values():
+                employee_id = roster.bookings.pop(booking_id, None)
+                if employee_id is not None:
+                    roster.schedules[employee_id].remove(booking_id)
+
+    def update_booking(self, booking, durations=None):
+        """Move a booking to its current employee/time, or drop it if no longer active"""
+        with self._lock:
+            self.remove_booking(booking.pk)
+            if booking.employee_id is None or booking.status not in ACTIVE_STATUSES:
+                return
+            interval = booking_interval(booking, durations)
+            if interval is None:
+                return
+            for roster in self._owners.values():
+                schedule = roster.schedules.get(booking.employee_id)
+                if schedule is not None:
+                    schedule.add(interval[0], interval[1], booking.pk)
+                    roster.bookings[booking.pk] = booking.employee_id
+
+    def free_employees(self, owner_id, start, end, lat=None, lng=None):
+        """
+        Employee ids of the owner free for [start, end), best fit first; equal
+        fits go nearest-first to (lat, lng) through the dispatch index.
+        """
+        from parking.dispatch import get_dispatch_index
+        roster = self.roster(owner_id)
+        distances = get_dispatch_index().distances(owner_id, lat, lng)
+        with self._lock:
+            free = []
+            for employee_id, schedule in roster.schedules.items():
+                if schedule.is_free(start, end):
+                    previous_end = schedule.previous_end(start)
+                    # Smallest idle gap before the new job first; idle employees last
+                    gap = (start - previous_end) if previous_end is not None else timedelta.max
+                    free.append((gap, distances.get(employee_id, float('inf')), employee_id))
+            return [employee_id for _, _, employee_id in sorted(free)]
+
+    def schedule(self, owner_id, employee_id):
+        return self.roster(owner_id).schedules.get(employee_id, EmployeeSchedule())
+
+
+_roster_index = RosterIndex()
+
+
+def get_roster_index():
+    return _roster_index
+
+
+def _employee_has_overlap(employee_id, start, end, durations, exclude_booking_id=None):
+    """Authoritative overlap check against the database"""
+    from parking.models import CarWashBooking
+    longest = max([timedelta(minutes=minutes) for minutes in durations.values()]
+                  + [timedelta(minutes=DEFAULT_DURATION_MINUTES)])
+    nearby = CarWashBooking.objects.filter(
+        employee_id=employee_id, status__in=ACTIVE_STATUSES,
+        scheduled_time__lt=end, scheduled_time__gt=start - longest,
+    )
+    if exclude_booking_id is not None:
+        nearby = nearby.exclude(carwash_booking_id=exclude_booking_id)
+    for scheduled, service_type in nearby.values_list('scheduled_time', 'service_type'):
+        if scheduled + booking_duration(service_type, durations) > start:
+            return True
+    return False
+
+
+def assign_booking(booking):
+    """
+    Assign a scheduled CarWashBooking to a free employee of its lot's owner.
+    Returns the Employee, or None if nobody is free for the booking's interval
+    or every free employee is at CARWASH_MAX_ASSIGNMENTS.
+    """
+    from parking.dispatch import claim_employee, get_dispatch_index
+    from parking.models import Employee
+    from parking.workload import claimed_assignment
+    if booking.lot is None or booking.scheduled_time is None:
+        return None
+    durations = service_durations()
+    start, end = booking_interval(booking, durations)
+    owner_id = booking.lot.owner_id
+    index = get_roster_index()
+
+    for employee_id in index.free_employees(owner_id, start, end, booking.lot.latitude, booking.lot.longitude):
+        with transaction.atomic():
+            employee = Employee.objects.select_for_update().filter(
+                employee_id=employee_id, owner_id=owner_id,
+            ).exclude(availability_status='offline').first()
+            if employee is None:
+                continue
+            if _employee_has_overlap(employee_id, start, end, durations, booking.pk):
+                # Another process booked this washer; resync and try the next one
+                index.invalidate(owner_id)
+                continue
+            if not claim_employee(employee_id, owner_id=owner_id):
+                continue  # busy or at CARWASH_MAX_ASSIGNMENTS
+            booking.employee = employee
+            # The claim already counted this assignment
+            with claimed_assignment(employee_id):
+                booking.save()
+        employee.refresh_from_db()
+        if employee.availability_status != 'available':
+            get_dispatch_index().update_employee(employee)
+        index.update_booking(booking, durations)
+        logger.info(f"🗓️ Rostered car wash booking {booking.pk} to employee {employee_id} "
+                    f"({start:%Y-%m-%d %H:%M}-{end:%H:%M})")
+        return employee
+    return None
+
+
+def plan_day(owner_id, day):
+    """
+    Interval-partitioning plan for one day: {booking_id: employee_id or None}.
+    In-progress bookings keep their employee; the rest are placed by start time
+    on whichever employee became free earliest and still has workload to spare
+    under CARWASH_MAX_ASSIGNMENTS (counting their washes on other days).
+    """
+    from parking.dispatch import get_max_assignments
+    from parking.models import CarWashBooking, Employee
+    durations = service_durations()
+    day_start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    day_end = day_start + timedelta(days=1)
+
+    load = dict(Employee.objects.filter(owner_id=owner_id).exclude(
+        availability_status='offline').order_by('employee_id').values_list('employee_id', 'current_assignments'))
+    employees = list(load)
+    cap = get_max_assignments()
+    bookings = CarWashBooking.objects.filter(
+        lot__owner_id=owner_id, status__in=ACTIVE_STATUSES,
+        scheduled_time__gte=day_start, scheduled_time__lt=day_end,
+    ).order_by('scheduled_time', 'carwash_booking_id')
+
+    free_at = {employee_id: day_start for employee_id in employees}
+    pinned = []
+    movable = []
+    for booking in bookings:
+        start, end = booking_interval(booking, durations)
+        if booking.status == 'in_progress' and booking.employee_id in free_at:
+            pinned.append((start, end, booking))
+        else:
+            movable.append((start, end, booking))
+            if booking.employee_id in load:
+                load[booking.employee_id] -= 1  # counted again wherever it is placed
+
+    plan = {}
+    pins = {}                 # employee_id -> intervals of their in-progress jobs
+    for start, end, booking in pinned:
+        pins.setdefault(booking.employee_id, []).append((start, end))
+        plan[booking.pk] = booking.employee_id
+
+    # Min-heap of (free_at, employee_id): the earliest-free employee takes the next job
+    heap = [(moment, employee_id) for employee_id, moment in free_at.items()]
+    heapq.heapify(heap)
+    for start, end, booking in movable:
+        skipped = []
+        chosen = None
+        while heap and heap[0][0] <= start:
+            moment, employee_id = heapq.heappop(heap)
+            if load[employee_id] >= cap or any(
+                    pin_start < end and start < pin_end for pin_start, pin_end in pins.get(employee_id, ())):
+                skipped.append((moment, employee_id))
+                continue
+            chosen = employee_id
+            load[employee_id] += 1
+            heapq.heappush(heap, (end, employee_id))
+            break
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        if chosen is None and booking.employee_id in load:
+            load[booking.employee_id] += 1  # stays where it is
+        plan[booking.pk] = chosen
+    return plan
+
+
+def rebalance_day(owner_id, day):
+    """
+    Apply plan_day; returns (plan, number of bookings whose employee changed).
+    Each move claims the new employee with the dispatch UPDATE (the workload
+    signal gives the old employee's unit back), so nobody goes over
+    CARWASH_MAX_ASSIGNMENTS. Moves whose claim fails are retried after the
+    others have freed capacity; bookings that still cannot move, or that the
+    plan cannot place, stay with their current employee.
+    """
+    from parking.dispatch import claim_employee, get_dispatch_index
+    from parking.models import CarWashBooking, Employee
+    from parking.workload import claimed_assignment
+    plan = plan_day(owner_id, day)
+    changed = 0
+    with transaction.atomic():
+        moves = [
+            booking for booking in CarWashBooking.objects.select_for_update().filter(carwash_booking_id__in=plan)
+            if plan[booking.pk] is not None and booking.employee_id != plan[booking.pk]
+        ]
+        while moves:
+            left = []
+            for booking in moves:
+                employee_id = plan[booking.pk]
+                if not claim_employee(employee_id, owner_id=owner_id):
+                    left.append(booking)
+                    continue
+                booking.employee_id = employee_id
+                # The claim already counted this assignment
+                with claimed_assignment(employee_id):
+                    booking.save()
+                changed += 1
+            if len(left) == len(moves):
+                break
+            moves = left
+    for employee in Employee.objects.filter(owner_id=owner_id):
+        get_dispatch_index().update_employee(employee)
+    get_roster_index().invalidate(owner_id)
+    return plan, changed
+
+
+def day_schedules(employees, day):
+    """
+    {employee_id: EmployeeSchedule} of the washes the employees worked or are
+    booked for around one day, from one query over all of them.
+    """
+    from parking.models import CarWashBooking
+    schedules = {employee.pk: EmployeeSchedule() for employee in employees}
+    rostered = [employee.pk for employee in employees if employee.owner_id is not None]
+    if not rostered:
+        return schedules
+    durations = service_durations()
+    day_start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    # From the day before, for washes that run past midnight
+    rows = CarWashBooking.objects.filter(
+        employee_id__in=rostered, status__in=WORKED_STATUSES,
+        scheduled_time__gte=day_start - timedelta(days=1), scheduled_time__lt=day_start + timedelta(days=1),
+    ).values_list('employee_id', 'carwash_booking_id', 'scheduled_time', 'service_type')
+    for employee_id, booking_id, scheduled, service_type in rows:
+        schedules[employee_id].add(scheduled, scheduled + booking_duration(service_type, durations), booking_id)
+    return schedules
+
+
+def day_schedule(employee, day):
+    """One employee's washes around one day, as an EmployeeSchedule"""
+    return day_schedules([employee], day)[employee.pk]
+
+
+def workday_window(day):
+    start_hour, end_hour = getattr(settings, 'CARWASH_WORKDAY_HOURS', DEFAULT_WORKDAY_HOURS)
+    midnight = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    return midnight + timedelta(hours=start_hour), midnight + timedelta(hours=end_hour)
+
+
+def employee_utilisation(employee, day, schedule=None):
+    """Booked minutes and share of the workday for one employee on one day"""
+    window_start, window_end = workday_window(day)
+    workday_minutes = (window_end - window_start).total_seconds() / 60
+    if employee.owner_id is None:
+        return {'date': day.isoformat(), 'booked_minutes': 0, 'workday_minutes': workday_minutes,
+                'utilisation': 0.0, 'bookings': 0}
+    if schedule is None:
+        schedule = day_schedule(employee, day)
+    booked = schedule.busy_minutes(window_start, window_end)
+    bookings = sum(1 for start, end, _ in schedule if start < window_end and end > window_start)
+    return {
+        'date': day.isoformat(),
+        'booked_minutes': round(booked),
+        'workday_minutes': round(workday_minutes),
+        'utilisation': round(booked / workday_minutes, 3) if workday_minutes else 0.0,
+        'bookings': bookings,
+    }
+
+
+def employees_utilisation(employees, day):
+    """{employee_id: employee_utilisation(...)} for a page of employees, in two queries"""
+    schedules = day_schedules(employees, day)
+    return {employee.pk: employee_utilisation(employee, day, schedules[employee.pk]) for employee in employees}
@@ -1,5 +1,5 @@
 """
-WebSocket routing for real-time notifications and time synchronization
+WebSocket routing for real-time notifications, time synchronization, lot availability and owner events
 """
 from django.urls import re_path
 from . import consumers
@@ -7,4 +7,6 @@ from . import consumers
 websocket_urlpatterns = [
     re_path(r"^ws/notifications/(?P<user_id>[\w\-]+)/$", consumers.NotificationConsumer.as_asgi()),
     re_path(r"^ws/time/$", consumers.TimeSyncConsumer.as_asgi()),
+    re_path(r"^ws/lots/(?P<lot_id>\d+)/$", consumers.LotAvailabilityConsumer.as_asgi()),
+    re_path(r"^ws/owner/events/$", consumers.OwnerEventConsumer.as_asgi()),
 ]
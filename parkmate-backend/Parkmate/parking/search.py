@@ -0,0 +1,314 @@
+"""
+Full-text search index for parking lots.
+
+Indexes lot name, street, locality, city, state and pincode. On SQLite builds
+with FTS5 the index is the LOT_SEARCH virtual table (created by migration
+0029); anywhere else an in-process inverted index is used. Both support ranked,
+prefix-matching queries ("mar dri" matches "Marine Drive") and are kept in sync
+by the P_Lot save/delete signals in parking/signals.py.
+
+Settings:
+    LOT_SEARCH_BACKEND  - 'auto' (default), 'fts5' or 'memory'
+"""
+import logging
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Case, Count, IntegerField, When
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'LOT_SEARCH'
+
+# (field, weight) - weights feed bm25() for FTS5 and the scorer of the fallback index
+SEARCH_FIELDS = (
+    ('lot_name', 10.0),
+    ('streetname', 4.0),
+    ('locality', 4.0),
+    ('city', 3.0),
+    ('state', 1.0),
+    ('pincode', 2.0),
+)
+
+# Ranked ids fetched from the index per query, ranked within the caller's queryset
+SEARCH_CANDIDATE_LIMIT = 500
+
+FTS5_CREATE_SQL = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS "{FTS_TABLE}" USING fts5('
+    + ', '.join(field for field, _ in SEARCH_FIELDS)
+    + ", tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+FTS5_DROP_SQL = f'DROP TABLE IF EXISTS "{FTS_TABLE}"'
+FTS5_DELETE_SQL = f'DELETE FROM "{FTS_TABLE}" WHERE rowid = %s'
+FTS5_INSERT_SQL = (
+    f'INSERT INTO "{FTS_TABLE}" (rowid, '
+    + ', '.join(field for field, _ in SEARCH_FIELDS)
+    + ') VALUES (%s' + ', %s' * len(SEARCH_FIELDS) + ')'
+)
+FTS5_SEARCH_SQL = (
+    f'SELECT rowid FROM "{FTS_TABLE}" WHERE "{FTS_TABLE}" MATCH %s '
+    f'ORDER BY bm25("{FTS_TABLE}", '
+    + ', '.join(str(weight) for _, weight in SEARCH_FIELDS)
+    + ') LIMIT %s'
+)
+FTS5_MATCH_IDS_SQL = f'SELECT rowid FROM "{FTS_TABLE}" WHERE "{FTS_TABLE}" MATCH %s'
+# FTS5_SEARCH_SQL restricted to the lot ids of a subquery (filled in with .format())
+FTS5_SEARCH_WITHIN_SQL = FTS5_SEARCH_SQL.replace(' ORDER BY', ' AND rowid IN ({}) ORDER BY')
+
+_TOKEN_RE = re.compile(r'[^\W_]+', re.UNICODE)
+
+
+def tokenize(text):
+    """Lowercase word tokens (letters/digits) of a string"""
+    if not text:
+        return []
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+def build_match_expression(query):
+    """Turn user input into an FTS5 MATCH expression: every token as a quoted prefix, ANDed"""
+    tokens = tokenize(query)
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def lot_document(lot):
+    """Values of the indexed fields for a lot (model instance or dict)"""
+    if isinstance(lot, dict):
+        return [lot.get(field) or '' for field, _ in SEARCH_FIELDS]
+    return [getattr(lot, field) or '' for field, _ in SEARCH_FIELDS]
+
+
+class FTS5LotSearchIndex:
+    """Search backed by the LOT_SEARCH FTS5 virtual table"""
+
+    name = 'fts5'
+
+    def _alias(self, write=False):
+        from parking.models import P_Lot
+        if write:
+            return router.db_for_write(P_Lot) or 'default'
+        return router.db_for_read(P_Lot) or 'default'
+
+    def index_lot(self, lot):
+        with connections[self._alias(write=True)].cursor() as cursor:
+            cursor.execute(FTS5_DELETE_SQL, [lot.pk])
+            cursor.execute(FTS5_INSERT_SQL, [lot.pk] + lot_document(lot))
+
+    def remove_lot(self, lot_id):
+        with connections[self._alias(write=True)].cursor() as cursor:
+            cursor.execute(FTS5_DELETE_SQL, [lot_id])
+
+    def rebuild(self):
+        from parking.models import P_Lot
+        fields = [field for field, _ in SEARCH_FIELDS]
+        count = 0
+        with connections[self._alias(write=True)].cursor() as cursor:
+            cursor.execute(f'DELETE FROM "{FTS_TABLE}"')
+            for row in P_Lot.objects.values_list('lot_id', *fields).iterator(chunk_size=2000):
+                cursor.execute(FTS5_INSERT_SQL, [row[0]] + [value or '' for value in row[1:]])
+                count += 1
+        return count
+
+    def ranked_ids(self, query, limit=SEARCH_CANDIDATE_LIMIT, queryset=None):
+        match = build_match_expression(query)
+        if not match:
+            return []
+        sql, params = FTS5_SEARCH_SQL, [match, limit]
+        if queryset is not None:
+            # Rank inside the caller's filters, so hidden lots cannot use up the limit
+            subquery, subquery_params = queryset.order_by().values('lot_id').query.sql_with_params()
+            sql, params = FTS5_SEARCH_WITHIN_SQL.format(subquery), [match, *subquery_params, limit]
+        with connections[self._alias()].cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def filter_matches(self, queryset, query):
+        """Restrict a P_Lot queryset to every lot matching the query (unranked, no limit)"""
+        match = build_match_expression(query)
+        if not match:
+            return queryset.none()
+        return queryset.filter(lot_id__in=RawSQL(FTS5_MATCH_IDS_SQL, [match]))
+
+
+class InMemoryLotSearchIndex:
+    """
+    In-process inverted index used when FTS5 is unavailable.
+    Terms are kept in a sorted list so prefix lookups are a bisect plus a scan
+    over the matching range.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}     # term -> {lot_id: weight}
+        self._terms = []        # sorted list of terms, for prefix matching
+        self._doc_terms = {}    # lot_id -> set of terms
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            from parking.models import P_Lot
+            fields = ['lot_id'] + [field for field, _ in SEARCH_FIELDS]
+            for row in P_Lot.objects.values(*fields).iterator(chunk_size=2000):
+                self._add(row['lot_id'], lot_document(row))
+            self._loaded = True
+            logger.info(f"🔎 Built in-memory lot search index ({len(self._doc_terms)} lots)")
+
+    def _add(self, lot_id, values):
+        weights = {}
+        for (_, weight), value in zip(SEARCH_FIELDS, values):
+            for term in tokenize(value):
+                weights[term] = weights.get(term, 0.0) + weight
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                insort(self._terms, term)
+            postings[lot_id] = weight
+        self._doc_terms[lot_id] = set(weights)
+
+    def _remove(self, lot_id):
+        for term in self._doc_terms.pop(lot_id, ()):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(lot_id, None)
+            if not postings:
+                del self._postings[term]
+                index = bisect_left(self._terms, term)
+                if index < len(self._terms) and self._terms[index] == term:
+                    self._terms.pop(index)
+
+    def load_documents(self, documents):
+        """Bulk-load (lot_id, values) pairs; used by rebuilds and benchmarks"""
+        with self._lock:
+            for lot_id, values in documents:
+                self._remove(lot_id)
+                self._add(lot_id, values)
+            self._loaded = True
+
+    def index_lot(self, lot):
+        if not self._loaded:
+            return  # the lazy build will pick the lot up
+        with self._lock:
+            self._remove(lot.pk)
+            self._add(lot.pk, lot_document(lot))
+
+    def remove_lot(self, lot_id):
+        with self._lock:
+            self._remove(lot_id)
+
+    def rebuild(self):
+        with self._lock:
+            self._postings, self._terms, self._doc_terms = {}, [], {}
+            self._loaded = False
+            self._ensure_loaded()
+            return len(self._doc_terms)
+
+    def _prefix_terms(self, prefix):
+        index = bisect_left(self._terms, prefix)
+        while index < len(self._terms) and self._terms[index].startswith(prefix):
+            yield self._terms[index]
+            index += 1
+
+    def _scores(self, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return {}
+        self._ensure_loaded()
+        with self._lock:
+            total_docs = max(len(self._doc_terms), 1)
+            scores = None
+            for token in tokens:
+                token_scores = {}
+                for term in self._prefix_terms(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + total_docs / len(postings))
+                    # Whole-word hits outrank prefix-only hits
+                    boost = 1.5 if term == token else 1.0
+                    for lot_id, weight in postings.items():
+                        token_scores[lot_id] = token_scores.get(lot_id, 0.0) + weight * idf * boost
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {lot_id: score + token_scores[lot_id]
+                              for lot_id, score in scores.items() if lot_id in token_scores}
+                if not scores:
+                    return {}
+            return scores
+
+    def ranked_ids(self, query, limit=SEARCH_CANDIDATE_LIMIT, queryset=None):
+        scores = self._scores(query)
+        if queryset is not None and scores:
+            allowed = set(queryset.filter(lot_id__in=list(scores)).values_list('lot_id', flat=True))
+            scores = {lot_id: score for lot_id, score in scores.items() if lot_id in allowed}
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [lot_id for lot_id, _ in ranked[:limit]]
+
+    def filter_matches(self, queryset, query):
+        return queryset.filter(lot_id__in=list(self._scores(query)))
+
+
+_memory_index = InMemoryLotSearchIndex()
+_fts5_index = FTS5LotSearchIndex()
+_fts5_available = {}
+
+
+def fts5_table_exists(alias='default'):
+    if alias not in _fts5_available:
+        connection = connections[alias]
+        exists = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+                )
+                exists = cursor.fetchone() is not None
+        _fts5_available[alias] = exists
+    return _fts5_available[alias]
+
+
+def get_lot_search_index():
+    """Return the active search backend"""
+    backend = getattr(settings, 'LOT_SEARCH_BACKEND', 'auto')
+    if backend == 'memory':
+        return _memory_index
+    if backend == 'fts5' or fts5_table_exists():
+        return _fts5_index
+    return _memory_index
+
+
+def search_lots(queryset, query, limit=SEARCH_CANDIDATE_LIMIT):
+    """
+    Filter a P_Lot queryset to lots matching `query`, ordered best match first.
+    The best `limit` are taken among the queryset's lots, so apply visibility
+    and other filters before searching.
+    """
+    ids = get_lot_search_index().ranked_ids(query, limit=limit, queryset=queryset)
+    if not ids:
+        return queryset.none()
+    ranking = Case(
+        *[When(lot_id=lot_id, then=position) for position, lot_id in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(lot_id__in=ids).annotate(search_rank=ranking).order_by('search_rank')
+
+
+def city_facets(queryset, query):
+    """Per-city counts of every lot in `queryset` matching `query`, largest first"""
+    matches = get_lot_search_index().filter_matches(queryset, query)
+    return list(
+        matches.order_by().values('city').annotate(count=Count('lot_id')).order_by('-count', 'city')
+    )
@@ -13,10 +13,14 @@ from .models import (
     Carwash,
     Carwash_type,
     Review,
+    LotRatingSummary,
     Employee,
     Tasks,
     CarWashBooking,
     CarWashService,
+    ArchivedBooking,
+    ArchivedPayment,
+    ArchivedCarwash,
     VEHICLE_CHOICES,
     BOOKING_CHOICES,
     PAYMENT_CHOICES,
@@ -429,6 +433,7 @@ class P_LotSerializer(serializers.ModelSerializer):
     available_slots=serializers.SerializerMethodField()
     lot_image_url = serializers.SerializerMethodField()  # Read-only URL output
     avg_rating = serializers.SerializerMethodField()
+    rating_summary = serializers.SerializerMethodField()
     
     class Meta:
         model = P_Lot
@@ -448,10 +453,14 @@ class P_LotSerializer(serializers.ModelSerializer):
             "lot_image",  # Writable field for uploads
             "lot_image_url",  # Read-only URL field
             "avg_rating",
+            "rating_summary",  # Review count, average and 1-5 star histogram
             "provides_carwash",  # New field for carwash service availability
         ]
     
     def get_available_slots(self, obj):
+        # Use the count annotated by list queries (e.g. nearby lots) when present
+        if hasattr(obj, 'available_slot_count'):
+            return obj.available_slot_count
         try:
             return obj.slots.filter(is_available=True).count()
         except:
@@ -467,15 +476,23 @@ class P_LotSerializer(serializers.ModelSerializer):
             return image_url
         return None
 
-    def get_avg_rating(self, obj):
-        """Calculate average rating for the lot"""
-        qs = Review.objects.filter(lot=obj)
-        if not qs.exists():
+    def _rating_summary(self, obj):
+        # Precomputed by the Review signals; select_related('rating_summary') avoids a query per lot
+        try:
+            return obj.rating_summary
+        except LotRatingSummary.DoesNotExist:
             return None
-        avg = qs.aggregate(Avg('rating'))['rating__avg']
-        return round(avg, 1) if avg else None
 
-    read_only_fields = ["lot_id", "available_slots", "lot_image_url", "avg_rating"]
+    def get_avg_rating(self, obj):
+        """Average rating for the lot, from its rating summary"""
+        summary = self._rating_summary(obj)
+        return summary.average if summary else None
+
+    def get_rating_summary(self, obj):
+        from parking.review_summary import summary_data
+        return summary_data(self._rating_summary(obj))
+
+    read_only_fields = ["lot_id", "available_slots", "lot_image_url", "avg_rating", "rating_summary"]
 
 
 # P_Slot serializer
@@ -869,6 +886,74 @@ class PaymentSerializer(serializers.ModelSerializer):
 
 
 
+# Archived booking serializers (read-only history)
+class ArchivedPaymentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedPayment
+        fields = [
+            "pay_id",
+            "payment_method",
+            "amount",
+            "status",
+            "service_type",
+            "transaction_id",
+            "is_renewal",
+            "created_at",
+            "verified_at",
+        ]
+        read_only_fields = fields
+
+
+class ArchivedCarwashSerializer(serializers.ModelSerializer):
+    carwash_type_name = serializers.CharField(source="carwash_type.name", read_only=True)
+
+    class Meta:
+        model = ArchivedCarwash
+        fields = ["carwash_id", "carwash_type", "carwash_type_name", "employee", "price", "status"]
+        read_only_fields = fields
+
+
+class ArchivedBookingSerializer(serializers.ModelSerializer):
+    """
+    Serializer for bookings moved to the archive tables.
+    Field names match BookingSerializer so history views can render both.
+    """
+    lot_detail = PLotNestedSerializer(source="lot", read_only=True)
+    payments = ArchivedPaymentSerializer(many=True, read_only=True)
+    carwash = serializers.SerializerMethodField()
+    is_archived = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ArchivedBooking
+        fields = [
+            "booking_id",
+            "user",
+            "slot",
+            "lot",
+            "lot_detail",
+            "vehicle_number",
+            "vehicle_type",
+            "booking_type",
+            "booking_time",
+            "start_time",
+            "end_time",
+            "price",
+            "status",
+            "payments",
+            "carwash",
+            "archived_at",
+            "is_archived",
+        ]
+        read_only_fields = fields
+
+    def get_carwash(self, obj):
+        carwashes = list(obj.carwashes.all())
+        return ArchivedCarwashSerializer(carwashes[0]).data if carwashes else None
+
+    def get_is_archived(self, obj):
+        return True
+
+
 # Services Serializer
 # class SimplePLotSerializer(serializers.ModelSerializer):
 # class Meta:
@@ -0,0 +1,258 @@
+"""
+Owner settlement ledger.
+
+SettlementLedger holds, per lot, day and payment method, the amount and
+number of SUCCESS, PENDING and FAILED payments. Owner statements read only
+these rows, so a month-end report never scans the payments table.
+
+Writes go through an outbox:
+
+    1. when a Payment is created or changes status/amount/method, the signals
+       in parking/signals.py (and the batch verification in
+       parking/payment_verification.py) append a SettlementOutbox row with the
+       signed change, in the same transaction as the payment write
+    2. after commit, drain() claims pending outbox rows, sums them per ledger
+       key in SQL and adds the sums to the ledger with F() updates
+
+If the drain fails or SETTLEMENT_DRAIN_ON_COMMIT is off, the rows wait for
+`python manage.py drain_settlement_outbox`. Deleting a payment (archival,
+cascades) leaves the ledger alone: settled money stays in the history.
+
+`python manage.py backfill_settlement_ledger` rebuilds the ledger from the
+live and archived payments in chunked pay_id passes. Each pass discards the
+pass's pending outbox rows and takes back the ones already applied since the
+rebuild started, so it can run while payments keep coming in.
+
+The day is the local date of Payment.created_at; payments without one are
+left out.
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = {'SUCCESS': 'success', 'PENDING': 'pending', 'FAILED': 'failed'}
+TOTALS = ('success_amount', 'success_count', 'pending_amount', 'pending_count', 'failed_amount', 'failed_count')
+SNAPSHOT_FIELDS = ('status', 'amount', 'payment_method', 'booking_id', 'carwash_booking_id', 'created_at')
+
+DRAIN_BATCH = 500
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def _local_day(value):
+    return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+
+
+def _placements(snapshots):
+    """{('booking' | 'carwash', id): (owner_id, lot_id)} for the bookings the snapshots point at"""
+    from parking.models import Booking, CarWashBooking
+    booking_ids = {s[3] for s in snapshots if s and s[3] is not None}
+    carwash_ids = {s[4] for s in snapshots if s and s[3] is None and s[4] is not None}
+    placements = {}
+    if booking_ids:
+        for pk, owner_id, lot_id in Booking.objects.filter(pk__in=booking_ids).values_list(
+                'pk', 'lot__owner_id', 'lot_id'):
+            placements[('booking', pk)] = (owner_id, lot_id)
+    if carwash_ids:
+        for pk, owner_id, lot_id in CarWashBooking.objects.filter(pk__in=carwash_ids).values_list(
+                'pk', 'lot__owner_id', 'lot_id'):
+            placements[('carwash', pk)] = (owner_id, lot_id)
+    return placements
+
+
+def _contribution(snapshot, placements):
+    """{(owner_id, lot_id, day, method): {total: value}} for one payment snapshot"""
+    if snapshot is None:
+        return {}
+    status, amount, method, booking_id, carwash_booking_id, created_at = snapshot
+    bucket = BUCKETS.get((status or '').upper())
+    ref = ('booking', booking_id) if booking_id is not None else ('carwash', carwash_booking_id)
+    owner_id, lot_id = placements.get(ref, (None, None))
+    if bucket is None or lot_id is None or created_at is None:
+        return {}
+    return {(owner_id, lot_id, _local_day(created_at), method): {
+        f'{bucket}_amount': Decimal(str(amount or 0)), f'{bucket}_count': 1,
+    }}
+
+
+def record_changes(changes):
+    """
+    Append outbox rows for [(payment_id, old_snapshot, new_snapshot)] (None for no
+    snapshot) and drain them once the surrounding transaction commits.
+    """
+    from parking.models import SettlementOutbox
+    placements = _placements([s for _, old, new in changes for s in (old, new)])
+    events = []
+    for payment_id, old, new in changes:
+        deltas = defaultdict(lambda: dict.fromkeys(TOTALS, 0))
+        for sign, snapshot in ((-1, old), (1, new)):
+            for key, values in _contribution(snapshot, placements).items():
+                for total, value in values.items():
+                    deltas[key][total] += sign * value
+        for (owner_id, lot_id, day, method), values in deltas.items():
+            if any(values.values()):
+                events.append(SettlementOutbox(payment_id=payment_id, owner_id=owner_id, lot_id=lot_id,
+                                               day=day, payment_method=method, **values))
+    if not events:
+        return 0
+    SettlementOutbox.objects.bulk_create(events)
+    if getattr(settings, 'SETTLEMENT_DRAIN_ON_COMMIT', True):
+        transaction.on_commit(_drain_quietly)
+    return len(events)
+
+
+def _add_to_ledger(owner_id, lot_id, day, method, values):
+    from parking.models import SettlementLedger
+    changes = {total: F(total) + value for total, value in values.items() if value}
+    if not changes:
+        return
+    changes['updated_at'] = timezone.now()
+    row = SettlementLedger.objects.filter(lot_id=lot_id, day=day, payment_method=method)
+    if row.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            SettlementLedger.objects.create(owner_id=owner_id, lot_id=lot_id, day=day, payment_method=method,
+                                            **{total: values.get(total, 0) for total in TOTALS})
+    except IntegrityError:
+        # Another drain opened the row first
+        row.update(**changes)
+
+
+def _outbox_sums(queryset):
+    """Outbox rows summed per ledger key"""
+    return queryset.order_by().values('owner_id', 'lot_id', 'day', 'payment_method').annotate(
+        **{f'sum_{total}': Sum(total) for total in TOTALS}
+    )
+
+
+def drain(limit=DRAIN_BATCH):
+    """Fold pending outbox rows into the ledger, `limit` at a time; returns the number applied"""
+    from parking.models import SettlementOutbox
+    applied = 0
+    while True:
+        with transaction.atomic():
+            pending = SettlementOutbox.objects.select_for_update(skip_locked=True).filter(
+                applied_at__isnull=True,
+            ).order_by('event_id')
+            ids = list(pending.values_list('event_id', flat=True)[:limit])
+            if not ids:
+                return applied
+            stamp = timezone.now()
+            claimed = SettlementOutbox.objects.filter(event_id__in=ids, applied_at__isnull=True).update(
+                applied_at=stamp,
+            )
+            for row in _outbox_sums(SettlementOutbox.objects.filter(event_id__in=ids, applied_at=stamp)):
+                _add_to_ledger(row['owner_id'], row['lot_id'], row['day'], row['payment_method'],
+                               {total: row[f'sum_{total}'] for total in TOTALS})
+            applied += claimed
+        if len(ids) < limit:
+            return applied
+
+
+def _drain_quietly():
+    try:
+        drain()
+    except Exception as e:
+        logger.error(f"❌ Settlement outbox drain failed (rows stay pending): {str(e)}")
+
+
+def _payment_sums(queryset, lot_path):
+    """Ledger totals of a payments queryset grouped by (owner, lot, day, method)"""
+    return queryset.filter(created_at__isnull=False, **{f'{lot_path}__isnull': False}).annotate(
+        s_owner=F(f'{lot_path}__owner_id'), s_lot=F(lot_path),
+        s_day=TruncDate('created_at', tzinfo=timezone.get_current_timezone()),
+    ).order_by().values('s_owner', 's_lot', 's_day', 'payment_method').annotate(**{
+        f'{bucket}_{kind}': (Sum('amount', filter=Q(status=status)) if kind == 'amount'
+                             else Count('pk', filter=Q(status=status)))
+        for status, bucket in BUCKETS.items() for kind in ('amount', 'count')
+    })
+
+
+def backfill(chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Rebuild the ledger from the live and archived payments, chunk_size pay_ids
+    per transaction. Returns the number of payments scanned.
+    """
+    from parking.models import ArchivedPayment, Payment, SettlementLedger, SettlementOutbox
+    with transaction.atomic():
+        reset_at = timezone.now()
+        SettlementOutbox.objects.filter(applied_at__isnull=True).update(applied_at=reset_at)
+        SettlementLedger.objects.all().delete()
+
+    last = max(Payment.objects.aggregate(m=Max('pay_id'))['m'] or 0,
+               ArchivedPayment.objects.aggregate(m=Max('pay_id'))['m'] or 0)
+    scanned = 0
+    for start in range(0, last, chunk_size):
+        in_range = {'pay_id__gt': start, 'pay_id__lte': start + chunk_size}
+        with transaction.atomic():
+            # Pending changes of this range are covered by the scan below
+            SettlementOutbox.objects.filter(
+                payment_id__gt=start, payment_id__lte=start + chunk_size, applied_at__isnull=True,
+            ).update(applied_at=reset_at)
+            # Lock the range against concurrent payment changes where the backend supports it
+            scanned += len(Payment.objects.select_for_update().filter(**in_range).values_list('pay_id', flat=True))
+
+            totals = defaultdict(lambda: dict.fromkeys(TOTALS, 0))
+            # Changes drained since the reset are already in the ledger; take them back out
+            drained = SettlementOutbox.objects.filter(
+                payment_id__gt=start, payment_id__lte=start + chunk_size, applied_at__gt=reset_at,
+            )
+            for row in _outbox_sums(drained):
+                key = (row['owner_id'], row['lot_id'], row['day'], row['payment_method'])
+                for total in TOTALS:
+                    totals[key][total] -= row[f'sum_{total}']
+
+            for queryset, lot_path in ((Payment.objects.filter(**in_range), 'booking__lot'),
+                                       (Payment.objects.filter(booking__isnull=True, **in_range),
+                                        'carwash_booking__lot'),
+                                       (ArchivedPayment.objects.filter(**in_range), 'booking__lot')):
+                for row in _payment_sums(queryset, lot_path):
+                    key = (row['s_owner'], row['s_lot'], row['s_day'], row['payment_method'])
+                    for total in TOTALS:
+                        totals[key][total] += row[total] or 0
+            for (owner_id, lot_id, day, method), values in totals.items():
+                _add_to_ledger(owner_id, lot_id, day, method, values)
+        scanned += ArchivedPayment.objects.filter(**in_range).count()
+        if progress:
+            progress(min(start + chunk_size, last), last, scanned)
+    return scanned
+
+
+def _money(value):
+    return str(Decimal(value).quantize(Decimal('0.01')))
+
+
+def statement(owner, first_day, last_day, lot_id=None, period='day'):
+    """
+    Ledger rows of an owner between first_day and last_day, grouped by period
+    ('day' or 'month'), lot and payment method, plus grand totals.
+    """
+    from django.db.models.functions import TruncMonth
+    from parking.models import SettlementLedger
+    rows = SettlementLedger.objects.filter(owner=owner, day__gte=first_day, day__lte=last_day)
+    if lot_id is not None:
+        rows = rows.filter(lot_id=lot_id)
+    period_expr = TruncMonth('day') if period == 'month' else F('day')
+    grouped = rows.annotate(period=period_expr).order_by('period', 'lot_id', 'payment_method').values(
+        'period', 'lot_id', 'lot__lot_name', 'payment_method',
+    ).annotate(**{f'sum_{total}': Sum(total) for total in TOTALS})
+
+    lines = []
+    grand = dict.fromkeys(TOTALS, 0)
+    for row in grouped:
+        line = {'period': row['period'].isoformat(), 'lot_id': row['lot_id'], 'lot_name': row['lot__lot_name'],
+                'payment_method': row['payment_method']}
+        for total in TOTALS:
+            value = row[f'sum_{total}'] or 0
+            grand[total] += value
+            line[total] = _money(value) if total.endswith('_amount') else value
+        lines.append(line)
+    return lines, {total: (_money(value) if total.endswith('_amount') else value) for total, value in grand.items()}
@@ -11,19 +11,33 @@ Events:
 10. Owner Assigned New Employee → Owner
 
 Additionally handles:
-- Employee workload counter synchronization for car wash bookings
+- Consistency audit journal
+- Employee workload counters for car wash bookings (incremental deltas)
+- Lot search index synchronization
+- Lot geo index synchronization
+- Map tile cluster synchronization
+- Employee dispatch index synchronization
+- Car wash roster synchronization
+- Car wash calendar cache invalidation
+- Car wash slot capacity ledger
+- Daily owner revenue rollup
+- Owner settlement ledger outbox
+- Lot rating summaries
+- Reviewable lots cache invalidation
+- Lot availability deltas (ws/lots/<lot_id>/)
+- Owner event stream
+- WebSocket token cache invalidation
 """
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
-from django.db import transaction
 from parking.notification_utils import send_ws_notification
 import logging
 
 logger = logging.getLogger(__name__)
 
 # Import models - use string references to avoid circular imports
-from parking.models import Booking, Payment, Carwash, CarWashBooking, Employee
+from parking.models import Booking, Payment, Carwash, CarWashBooking, Employee, P_Lot, OwnerProfile, P_Slot, Review
 
 # Signal receivers for notifications
 
@@ -40,7 +54,7 @@ def booking_status_changed(sender, instance, created, **kwargs):
             # Check if end_time has passed
             if instance.end_time and timezone.now() > instance.end_time:
                 send_ws_notification(
-                    instance.user.id,
+                    instance.user.auth_user_id,
                     "warning",
                     f"Your booking for Slot #{instance.slot.slot_id} has expired."
                 )
@@ -49,7 +63,7 @@ def booking_status_changed(sender, instance, created, **kwargs):
         # Event 6: Booking Declined by Admin
         if instance.status.upper() == "CANCELLED_BY_ADMIN":
             send_ws_notification(
-                instance.user.id,
+                instance.user.auth_user_id,
                 "warning",
                 "Admin declined your booking request."
             )
@@ -60,7 +74,7 @@ def booking_status_changed(sender, instance, created, **kwargs):
             # Send to owner
             if instance.lot and instance.lot.owner:
                 send_ws_notification(
-                    instance.lot.owner.auth_user.id,
+                    instance.lot.owner.auth_user_id,
                     "info",
                     f"New booking received for Lot #{instance.lot.lot_id}."
                 )
@@ -70,24 +84,31 @@ def booking_status_changed(sender, instance, created, **kwargs):
         logger.error(f"❌ Error in booking_status_changed signal: {str(e)}")
 
 
+@receiver(post_init, sender=Payment)
+def remember_payment_status(sender, instance, **kwargs):
+    instance._notify_status = _loaded(instance, 'status')
+
+
 @receiver(post_save, sender=Payment)
-def payment_status_changed(sender, instance, **kwargs):
+def payment_status_changed(sender, instance, created, **kwargs):
     """
     Listen for Payment model changes.
     Handles: Cash payment verified
     """
     try:
-        # Event 7: Cash Payment Verified
-        if (instance.method.upper() == "CASH" and 
-            instance.status.upper() == "VERIFIED"):
+        previous = None if created else instance._notify_status
+        instance._notify_status = (instance.status,)
+        # Event 7: Cash Payment Verified (PENDING → SUCCESS)
+        if (instance.payment_method == "Cash" and
+            instance.status == "SUCCESS" and previous == ("PENDING",)):
             
             if instance.booking and instance.booking.user:
                 send_ws_notification(
-                    instance.booking.user.id,
+                    instance.booking.user.auth_user_id,
                     "success",
                     "Your cash payment has been verified. Booking activated!"
                 )
-                logger.info(f"✅ Sent payment verified notification for payment {instance.payment_id}")
+                logger.info(f"✅ Sent payment verified notification for payment {instance.pay_id}")
 
     except Exception as e:
         logger.error(f"❌ Error in payment_status_changed signal: {str(e)}")
@@ -105,7 +126,7 @@ def carwash_status_changed(sender, instance, **kwargs):
             
             if instance.booking and instance.booking.user:
                 send_ws_notification(
-                    instance.booking.user.id,
+                    instance.booking.user.auth_user_id,
                     "success",
                     "Your car wash service has been completed!"
                 )
@@ -136,159 +157,714 @@ def carwash_status_changed(sender, instance, **kwargs):
 #         logger.error(f"❌ Error in employee_assigned signal: {str(e)}")
 
 
+# ============================================================
+# CONSISTENCY AUDIT JOURNAL
+# ============================================================
+# Registered before the workload receivers so a car wash's loaded snapshot
+# still names its previous employee. See parking/audit.py.
+
+def _journal(*entries):
+    from parking.audit import mark
+    try:
+        mark(*entries)
+    except Exception as e:
+        logger.error(f"❌ Error journaling rows for the consistency audit: {str(e)}")
+
+
+@receiver(post_save, sender=P_Slot)
+@receiver(post_delete, sender=P_Slot)
+def journal_slot(sender, instance, **kwargs):
+    _journal(('lot', instance.lot_id), ('slot', instance.pk))
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def journal_booking(sender, instance, **kwargs):
+    _journal(('slot', instance.slot_id), ('booking', instance.pk))
+
+
+def _previous_employee(instance):
+    snapshot = getattr(instance, '_workload_snapshot', None)
+    if snapshot and snapshot[0] != instance.employee_id:
+        return snapshot[0]
+    return None
+
+
+@receiver(post_save, sender=Carwash)
+@receiver(post_delete, sender=Carwash)
+def journal_addon_carwash(sender, instance, **kwargs):
+    _journal(('booking', instance.booking_id), ('employee', instance.employee_id),
+             ('employee', _previous_employee(instance)))
+
+
+@receiver(post_save, sender=CarWashBooking)
+@receiver(post_delete, sender=CarWashBooking)
+def journal_carwash_booking(sender, instance, **kwargs):
+    _journal(('employee', instance.employee_id), ('employee', _previous_employee(instance)))
+
+
+@receiver(post_save, sender=Employee)
+def journal_employee(sender, instance, **kwargs):
+    _journal(('employee', instance.pk))
+
+
+@receiver(post_save, sender=Payment)
+def journal_payment(sender, instance, **kwargs):
+    _journal(('payment', instance.pk))
+
+
 # ============================================================
 # EMPLOYEE WORKLOAD SYNCHRONIZATION SIGNALS
 # ============================================================
 
-def recalculate_employee_workload(employee):
-    """
-    Recalculate employee workload from scratch based on actual active assignments.
-    This ensures consistency even if increment/decrement logic has bugs.
-    
-    Returns the employee with updated workload (not saved yet).
-    """
-    if not employee:
+# Each row remembers its (employee, status) as loaded; after a save or delete the
+# workload counters move by ±1 only if the row entered or left an active
+# assignment. See parking/workload.py.
+
+def _loaded(instance, *fields):
+    """Field values as loaded, without triggering queries for deferred fields"""
+    if any(field not in instance.__dict__ for field in fields):
         return None
-    
-    # Count active STANDALONE car wash bookings
-    standalone_count = CarWashBooking.objects.filter(
-        employee=employee,
-        status__in=['pending', 'confirmed', 'in_progress']
-    ).count()
-    
-    # Count active ADD-ON car wash services
-    addon_count = Carwash.objects.filter(
-        employee=employee,
-        booking__status__in=['booked', 'active']
-    ).count()
-    
-    total_active = standalone_count + addon_count
-    
-    # Update employee
-    old_count = employee.current_assignments
-    employee.current_assignments = total_active
-    
-    # Update availability status
-    if total_active >= 3:
-        employee.availability_status = 'busy'
-    else:
-        employee.availability_status = 'available'
-    
-    if old_count != total_active:
-        logger.info(f"🔄 Recalculated workload for {employee.firstname} {employee.lastname}: {old_count} → {total_active}")
-    
-    return employee
+    return tuple(instance.__dict__[field] for field in fields)
+
+
+@receiver(post_init, sender=CarWashBooking)
+@receiver(post_init, sender=Carwash)
+def remember_carwash_assignment(sender, instance, **kwargs):
+    instance._workload_snapshot = _loaded(instance, 'employee_id', 'status')
+
+
+@receiver(post_init, sender=Booking)
+def remember_booking_status(sender, instance, **kwargs):
+    instance._workload_snapshot = _loaded(instance, 'status')
 
 
 @receiver(post_save, sender=CarWashBooking)
-def sync_employee_workload_on_carwash_save(sender, instance, created, **kwargs):
-    """
-    Sync employee workload when CarWashBooking is created or updated.
-    This ensures consistency by recalculating from actual data.
-    """
-    if instance.employee:
-        try:
-            with transaction.atomic():
-                employee = Employee.objects.select_for_update().get(pk=instance.employee.pk)
-                recalculated = recalculate_employee_workload(employee)
-                if recalculated:
-                    recalculated.save()
-        except Employee.DoesNotExist:
-            logger.warning(f"Employee {instance.employee.pk} not found during workload sync")
+def update_workload_on_carwash_save(sender, instance, created, **kwargs):
+    from parking.workload import apply_transition, standalone_counts
+    try:
+        old = None if created else instance._workload_snapshot
+        current = (instance.employee_id, instance.status)
+        if old is None and not created:
+            return  # loaded with deferred fields; left to reconcile_workloads()
+        if old != current:
+            old_employee, old_status = old or (None, None)
+            apply_transition(
+                (old_employee, standalone_counts(old_employee, old_status)),
+                (instance.employee_id, standalone_counts(*current)),
+            )
+        instance._workload_snapshot = current
+    except Exception as e:
+        logger.error(f"❌ Error updating workload for car wash booking {instance.pk}: {str(e)}")
 
 
 @receiver(post_delete, sender=CarWashBooking)
-def sync_employee_workload_on_carwash_delete(sender, instance, **kwargs):
-    """
-    Sync employee workload when CarWashBooking is deleted.
-    """
-    if instance.employee:
-        try:
-            with transaction.atomic():
-                employee = Employee.objects.select_for_update().get(pk=instance.employee.pk)
-                recalculated = recalculate_employee_workload(employee)
-                if recalculated:
-                    recalculated.save()
-        except Employee.DoesNotExist:
-            logger.warning(f"Employee {instance.employee.pk} not found during workload sync")
+def update_workload_on_carwash_delete(sender, instance, **kwargs):
+    from parking.workload import apply_delta, standalone_counts
+    try:
+        if standalone_counts(instance.employee_id, instance.status):
+            apply_delta(instance.employee_id, -1)
+    except Exception as e:
+        logger.error(f"❌ Error updating workload for deleted car wash booking {instance.pk}: {str(e)}")
+
+
+def _parent_booking_active(carwash):
+    from parking.workload import booking_is_active
+    parent_status = Booking.objects.filter(pk=carwash.booking_id).values_list('status', flat=True).first()
+    return booking_is_active(parent_status)
 
 
 @receiver(post_save, sender=Carwash)
-def sync_employee_workload_on_addon_save(sender, instance, created, **kwargs):
-    """
-    Sync employee workload when add-on Carwash is created or updated.
-    """
-    if instance.employee:
-        try:
-            with transaction.atomic():
-                employee = Employee.objects.select_for_update().get(pk=instance.employee.pk)
-                recalculated = recalculate_employee_workload(employee)
-                if recalculated:
-                    recalculated.save()
-        except Employee.DoesNotExist:
-            logger.warning(f"Employee {instance.employee.pk} not found during workload sync")
+def update_workload_on_addon_save(sender, instance, created, **kwargs):
+    from parking.workload import addon_counts, apply_transition
+    try:
+        old = None if created else instance._workload_snapshot
+        current = (instance.employee_id, instance.status)
+        if old is None and not created:
+            return  # loaded with deferred fields; left to reconcile_workloads()
+        if old != current:
+            # The parent's status is the same before and after this save
+            parent_active = _parent_booking_active(instance)
+            old_employee, old_status = old or (None, None)
+            apply_transition(
+                (old_employee, addon_counts(old_employee, old_status, parent_active)),
+                (instance.employee_id, addon_counts(*current, parent_active)),
+            )
+        instance._workload_snapshot = current
+    except Exception as e:
+        logger.error(f"❌ Error updating workload for add-on car wash {instance.pk}: {str(e)}")
 
 
 @receiver(post_delete, sender=Carwash)
-def sync_employee_workload_on_addon_delete(sender, instance, **kwargs):
-    """
-    Sync employee workload when add-on Carwash is deleted.
-    """
-    if instance.employee:
-        try:
-            with transaction.atomic():
-                employee = Employee.objects.select_for_update().get(pk=instance.employee.pk)
-                recalculated = recalculate_employee_workload(employee)
-                if recalculated:
-                    recalculated.save()
-        except Employee.DoesNotExist:
-            logger.warning(f"Employee {instance.employee.pk} not found during workload sync")
-
-
-@receiver(pre_save, sender=CarWashBooking)
-def handle_employee_reassignment(sender, instance, **kwargs):
-    """
-    Handle employee reassignment: recalculate both old and new employee workloads.
-    """
-    if instance.pk:  # Only for updates, not creates
-        try:
-            old_instance = CarWashBooking.objects.get(pk=instance.pk)
-            old_employee = old_instance.employee
-            new_employee = instance.employee
-            
-            # If employee changed, recalculate both
-            if old_employee and new_employee and old_employee.pk != new_employee.pk:
-                logger.info(f"🔄 Employee reassignment: {old_employee} → {new_employee}")
-                
-                # Recalculate old employee (after the save completes)
-                # This will be handled by post_save signal
-                
-        except CarWashBooking.DoesNotExist:
-            pass
-
-
-@receiver(pre_save, sender=Carwash)
-def handle_addon_employee_reassignment(sender, instance, **kwargs):
-    """
-    Handle employee reassignment for add-on car wash services.
-    """
-    if instance.pk:  # Only for updates, not creates
-        try:
-            old_instance = Carwash.objects.get(pk=instance.pk)
-            old_employee = old_instance.employee
-            new_employee = instance.employee
-            
-            # If employee changed, also sync the old employee
-            if old_employee and new_employee and old_employee.pk != new_employee.pk:
-                logger.info(f"🔄 Add-on employee reassignment: {old_employee} → {new_employee}")
-                
-                # Sync old employee (new employee will be synced by post_save)
-                with transaction.atomic():
-                    old_emp = Employee.objects.select_for_update().get(pk=old_employee.pk)
-                    recalculated = recalculate_employee_workload(old_emp)
-                    if recalculated:
-                        recalculated.save()
-                        
-        except Carwash.DoesNotExist:
-            pass
+def update_workload_on_addon_delete(sender, instance, **kwargs):
+    from parking.workload import addon_counts, apply_delta
+    try:
+        # Cascades delete car washes before their booking, so the parent is still readable
+        if addon_counts(instance.employee_id, instance.status, _parent_booking_active(instance)):
+            apply_delta(instance.employee_id, -1)
+    except Exception as e:
+        logger.error(f"❌ Error updating workload for deleted add-on car wash {instance.pk}: {str(e)}")
+
+
+@receiver(post_save, sender=Booking)
+def update_workload_on_booking_status(sender, instance, created, **kwargs):
+    """A slot booking ending (or reopening) releases (or retakes) its add-on car wash employees"""
+    from django.db.models import Count
+    from parking.workload import ADDON_ACTIVE_STATUSES, apply_delta, booking_is_active
+    try:
+        old = instance._workload_snapshot
+        instance._workload_snapshot = (instance.status,)
+        if created or old is None:
+            return
+        was_active, is_active = booking_is_active(old[0]), booking_is_active(instance.status)
+        if was_active == is_active:
+            return
+        sign = 1 if is_active else -1
+        assigned = Carwash.objects.filter(
+            booking_id=instance.pk, employee__isnull=False, status__in=ADDON_ACTIVE_STATUSES,
+        ).values('employee').annotate(count=Count('pk'))
+        for row in assigned:
+            apply_delta(row['employee'], sign * row['count'])
+    except Exception as e:
+        logger.error(f"❌ Error updating workload for booking {instance.pk}: {str(e)}")
+
+
+# ============================================================
+# LOT SEARCH INDEX SYNCHRONIZATION
+# ============================================================
+
+@receiver(post_save, sender=P_Lot)
+def index_lot_for_search(sender, instance, **kwargs):
+    """Keep the lot search index in step with lot name/address edits"""
+    from parking.search import get_lot_search_index
+    try:
+        get_lot_search_index().index_lot(instance)
+    except Exception as e:
+        logger.error(f"❌ Failed to index lot {instance.pk} for search: {str(e)}")
+
+
+@receiver(post_delete, sender=P_Lot)
+def remove_lot_from_search(sender, instance, **kwargs):
+    """Drop deleted lots from the lot search index"""
+    from parking.search import get_lot_search_index
+    try:
+        get_lot_search_index().remove_lot(instance.pk)
+    except Exception as e:
+        logger.error(f"❌ Failed to remove lot {instance.pk} from search index: {str(e)}")
+
+
+# ============================================================
+# LOT GEO INDEX SYNCHRONIZATION
+# ============================================================
+
+@receiver(post_save, sender=P_Lot)
+def update_lot_geo_index(sender, instance, **kwargs):
+    """Move a lot in the nearby-lots index when its coordinates change"""
+    from parking.geo import get_lot_geo_index
+    try:
+        get_lot_geo_index().update_lot(instance)
+    except Exception as e:
+        logger.error(f"❌ Failed to update geo index for lot {instance.pk}: {str(e)}")
+
+
+@receiver(post_delete, sender=P_Lot)
+def remove_lot_from_geo_index(sender, instance, **kwargs):
+    from parking.geo import get_lot_geo_index
+    try:
+        get_lot_geo_index().remove_lot(instance.pk)
+    except Exception as e:
+        logger.error(f"❌ Failed to remove lot {instance.pk} from geo index: {str(e)}")
+
+
+@receiver(post_save, sender=OwnerProfile)
+def refresh_owner_lots_in_geo_index(sender, instance, created, **kwargs):
+    """Approving or declining an owner shows or hides all of their lots"""
+    if created:
+        return
+    from parking.geo import get_lot_geo_index
+    try:
+        index = get_lot_geo_index()
+        for lot in instance.lot_owner.all():
+            lot.owner = instance
+            index.update_lot(lot)
+    except Exception as e:
+        logger.error(f"❌ Failed to refresh geo index for owner {instance.pk}: {str(e)}")
+
+
+# ============================================================
+# MAP TILE CLUSTER SYNCHRONIZATION
+# ============================================================
+
+def refresh_lot_tiles(lot_ids):
+    from parking.tiles import get_lot_tile_grid
+    try:
+        get_lot_tile_grid().refresh_lots(lot_ids)
+    except Exception as e:
+        logger.error(f"❌ Failed to refresh map tiles for lots {list(lot_ids)}: {str(e)}")
+
+
+@receiver(post_save, sender=P_Lot)
+def update_lot_tiles(sender, instance, **kwargs):
+    refresh_lot_tiles([instance.pk])
+
+
+@receiver(post_delete, sender=P_Lot)
+def remove_lot_from_tiles(sender, instance, **kwargs):
+    from parking.tiles import get_lot_tile_grid
+    try:
+        get_lot_tile_grid().remove_lot(instance.pk)
+    except Exception as e:
+        logger.error(f"❌ Failed to remove lot {instance.pk} from map tiles: {str(e)}")
+
+
+@receiver(post_save, sender=P_Slot)
+@receiver(post_delete, sender=P_Slot)
+def update_lot_tiles_on_slot_change(sender, instance, **kwargs):
+    """Slot bookings/releases and price edits change a cluster's free count and min price"""
+    refresh_lot_tiles([instance.lot_id])
+
+
+@receiver(post_save, sender=OwnerProfile)
+def refresh_owner_lots_in_tiles(sender, instance, created, **kwargs):
+    if created:
+        return
+    refresh_lot_tiles(instance.lot_owner.values_list('lot_id', flat=True))
+
+
+# ============================================================
+# EMPLOYEE DISPATCH INDEX SYNCHRONIZATION
+# ============================================================
+
+@receiver(post_save, sender=Employee)
+def update_employee_dispatch_index(sender, instance, **kwargs):
+    """Keep the dispatch index in step with employee location and availability"""
+    from parking.dispatch import get_dispatch_index
+    try:
+        get_dispatch_index().update_employee(instance)
+    except Exception as e:
+        logger.error(f"❌ Failed to update dispatch index for employee {instance.pk}: {str(e)}")
+
+
+@receiver(post_delete, sender=Employee)
+def remove_employee_from_dispatch_index(sender, instance, **kwargs):
+    from parking.dispatch import get_dispatch_index
+    try:
+        get_dispatch_index().remove_employee(instance.pk)
+    except Exception as e:
+        logger.error(f"❌ Failed to remove employee {instance.pk} from dispatch index: {str(e)}")
+
+
+# ============================================================
+# CAR WASH ROSTER SYNCHRONIZATION
+# ============================================================
+
+@receiver(post_save, sender=CarWashBooking)
+def update_carwash_roster(sender, instance, **kwargs):
+    """Keep employee rosters in step with booking time, employee and status changes"""
+    from parking.roster import get_roster_index
+    try:
+        get_roster_index().update_booking(instance)
+    except Exception as e:
+        logger.error(f"❌ Failed to update roster for car wash booking {instance.pk}: {str(e)}")
+
+
+@receiver(post_delete, sender=CarWashBooking)
+def remove_from_carwash_roster(sender, instance, **kwargs):
+    from parking.roster import get_roster_index
+    try:
+        get_roster_index().remove_booking(instance.pk)
+    except Exception as e:
+        logger.error(f"❌ Failed to remove car wash booking {instance.pk} from roster: {str(e)}")
+
+
+@receiver(post_save, sender=Employee)
+def refresh_roster_on_employee_change(sender, instance, **kwargs):
+    """Going offline or moving to another owner changes who can be rostered"""
+    from parking.roster import get_roster_index
+    try:
+        get_roster_index().update_employee(instance)
+    except Exception as e:
+        logger.error(f"❌ Failed to refresh roster for employee {instance.pk}: {str(e)}")
+
+
+# ============================================================
+# CAR WASH CALENDAR CACHE INVALIDATION
+# ============================================================
+
+@receiver(post_init, sender=CarWashBooking)
+def remember_calendar_slot(sender, instance, **kwargs):
+    instance._calendar_slot = _loaded(instance, 'lot_id', 'scheduled_time')
+
+
+@receiver(post_save, sender=CarWashBooking)
+@receiver(post_delete, sender=CarWashBooking)
+def invalidate_carwash_calendar(sender, instance, **kwargs):
+    """Drop the cached calendar days the booking was and now is scheduled on"""
+    from django.db import transaction
+    from parking.carwash_calendar import invalidate
+    try:
+        slots = {(instance.lot_id, instance.scheduled_time)}
+        if instance._calendar_slot is not None:
+            slots.add(instance._calendar_slot)
+        instance._calendar_slot = (instance.lot_id, instance.scheduled_time)
+
+        def drop():
+            for lot_id, scheduled_time in slots:
+                invalidate(lot_id, scheduled_time)
+        # Again after commit, in case a reader re-cached the old counts meanwhile
+        drop()
+        transaction.on_commit(drop)
+    except Exception as e:
+        logger.error(f"❌ Failed to invalidate car wash calendar for booking {instance.pk}: {str(e)}")
+
+
+# ============================================================
+# CAR WASH SLOT CAPACITY LEDGER
+# ============================================================
+
+@receiver(post_save, sender=CarWashBooking)
+def sync_carwash_slot_capacity(sender, instance, created, **kwargs):
+    """Release or take slot capacity when a booking ends, reopens or moves"""
+    from parking.carwash_capacity import sync_booking
+    if created and instance.capacity_slot_id is not None:
+        return  # reserved before the insert
+    try:
+        sync_booking(instance)
+    except Exception as e:
+        logger.error(f"❌ Failed to sync slot capacity for car wash booking {instance.pk}: {str(e)}")
+
+
+@receiver(post_delete, sender=CarWashBooking)
+def release_carwash_slot_capacity(sender, instance, **kwargs):
+    from parking.carwash_capacity import release_deleted
+    try:
+        release_deleted(instance.capacity_slot_id)
+    except Exception as e:
+        logger.error(f"❌ Failed to release slot capacity for car wash booking {instance.pk}: {str(e)}")
+
+
+@receiver(post_save, sender=P_Lot)
+def apply_carwash_slot_capacity(sender, instance, created, **kwargs):
+    from parking.carwash_calendar import invalidate_lot
+    from parking.carwash_capacity import apply_lot_capacity
+    if created:
+        return
+    try:
+        apply_lot_capacity(instance)
+        invalidate_lot(instance.pk)
+    except Exception as e:
+        logger.error(f"❌ Failed to apply car wash slot capacity for lot {instance.pk}: {str(e)}")
+
+
+# ============================================================
+# DAILY OWNER REVENUE ROLLUP
+# ============================================================
+
+@receiver(post_init, sender=CarWashBooking)
+def remember_revenue_contribution(sender, instance, **kwargs):
+    from parking.revenue_rollup import SNAPSHOT_FIELDS
+    instance._revenue_snapshot = _loaded(instance, *SNAPSHOT_FIELDS)
+
+
+@receiver(post_save, sender=CarWashBooking)
+def update_revenue_rollup(sender, instance, created, **kwargs):
+    """Apply the change in the booking's contribution to the daily rollup"""
+    from parking.revenue_rollup import SNAPSHOT_FIELDS, apply_transition
+    try:
+        old = None if created else instance._revenue_snapshot
+        if old is None and not created:
+            return  # loaded with deferred fields; left to rebuild_revenue_rollup
+        current = tuple(getattr(instance, field) for field in SNAPSHOT_FIELDS)
+        if old != current:
+            apply_transition(old, current)
+        instance._revenue_snapshot = current
+    except Exception as e:
+        logger.error(f"❌ Failed to update revenue rollup for car wash booking {instance.pk}: {str(e)}")
+
+
+@receiver(post_delete, sender=CarWashBooking)
+def remove_from_revenue_rollup(sender, instance, **kwargs):
+    from parking.revenue_rollup import SNAPSHOT_FIELDS, apply_transition
+    try:
+        apply_transition(tuple(getattr(instance, field) for field in SNAPSHOT_FIELDS), None)
+    except Exception as e:
+        logger.error(f"❌ Failed to remove car wash booking {instance.pk} from revenue rollup: {str(e)}")
+
+
+# ============================================================
+# OWNER SETTLEMENT LEDGER OUTBOX
+# ============================================================
+
+@receiver(post_init, sender=Payment)
+def remember_settlement_contribution(sender, instance, **kwargs):
+    from parking.settlement import SNAPSHOT_FIELDS
+    instance._settlement_snapshot = _loaded(instance, *SNAPSHOT_FIELDS)
+
+
+@receiver(post_save, sender=Payment)
+def append_settlement_outbox(sender, instance, created, **kwargs):
+    """Append the payment's settlement change to the outbox (drained after commit)"""
+    from parking.settlement import SNAPSHOT_FIELDS, record_changes
+    try:
+        old = None if created else instance._settlement_snapshot
+        if old is None and not created:
+            return  # loaded with deferred fields; left to backfill_settlement_ledger
+        current = tuple(getattr(instance, field) for field in SNAPSHOT_FIELDS)
+        if old != current:
+            record_changes([(instance.pk, old, current)])
+        instance._settlement_snapshot = current
+    except Exception as e:
+        logger.error(f"❌ Failed to append settlement outbox row for payment {instance.pk}: {str(e)}")
+
+
+# ============================================================
+# LOT RATING SUMMARY
+# ============================================================
+
+@receiver(post_init, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    instance._rating_snapshot = _loaded(instance, 'lot_id', 'rating')
+
+
+@receiver(post_save, sender=Review)
+def update_lot_rating_summary(sender, instance, created, **kwargs):
+    """Move the review's rating into (or between) the lot rating summaries"""
+    from parking.review_summary import apply_transition
+    try:
+        old = None if created else instance._rating_snapshot
+        if old is None and not created:
+            return  # loaded with deferred fields; left to review_summary.rebuild()
+        current = (instance.lot_id, instance.rating)
+        if old != current:
+            apply_transition(old, current)
+        instance._rating_snapshot = current
+    except Exception as e:
+        logger.error(f"❌ Failed to update rating summary for review {instance.pk}: {str(e)}")
+
+
+@receiver(post_delete, sender=Review)
+def remove_from_lot_rating_summary(sender, instance, **kwargs):
+    from parking.review_summary import apply_transition
+    try:
+        apply_transition((instance.lot_id, instance.rating), None)
+    except Exception as e:
+        logger.error(f"❌ Failed to remove review {instance.pk} from rating summary: {str(e)}")
+
+
+# ============================================================
+# REVIEWABLE LOTS CACHE
+# ============================================================
+
+@receiver(post_init, sender=Booking)
+@receiver(post_init, sender=CarWashBooking)
+def remember_reviewable_lot(sender, instance, **kwargs):
+    instance._reviewable_snapshot = _loaded(instance, 'lot_id', 'status')
+
+
+def _completed(snapshot):
+    return snapshot is not None and (snapshot[1] or '').lower() == 'completed'
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_save, sender=CarWashBooking)
+@receiver(post_delete, sender=Booking)
+@receiver(post_delete, sender=CarWashBooking)
+def invalidate_reviewable_lots(sender, instance, **kwargs):
+    """Drop the user's cached reviewable lots when a booking moves into or out of 'completed'"""
+    from django.db import transaction
+    from parking.models import UserProfile
+    from parking.reviewable_lots import invalidate
+    try:
+        old = getattr(instance, '_reviewable_snapshot', None)
+        current = (instance.lot_id, instance.status)
+        instance._reviewable_snapshot = current
+        if kwargs.get('signal') is post_delete:
+            changed = _completed(current)
+        else:
+            changed = (_completed(old) or _completed(current)) and old != current
+        if not changed:
+            return
+        auth_user_id = UserProfile.objects.filter(pk=instance.user_id).values_list('auth_user_id', flat=True).first()
+        if auth_user_id is None:
+            return
+        invalidate(auth_user_id)
+        # Again after commit, in case a reader re-cached the old list meanwhile
+        transaction.on_commit(lambda: invalidate(auth_user_id))
+    except Exception as e:
+        logger.error(f"❌ Failed to invalidate reviewable lots for {sender.__name__} {instance.pk}: {str(e)}")
+
+
+# ============================================================
+# LOT AVAILABILITY DELTAS
+# ============================================================
+# The one publish point for ws/lots/<lot_id>/: every booking write path
+# saves the Booking and/or its slot. See parking/lot_availability.py.
+
+@receiver(post_init, sender=Booking)
+def remember_booked_slot(sender, instance, **kwargs):
+    instance._availability_snapshot = _loaded(instance, 'lot_id', 'slot_id', 'status', 'end_time')
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def publish_booking_availability(sender, instance, created=False, **kwargs):
+    """Publish the slot (and the previous slot) of a booking that was created, deleted or changed status/end_time"""
+    from parking.lot_availability import slot_changed
+    try:
+        old = getattr(instance, '_availability_snapshot', None)
+        current = (instance.lot_id, instance.slot_id, instance.status, instance.end_time)
+        instance._availability_snapshot = current
+        if old == current and not created and kwargs.get('signal') is not post_delete:
+            return
+        slot_changed(instance.lot_id, instance.slot_id)
+        if old is not None and old[1] != instance.slot_id:
+            slot_changed(old[0], old[1])
+    except Exception as e:
+        logger.error(f"❌ Failed to publish availability for booking {instance.pk}: {str(e)}")
+
+
+@receiver(post_init, sender=P_Slot)
+def remember_slot_availability(sender, instance, **kwargs):
+    instance._availability_snapshot = _loaded(instance, 'is_available', 'vehicle_type', 'price')
+
+
+@receiver(post_save, sender=P_Slot)
+@receiver(post_delete, sender=P_Slot)
+def publish_slot_availability(sender, instance, created=False, **kwargs):
+    """Publish a slot that was added, removed or changed availability, vehicle type or price"""
+    from parking.lot_availability import slot_changed
+    try:
+        old = getattr(instance, '_availability_snapshot', None)
+        current = (instance.is_available, instance.vehicle_type, instance.price)
+        instance._availability_snapshot = current
+        if old == current and not created and kwargs.get('signal') is not post_delete:
+            return
+        slot_changed(instance.lot_id, instance.slot_id, created=created)
+    except Exception as e:
+        logger.error(f"❌ Failed to publish availability for slot {instance.pk}: {str(e)}")
+
+
+# ============================================================
+# OWNER EVENT STREAM
+# ============================================================
+# Appended in the same transaction as the change. See parking/owner_events.py.
+
+def _owner_of_lot(lot_id):
+    if lot_id is None:
+        return None
+    return P_Lot.objects.filter(pk=lot_id).values_list('owner_id', flat=True).first()
+
+
+def _owner_of_booking(booking_id):
+    if booking_id is None:
+        return None
+    return Booking.objects.filter(pk=booking_id).values_list('lot__owner_id', flat=True).first()
+
+
+@receiver(post_init, sender=Booking)
+def remember_booking_event_state(sender, instance, **kwargs):
+    instance._owner_event_snapshot = _loaded(instance, 'status')
+
+
+@receiver(post_save, sender=Booking)
+def record_booking_event(sender, instance, created, **kwargs):
+    """booking_created for new bookings, booking_status when the status changes"""
+    from parking.owner_events import record
+    try:
+        old = None if created else instance._owner_event_snapshot
+        instance._owner_event_snapshot = (instance.status,)
+        if created:
+            record(_owner_of_lot(instance.lot_id), 'booking_created',
+                   booking_id=instance.booking_id, lot_id=instance.lot_id, slot_id=instance.slot_id,
+                   status=instance.status, booking_type=instance.booking_type,
+                   vehicle_number=instance.vehicle_number, price=str(instance.price),
+                   start_time=instance.start_time.isoformat() if instance.start_time else None,
+                   end_time=instance.end_time.isoformat() if instance.end_time else None)
+        elif old is not None and old != (instance.status,):
+            record(_owner_of_lot(instance.lot_id), 'booking_status',
+                   booking_id=instance.booking_id, lot_id=instance.lot_id,
+                   status=instance.status, previous=old[0])
+    except Exception as e:
+        logger.error(f"❌ Failed to record owner event for booking {instance.pk}: {str(e)}")
+
+
+@receiver(post_init, sender=Payment)
+def remember_payment_event_state(sender, instance, **kwargs):
+    instance._owner_event_snapshot = _loaded(instance, 'status')
+
+
+@receiver(post_save, sender=Payment)
+def record_payment_event(sender, instance, created, **kwargs):
+    """payment_pending for new pending payments, payment_status when the status changes"""
+    from parking.owner_events import record
+    try:
+        old = None if created else instance._owner_event_snapshot
+        instance._owner_event_snapshot = (instance.status,)
+        if not created and (old is None or old == (instance.status,)):
+            return
+        if instance.booking_id:
+            owner_id = _owner_of_booking(instance.booking_id)
+        else:
+            owner_id = CarWashBooking.objects.filter(pk=instance.carwash_booking_id).values_list(
+                'lot__owner_id', flat=True).first()
+        data = dict(pay_id=instance.pay_id, booking_id=instance.booking_id,
+                    carwash_booking_id=instance.carwash_booking_id, payment_method=instance.payment_method,
+                    amount=str(instance.amount), status=instance.status)
+        if created and instance.status == 'PENDING':
+            record(owner_id, 'payment_pending', **data)
+        elif not created:
+            record(owner_id, 'payment_status', previous=old[0], **data)
+    except Exception as e:
+        logger.error(f"❌ Failed to record owner event for payment {instance.pk}: {str(e)}")
+
+
+@receiver(post_init, sender=Carwash)
+@receiver(post_init, sender=CarWashBooking)
+def remember_carwash_event_state(sender, instance, **kwargs):
+    fields = ('status', 'employee_id') if sender is Carwash else ('status', 'employee_id', 'payment_status')
+    instance._owner_event_snapshot = _loaded(instance, *fields)
+
+
+@receiver(post_save, sender=Carwash)
+@receiver(post_save, sender=CarWashBooking)
+def record_carwash_event(sender, instance, created, **kwargs):
+    """carwash_status, employee_assignment and (car wash bookings) payment events"""
+    from parking.owner_events import record
+    try:
+        old = None if created else instance._owner_event_snapshot
+        if sender is Carwash:
+            current = (instance.status, instance.employee_id)
+            owner_id = _owner_of_booking(instance.booking_id)
+            ids = dict(carwash_id=instance.carwash_id, booking_id=instance.booking_id)
+        else:
+            current = (instance.status, instance.employee_id, instance.payment_status)
+            owner_id = _owner_of_lot(instance.lot_id)
+            ids = dict(carwash_booking_id=instance.carwash_booking_id, lot_id=instance.lot_id)
+        instance._owner_event_snapshot = current
+        if owner_id is None or (old is None and not created) or old == current:
+            return
+
+        if created or old[0] != current[0]:
+            record(owner_id, 'carwash_status', status=current[0], previous=None if created else old[0], **ids)
+        if (created and current[1]) or (not created and old[1] != current[1]):
+            record(owner_id, 'employee_assignment', employee_id=current[1],
+                   previous_employee_id=None if created else old[1], **ids)
+        if sender is CarWashBooking:
+            if created and current[2] == 'pending':
+                record(owner_id, 'payment_pending', payment_method=instance.payment_method,
+                       amount=str(instance.price), status=current[2], **ids)
+            elif not created and old[2] != current[2]:
+                record(owner_id, 'payment_status', status=current[2], previous=old[2], **ids)
+    except Exception as e:
+        logger.error(f"❌ Failed to record owner event for {sender.__name__} {instance.pk}: {str(e)}")
+
+
+# ============================================================
+# WEBSOCKET TOKEN CACHE
+# ============================================================
 
+@receiver(post_delete, sender='authtoken.Token')
+def forget_websocket_token(sender, instance, **kwargs):
+    """A deleted token (logout) stops authenticating new sockets of this process at once"""
+    from parking.ws_auth import token_cache
+    token_cache.forget(instance.key)
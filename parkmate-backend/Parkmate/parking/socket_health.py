@@ -0,0 +1,232 @@
+"""
+Heartbeats, dead-connection reaping and per-user limits for the WebSocket consumers.
+
+A client that vanishes without a close frame (sleeping laptop, dropped
+mobile network, killed proxy) leaves a half-open socket behind: its
+consumer stays in its channel layer groups, a ticking /ws/time/ socket
+stays subscribed to the time ticker and a lot socket keeps the expiry
+watcher armed, until the TCP connection finally times out - if ever.
+
+Every consumer using HeartbeatMixin is registered with the process-wide
+`registry`. One reaper task per worker process (not one per socket, see
+parking/time_broadcast.py) wakes up every WS_HEARTBEAT_INTERVAL seconds and
+
+    sends {"type": "ping", "ts": <epoch ms>} to each socket; clients answer
+    {"type": "pong"} (any frame from the client counts as alive)
+
+    reaps sockets that sent nothing for WS_HEARTBEAT_TIMEOUT seconds: they
+    are closed with code 4408 and released at once - groups discarded, ticker
+    and watcher subscriptions dropped - without waiting for the transport
+
+A user may hold at most WS_MAX_SOCKETS_PER_USER sockets of each kind in a
+worker process. When a new one connects the oldest is closed with 4429
+(usually a tab reload whose old socket has not noticed yet). Sockets nobody
+is signed in on (the public time and lot channels) are not capped.
+
+`registry.metrics()` reports live sockets per kind, the largest groups and
+the reap/evict counters (GET /api/admin/websockets/metrics/).
+
+Settings:
+    WS_HEARTBEAT_INTERVAL    - seconds between pings (default 25)
+    WS_HEARTBEAT_TIMEOUT     - seconds of client silence before reaping (default 60)
+    WS_MAX_SOCKETS_PER_USER  - sockets of one kind per user and process (default 5, 0 = no limit)
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEARTBEAT_INTERVAL = 25
+DEFAULT_HEARTBEAT_TIMEOUT = 60
+DEFAULT_MAX_SOCKETS_PER_USER = 5
+
+CLOSE_UNRESPONSIVE = 4408
+CLOSE_TOO_MANY_SOCKETS = 4429
+
+
+def get_heartbeat_interval():
+    return getattr(settings, 'WS_HEARTBEAT_INTERVAL', DEFAULT_HEARTBEAT_INTERVAL)
+
+
+def get_heartbeat_timeout():
+    return getattr(settings, 'WS_HEARTBEAT_TIMEOUT', DEFAULT_HEARTBEAT_TIMEOUT)
+
+
+def get_max_sockets_per_user():
+    return getattr(settings, 'WS_MAX_SOCKETS_PER_USER', DEFAULT_MAX_SOCKETS_PER_USER)
+
+
+class SocketRegistry:
+    """Live sockets of this process, their groups, and the shared heartbeat task"""
+
+    def __init__(self):
+        self.sockets = {}  # consumer -> (kind, user key or None, connected at)
+        self.by_user = defaultdict(list)  # (kind, user key) -> consumers, oldest first
+        self.groups = defaultdict(set)  # group name -> consumers of this process
+        self.counters = Counter()
+        self.task = None
+
+    def register(self, consumer, kind, user_key=None):
+        """Track a socket; returns the sockets it pushes over the per-user limit (oldest first)"""
+        self.sockets[consumer] = (kind, user_key, time.monotonic())
+        consumer.last_seen = time.monotonic()
+        evicted = []
+        if user_key is not None:
+            same_user = self.by_user[(kind, user_key)]
+            same_user.append(consumer)
+            limit = get_max_sockets_per_user()
+            if limit:
+                evicted = same_user[:-limit]
+        self._start()
+        return evicted
+
+    def unregister(self, consumer):
+        kind, user_key, _ = self.sockets.pop(consumer, (None, None, None))
+        if user_key is not None:
+            same_user = self.by_user.get((kind, user_key), [])
+            if consumer in same_user:
+                same_user.remove(consumer)
+            if not same_user:
+                self.by_user.pop((kind, user_key), None)
+        if not self.sockets and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def joined(self, consumer, group):
+        self.groups[group].add(consumer)
+
+    def left(self, consumer, group):
+        members = self.groups.get(group)
+        if members is not None:
+            members.discard(consumer)
+            if not members:
+                del self.groups[group]
+
+    def _start(self):
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            self.task = loop.create_task(self._run())
+
+    async def sweep(self):
+        """Reap silent sockets and ping the rest; returns (pinged, reaped)"""
+        now = time.monotonic()
+        timeout = get_heartbeat_timeout()
+        ping = json.dumps({"type": "ping", "ts": int(time.time() * 1000)})
+        pinged = reaped = 0
+        for consumer in list(self.sockets):
+            if now - consumer.last_seen > timeout:
+                self.counters['reaped'] += 1
+                reaped += 1
+                await consumer.reap(CLOSE_UNRESPONSIVE)
+                continue
+            try:
+                await consumer.send(text_data=ping)
+                pinged += 1
+            except Exception as e:
+                # A socket closing mid-sweep; its disconnect() releases it
+                logger.error(f"❌ Error sending WebSocket heartbeat: {str(e)}")
+        if reaped:
+            logger.info(f"💀 Reaped {reaped} unresponsive WebSocket(s), {len(self.sockets)} left")
+        return pinged, reaped
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(get_heartbeat_interval())
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"❌ WebSocket heartbeat sweep failed: {str(e)}")
+
+    def metrics(self, top=10):
+        by_kind = Counter(kind for kind, _, _ in self.sockets.values())
+        largest = sorted(self.groups.items(), key=lambda item: len(item[1]), reverse=True)[:top]
+        return {
+            'sockets': len(self.sockets),
+            'sockets_by_kind': dict(by_kind),
+            'users': len(self.by_user),
+            'most_sockets_per_user': max((len(c) for c in self.by_user.values()), default=0),
+            'groups': len(self.groups),
+            'group_memberships': sum(len(members) for members in self.groups.values()),
+            'largest_groups': [{'group': name, 'members': len(members)} for name, members in largest],
+            'reaped': self.counters['reaped'],
+            'evicted': self.counters['evicted'],
+            'heartbeat_interval': get_heartbeat_interval(),
+            'heartbeat_timeout': get_heartbeat_timeout(),
+            'max_sockets_per_user': get_max_sockets_per_user(),
+            'heartbeat_running': bool(self.task and not self.task.done()),
+        }
+
+
+registry = SocketRegistry()
+
+
+def metrics():
+    return registry.metrics()
+
+
+class HeartbeatMixin:
+    """
+    Registers an AsyncWebsocketConsumer with the registry. Consumers call
+    track_socket() once accepted, join groups through join_group(), and call
+    release_socket() from disconnect(); reaping calls disconnect() itself.
+    """
+    socket_kind = None  # label in the gauge and the per-user limit
+
+    async def track_socket(self, user_key=None):
+        """Start heartbeats for this socket and close the user's oldest sockets over the limit"""
+        self.socket_released = False
+        for old in registry.register(self, self.socket_kind, user_key):
+            registry.counters['evicted'] += 1
+            logger.info(f"✂️ Closing oldest {self.socket_kind} WebSocket of {user_key} (limit reached)")
+            await old.reap(CLOSE_TOO_MANY_SOCKETS)
+
+    async def join_group(self, group):
+        await self.channel_layer.group_add(group, self.channel_name)
+        if not hasattr(self, "socket_groups"):
+            self.socket_groups = set()
+        self.socket_groups.add(group)
+        registry.joined(self, group)
+
+    async def release_socket(self):
+        """Leave every group joined through join_group() and stop tracking (idempotent)"""
+        self.socket_released = True
+        registry.unregister(self)
+        groups, self.socket_groups = getattr(self, "socket_groups", set()), set()
+        for group in groups:
+            registry.left(self, group)
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def reap(self, code):
+        """Close from the server side and clean up now rather than when the transport notices"""
+        if getattr(self, "socket_released", False):
+            return
+        try:
+            await self.close(code=code)
+        except Exception as e:
+            logger.error(f"❌ Error closing {self.socket_kind} WebSocket: {str(e)}")
+        await self.disconnect(code)
+        await self.release_socket()
+
+    async def websocket_receive(self, message):
+        """Any frame proves the client is alive; pongs stop here"""
+        self.last_seen = time.monotonic()
+        text = message.get("text")
+        if text and '"pong"' in text:
+            try:
+                if json.loads(text).get("type") == "pong":
+                    return
+            except (ValueError, AttributeError):
+                pass
+        await super().websocket_receive(message)
+
+    async def websocket_disconnect(self, message):
+        """Skip the consumer's disconnect() when reaping already ran it"""
+        if getattr(self, "socket_released", False):
+            from channels.exceptions import StopConsumer
+            raise StopConsumer()
+        await super().websocket_disconnect(message)
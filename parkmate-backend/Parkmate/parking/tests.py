@@ -1,3 +1,1808 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
 
-# Create your tests here.
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework.authtoken.models import Token
+
+from parking.models import (AuthUser, UserProfile, OwnerProfile, P_Lot, P_Slot, Review,
+                            Booking, Payment, Carwash, Carwash_type, ArchivedBooking, Employee,
+                            CarWashBooking, CarWashService, LotRatingSummary, Notification)
+from parking.search import FTS_TABLE, FTS5_INSERT_SQL, fts5_table_exists
+
+
+# Models mirrored into the replica by the sync fixture, in dependency order
+REPLICATED_MODELS = [AuthUser, UserProfile, OwnerProfile, P_Lot, LotRatingSummary, P_Slot, Review]
+
+
+def sync_replica():
+    """Copy the primary's parking rows into the replica (simulates replication catching up)"""
+    for model in reversed(REPLICATED_MODELS):
+        model.objects.using('replica').all().delete()
+    for model in REPLICATED_MODELS:
+        rows = list(model.objects.using('default').all())
+        model.objects.using('replica').bulk_create(rows)
+    if fts5_table_exists('default') and fts5_table_exists('replica'):
+        with connections['default'].cursor() as cursor:
+            cursor.execute(f'SELECT rowid, * FROM "{FTS_TABLE}"')
+            rows = cursor.fetchall()
+        with connections['replica'].cursor() as cursor:
+            cursor.execute(f'DELETE FROM "{FTS_TABLE}"')
+            for row in rows:
+                cursor.execute(FTS5_INSERT_SQL, list(row))
+
+
+def make_user(username, role='User'):
+    auth_user = AuthUser.objects.create_user(username=username, password='pass12345', role=role)
+    token = Token.objects.create(user=auth_user)
+    return auth_user, token
+
+
+def make_owner_lot(username='owner', lot_name='Marine Drive Lot', **lot_fields):
+    owner_user, owner_token = make_user(username, role='Owner')
+    owner = OwnerProfile.objects.create(
+        auth_user=owner_user, firstname='Olive', lastname='Owner', phone='9876543210',
+        streetname='MG Road', city='Kochi', state='Kerala', pincode='682001',
+        verification_status=OwnerProfile.STATUS_APPROVED,
+    )
+    fields = {'streetname': 'Marine Drive', 'city': 'Kochi', 'state': 'Kerala',
+              'pincode': '682031', 'total_slots': 0}
+    fields.update(lot_fields)
+    lot = P_Lot.objects.create(owner=owner, lot_name=lot_name, **fields)
+    return owner, owner_token, lot
+
+
+def make_user_profile(username):
+    auth_user, token = make_user(username)
+    profile = UserProfile.objects.create(
+        auth_user=auth_user, firstname='Rita', lastname='Rider', phone='9876543211',
+        vehicle_number='KL-07-AB-1234', vehicle_type='Sedan',
+    )
+    return profile, token
+
+
+def api_client(token):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        _, _, self.lot = make_owner_lot('router_owner')
+        _, self.reviewer_token = make_user_profile('router_reviewer')
+        _, self.reader_token = make_user('router_reader')
+        sync_replica()
+
+    def client_for(self, token):
+        return api_client(token)
+
+    def test_read_heavy_get_is_served_from_replica(self):
+        P_Lot.objects.create(
+            owner=self.lot.owner, lot_name='Lagging Lot', streetname='Broadway',
+            city='Kochi', state='Kerala', pincode='682031', total_slots=0,
+        )
+        response = self.client_for(self.reader_token).get('/api/lots/')
+        self.assertEqual([lot['lot_name'] for lot in response.data], ['Marine Drive Lot'])
+
+        sync_replica()
+        response = self.client_for(self.reader_token).get('/api/lots/')
+        self.assertEqual(len(response.data), 2)
+
+    def test_writer_reads_own_write_during_sticky_window(self):
+        writer = self.client_for(self.reviewer_token)
+        response = writer.post('/api/reviews/', {
+            'lot': self.lot.lot_id, 'rating': 4, 'review_desc': 'Easy to find', 'review_type': 'SLOT',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        # The writer is pinned to the primary and sees the new review at once
+        self.assertEqual(len(writer.get('/api/reviews/').data), 1)
+        # Other users keep reading the (lagging) replica
+        self.assertEqual(len(self.client_for(self.reader_token).get('/api/reviews/').data), 0)
+
+        cache.clear()  # sticky window expires
+        self.assertEqual(len(writer.get('/api/reviews/').data), 0)
+
+    def test_sticky_window_is_shared_with_other_worker_processes(self):
+        import subprocess
+        import sys
+        from django.conf import settings
+        from parking.db_router import is_sticky
+
+        if settings.CACHES['default']['BACKEND'].endswith('LocMemCache'):
+            self.skipTest('CACHE=memory is a single-process cache')
+
+        # Another worker process takes the write and pins the user there
+        subprocess.run([sys.executable, '-c', (
+            'import django; django.setup(); '
+            'from parking.db_router import mark_sticky; mark_sticky("router-worker")'
+        )], check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=dict(os.environ, DJANGO_SETTINGS_MODULE='Parkmate.settings'))
+        self.assertTrue(is_sticky('router-worker'))
+
+
+class BookingArchiveTests(TestCase):
+    def setUp(self):
+        _, self.owner_token, self.lot = make_owner_lot('archive_owner', provides_carwash=True)
+        self.slot = P_Slot.objects.create(lot=self.lot, vehicle_type='Sedan')
+        self.profile, self.token = make_user_profile('archive_user')
+        self.wash_type = Carwash_type.objects.create(name='Exterior', description='Outside only', price=200)
+
+    def make_booking(self, status, ended_days_ago):
+        end = timezone.now() - timedelta(days=ended_days_ago)
+        booking = Booking.objects.create(
+            user=self.profile, slot=self.slot, lot=self.lot, booking_type='Instant',
+            start_time=end - timedelta(minutes=10), end_time=end, status=status, price=50,
+        )
+        Payment.objects.create(booking=booking, user=self.profile, payment_method='UPI', amount=50)
+        return booking
+
+    def test_old_finished_bookings_move_to_archive_with_children(self):
+        from parking.archive import archive_bookings
+
+        old = self.make_booking('completed', ended_days_ago=60)
+        Carwash.objects.create(booking=old, carwash_type=self.wash_type, price=200, status='completed')
+        old_cancelled = self.make_booking('CANCELLED', ended_days_ago=45)
+        recent = self.make_booking('completed', ended_days_ago=1)
+        active = self.make_booking('booked', ended_days_ago=90)
+
+        self.assertEqual(archive_bookings(days=30, chunk_size=1), 2)
+
+        self.assertEqual(
+            set(Booking.objects.values_list('booking_id', flat=True)),
+            {recent.booking_id, active.booking_id},
+        )
+        archived = ArchivedBooking.objects.get(booking_id=old.booking_id)
+        self.assertEqual(archived.payments.count(), 1)
+        self.assertEqual(archived.carwashes.count(), 1)
+        self.assertEqual(ArchivedBooking.objects.get(booking_id=old_cancelled.booking_id).status, 'cancelled')
+        self.assertFalse(Payment.objects.filter(booking_id=old.booking_id).exists())
+
+    def test_history_endpoint_includes_archived_bookings(self):
+        from parking.archive import archive_bookings
+
+        old = self.make_booking('completed', ended_days_ago=60)
+        recent = self.make_booking('completed', ended_days_ago=1)
+        archive_bookings(days=30)
+
+        response = api_client(self.token).get('/api/bookings/history/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['booking_id'], row['is_archived']) for row in response.data['results']],
+            [(recent.booking_id, False), (old.booking_id, True)],
+        )
+
+    def test_booking_list_payments_and_reviewable_lots_include_archived_bookings(self):
+        from parking.archive import archive_bookings
+
+        old = self.make_booking('completed', ended_days_ago=60)
+        recent = self.make_booking('booked', ended_days_ago=-1)
+        Payment.objects.create(booking=recent, user=self.profile, payment_method='Cash', amount=200)
+        archive_bookings(days=30)
+        cache.clear()
+
+        bookings = api_client(self.token).get('/api/bookings/').data
+        self.assertEqual(sorted((row['booking_id'], row.get('is_archived', False)) for row in bookings),
+                         [(old.booking_id, True), (recent.booking_id, False)])
+
+        payments = api_client(self.owner_token).get('/api/owner/payments/').data['results']
+        self.assertEqual(sorted((row['amount'], row['payment_type'], row['is_archived']) for row in payments),
+                         [('200.00', 'Car Wash Payment', False), ('50.00', 'Slot Payment', False),
+                          ('50.00', 'Slot Payment', True)])
+        upi = api_client(self.owner_token).get('/api/owner/payments/', {'payment_method': 'UPI'}).data['results']
+        self.assertEqual(sorted(row['is_archived'] for row in upi), [False, True])
+
+        lots = api_client(self.token).get('/api/user-booked-lots/').data
+        self.assertEqual([lot['lot_id'] for lot in lots], [self.lot.lot_id])
+
+    @override_settings(BOOKING_LIST_ARCHIVED_LIMIT=1)
+    def test_booking_list_only_appends_the_newest_archived_bookings(self):
+        from parking.archive import archive_bookings
+
+        self.make_booking('completed', ended_days_ago=90)
+        newer = self.make_booking('completed', ended_days_ago=60)
+        archive_bookings(days=30)
+
+        bookings = api_client(self.token).get('/api/bookings/').data
+        self.assertEqual([row['booking_id'] for row in bookings], [newer.booking_id])
+        history = api_client(self.token).get('/api/bookings/history/').data
+        self.assertEqual(history['count'], 2)
+
+        # A user account without a profile yet gets an empty list, not an error
+        _, bare_token = make_user('archive_bare_user')
+        response = api_client(bare_token).get('/api/bookings/')
+        self.assertEqual((response.status_code, response.data), (200, []))
+
+
+class LotSearchTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.owner, _, self.marine = make_owner_lot('search_owner', lot_name='Marine Drive Parking')
+        self.lulu = P_Lot.objects.create(
+            owner=self.owner, lot_name='Lulu Mall Basement', streetname='Edappally', city='Kochi',
+            state='Kerala', pincode='682024', total_slots=0,
+        )
+        self.round = P_Lot.objects.create(
+            owner=self.owner, lot_name='Round North Plaza', streetname='Marine Lane', city='Thrissur',
+            state='Kerala', pincode='680001', total_slots=0,
+        )
+        _, self.reader_token = make_user('search_reader')
+        sync_replica()
+
+    def check_ranked_prefix_search(self):
+        from parking.search import search_lots
+
+        # Prefix match on every word; the lot-name hit outranks the street hit
+        self.assertEqual(
+            [lot.lot_id for lot in search_lots(P_Lot.objects.all(), 'mari')],
+            [self.marine.lot_id, self.round.lot_id],
+        )
+        self.assertEqual(list(search_lots(P_Lot.objects.all(), 'mari dri')), [self.marine])
+        self.assertEqual(list(search_lots(P_Lot.objects.all(), '68202')), [self.lulu])
+
+        # Edits and deletes reach the index through the signals
+        self.lulu.lot_name = 'Oberon Mall Basement'
+        self.lulu.save()
+        self.assertEqual(list(search_lots(P_Lot.objects.all(), 'obe')), [self.lulu])
+        self.round.delete()
+        self.assertEqual(list(search_lots(P_Lot.objects.all(), 'marine')), [self.marine])
+
+        # The limit applies within the filtered set: better-ranked hidden lots do not crowd it out
+        hidden = P_Lot.objects.create(owner=self.owner, lot_name='Marine Marine Deck', streetname='Marine Road',
+                                      city='Kochi', state='Kerala', pincode='682031', total_slots=0)
+        self.assertEqual(list(search_lots(P_Lot.objects.all(), 'marine', limit=1)), [hidden])
+        visible = P_Lot.objects.exclude(lot_id=hidden.lot_id)
+        self.assertEqual(list(search_lots(visible, 'marine', limit=1)), [self.marine])
+
+    def test_ranked_prefix_search(self):
+        self.check_ranked_prefix_search()
+
+    @override_settings(LOT_SEARCH_BACKEND='memory')
+    def test_ranked_prefix_search_in_memory_fallback(self):
+        from parking.search import get_lot_search_index
+        get_lot_search_index().rebuild()
+        self.check_ranked_prefix_search()
+
+    def test_search_endpoint_returns_city_facets(self):
+        client = api_client(self.reader_token)
+        response = client.get('/api/lots/search/', {'q': 'marine'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(
+            response.data['facets']['city'],
+            [{'city': 'Kochi', 'count': 1}, {'city': 'Thrissur', 'count': 1}],
+        )
+
+        response = client.get('/api/lots/search/', {'q': 'marine', 'city': 'thrissur'})
+        self.assertEqual([lot['lot_name'] for lot in response.data['results']], ['Round North Plaza'])
+
+        response = client.get('/api/lots/', {'q': 'lulu'})
+        self.assertEqual([lot['lot_name'] for lot in response.data], ['Lulu Mall Basement'])
+
+
+class NearbyLotsTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        from parking.geo import get_lot_geo_index
+
+        cache.clear()
+        # Ernakulam South, ~1 km from Marine Drive, ~10 km from the airport road lot
+        self.owner, _, self.marine = make_owner_lot(
+            'geo_owner', lot_name='Marine Drive Lot', latitude='9.977200', longitude='76.276100',
+        )
+        self.south = P_Lot.objects.create(
+            owner=self.owner, lot_name='South Station Lot', streetname='Station Road', city='Kochi',
+            state='Kerala', pincode='682016', total_slots=0, latitude='9.968900', longitude='76.289600',
+        )
+        self.far = P_Lot.objects.create(
+            owner=self.owner, lot_name='Kalamassery Lot', streetname='NH 66', city='Kochi',
+            state='Kerala', pincode='683104', total_slots=0, latitude='10.054800', longitude='76.322000',
+        )
+        P_Slot.objects.create(lot=self.south, vehicle_type='Sedan')
+        P_Slot.objects.create(lot=self.south, vehicle_type='Sedan', is_available=False)
+        _, self.reader_token = make_user('geo_reader')
+        get_lot_geo_index().rebuild()
+
+    def test_grid_and_sql_fallback_agree(self):
+        from parking.geo import nearest_lots_sql, get_lot_geo_index
+
+        expected = [self.south.lot_id, self.marine.lot_id, self.far.lot_id]
+        self.assertEqual([lot_id for _, lot_id in get_lot_geo_index().nearest(9.9667, 76.2901, k=5)], expected)
+        self.assertEqual([lot_id for _, lot_id in nearest_lots_sql(9.9667, 76.2901, k=5)], expected)
+        self.assertEqual(
+            [lot_id for _, lot_id in get_lot_geo_index().nearest(9.9667, 76.2901, k=5, radius_km=3)],
+            [self.south.lot_id, self.marine.lot_id],
+        )
+
+        # Moving a lot and declining its owner reach the index through the signals
+        self.far.latitude, self.far.longitude = '9.966800', '76.290000'
+        self.far.save()
+        self.assertEqual(get_lot_geo_index().nearest(9.9667, 76.2901, k=1)[0][1], self.far.lot_id)
+        self.owner.verification_status = OwnerProfile.STATUS_DECLINED
+        self.owner.save()
+        self.assertEqual(get_lot_geo_index().nearest(9.9667, 76.2901, k=5), [])
+
+    def test_nearby_endpoint_returns_distance_and_availability(self):
+        sync_replica()
+        client = api_client(self.reader_token)
+        response = client.get('/api/lots/nearby/', {'lat': 9.9667, 'lng': 76.2901, 'radius': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([lot['lot_name'] for lot in response.data['results']],
+                         ['South Station Lot', 'Marine Drive Lot'])
+        self.assertEqual(response.data['results'][0]['available_slots'], 1)
+        self.assertLess(response.data['results'][0]['distance_km'], response.data['results'][1]['distance_km'])
+
+        self.assertEqual(client.get('/api/lots/nearby/', {'lat': 'x', 'lng': 1}).status_code, 400)
+        self.assertEqual(client.get('/api/lots/nearby/', {'lat': 9.9, 'lng': 76.3, 'radius': 'nan'}).status_code, 400)
+
+
+class LotTileTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        from parking.tiles import get_lot_tile_grid
+
+        cache.clear()
+        self.owner, _, self.marine = make_owner_lot(
+            'tile_owner', lot_name='Marine Drive Lot', latitude='9.977200', longitude='76.276100',
+        )
+        self.south = P_Lot.objects.create(
+            owner=self.owner, lot_name='South Station Lot', streetname='Station Road', city='Kochi',
+            state='Kerala', pincode='682016', total_slots=0, latitude='9.968900', longitude='76.289600',
+        )
+        P_Slot.objects.create(lot=self.marine, vehicle_type='Sedan', price=40)
+        self.south_slot = P_Slot.objects.create(lot=self.south, vehicle_type='Sedan', price=60)
+        _, self.reader_token = make_user('tile_reader')
+        get_lot_tile_grid().rebuild()
+
+    def tiles(self, zoom):
+        response = api_client(self.reader_token).get(
+            '/api/lots/tiles/', {'bbox': '76.0,9.8,76.5,10.2', 'zoom': zoom},
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data['clusters']
+
+    def test_low_zoom_merges_lots_into_one_cluster(self):
+        [cluster] = self.tiles(6)
+        self.assertEqual(cluster['count'], 2)
+        self.assertEqual(cluster['free_slots'], 2)
+        self.assertEqual(cluster['min_price'], 40.0)
+        self.assertAlmostEqual(cluster['lat'], (9.9772 + 9.9689) / 2, places=4)
+
+        # High zoom splits them into single-lot pins
+        self.assertEqual(sorted(cluster['lot_id'] for cluster in self.tiles(16)),
+                         [self.marine.lot_id, self.south.lot_id])
+
+    def test_clusters_follow_slot_availability(self):
+        self.south_slot.is_available = False
+        self.south_slot.save()
+        [cluster] = self.tiles(6)
+        self.assertEqual(cluster['free_slots'], 1)
+
+        self.south.delete()
+        [cluster] = self.tiles(6)
+        self.assertEqual((cluster['count'], cluster['lot_id']), (1, self.marine.lot_id))
+
+    def test_non_finite_bbox_is_rejected(self):
+        client = api_client(self.reader_token)
+        for bbox in ('nan,9.8,76.5,10.2', '-inf,-90,inf,90'):
+            self.assertEqual(client.get('/api/lots/tiles/', {'bbox': bbox, 'zoom': 6}).status_code, 400)
+
+
+class EmployeeDispatchTests(TestCase):
+    def setUp(self):
+        self.owner, _, self.lot = make_owner_lot(
+            'dispatch_owner', latitude='9.977200', longitude='76.276100', provides_carwash=True,
+        )
+        self.near = self.make_employee('Nina', '9.978000', '76.277000')
+        self.far = self.make_employee('Faris', '10.054800', '76.322000')
+        self.nowhere = self.make_employee('Noel', None, None)
+
+    def make_employee(self, name, lat, lng, **fields):
+        return Employee.objects.create(
+            firstname=name, lastname='Washer', phone='9876543212', driving_license=f'KL07{name}',
+            latitude=lat, longitude=lng, owner=self.owner, **fields,
+        )
+
+    def test_nearest_employee_with_capacity_is_claimed(self):
+        from parking.dispatch import dispatch_employee, dispatch_stats
+
+        decisions = [dispatch_employee(self.lot) for _ in range(4)]
+        self.assertEqual([decision.employee for decision in decisions],
+                         [self.near, self.near, self.near, self.far])
+        self.assertLess(decisions[0].distance_km, 1)
+
+        self.near.refresh_from_db()
+        self.assertEqual((self.near.current_assignments, self.near.availability_status), (3, 'busy'))
+        self.assertGreaterEqual(dispatch_stats()['count'], 4)
+
+    def test_claim_never_exceeds_capacity(self):
+        from parking.dispatch import claim_employee
+
+        Employee.objects.filter(pk=self.near.pk).update(current_assignments=2)
+        # Both "concurrent" bookings saw spare capacity; only one UPDATE can match
+        self.assertTrue(claim_employee(self.near.pk, owner_id=self.owner.pk))
+        self.assertFalse(claim_employee(self.near.pk, owner_id=self.owner.pk))
+        self.near.refresh_from_db()
+        self.assertEqual(self.near.current_assignments, 3)
+
+    def test_employees_without_coordinates_are_used_last(self):
+        from parking.dispatch import dispatch_employee
+
+        self.near.availability_status = 'offline'
+        self.near.save()
+        Employee.objects.filter(pk=self.far.pk).update(current_assignments=3, availability_status='busy')
+        self.assertEqual(dispatch_employee(self.lot).employee, self.nowhere)
+
+
+class CarWashRosterTests(TestCase):
+    def setUp(self):
+        from parking.roster import get_roster_index
+        get_roster_index().invalidate()  # rosters cached by earlier tests may reuse these ids
+        self.owner, self.owner_token, self.lot = make_owner_lot('roster_owner', provides_carwash=True)
+        self.profile, _ = make_user_profile('roster_user')
+        self.anna = self.make_employee('Anna')
+        self.ben = self.make_employee('Ben')
+        CarWashService.objects.create(service_name='Exterior Wash', service_type='exterior',
+                                      description='Outside', base_price=300, estimated_duration=30)
+        CarWashService.objects.create(service_name='Full Service', service_type='full',
+                                      description='Everything', base_price=750, estimated_duration=90)
+        self.day = (timezone.localtime() + timedelta(days=2)).date()
+
+    def make_employee(self, name):
+        return Employee.objects.create(firstname=name, lastname='Washer', phone='9876543213',
+                                       driving_license=f'KL07{name}', owner=self.owner)
+
+    def at(self, hour, minute=0):
+        return timezone.make_aware(datetime.combine(self.day, datetime.min.time())) + timedelta(hours=hour, minutes=minute)
+
+    def make_booking(self, hour, minute=0, service_type='Exterior', employee=None):
+        return CarWashBooking.objects.create(
+            user=self.profile, lot=self.lot, service_type=service_type, price=300, payment_method='UPI',
+            scheduled_time=self.at(hour, minute), employee=employee,
+        )
+
+    def test_schedule_free_queries(self):
+        from parking.roster import EmployeeSchedule
+
+        schedule = EmployeeSchedule()
+        schedule.add(self.at(10), self.at(11, 30), 1)
+        schedule.add(self.at(9), self.at(9, 30), 2)
+        self.assertTrue(schedule.is_free(self.at(9, 30), self.at(10)))
+        self.assertFalse(schedule.is_free(self.at(11), self.at(12)))
+        self.assertTrue(schedule.is_free(self.at(11, 30), self.at(12)))
+        self.assertEqual(schedule.busy_minutes(self.at(9), self.at(21)), 120)
+        schedule.remove(1)
+        self.assertTrue(schedule.is_free(self.at(11), self.at(12)))
+
+    @override_settings(CARWASH_MAX_ASSIGNMENTS=10)
+    def test_future_bookings_do_not_block_other_times(self):
+        from parking.roster import assign_booking, get_roster_index
+
+        # Anna is booked back to back in the morning, Ben has a long job at 10:00
+        self.make_booking(9, employee=self.anna)
+        self.make_booking(9, 30, employee=self.anna)
+        self.make_booking(10, service_type='Full Service', employee=self.ben)
+
+        self.assertEqual(assign_booking(self.make_booking(10, 30)), self.anna)
+        self.assertIsNone(assign_booking(self.make_booking(10, 45)))
+        # Best fit: Anna's 10:30 job ends at 11:00, Ben is busy until 11:30
+        self.assertEqual(assign_booking(self.make_booking(11)), self.anna)
+        self.assertEqual(get_roster_index().free_employees(self.owner.id, self.at(11, 15), self.at(11, 45)), [])
+        self.assertEqual(get_roster_index().free_employees(self.owner.id, self.at(8), self.at(8, 30)),
+                         [self.anna.pk, self.ben.pk])
+
+    @override_settings(CARWASH_MAX_ASSIGNMENTS=1)
+    def test_rostering_respects_the_workload_cap(self):
+        from parking.roster import assign_booking
+
+        self.assertEqual(assign_booking(self.make_booking(9)), self.anna)
+        self.anna.refresh_from_db()
+        self.assertEqual((self.anna.current_assignments, self.anna.availability_status), (1, 'busy'))
+        # Anna is free at 15:00 but at the cap, so Ben takes it; then nobody can
+        self.assertEqual(assign_booking(self.make_booking(15)), self.ben)
+        self.assertIsNone(assign_booking(self.make_booking(17)))
+
+    def test_equal_fits_are_rostered_nearest_first(self):
+        from parking.roster import assign_booking
+
+        self.lot.latitude, self.lot.longitude = '9.977200', '76.276100'
+        self.lot.save()
+        # Both idle, so equally good fits: Ben is the one next to the lot
+        for employee, lat, lng in ((self.anna, '10.054800', '76.322000'), (self.ben, '9.978000', '76.277000')):
+            employee.latitude, employee.longitude = lat, lng
+            employee.save()
+        self.assertEqual(assign_booking(self.make_booking(9)), self.ben)
+
+    def test_rebalance_partitions_day_and_admin_view_reports_utilisation(self):
+        from parking.roster import rebalance_day
+
+        # Everything piled onto Anna, overlapping
+        first = self.make_booking(9, employee=self.anna)
+        second = self.make_booking(9, 15, employee=self.anna)
+        third = self.make_booking(9, 30, employee=self.anna)
+        plan, changed = rebalance_day(self.owner.id, self.day)
+        self.assertEqual(plan, {first.pk: self.anna.pk, second.pk: self.ben.pk, third.pk: self.anna.pk})
+        self.assertEqual(changed, 1)
+
+        admin_user, admin_token = make_user('roster_admin', role='Admin')
+        response = api_client(admin_token).get('/api/employees/admin-list/', {'date': self.day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        utilisation = {row['employee_id']: row['utilisation'] for row in response.data['employees']}
+        self.assertEqual(utilisation[self.anna.pk]['booked_minutes'], 60)
+        self.assertEqual(utilisation[self.ben.pk]['bookings'], 1)
+
+    def test_rebalance_keeps_unplaced_bookings_on_their_employee(self):
+        from parking.roster import rebalance_day
+
+        bookings = [self.make_booking(9, employee=self.anna) for _ in range(3)]
+        plan, changed = rebalance_day(self.owner.id, self.day)
+        self.assertIsNone(plan[bookings[2].pk])
+        self.assertEqual(changed, 1)
+        bookings[2].refresh_from_db()
+        self.assertEqual(bookings[2].employee_id, self.anna.pk)
+
+    @override_settings(CARWASH_MAX_ASSIGNMENTS=2)
+    def test_rebalance_respects_the_workload_cap(self):
+        from parking.roster import rebalance_day
+
+        bookings = [self.make_booking(hour) for hour in (9, 10, 11, 12, 13)]
+        plan, changed = rebalance_day(self.owner.id, self.day)
+        self.assertEqual([plan[booking.pk] for booking in bookings],
+                         [self.anna.pk, self.ben.pk, self.anna.pk, self.ben.pk, None])
+        self.assertEqual(changed, 4)
+        for employee in (self.anna, self.ben):
+            employee.refresh_from_db()
+            self.assertEqual((employee.current_assignments, employee.availability_status), (2, 'busy'))
+
+    def test_days_before_the_index_window_are_read_from_the_database(self):
+        past = (timezone.localtime() - timedelta(days=5)).date()
+        washed = CarWashBooking.objects.create(
+            user=self.profile, lot=self.lot, service_type='Full Service', price=750, payment_method='UPI',
+            scheduled_time=timezone.make_aware(datetime.combine(past, datetime.min.time())) + timedelta(hours=10),
+            employee=self.anna, status='completed',
+        )
+        admin_user, admin_token = make_user('roster_history_admin', role='Admin')
+        response = api_client(admin_token).get(f'/api/employees/{self.anna.pk}/schedule/', {'date': past.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['carwash_booking_id'] for row in response.data['bookings']], [washed.pk])
+        self.assertEqual(response.data['utilisation']['booked_minutes'], 90)
+
+    def test_utilisation_keeps_completed_washes_and_lists_in_constant_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        wash = self.make_booking(10, employee=self.anna)
+        wash.status = 'completed'
+        wash.save()
+        self.make_booking(11, employee=self.ben)
+        admin_user, admin_token = make_user('roster_page_admin', role='Admin')
+        client = api_client(admin_token)
+
+        def admin_list():
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get('/api/employees/admin-list/', {'date': self.day.isoformat()})
+            self.assertEqual(response.status_code, 200)
+            return {row['employee_id']: row['utilisation'] for row in response.data['employees']}, len(queries)
+
+        utilisation, queries = admin_list()
+        self.assertEqual(utilisation[self.anna.pk]['booked_minutes'], 30)
+        self.assertEqual(utilisation[self.ben.pk]['bookings'], 1)
+        self.make_employee('Cara')
+        self.assertEqual(admin_list()[1], queries)
+
+
+class EmployeeWorkloadTests(TestCase):
+    def setUp(self):
+        self.owner, _, self.lot = make_owner_lot('workload_owner', provides_carwash=True)
+        self.slot = P_Slot.objects.create(lot=self.lot, vehicle_type='Sedan')
+        self.profile, _ = make_user_profile('workload_user')
+        self.wash_type = Carwash_type.objects.create(name='Exterior', description='Outside only', price=200)
+        self.anna = self.make_employee('Anna')
+        self.ben = self.make_employee('Ben')
+
+    def make_employee(self, name):
+        return Employee.objects.create(firstname=name, lastname='Washer', phone='9876543214',
+                                       driving_license=f'KL07{name}', owner=self.owner)
+
+    def make_wash(self, employee, status='pending'):
+        return CarWashBooking.objects.create(user=self.profile, lot=self.lot, service_type='Exterior',
+                                             price=300, payment_method='UPI', employee=employee, status=status)
+
+    def workload(self, employee):
+        employee.refresh_from_db()
+        return employee.current_assignments, employee.availability_status
+
+    def test_deltas_follow_status_and_employee_transitions(self):
+        washes = [self.make_wash(self.anna) for _ in range(3)]
+        self.assertEqual(self.workload(self.anna), (3, 'busy'))
+
+        washes[0].status = 'confirmed'  # still active: no change
+        washes[0].save()
+        washes[1].employee = self.ben
+        washes[1].save()
+        self.assertEqual(self.workload(self.anna), (2, 'available'))
+        self.assertEqual(self.workload(self.ben), (1, 'available'))
+
+        # Reloaded rows carry their own snapshot
+        reloaded = CarWashBooking.objects.get(pk=washes[2].pk)
+        reloaded.status = 'completed'
+        reloaded.save()
+        washes[0].delete()
+        self.assertEqual(self.workload(self.anna), (0, 'available'))
+
+    def test_addon_washes_follow_their_slot_booking(self):
+        booking = Booking.objects.create(user=self.profile, slot=self.slot, lot=self.lot,
+                                         booking_type='Instant', price=50)
+        Carwash.objects.create(booking=booking, carwash_type=self.wash_type, employee=self.anna, price=200)
+        self.assertEqual(self.workload(self.anna), (1, 'available'))
+
+        booking.status = 'completed'
+        booking.save()
+        self.assertEqual(self.workload(self.anna), (0, 'available'))
+        booking.status = 'booked'
+        booking.save()
+        self.assertEqual(self.workload(self.anna), (1, 'available'))
+
+        booking.delete()  # cascades to the add-on
+        self.assertEqual(self.workload(self.anna), (0, 'available'))
+
+    def test_dispatch_claim_is_not_counted_twice(self):
+        from parking.dispatch import dispatch_employee
+        from parking.workload import claimed_assignment
+
+        employee = dispatch_employee(self.lot).employee
+        with claimed_assignment(employee.pk):
+            self.make_wash(employee)
+        self.assertEqual(self.workload(employee)[0], 1)
+
+        # A claim no save consumed is given back
+        other = dispatch_employee(self.lot).employee
+        self.assertNotEqual(other, employee)
+        with claimed_assignment(other.pk):
+            pass
+        self.assertEqual(self.workload(other)[0], 0)
+
+    def test_refused_addon_wash_claims_no_employee(self):
+        from unittest import mock
+        from parking.serializers import CarwashSerializer
+
+        booking = Booking.objects.create(user=self.profile, slot=self.slot, lot=self.lot,
+                                         booking_type='Instant', price=50)
+        client = api_client(Token.objects.get(user=self.profile.auth_user))
+        payload = {'booking_id': booking.pk, 'carwash_type_id': self.wash_type.pk,
+                   'payment_method': 'UPI', 'amount': 200}
+        from rest_framework.serializers import ValidationError
+        refuse = mock.patch.object(CarwashSerializer, 'validate_booking', side_effect=ValidationError('Taken'))
+        with refuse:
+            self.assertEqual(client.post('/api/carwashes/pay_for_service/', payload, format='json').status_code, 400)
+        self.assertEqual(self.workload(self.anna)[0] + self.workload(self.ben)[0], 0)
+        self.assertFalse(Payment.objects.filter(booking=booking).exists())
+
+        response = client.post('/api/carwashes/pay_for_service/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.workload(self.anna)[0] + self.workload(self.ben)[0], 1)
+
+    def test_reconcile_fixes_drift_in_one_pass(self):
+        from parking.workload import reconcile_workloads
+
+        self.make_wash(self.anna)
+        self.make_wash(self.anna, status='completed')
+        Employee.objects.filter(pk=self.anna.pk).update(current_assignments=5, availability_status='busy')
+        Employee.objects.filter(pk=self.ben.pk).update(current_assignments=2)
+
+        self.assertEqual(sorted(reconcile_workloads(dry_run=True)), [(self.anna.pk, 5, 1), (self.ben.pk, 2, 0)])
+        self.assertEqual(self.workload(self.anna), (5, 'busy'))
+        reconcile_workloads()
+        self.assertEqual(self.workload(self.anna), (1, 'available'))
+        self.assertEqual(self.workload(self.ben), (0, 'available'))
+        self.assertEqual(reconcile_workloads(), [])
+
+
+class ConsistencyAuditTests(TestCase):
+    def setUp(self):
+        _, _, self.lot = make_owner_lot('audit_owner', provides_carwash=True)
+        self.slot = P_Slot.objects.create(lot=self.lot, vehicle_type='Sedan')
+        self.other_slot = P_Slot.objects.create(lot=self.lot, vehicle_type='Sedan')
+        self.profile, _ = make_user_profile('audit_user')
+        self.wash_type = Carwash_type.objects.create(name='Exterior', description='Outside only', price=200)
+        self.employee = Employee.objects.create(firstname='Anna', lastname='Washer', phone='9876543215',
+                                                driving_license='KL07Anna', owner=self.lot.owner)
+        self.booking = Booking.objects.create(user=self.profile, slot=self.slot, lot=self.lot,
+                                              booking_type='Instant', price=50)
+
+    def test_full_audit_reports_then_repairs_drift(self):
+        from parking.audit import run_audit
+
+        # Drift introduced behind the signals' back
+        P_Lot.objects.filter(pk=self.lot.pk).update(total_slots=7)
+        P_Slot.objects.filter(pk=self.slot.pk).update(is_available=True)
+        P_Slot.objects.filter(pk=self.other_slot.pk).update(is_available=False)
+        Employee.objects.filter(pk=self.employee.pk).update(current_assignments=2)
+        orphan = Payment.objects.create(user=self.profile, payment_method='UPI', amount=50)
+
+        report = run_audit()
+        counts = {name: result['count'] for name, result in report['checks'].items()}
+        self.assertEqual(counts, {'lot_total_slots': 1, 'slot_availability': 2, 'duplicate_carwashes': 0,
+                                  'employee_workload': 1, 'orphaned_payments': 1, 'carwash_slot_capacity': 0})
+        self.assertEqual(report['checks']['orphaned_payments']['issues'][0]['id'], orphan.pk)
+
+        run_audit(repair=True)
+        self.lot.refresh_from_db()
+        self.assertEqual(self.lot.total_slots, 2)
+        self.assertEqual(P_Slot.objects.get(pk=self.slot.pk).is_available, False)
+        self.assertEqual(P_Slot.objects.get(pk=self.other_slot.pk).is_available, True)
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.current_assignments, 0)
+
+        counts = {name: result['count'] for name, result in run_audit()['checks'].items()}
+        self.assertEqual(counts['orphaned_payments'], 1)  # never deleted
+        self.assertEqual(sum(counts.values()), 1)
+
+    def test_incremental_audit_only_checks_journaled_rows(self):
+        from parking.audit import run_audit
+        from parking.models import ConsistencyMark
+
+        run_audit(repair=True)
+        self.assertFalse(ConsistencyMark.objects.exists())
+
+        other_lot = P_Lot.objects.create(owner=self.lot.owner, lot_name='Fort Lot', streetname='Beach Road',
+                                         city='Kochi', state='Kerala', pincode='682001', total_slots=0)
+        P_Lot.objects.filter(pk=other_lot.pk).update(total_slots=7)  # not journaled
+        self.other_slot.is_available = False
+        self.other_slot.save()                                         # journaled
+        report = run_audit(repair=True, incremental=True)
+        self.assertEqual((report['scope']['slot'], report['scope']['lot']), (1, 1))
+        self.assertEqual(report['checks']['slot_availability']['count'], 1)
+        self.assertEqual(report['checks']['lot_total_slots']['count'], 0)
+        self.assertTrue(P_Slot.objects.get(pk=self.other_slot.pk).is_available)
+        self.assertFalse(ConsistencyMark.objects.exists())
+        self.assertEqual(run_audit()['checks']['lot_total_slots']['count'], 1)
+
+    def test_every_run_advances_the_watermark_and_prunes_consumed_marks(self):
+        from parking.audit import last_watermark, run_audit
+        from parking.models import ConsistencyAuditRun, ConsistencyMark
+
+        run_audit(repair=True)
+        self.assertFalse(ConsistencyMark.objects.exists())
+
+        self.other_slot.save()                                                   # journaled
+        self.lot.refresh_from_db()
+        self.lot.save()                                                          # journaled, consistent
+        P_Slot.objects.filter(pk=self.other_slot.pk).update(is_available=False)  # drift behind the signals
+        newest = ConsistencyMark.objects.latest('mark_id').mark_id
+
+        report = run_audit(incremental=True)
+        self.assertEqual(report['checks']['slot_availability']['count'], 1)
+        self.assertEqual(last_watermark(), newest)
+        # Only the unresolved slot is left in the journal, for the next run
+        self.assertEqual(list(ConsistencyMark.objects.values_list('scope', 'object_id')),
+                         [('slot', self.other_slot.pk)])
+
+        report = run_audit(incremental=True)
+        self.assertEqual((report['scope']['slot'], report['scope']['lot']), (1, 0))
+
+        # A run of only some checks reads the journal without consuming it
+        watermark = last_watermark()
+        run_audit(incremental=True, checks=('slot_availability',))
+        self.assertEqual(last_watermark(), watermark)
+        self.assertEqual(ConsistencyMark.objects.count(), 1)
+        self.assertEqual(ConsistencyAuditRun.objects.count(), 4)
+
+        # A mark that committed after a run, with an id below its watermark, is still read
+        run_audit(repair=True)
+        late = ConsistencyMark.objects.create(mark_id=last_watermark() - 1, scope='lot', object_id=self.lot.pk)
+        report = run_audit(incremental=True)
+        self.assertEqual(report['scope']['lot'], 1)
+        self.assertFalse(ConsistencyMark.objects.filter(pk=late.pk).exists())
+
+
+class CarWashCalendarTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        _, _, self.lot = make_owner_lot('calendar_owner', provides_carwash=True)
+        self.profile, _ = make_user_profile('calendar_user')
+        self.first_day = timezone.localdate() + timedelta(days=1)
+
+    def book(self, day_offset, hour, minute=0, status='pending'):
+        scheduled = timezone.make_aware(datetime.combine(
+            self.first_day + timedelta(days=day_offset), datetime.min.time(),
+        )) + timedelta(hours=hour, minutes=minute)
+        return CarWashBooking.objects.create(user=self.profile, lot=self.lot, service_type='Exterior', price=300,
+                                             payment_method='UPI', scheduled_time=scheduled, status=status)
+
+    def calendar(self):
+        response = APIClient().get('/api/carwash-bookings/calendar/', {
+            'lot_id': self.lot.pk, 'from': self.first_day.isoformat(), 'days': 7,
+        })
+        self.assertEqual(response.status_code, 200)
+        return {(day['date'], slot['time']): slot for day in response.data['days'] for slot in day['slots']}
+
+    def test_week_is_one_query_and_cached_until_bookings_change(self):
+        self.book(0, 10)
+        self.book(0, 10, 30)
+        self.book(3, 15, status='cancelled')
+
+        with self.assertNumQueries(3):  # the lot's slot settings, the ledger rows and loose bookings
+            grid = self.calendar()
+        self.assertEqual(len(grid), 7 * 12)
+        first = self.first_day.isoformat()
+        self.assertEqual((grid[(first, '10:00')]['booked_count'], grid[(first, '10:00')]['available']), (2, False))
+        fourth = (self.first_day + timedelta(days=3)).isoformat()
+        self.assertEqual(grid[(fourth, '15:00')]['booked_count'], 0)
+
+        with self.assertNumQueries(0):
+            self.calendar()
+
+        # Rescheduling invalidates both the old and the new day
+        moved = CarWashBooking.objects.get(scheduled_time__minute=30)
+        moved.scheduled_time += timedelta(days=3)
+        moved.save()
+        grid = self.calendar()
+        self.assertEqual(grid[(first, '10:00')]['booked_count'], 1)
+        self.assertEqual(grid[(fourth, '10:00')]['booked_count'], 1)
+
+    def test_slots_follow_the_lot_slot_length_and_ledger(self):
+        from parking.carwash_capacity import reserve
+        from parking.models import CarWashSlotCapacity
+
+        self.lot.carwash_slot_minutes = 30
+        self.lot.carwash_slot_capacity = 1
+        self.lot.save()
+        self.book(0, 10)
+        self.book(0, 10, 30)
+        slot_time = timezone.make_aware(datetime.combine(self.first_day, datetime.min.time())) + timedelta(hours=11)
+        self.assertTrue(reserve(self.lot, slot_time)[1])
+        CarWashSlotCapacity.objects.filter(slot_start=slot_time).update(capacity=3)  # a row opened before a change
+
+        grid = self.calendar()
+        first = self.first_day.isoformat()
+        self.assertEqual(len([key for key in grid if key[0] == first]), 24)
+        self.assertEqual([(grid[(first, time)]['booked_count'], grid[(first, time)]['capacity'],
+                           grid[(first, time)]['available']) for time in ('10:00', '10:30', '11:00', '11:30')],
+                         [(1, 1, False), (1, 1, False), (1, 3, True), (0, 1, True)])
+
+    def test_day_view_matches_calendar(self):
+        self.book(0, 9)
+        response = APIClient().get('/api/carwash-bookings/available_time_slots/', {
+            'lot_id': self.lot.pk, 'date': self.first_day.isoformat(),
+        })
+        self.assertEqual(response.data['slots'][0]['booked_count'], 1)
+        self.assertEqual(len(response.data['slots']), 12)
+
+
+class CarWashSlotCapacityTests(TestCase):
+    def setUp(self):
+        _, _, self.lot = make_owner_lot('capacity_owner', provides_carwash=True)
+        self.profile, self.token = make_user_profile('capacity_user')
+        self.slot_time = timezone.make_aware(datetime.combine(
+            timezone.localdate() + timedelta(days=2), datetime.min.time(),
+        )) + timedelta(hours=10)
+
+    def post_booking(self, minute=0):
+        return api_client(self.token).post('/api/carwash-bookings/', {
+            'service_type': 'Exterior', 'lot': self.lot.pk, 'price': '300.00', 'payment_method': 'UPI',
+            'scheduled_time': (self.slot_time + timedelta(minutes=minute)).isoformat(),
+        }, format='json')
+
+    def ledger(self):
+        from parking.models import CarWashSlotCapacity
+        slot = CarWashSlotCapacity.objects.get(lot=self.lot)
+        return slot.booked, slot.capacity
+
+    def test_reservation_is_refused_once_the_slot_is_full_and_released_on_cancel(self):
+        first = self.post_booking()
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(self.post_booking(minute=20).status_code, 201)
+        full = self.post_booking(minute=40)
+        self.assertEqual(full.status_code, 409)
+        self.assertEqual((full.data['booked_count'], full.data['capacity']), (2, 2))
+        self.assertEqual(self.ledger(), (2, 2))
+
+        booking = CarWashBooking.objects.get(pk=first.data['carwash_booking_id'])
+        booking.status = 'cancelled'
+        booking.save()
+        booking.save()  # releasing twice must not free two units
+        self.assertEqual(self.ledger(), (1, 2))
+        self.assertEqual(self.post_booking(minute=40).status_code, 201)
+
+    def test_per_lot_granularity_capacity_and_reschedule(self):
+        from parking.carwash_capacity import drifted_slots, reserve
+        from parking.models import CarWashSlotCapacity
+
+        self.lot.carwash_slot_minutes = 30
+        self.lot.carwash_slot_capacity = 1
+        self.lot.save()
+        slot, reserved = reserve(self.lot, self.slot_time + timedelta(minutes=10))
+        self.assertTrue(reserved)
+        self.assertEqual(slot.slot_end - slot.slot_start, timedelta(minutes=30))
+        self.assertFalse(reserve(self.lot, self.slot_time + timedelta(minutes=20))[1])
+        self.assertTrue(reserve(self.lot, self.slot_time + timedelta(minutes=40))[1])
+        CarWashSlotCapacity.objects.update(booked=0)
+
+        # A booking saved outside the API still holds its slot, and moves with it
+        booking = CarWashBooking.objects.create(user=self.profile, lot=self.lot, service_type='Exterior',
+                                                price=300, payment_method='UPI', scheduled_time=self.slot_time)
+        booking.scheduled_time += timedelta(hours=1)
+        booking.save()
+        held = CarWashSlotCapacity.objects.filter(booked=1).get()
+        self.assertEqual((held.slot_start, booking.capacity_slot_id), (booking.scheduled_time, held.slot_id))
+        self.assertEqual(drifted_slots(), [])
+
+
+class DailyOwnerRevenueTests(TestCase):
+    def setUp(self):
+        _, self.owner_token, self.lot = make_owner_lot('revenue_owner', provides_carwash=True)
+        self.profile, _ = make_user_profile('revenue_user')
+        self.today = timezone.localdate()
+
+    def book(self, price, **fields):
+        return CarWashBooking.objects.create(user=self.profile, lot=self.lot, service_type='Exterior',
+                                             price=price, payment_method='Cash', **fields)
+
+    def rollup(self):
+        from parking.models import DailyOwnerRevenue
+        return sorted(DailyOwnerRevenue.objects.values_list('day', 'bookings', 'completed', 'revenue'))
+
+    def test_rollup_follows_transitions_and_matches_rebuild(self):
+        from decimal import Decimal
+        from parking.revenue_rollup import rebuild
+
+        paid = self.book('0.10')
+        unpaid = self.book('0.20')
+        paid.status = 'completed'
+        paid.save()
+        self.assertEqual(self.rollup(), [(self.today, 2, 1, Decimal('0'))])
+        paid.payment_status = 'verified'
+        paid.save()
+        unpaid.status = 'completed'
+        unpaid.completed_time = timezone.now() + timedelta(days=1)
+        unpaid.save()
+        self.assertEqual(self.rollup(), [(self.today, 2, 1, Decimal('0.10')),
+                                         (self.today + timedelta(days=1), 0, 1, Decimal('0'))])
+
+        unpaid.delete()
+        incremental = self.rollup()
+        rebuild()
+        # The incremental path leaves an emptied day behind; the rebuild does not write it
+        self.assertEqual(self.rollup(), [row for row in incremental if row[1] or row[2]])
+
+    def test_dashboard_is_one_aggregate_and_series_reads_the_rollup(self):
+        for price in ('0.10', '0.20'):
+            self.book(price, status='completed', payment_status='verified')
+        self.book('99.00')
+        client = api_client(self.owner_token)
+
+        with self.assertNumQueries(3):  # token, owner profile, one aggregate
+            dashboard = client.get('/api/owner/carwash-bookings/dashboard/')
+        self.assertEqual((dashboard.data['total_bookings'], dashboard.data['completed_bookings']), (3, 2))
+        self.assertEqual(dashboard.data['total_revenue'], 0.3)
+
+        response = client.get('/api/owner/carwash-bookings/revenue-series/', {'from': (
+            self.today - timedelta(days=6)).isoformat(), 'to': self.today.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        days = response.data['lots'][0]['days']
+        self.assertEqual(len(days), 7)
+        self.assertEqual(days[-1], {'date': self.today.isoformat(), 'bookings': 3, 'completed': 2, 'revenue': 0.3})
+        self.assertEqual(days[0]['bookings'], 0)
+
+
+class BatchCashVerificationTests(TestCase):
+    def setUp(self):
+        self.owner, self.owner_token, self.lot = make_owner_lot('batch_owner', provides_carwash=True)
+        _, _, self.other_lot = make_owner_lot('batch_other_owner', lot_name='Other Lot')
+        self.profile, _ = make_user_profile('batch_user')
+        self.wash_type = Carwash_type.objects.create(name='Exterior', description='Outside only', price=200)
+
+    def make_booking(self, lot, status='booked'):
+        slot = P_Slot.objects.create(lot=lot, vehicle_type='Sedan')
+        return Booking.objects.create(user=self.profile, slot=slot, lot=lot, booking_type='Instant',
+                                      status=status, price=50)
+
+    def pay(self, booking, method='Cash', status='PENDING'):
+        return Payment.objects.create(booking=booking, user=self.profile, payment_method=method,
+                                      amount=50, status=status)
+
+    def test_batch_checks_ownership_and_activates_bookings_and_carwashes(self):
+        employee = Employee.objects.create(firstname='Anna', lastname='Washer', phone='9876543214',
+                                           driving_license='KL07Anna', owner=self.owner)
+        with_wash = self.make_booking(self.lot)
+        slot_payment = self.pay(with_wash)
+        wash_payment = self.pay(with_wash)
+        wash = Carwash.objects.create(booking=with_wash, carwash_type=self.wash_type, price=200,
+                                      employee=employee, status='pending')
+        lapsed = self.make_booking(self.lot, status='cancelled')
+        lapsed_payment = self.pay(lapsed)
+        online = self.pay(self.make_booking(self.lot), method='UPI', status='SUCCESS')
+        foreign = self.pay(self.make_booking(self.other_lot))
+        employee.refresh_from_db()
+        workload = employee.current_assignments
+        from unittest import mock
+        from parking.models import OwnerEvent
+        last_event = OwnerEvent.objects.filter(owner=self.owner).order_by('-seq').values_list('seq', flat=True).first()
+
+        with mock.patch('parking.lot_availability.slot_changed') as slot_changed:
+            response = api_client(self.owner_token).post('/api/owner/payments/verify-batch/', {
+                'payment_ids': [slot_payment.pk, wash_payment.pk, lapsed_payment.pk, online.pk, foreign.pk, 999999],
+            }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.data['verified']), sorted([slot_payment.pk, wash_payment.pk, lapsed_payment.pk]))
+        self.assertEqual(response.data['already_verified'], [online.pk])
+        self.assertEqual([failure['payment_id'] for failure in response.data['failed']], [foreign.pk, 999999])
+        self.assertEqual(response.data['bookings_activated'], [lapsed.pk])
+        self.assertEqual(response.data['carwashes_activated'], [wash.pk])
+
+        self.assertEqual(Payment.objects.filter(status='PENDING').count(), 1)  # only the other owner's
+        lapsed.refresh_from_db()
+        wash.refresh_from_db()
+        employee.refresh_from_db()
+        self.assertEqual((lapsed.status, wash.status), ('booked', 'active'))
+        self.assertEqual(employee.current_assignments, workload)
+        self.assertEqual(Payment.objects.get(pk=slot_payment.pk).verified_by_id, self.owner.auth_user_id)
+
+        # The events and availability update the bulk UPDATEs would have skipped
+        events = OwnerEvent.objects.filter(owner=self.owner, seq__gt=last_event)
+        self.assertEqual(sorted(events.values_list('kind', flat=True)),
+                         ['booking_status', 'carwash_status'] + ['payment_status'] * 3)
+        self.assertEqual(events.get(kind='booking_status').data['previous'], 'cancelled')
+        slot_changed.assert_called_once_with(self.lot.pk, lapsed.slot_id)
+
+    def test_reopening_a_completed_booking_drops_the_reviewable_lots_cache(self):
+        from parking.reviewable_lots import reviewable_lots
+
+        cache.clear()
+        completed = self.make_booking(self.lot, status='completed')
+        payment = self.pay(completed)
+        auth_user_id = self.profile.auth_user_id
+        self.assertEqual([lot['lot_id'] for lot in reviewable_lots(auth_user_id)], [self.lot.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = api_client(self.owner_token).post('/api/owner/payments/verify-batch/', {
+                'payment_ids': [payment.pk],
+            }, format='json')
+        self.assertEqual(response.data['bookings_activated'], [completed.pk])
+        self.assertEqual(reviewable_lots(auth_user_id), [])
+
+
+class SettlementLedgerTests(TestCase):
+    def setUp(self):
+        self.owner, self.owner_token, self.lot = make_owner_lot('settlement_owner', provides_carwash=True)
+        self.profile, _ = make_user_profile('settlement_user')
+        slot = P_Slot.objects.create(lot=self.lot, vehicle_type='Sedan')
+        self.booking = Booking.objects.create(user=self.profile, slot=slot, lot=self.lot,
+                                              booking_type='Instant', price=50)
+        self.wash = CarWashBooking.objects.create(user=self.profile, lot=self.lot, service_type='Exterior',
+                                                  price=300, payment_method='Cash')
+
+    def pay(self, amount, method='Cash', status='PENDING', **link):
+        link = link or {'booking': self.booking}
+        with self.captureOnCommitCallbacks(execute=True):
+            return Payment.objects.create(user=self.profile, payment_method=method, amount=amount,
+                                          status=status, **link)
+
+    def ledger(self):
+        from parking.models import SettlementLedger
+        return {row[0]: row[1:] for row in SettlementLedger.objects.values_list(
+            'payment_method', 'success_amount', 'success_count', 'pending_amount', 'pending_count')}
+
+    def test_outbox_keeps_ledger_in_step_and_backfill_rebuilds_it(self):
+        from decimal import Decimal
+        from parking.models import SettlementOutbox
+        from parking.settlement import backfill
+
+        cash = self.pay('50.00')
+        self.pay('20.00')
+        self.pay('300.00', method='UPI', status='SUCCESS', carwash_booking=self.wash)
+        with self.captureOnCommitCallbacks(execute=True):
+            cash.status = 'SUCCESS'
+            cash.save()
+            cash.save()  # unchanged: no outbox row
+        with self.captureOnCommitCallbacks(execute=True):
+            response = api_client(self.owner_token).post('/api/owner/payments/verify-batch/', {
+                'payment_ids': list(Payment.objects.filter(status='PENDING').values_list('pk', flat=True)),
+            }, format='json')
+        self.assertEqual(len(response.data['verified']), 1)
+
+        expected = {'Cash': (Decimal('70.00'), 2, Decimal('0.00'), 0), 'UPI': (Decimal('300.00'), 1, Decimal('0.00'), 0)}
+        self.assertEqual(self.ledger(), expected)
+        self.assertEqual(SettlementOutbox.objects.count(), 5)
+        self.assertFalse(SettlementOutbox.objects.filter(applied_at__isnull=True).exists())
+
+        # Archived payments stay in the history
+        Booking.objects.filter(pk=self.booking.pk).delete()
+        self.assertEqual(self.ledger(), expected)
+        self.assertEqual(backfill(chunk_size=1), 1)
+        self.assertEqual(self.ledger(), {'UPI': expected['UPI']})
+
+    def test_statement_reads_only_the_ledger(self):
+        self.pay('50.00', status='SUCCESS')
+        self.pay('20.00')
+        client = api_client(self.owner_token)
+        with self.assertNumQueries(3):  # token, owner profile, one grouped ledger query
+            response = client.get('/api/owner/settlements/', {'period': 'month'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['rows']), 1)
+        row = response.data['rows'][0]
+        self.assertEqual((row['lot_name'], row['payment_method'], row['success_amount'], row['pending_count']),
+                         ('Marine Drive Lot', 'Cash', '50.00', 1))
+        self.assertEqual(row['period'], timezone.localdate().replace(day=1).isoformat())
+        self.assertEqual(response.data['totals']['success_count'], 1)
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        _, _, self.lot = make_owner_lot('idempotency_owner', provides_carwash=True)
+        self.profile, self.token = make_user_profile('idempotency_user')
+        self.slot_time = timezone.make_aware(datetime.combine(
+            timezone.localdate() + timedelta(days=2), datetime.min.time(),
+        )) + timedelta(hours=11)
+
+    def post_booking(self, key, price='300.00', token=None):
+        return api_client(token or self.token).post('/api/carwash-bookings/', {
+            'service_type': 'Exterior', 'lot': self.lot.pk, 'price': price, 'payment_method': 'UPI',
+            'scheduled_time': self.slot_time.isoformat(),
+        }, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_first_response_without_writing(self):
+        first = self.post_booking('retry-1')
+        self.assertEqual(first.status_code, 201)
+
+        with self.assertNumQueries(1):  # the indexed key lookup
+            retry = self.post_booking('retry-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json()['carwash_booking_id'], first.data['carwash_booking_id'])
+        self.assertEqual(CarWashBooking.objects.count(), 1)
+
+        self.assertEqual(self.post_booking('retry-1', price='350.00').status_code, 422)
+        # Keys are per caller, and requests without a key are untouched
+        _, other_token = make_user_profile('idempotency_other')
+        self.assertEqual(self.post_booking('retry-1', token=other_token).status_code, 201)
+        self.assertEqual(CarWashBooking.objects.count(), 2)
+
+    def test_server_errors_release_the_key(self):
+        from unittest import mock
+        from rest_framework.response import Response
+        from parking.models import IdempotencyKey
+        from parking.views import CarWashBookingViewSet
+
+        with mock.patch.object(CarWashBookingViewSet, 'create', return_value=Response(status=503)):
+            self.assertEqual(self.post_booking('flaky').status_code, 503)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        retry = self.post_booking('flaky')
+        self.assertEqual(retry.status_code, 201)
+        self.assertFalse(retry.has_header('Idempotent-Replayed'))
+
+    def test_transaction_ids_from_the_same_second_differ(self):
+        from unittest import mock
+        from parking.views import _transaction_id
+
+        with mock.patch('time.time', return_value=1700000000):
+            first, second = _transaction_id('CW', 7), _transaction_id('CW', 7)
+        self.assertTrue(first.startswith('CW-7-1700000000-'))
+        self.assertNotEqual(first, second)
+
+
+class LotRatingSummaryTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        _, _, self.lot = make_owner_lot('rating_owner')
+        self.profile, self.token = make_user_profile('rating_user')
+
+    def review(self, rating, review_type='SLOT', lot=None):
+        return Review.objects.create(lot=lot or self.lot, user=self.profile, rating=rating,
+                                     review_desc='Fine', review_type=review_type)
+
+    def test_signals_keep_the_summary_current(self):
+        from parking.review_summary import rebuild
+        first = self.review(5)
+        self.review(3)
+        summary = LotRatingSummary.objects.get(lot=self.lot)
+        self.assertEqual((summary.review_count, summary.rating_sum, summary.stars_5, summary.stars_3), (2, 8, 1, 1))
+
+        first.rating = 1
+        first.save()
+        _, _, other_lot = make_owner_lot('rating_owner_2')
+        moved = Review.objects.get(pk=first.pk)
+        moved.lot = other_lot
+        moved.save()
+        self.review(4).delete()
+        summary.refresh_from_db()
+        self.assertEqual((summary.review_count, summary.rating_sum, summary.stars_5, summary.stars_1), (1, 3, 0, 0))
+        self.assertEqual(LotRatingSummary.objects.get(lot=other_lot).stars_1, 1)
+
+        LotRatingSummary.objects.all().delete()
+        self.assertEqual(rebuild(), 2)
+        summary = LotRatingSummary.objects.get(lot=self.lot)
+        self.assertEqual((summary.review_count, summary.rating_sum, summary.average), (1, 3, 3.0))
+
+    def test_lot_page_reads_summary_and_feed_pages_by_cursor(self):
+        for rating in (5, 4, 4):
+            self.review(rating)
+        self.review(2, review_type='CARWASH')
+        sync_replica()
+        client = api_client(self.token)
+
+        lot = client.get(f'/api/lots/{self.lot.lot_id}/').data
+        self.assertEqual(lot['avg_rating'], 3.8)
+        self.assertEqual(lot['rating_summary'], {
+            'count': 4, 'average': 3.8, 'histogram': {'1': 0, '2': 1, '3': 0, '4': 2, '5': 1},
+        })
+
+        page = client.get('/api/reviews/feed/', {'lot_id': self.lot.lot_id, 'type': 'SLOT', 'page_size': 2}).data
+        self.assertEqual(len(page['results']), 2)
+        rest = client.get(page['next']).data
+        self.assertIsNone(rest['next'])
+        feed = page['results'] + rest['results']
+        self.assertEqual(sorted(review['rating'] for review in feed), [4, 4, 5])
+        self.assertEqual([review['created_at'] for review in feed],
+                         sorted((review['created_at'] for review in feed), reverse=True))
+        # The plain list stays unpaginated
+        self.assertEqual(len(client.get('/api/reviews/', {'lot_id': self.lot.lot_id}).data), 4)
+
+
+class ReviewableLotsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        _, _, self.lot = make_owner_lot('reviewable_owner')
+        _, _, self.wash_lot = make_owner_lot('reviewable_wash_owner', lot_name='Wash Lot', provides_carwash=True)
+        self.slot = P_Slot.objects.create(lot=self.lot, vehicle_type='Sedan')
+        self.profile, self.token = make_user_profile('reviewable_user')
+
+    def test_completed_bookings_of_both_kinds_are_cached_until_one_completes(self):
+        client = api_client(self.token)
+        Booking.objects.create(user=self.profile, slot=self.slot, lot=self.lot,
+                               booking_type='Instant', price=50, status='completed')
+        wash = CarWashBooking.objects.create(user=self.profile, lot=self.wash_lot, service_type='Exterior',
+                                             price=300, payment_method='UPI')
+        Booking.objects.create(user=self.profile, slot=self.slot, lot=self.lot,
+                               booking_type='Instant', price=50, status='completed')
+
+        with self.assertNumQueries(3):  # token, profile, lots over the UNION
+            response = client.get('/api/user-booked-lots/')
+        self.assertEqual([lot['lot_id'] for lot in response.data], [self.lot.lot_id])
+        self.assertEqual(response.data[0]['available_slots'], 1)
+        with self.assertNumQueries(1):  # token only
+            client.get('/api/user-booked-lots/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            wash.status = 'completed'
+            wash.save()
+        response = client.get('/api/user-booked-lots/')
+        self.assertEqual([lot['lot_id'] for lot in response.data], [self.lot.lot_id, self.wash_lot.lot_id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.filter(status='completed').delete()
+        response = client.get('/api/user-booked-lots/')
+        self.assertEqual([lot['lot_id'] for lot in response.data], [self.wash_lot.lot_id])
+
+
+class TimeSyncConsumerTests(TestCase):
+    async def test_ticks_are_serialized_once_and_shared(self):
+        from unittest import mock
+        from channels.testing import WebsocketCommunicator
+        from parking import time_broadcast
+        from parking.consumers import TimeSyncConsumer
+
+        clocks = [WebsocketCommunicator(TimeSyncConsumer.as_asgi(), '/ws/time/') for _ in range(3)]
+        with mock.patch.object(time_broadcast, 'time_payload', wraps=time_broadcast.time_payload) as payload:
+            for clock in clocks:
+                connected, _ = await clock.connect()
+                self.assertTrue(connected)
+                self.assertEqual((await clock.receive_json_from())['mode'], 'tick')
+                self.assertEqual((await clock.receive_json_from())['type'], 'time_update')
+            self.assertEqual(time_broadcast.broadcaster.subscribers, 3)
+
+            ticks = [await clock.receive_from(timeout=3) for clock in clocks]
+            self.assertEqual(len(set(ticks)), 1)
+            # One payload per second for all sockets (the connect second and the tick)
+            self.assertLessEqual(payload.call_count, 3)
+
+            for clock in clocks:
+                await clock.disconnect()
+        self.assertEqual(time_broadcast.broadcaster.subscribers, 0)
+        self.assertIsNone(time_broadcast.broadcaster.task)
+
+    async def test_compact_mode_syncs_on_connect_and_on_request(self):
+        from channels.testing import WebsocketCommunicator
+        from parking.consumers import TimeSyncConsumer
+
+        clock = WebsocketCommunicator(TimeSyncConsumer.as_asgi(), '/ws/time/?mode=compact')
+        await clock.connect()
+        self.assertEqual((await clock.receive_json_from())['mode'], 'compact')
+        sync = await clock.receive_json_from()
+        self.assertEqual(sync['type'], 'sync')
+        self.assertAlmostEqual(sync['epoch_ms'] / 1000, timezone.now().timestamp(), delta=5)
+        self.assertEqual(sync['offset_seconds'], 5 * 3600 + 30 * 60)
+
+        await clock.send_json_to({'type': 'sync', 'client_ts': 1234})
+        self.assertEqual((await clock.receive_json_from())['client_ts'], 1234)
+        # No ticks in compact mode
+        self.assertTrue(await clock.receive_nothing(timeout=1.5))
+        await clock.disconnect()
+
+
+class SQLiteChannelLayerTests(TestCase):
+    def setUp(self):
+        import tempfile
+        self.path = f'{tempfile.mkdtemp()}/layer.sqlite3'
+
+    async def test_group_send_reaches_channels_of_other_processes(self):
+        from channels.exceptions import ChannelFull
+        from parking.channel_layers import SQLiteChannelLayer
+
+        # Two layer instances on one file behave like two worker processes
+        worker_a = SQLiteChannelLayer(path=self.path, capacity=2)
+        worker_b = SQLiteChannelLayer(path=self.path, capacity=2)
+        socket_a = await worker_a.new_channel()
+        socket_b = await worker_b.new_channel()
+        await worker_a.group_add('user_7', socket_a)
+        await worker_b.group_add('user_7', socket_b)
+
+        await worker_b.group_send('user_7', {'type': 'send_notification', 'message': 'Paid'})
+        self.assertEqual((await worker_a.receive(socket_a))['message'], 'Paid')
+        self.assertEqual((await worker_b.receive(socket_b))['message'], 'Paid')
+
+        await worker_a.group_discard('user_7', socket_a)
+        await worker_a.group_send('user_7', {'type': 'send_notification', 'message': 'Only b'})
+        self.assertEqual((await worker_b.receive(socket_b))['message'], 'Only b')
+
+        # Plain (non process-local) channels are shared, and capacity is enforced
+        await worker_a.send('jobs', {'type': 'job', 'n': 1})
+        await worker_a.send('jobs', {'type': 'job', 'n': 2})
+        with self.assertRaises(ChannelFull):
+            await worker_a.send('jobs', {'type': 'job', 'n': 3})
+        self.assertEqual((await worker_b.receive('jobs'))['n'], 1)
+        self.assertEqual((await worker_a.receive('jobs'))['n'], 2)
+
+    def test_idle_polls_do_not_take_the_write_lock(self):
+        import sqlite3
+        from parking.channel_layers import SQLiteChannelLayer
+
+        worker_a = SQLiteChannelLayer(path=self.path)
+        worker_b = SQLiteChannelLayer(path=self.path)
+        worker_a._take(worker_a.client_prefix, 10)
+        worker_b._db()
+
+        # Another process holds the write lock; an idle poll neither waits for it nor fails
+        writer = sqlite3.connect(self.path, isolation_level=None)
+        writer.execute('BEGIN IMMEDIATE')
+        worker_a._db().execute('PRAGMA busy_timeout = 100')
+        self.assertEqual(worker_a._take(worker_a.client_prefix, 10), [])
+        writer.execute('ROLLBACK')
+        writer.close()
+
+        channel = f'specific.{worker_a.client_prefix}!x'
+        worker_b._insert(channel, '{"n": 1}', 10)
+        self.assertEqual(worker_a._take(worker_a.client_prefix, 10), [(channel, '{"n": 1}')])
+        # Its own sends are seen even though they do not move its data_version
+        worker_a._insert(channel, '{"n": 2}', 10)
+        self.assertEqual(worker_a._take(worker_a.client_prefix, 10), [(channel, '{"n": 2}')])
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        from unittest import mock
+        from parking import notification_outbox
+        self.outbox = notification_outbox.NotificationDispatcher()
+        self.outbox._ensure_thread = lambda: None  # delivered by flush() in the tests
+        patcher = mock.patch.object(notification_outbox, 'dispatcher', self.outbox)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_notifications_wait_for_commit_and_bursts_are_coalesced(self):
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+        from django.db import transaction
+        from parking.notification_utils import send_ws_notification
+
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)('user_42', channel)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    send_ws_notification(42, 'info', 'Rolled back')
+                    raise ValueError
+            except ValueError:
+                pass
+            with transaction.atomic():
+                for _ in range(3):
+                    send_ws_notification(42, 'info', 'New booking received for Lot #3.')
+                send_ws_notification(42, 'success', 'Payment verified')
+                self.assertEqual(self.outbox.metrics()['queue_depth'], 0)  # not before commit
+        # Stored with the write that caused them, before any dispatch
+        self.assertEqual(list(Notification.objects.filter(recipient='42').order_by('seq').values_list('seq', 'message')),
+                         [(1, 'New booking received for Lot #3.'), (2, 'New booking received for Lot #3.'),
+                          (3, 'New booking received for Lot #3.'), (4, 'Payment verified')])
+
+        self.assertEqual(self.outbox.flush(), 4)
+        event = async_to_sync(layer.receive)(channel)
+        self.assertEqual(event['type'], 'send_notification_batch')
+        self.assertEqual(event['notifications'], [
+            {'level': 'info', 'message': 'New booking received for Lot #3.', 'count': 3, 'seq': 3},
+            {'level': 'success', 'message': 'Payment verified', 'count': 1, 'seq': 4},
+        ])
+        metrics = self.outbox.metrics()
+        self.assertEqual((metrics['enqueued'], metrics['delivered'], metrics['coalesced'], metrics['queue_depth']),
+                         (4, 4, 2, 0))
+        self.assertEqual(metrics['lag_ms']['samples'], 4)
+
+    def test_coalesced_frames_stay_in_seq_order(self):
+        from parking.notification_outbox import coalesce
+        events = [(0, '7', {'level': 'info', 'message': message, 'count': 1, 'seq': seq})
+                  for seq, message in enumerate(['A', 'B', 'A'], start=1)]
+        self.assertEqual([(n['message'], n['count'], n['seq']) for n in coalesce(events)['7']],
+                         [('B', 1, 2), ('A', 2, 3)])
+
+    def test_cash_verification_notifies_the_booking_user_once(self):
+        _, _, lot = make_owner_lot('outbox_owner')
+        profile, _ = make_user_profile('outbox_user')
+        booking = Booking.objects.create(user=profile, slot=P_Slot.objects.create(lot=lot, vehicle_type='Sedan'),
+                                         lot=lot, booking_type='Instant', price=50)
+        payment = Payment.objects.create(booking=booking, user=profile, payment_method='Cash', amount=50,
+                                         status='PENDING')
+        self.outbox._pending.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.status = 'SUCCESS'
+            payment.save()
+            payment.save()
+        self.assertEqual([(user_id, notification['level']) for _, user_id, notification in self.outbox._pending],
+                         [(str(profile.auth_user_id), 'success')])
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class NotificationInboxTests(TransactionTestCase):
+    # database_sync_to_async closes connections that are inside a transaction,
+    # so the consumer test cannot run inside TestCase's atomic block
+    async def test_reconnect_replays_missed_notifications_once(self):
+        from channels.db import database_sync_to_async
+        from channels.layers import get_channel_layer
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from parking.notification_inbox import store
+        from parking.routing import websocket_urlpatterns
+        from parking.ws_auth import TokenAuthMiddlewareStack
+
+        user, token = await database_sync_to_async(make_user)('inbox_user')
+        missed = {str(user.id): [{'level': 'info', 'message': f'Update {n}', 'count': 1} for n in range(1, 4)]}
+        await database_sync_to_async(store)(missed)
+
+        socket = WebsocketCommunicator(TokenAuthMiddlewareStack(URLRouter(websocket_urlpatterns)),
+                                       f'/ws/notifications/{user.id}/?since=1&token={token.key}')
+        connected, _ = await socket.connect()
+        self.assertTrue(connected)
+        self.assertEqual((await socket.receive_json_from())['seq'], 3)
+        replayed = [await socket.receive_json_from() for _ in range(2)]
+        self.assertEqual([(frame['seq'], frame['message'], frame['replayed']) for frame in replayed],
+                         [(2, 'Update 2', True), (3, 'Update 3', True)])
+
+        # A live batch overlapping the replay only delivers what is new
+        await get_channel_layer().group_send(f'user_{user.id}', {'type': 'send_notification_batch', 'notifications': [
+            {'level': 'info', 'message': 'Update 3', 'count': 1, 'seq': 3},
+            {'level': 'success', 'message': 'Update 4', 'count': 2, 'seq': 4},
+        ]})
+        live = await socket.receive_json_from()
+        self.assertEqual((live['seq'], live['message']), (4, 'Update 4 (×2)'))
+        self.assertTrue(await socket.receive_nothing(timeout=0.2))
+        await socket.disconnect()
+
+    def test_rest_fallback_and_pruning_keep_sequence(self):
+        from django.core.management import call_command
+        from parking.notification_inbox import store
+
+        auth_user, token = make_user('inbox_user')
+        recipient = str(auth_user.id)
+        store({recipient: [{'level': 'info', 'message': 'Old', 'count': 1},
+                           {'level': 'warning', 'message': 'Newer', 'count': 1}],
+               'someone-else': [{'level': 'info', 'message': 'Not yours', 'count': 1}]})
+
+        response = api_client(token).get('/api/notifications/', {'since': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['latest_seq'], 2)
+        self.assertEqual([(n['seq'], n['type'], n['message']) for n in response.data['notifications']],
+                         [(2, 'warning', 'Newer')])
+        self.assertEqual(APIClient().get('/api/notifications/').status_code, 401)
+
+        Notification.objects.update(created_at=timezone.now() - timedelta(days=30))
+        call_command('prune_notifications', stdout=open(os.devnull, 'w'))
+        self.assertFalse(Notification.objects.exists())
+        batch = {recipient: [{'level': 'info', 'message': 'After prune', 'count': 1}]}
+        store(batch)
+        self.assertEqual(batch[recipient][0]['seq'], 3)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class LotAvailabilityTests(TransactionTestCase):
+    # The consumer reads through database_sync_to_async and deltas are sent on commit
+    def setUp(self):
+        _, _, self.lot = make_owner_lot('availability_owner')
+        self.profile, _ = make_user_profile('availability_user')
+        self.free = P_Slot.objects.create(lot=self.lot, vehicle_type='Sedan', price=40)
+        self.taken = P_Slot.objects.create(lot=self.lot, vehicle_type='Bike', price=20, is_available=False)
+        self.booking = Booking.objects.create(user=self.profile, slot=self.taken, lot=self.lot,
+                                              booking_type='Instant', price=20,
+                                              end_time=timezone.now() + timedelta(hours=1))
+
+    def book(self, slot, end_time):
+        from django.db import transaction
+        with transaction.atomic():
+            booking = Booking.objects.create(user=self.profile, slot=slot, lot=self.lot, booking_type='Instant',
+                                             price=slot.price, end_time=end_time)
+            slot.is_available = False
+            slot.save()
+        return booking
+
+    async def connect(self):
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from parking.routing import websocket_urlpatterns
+        socket = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/lots/{self.lot.lot_id}/')
+        connected, _ = await socket.connect()
+        self.assertTrue(connected)
+        return socket
+
+    async def test_snapshot_then_one_delta_per_booking_write(self):
+        from channels.db import database_sync_to_async
+
+        socket = await self.connect()
+        snapshot = await socket.receive_json_from()
+        self.assertEqual(snapshot['type'], 'snapshot')
+        by_id = {slot['id']: slot for slot in snapshot['slots']}
+        self.assertEqual(by_id[self.free.slot_id]['state'], 'available')
+        self.assertEqual(by_id[self.taken.slot_id]['state'], 'booked')
+        self.assertIsNotNone(by_id[self.taken.slot_id]['end_time'])
+
+        # Booking and slot are saved in one transaction: a single delta
+        end_time = timezone.now() + timedelta(hours=2)
+        await database_sync_to_async(self.book)(self.free, end_time)
+        delta = await socket.receive_json_from()
+        self.assertEqual(delta, {'type': 'delta', 'lot_id': self.lot.lot_id, 'slots': [
+            {'id': self.free.slot_id, 'state': 'booked', 'end_time': end_time.isoformat()},
+        ]})
+        self.assertTrue(await socket.receive_nothing(timeout=0.2))
+        await socket.disconnect()
+
+    async def test_watched_lot_expires_bookings_at_end_time(self):
+        from channels.db import database_sync_to_async
+        from parking.lot_availability import expiry_watcher
+
+        socket = await self.connect()
+        await socket.receive_json_from()
+        await database_sync_to_async(self.book)(self.free, timezone.now() + timedelta(seconds=0.5))
+        self.assertEqual((await socket.receive_json_from())['slots'][0]['state'], 'booked')
+
+        expired = await socket.receive_json_from(timeout=3)
+        self.assertEqual(expired['slots'], [{'id': self.free.slot_id, 'state': 'available', 'end_time': None}])
+        await socket.disconnect()
+        self.assertNotIn(self.lot.lot_id, expiry_watcher.watchers)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class OwnerEventStreamTests(TransactionTestCase):
+    # Long polls and sockets read through database_sync_to_async and wake up on commit
+    def setUp(self):
+        self.owner, self.owner_token, self.lot = make_owner_lot('events_owner')
+        self.profile, _ = make_user_profile('events_user')
+        self.slot = P_Slot.objects.create(lot=self.lot, vehicle_type='Sedan', price=40)
+
+    def book(self):
+        return Booking.objects.create(user=self.profile, slot=self.slot, lot=self.lot, booking_type='Instant',
+                                      price=40)
+
+    def test_business_changes_append_numbered_events(self):
+        booking = self.book()
+        payment = Payment.objects.create(booking=booking, user=self.profile, payment_method='Cash', amount=40,
+                                         status='PENDING')
+        payment.status = 'SUCCESS'
+        payment.save()
+        wash = CarWashBooking.objects.create(user=self.profile, lot=self.lot, service_type='Exterior', price=300,
+                                             payment_method='Cash')
+        wash.status = 'confirmed'
+        wash.save()
+        booking.save()  # unchanged: no event
+
+        response = api_client(self.owner_token).get('/api/owner/events/', {'since': 0, 'timeout': 0})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual([(event['seq'], event['kind']) for event in body['events']], [
+            (1, 'booking_created'), (2, 'payment_pending'), (3, 'payment_status'),
+            (4, 'carwash_status'), (5, 'payment_pending'), (6, 'carwash_status'),
+        ])
+        self.assertEqual(body['events'][2]['data']['previous'], 'PENDING')
+        self.assertEqual((body['latest_seq'], body['next_since']), (6, 6))
+
+        _, user_token = make_user('events_not_owner')
+        self.assertEqual(api_client(user_token).get('/api/owner/events/').status_code, 403)
+        self.assertEqual(APIClient().get('/api/owner/events/').status_code, 401)
+
+    async def test_long_poll_and_socket_wake_up_on_commit(self):
+        import asyncio
+        from channels.db import database_sync_to_async
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from django.test import AsyncClient
+        from parking.routing import websocket_urlpatterns
+        from parking.ws_auth import TokenAuthMiddlewareStack
+
+        app = TokenAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+        await database_sync_to_async(self.book)()
+        socket = WebsocketCommunicator(app, f'/ws/owner/events/?token={self.owner_token.key}&since=0')
+        connected, _ = await socket.connect()
+        self.assertTrue(connected)
+        self.assertEqual((await socket.receive_json_from())['seq'], 1)
+        replayed = await socket.receive_json_from()
+        self.assertEqual([event['kind'] for event in replayed['events']], ['booking_created'])
+
+        poll = asyncio.ensure_future(AsyncClient().get(
+            '/api/owner/events/', {'since': 1, 'timeout': 10}, headers={'Authorization': f'Token {self.owner_token.key}'}))
+        await asyncio.sleep(0.3)
+        self.assertFalse(poll.done())  # waiting, not answering empty
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await database_sync_to_async(lambda: Payment.objects.create(
+            booking=Booking.objects.get(lot=self.lot), user=self.profile, payment_method='Cash', amount=40,
+            status='PENDING'))()
+        response = await asyncio.wait_for(poll, 5)
+        self.assertLess(loop.time() - started, 2)
+        self.assertEqual([(event['seq'], event['kind']) for event in response.json()['events']],
+                         [(2, 'payment_pending')])
+        live = await socket.receive_json_from()
+        self.assertEqual([event['seq'] for event in live['events']], [2])
+        await socket.disconnect()
+
+        stranger = WebsocketCommunicator(app, '/ws/owner/events/?token=nope')
+        await stranger.connect()
+        self.assertEqual((await stranger.receive_output())['code'], 4401)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+                   WS_MAX_SOCKETS_PER_USER=2)
+class SocketHealthTests(TransactionTestCase):
+    # Notification sockets read their inbox through database_sync_to_async
+    async def receive_type(self, socket, kind):
+        while True:
+            message = await socket.receive_json_from()
+            if message.get('type') == kind:
+                return message
+
+    async def test_silent_sockets_are_reaped_and_released(self):
+        from channels.db import database_sync_to_async
+        from channels.layers import get_channel_layer
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from parking.routing import websocket_urlpatterns
+        from parking.socket_health import registry
+        from parking.time_broadcast import broadcaster
+        from parking.ws_auth import TokenAuthMiddlewareStack
+
+        user, token = await database_sync_to_async(make_user)('heartbeat_user')
+        app = TokenAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+        notifications = WebsocketCommunicator(app, f'/ws/notifications/{user.id}/?token={token.key}')
+        clock = WebsocketCommunicator(app, '/ws/time/')
+        for socket in (notifications, clock):
+            self.assertTrue((await socket.connect())[0])
+        await self.receive_type(notifications, 'info')
+        gauge = registry.metrics()
+        self.assertEqual(gauge['sockets_by_kind'], {'notifications': 1, 'time': 1})
+        self.assertIn({'group': f'user_{user.id}', 'members': 1}, gauge['largest_groups'])
+        self.assertTrue(gauge['heartbeat_running'])
+
+        await registry.sweep()
+        self.assertIn('ts', await self.receive_type(notifications, 'ping'))
+        await self.receive_type(clock, 'ping')
+        await notifications.send_json_to({'type': 'pong'})
+        await asyncio.sleep(0.05)
+
+        # The clock stops answering
+        for consumer, (kind, _, _) in registry.sockets.items():
+            if kind == 'time':
+                consumer.last_seen -= 3600
+        self.assertEqual((await registry.sweep())[1], 1)
+        while (message := await clock.receive_output())['type'] != 'websocket.close':
+            pass
+        self.assertEqual(message['code'], 4408)
+        self.assertEqual(broadcaster.subscribers, 0)
+        self.assertEqual(registry.metrics()['sockets_by_kind'], {'notifications': 1})
+
+        await notifications.disconnect()
+        self.assertEqual(registry.metrics()['sockets'], 0)
+        self.assertEqual(registry.metrics()['groups'], 0)
+        self.assertFalse(get_channel_layer().groups.get(f'user_{user.id}'))
+
+    async def test_oldest_socket_of_a_user_is_closed_over_the_limit(self):
+        from channels.db import database_sync_to_async
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from parking.routing import websocket_urlpatterns
+        from parking.socket_health import registry
+        from parking.ws_auth import TokenAuthMiddlewareStack
+
+        user, token = await database_sync_to_async(make_user)('busy_user')
+        app = TokenAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+        sockets = [WebsocketCommunicator(app, f'/ws/notifications/{user.id}/?token={token.key}') for _ in range(3)]
+        evicted_before = registry.counters['evicted']
+        for socket in sockets:
+            await socket.connect()
+            await self.receive_type(socket, 'info')
+        self.assertEqual((await sockets[0].receive_output())['code'], 4429)
+        self.assertEqual(registry.counters['evicted'] - evicted_before, 1)
+        self.assertEqual(registry.metrics()['most_sockets_per_user'], 2)
+        for socket in sockets[1:]:
+            await socket.disconnect()
+        self.assertEqual(registry.metrics()['sockets'], 0)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class WebSocketTokenAuthTests(TransactionTestCase):
+    # Consumers and the token cache read through database_sync_to_async
+    def setUp(self):
+        from channels.routing import URLRouter
+        from parking.routing import websocket_urlpatterns
+        from parking.ws_auth import TokenAuthMiddlewareStack
+        self.app = TokenAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+        self.profile, self.token = make_user_profile('socket_user')
+
+    async def open(self, path):
+        from channels.testing import WebsocketCommunicator
+        socket = WebsocketCommunicator(self.app, path)
+        await socket.connect()
+        return socket, await socket.receive_output()
+
+    async def test_notification_socket_needs_the_owners_token(self):
+        from channels.db import database_sync_to_async
+        own_id = self.profile.auth_user_id
+        other, other_token = await database_sync_to_async(make_user)('someone_else', role='Owner')
+
+        for path in (f'/ws/notifications/{own_id}/',
+                     f'/ws/notifications/{own_id}/?token={other_token.key}',
+                     f'/ws/notifications/{own_id}/?token=unknown'):
+            _, first = await self.open(path)
+            self.assertEqual(first, {'type': 'websocket.close', 'code': 4401}, path)
+
+        # A user whose profile id equals the owner's auth user id must not open the owner's group
+        colliding_user, colliding_token = await database_sync_to_async(make_user)('colliding_user')
+        await database_sync_to_async(UserProfile.objects.filter(pk=other.id).update)(id=other.id + 10000)
+        await database_sync_to_async(UserProfile.objects.create)(
+            id=other.id, auth_user=colliding_user, firstname='Cal', lastname='Lide', phone='9876543212',
+            vehicle_number='KL-07-AB-9999', vehicle_type='Sedan')
+        _, first = await self.open(f'/ws/notifications/{other.id}/?token={colliding_token.key}')
+        self.assertEqual(first['code'], 4401)
+
+        socket, first = await self.open(f'/ws/notifications/{own_id}/?token={self.token.key}')
+        self.assertEqual(json.loads(first['text'])['type'], 'info')
+        await socket.disconnect()
+
+    async def test_reconnect_storm_resolves_each_token_once(self):
+        from channels.db import database_sync_to_async
+        from parking.ws_auth import token_cache
+
+        before = dict(token_cache.counters)
+        path = f'/ws/notifications/{self.profile.auth_user_id}/?token={self.token.key}'
+        opened = await asyncio.gather(*(self.open(path) for _ in range(5)))
+        self.assertEqual(token_cache.counters['misses'] - before.get('misses', 0), 1)
+        for socket, first in opened:
+            self.assertEqual(json.loads(first['text'])['type'], 'info')
+            await socket.disconnect()
+
+        # Logging out deletes the token, which drops it from the cache
+        await database_sync_to_async(self.token.delete)()
+        _, first = await self.open(path)
+        self.assertEqual(first['code'], 4401)
@@ -0,0 +1,236 @@
+"""
+Pre-aggregated map clusters for lot pins.
+
+For every zoom level from 0 to LOT_TILE_MAX_ZOOM the approved lots with
+coordinates are bucketed into square lat/lng cells of 360 / 2**zoom /
+TILE_CELLS_PER_TILE degrees (so a 256px map tile holds a 4x4 grid of
+clusters). Each cell keeps a running count, coordinate sums (for
+the centroid), free slot total and a price histogram (for the min price), so
+a viewport request only reads the cells it covers and the payload size
+depends on the viewport, not on the number of lots.
+
+Cells are updated in place from the P_Lot / P_Slot / OwnerProfile signals
+(parking/signals.py) and rebuilt from the database every LOT_TILE_INDEX_TTL
+seconds so writes made by other worker processes are picked up.
+
+Settings:
+    LOT_TILE_MAX_ZOOM     - deepest precomputed zoom level (default 16)
+    LOT_TILE_INDEX_TTL    - seconds before a full rebuild (default 300, 0 = never)
+"""
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Min, Q
+
+logger = logging.getLogger(__name__)
+
+TILE_CELLS_PER_TILE = 4
+DEFAULT_MAX_ZOOM = 16
+DEFAULT_INDEX_TTL = 300
+
+# Above this many cells in the viewport, scan the occupied cells instead of the cell range
+MAX_CELL_SCAN = 4096
+
+APPROVED_STATUS = 'APPROVED'
+
+
+def cell_degrees(zoom):
+    return 360.0 / (2 ** zoom) / TILE_CELLS_PER_TILE
+
+
+class _Cluster:
+    __slots__ = ('count', 'sum_lat', 'sum_lng', 'sum_ids', 'free', 'prices')
+
+    def __init__(self):
+        self.count = 0
+        self.sum_lat = 0.0
+        self.sum_lng = 0.0
+        self.sum_ids = 0      # equals the lot id when count == 1
+        self.free = 0
+        self.prices = {}      # min slot price of each lot -> number of lots
+
+    def apply(self, lot_id, lat, lng, free, min_price, sign):
+        self.count += sign
+        self.sum_lat += sign * lat
+        self.sum_lng += sign * lng
+        self.sum_ids += sign * lot_id
+        self.free += sign * free
+        if min_price is not None:
+            remaining = self.prices.get(min_price, 0) + sign
+            if remaining:
+                self.prices[min_price] = remaining
+            else:
+                self.prices.pop(min_price, None)
+
+    def merge(self, other):
+        self.count += other.count
+        self.sum_lat += other.sum_lat
+        self.sum_lng += other.sum_lng
+        self.sum_ids += other.sum_ids
+        self.free += other.free
+        for price, lots in other.prices.items():
+            self.prices[price] = self.prices.get(price, 0) + lots
+
+    def as_dict(self):
+        data = {
+            'lat': round(self.sum_lat / self.count, 5),
+            'lng': round(self.sum_lng / self.count, 5),
+            'count': self.count,
+            'free_slots': self.free,
+            'min_price': min(self.prices) if self.prices else None,
+        }
+        if self.count == 1:
+            data['lot_id'] = self.sum_ids
+        return data
+
+
+class LotTileGrid:
+    """Multi-resolution cluster grid over approved lot coordinates"""
+
+    def __init__(self, max_zoom=None):
+        self._lock = threading.RLock()
+        self._max_zoom = max_zoom
+        self._lots = {}       # lot_id -> (lat, lng, free, min_price)
+        self._levels = {}     # zoom -> {(ix, iy): _Cluster}
+        self._built_at = None
+
+    @property
+    def max_zoom(self):
+        if self._max_zoom is None:
+            self._max_zoom = getattr(settings, 'LOT_TILE_MAX_ZOOM', DEFAULT_MAX_ZOOM)
+        return self._max_zoom
+
+    def __len__(self):
+        return len(self._lots)
+
+    def _apply(self, lot_id, record, sign):
+        lat, lng, free, min_price = record
+        ix, iy = _finest_cell(lat, lng, self.max_zoom)
+        for zoom in range(self.max_zoom + 1):
+            shift = self.max_zoom - zoom
+            key = (ix >> shift, iy >> shift)
+            cells = self._levels.setdefault(zoom, {})
+            cluster = cells.get(key)
+            if cluster is None:
+                cluster = cells[key] = _Cluster()
+            cluster.apply(lot_id, lat, lng, free, min_price, sign)
+            if not cluster.count:
+                del cells[key]
+
+    def _set(self, lot_id, record):
+        previous = self._lots.pop(lot_id, None)
+        if previous is not None:
+            self._apply(lot_id, previous, -1)
+        if record is not None:
+            self._lots[lot_id] = record
+            self._apply(lot_id, record, +1)
+
+    def load_records(self, records):
+        """Replace the grid contents with (lot_id, lat, lng, free, min_price) rows"""
+        lots = {}
+        finest = {}
+        for lot_id, lat, lng, free, min_price in records:
+            record = lots[lot_id] = _record(lat, lng, free, min_price)
+            key = _finest_cell(record[0], record[1], self.max_zoom)
+            cluster = finest.get(key)
+            if cluster is None:
+                cluster = finest[key] = _Cluster()
+            cluster.apply(lot_id, *record, +1)
+
+        # Each coarser level halves the cell size, so its cells are merges of 2x2 child cells
+        levels = {self.max_zoom: finest}
+        for zoom in range(self.max_zoom - 1, -1, -1):
+            cells = {}
+            for (ix, iy), child in levels[zoom + 1].items():
+                key = (ix >> 1, iy >> 1)
+                cluster = cells.get(key)
+                if cluster is None:
+                    cluster = cells[key] = _Cluster()
+                cluster.merge(child)
+            levels[zoom] = cells
+
+        with self._lock:
+            self._lots, self._levels = lots, levels
+            self._built_at = time.monotonic()
+
+    def rebuild(self):
+        self.load_records(_lot_rows(_approved_lots()))
+        logger.info(f"🗺️ Built lot tile grid ({len(self._lots)} lots, zoom 0-{self.max_zoom})")
+        return len(self._lots)
+
+    def _ensure_fresh(self):
+        ttl = getattr(settings, 'LOT_TILE_INDEX_TTL', DEFAULT_INDEX_TTL)
+        built_at = self._built_at
+        if built_at is not None and (not ttl or time.monotonic() - built_at < ttl):
+            return
+        with self._lock:
+            if self._built_at == built_at:
+                self.rebuild()
+
+    def refresh_lots(self, lot_ids):
+        """Re-read position, approval, free slots and min price for some lots"""
+        if self._built_at is None:
+            return  # the lazy build will pick the lots up
+        lot_ids = set(lot_ids)
+        rows = {row[0]: row for row in _lot_rows(_approved_lots().filter(lot_id__in=lot_ids))}
+        with self._lock:
+            for lot_id in lot_ids:
+                row = rows.get(lot_id)
+                self._set(lot_id, _record(*row[1:]) if row else None)
+
+    def remove_lot(self, lot_id):
+        with self._lock:
+            self._set(lot_id, None)
+
+    def clusters(self, min_lng, min_lat, max_lng, max_lat, zoom):
+        """Cluster dicts for every occupied cell intersecting the bbox at `zoom`"""
+        self._ensure_fresh()
+        zoom = max(0, min(int(zoom), self.max_zoom))
+        size = cell_degrees(zoom)
+        x0, x1 = int(math.floor(min_lng / size)), int(math.floor(max_lng / size))
+        y0, y1 = int(math.floor(min_lat / size)), int(math.floor(max_lat / size))
+
+        with self._lock:
+            cells = self._levels.get(zoom, {})
+            if (x1 - x0 + 1) * (y1 - y0 + 1) > min(MAX_CELL_SCAN, len(cells)):
+                hits = [cluster for (ix, iy), cluster in cells.items()
+                        if x0 <= ix <= x1 and y0 <= iy <= y1]
+            else:
+                hits = [cells[(ix, iy)] for ix in range(x0, x1 + 1) for iy in range(y0, y1 + 1)
+                        if (ix, iy) in cells]
+            return zoom, [cluster.as_dict() for cluster in hits]
+
+
+def _finest_cell(lat, lng, max_zoom):
+    """Cell of a point at the deepest level; coarser cells are found by shifting"""
+    size = cell_degrees(max_zoom)
+    return int(math.floor(lng / size)), int(math.floor(lat / size))
+
+
+def _record(lat, lng, free, min_price):
+    return float(lat), float(lng), int(free or 0), float(min_price) if min_price is not None else None
+
+
+def _approved_lots():
+    from parking.models import P_Lot
+    return P_Lot.objects.filter(
+        owner__verification_status=APPROVED_STATUS,
+        latitude__isnull=False, longitude__isnull=False,
+    )
+
+
+def _lot_rows(queryset):
+    return queryset.annotate(
+        free=Count('slots', filter=Q(slots__is_available=True)),
+        min_price=Min('slots__price'),
+    ).values_list('lot_id', 'latitude', 'longitude', 'free', 'min_price')
+
+
+_tile_grid = LotTileGrid()
+
+
+def get_lot_tile_grid():
+    return _tile_grid
@@ -0,0 +1,119 @@
+"""
+Shared server time broadcaster for the /ws/time/ sockets.
+
+Every worker process runs at most one ticker task. Once per second, on the
+second boundary, it builds the time payload once, serializes it once and
+writes the same text to every subscribed socket of the process. A socket no
+longer runs its own timer, strftime calls and json.dumps.
+
+The fan-out group is a process-local set of consumers rather than a channel
+layer group: every socket lives in this process anyway, and the layer's
+group_send copies the message and starts a task per member, which costs
+more than the old per-socket loops (see bench_time_sync.py). The ticker
+starts with the first subscriber and stops after the last one leaves.
+
+Compact clients (`/ws/time/?mode=compact`) never join the group. They get a
+`sync` message with the server epoch and UTC offset on connect and whenever
+they send `{"type": "sync"}`, and keep the clock running locally.
+"""
+import asyncio
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+def time_payload(now=None):
+    """The full time_update message (the fields TimeContext.jsx reads)"""
+    current_time = timezone.localtime(now or timezone.now())
+    return {
+        "type": "time_update",
+        "datetime": current_time.isoformat(),  # ISO 8601 format
+        "formatted": current_time.strftime("%A, %B %d %Y, %I:%M:%S %p"),  # Human readable
+        "date": current_time.strftime("%Y-%m-%d"),  # Date only
+        "time": current_time.strftime("%I:%M:%S %p"),  # Time only
+        "time_24h": current_time.strftime("%H:%M:%S"),  # 24-hour format
+        "timestamp": int(current_time.timestamp()),  # Unix timestamp
+        "year": current_time.year,
+        "month": current_time.month,
+        "day": current_time.day,
+        "hour": current_time.hour,
+        "minute": current_time.minute,
+        "second": current_time.second,
+        "weekday": current_time.strftime("%A"),
+        "timezone": str(current_time.tzinfo),
+    }
+
+
+def sync_payload(client_ts=None):
+    """Compact-mode sync: server epoch (ms) and UTC offset; clients interpolate between syncs"""
+    now = timezone.now()
+    offset = timezone.localtime(now).utcoffset()
+    message = {
+        "type": "sync",
+        "epoch_ms": int(now.timestamp() * 1000),
+        "offset_seconds": int(offset.total_seconds()) if offset else 0,
+        "timezone": settings.TIME_ZONE,
+    }
+    if client_ts is not None:
+        message["client_ts"] = client_ts  # echoed so the client can measure the round trip
+    return message
+
+
+class TimeBroadcaster:
+    """Process-wide ticker writing one serialized payload to every subscriber each second"""
+
+    def __init__(self):
+        self.members = set()
+        self.task = None
+        self._latest = (None, None)  # (epoch second, serialized payload)
+
+    @property
+    def subscribers(self):
+        return len(self.members)
+
+    def current_text(self):
+        """Serialized payload of the current second, built at most once per second"""
+        second = int(time.time())
+        if self._latest[0] != second:
+            self._latest = (second, json.dumps(time_payload()))
+        return self._latest[1]
+
+    def subscribe(self, consumer):
+        self.members.add(consumer)
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            self.task = loop.create_task(self._run())
+            logger.info("⏱ Server time ticker started")
+
+    def unsubscribe(self, consumer):
+        self.members.discard(consumer)
+        if not self.members and self.task is not None:
+            self.task.cancel()
+            self.task = None
+            logger.info("⏹ Server time ticker stopped (no subscribers)")
+
+    async def tick(self):
+        """Write the current payload to every subscriber; returns the number written"""
+        text = self.current_text()
+        written = 0
+        for consumer in list(self.members):
+            try:
+                await consumer.send(text_data=text)
+                written += 1
+            except Exception as e:
+                # A socket closing mid-tick; its disconnect() unsubscribes it
+                logger.error(f"❌ Error in time sync broadcast: {str(e)}")
+        return written
+
+    async def _run(self):
+        while True:
+            # Tick on the second boundary so every clock flips together
+            await asyncio.sleep(1.001 - time.time() % 1)
+            await self.tick()
+
+
+broadcaster = TimeBroadcaster()
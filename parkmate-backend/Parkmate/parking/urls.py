@@ -3,9 +3,10 @@ from rest_framework.routers import DefaultRouter
 from .views import(
     AuthViewSet,UserProfileViewSet,OwnerProfileViewSet,P_LotVIewSet,P_SlotViewSet,BookingViewSet,
     PaymentViewSet,TasksViewSet,CarwashViewSet,CarwashTypeViewSet,
-    EmployeeViewSet,ReviewViewSet,VerifyCashPaymentView,OwnerPaymentsView,
+    EmployeeViewSet,ReviewViewSet,VerifyCashPaymentView,VerifyCashPaymentBatchView,OwnerPaymentsView,
+    OwnerSettlementStatementView, NotificationMetricsView, NotificationInboxView, WebSocketMetricsView,
     CarWashServiceViewSet, CarWashBookingViewSet, OwnerCarWashBookingViewSet,
-    user_booked_lots,
+    user_booked_lots, owner_events,
 )
 
 router=DefaultRouter()
@@ -42,8 +43,14 @@ urlpatterns = [
     path('auth/logout/', auth_logout, name='auth-logout'),
     path('auth/verify/', auth_verify, name='auth-verify'),
     
+    path('owner/payments/verify-batch/', VerifyCashPaymentBatchView.as_view(), name='verify-cash-payment-batch'),
     path('owner/payments/<str:payment_id>/verify/', VerifyCashPaymentView.as_view(), name='verify-cash-payment'),
     path('owner/payments/', OwnerPaymentsView.as_view(), name='owner-payments'),
+    path('owner/settlements/', OwnerSettlementStatementView.as_view(), name='owner-settlements'),
+    path('owner/events/', owner_events, name='owner-events'),
+    path('admin/notifications/metrics/', NotificationMetricsView.as_view(), name='notification-metrics'),
+    path('admin/websockets/metrics/', WebSocketMetricsView.as_view(), name='websocket-metrics'),
+    path('notifications/', NotificationInboxView.as_view(), name='notification-inbox'),
     
     # User booked lots endpoint for review form
     path('user-booked-lots/', user_booked_lots, name='user-booked-lots'),
@@ -12,6 +12,7 @@ from django.utils import timezone
 from datetime import timedelta
 from rest_framework.parsers import MultiPartParser, FormParser,JSONParser
 from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
 
 from .models import (AuthUser, UserProfile, P_Lot, P_Slot, OwnerProfile, Booking,
                      Payment, Tasks, Carwash, Carwash_type, Employee, Review,
@@ -23,11 +24,19 @@ from .serializers import (UserRegisterSerializer, OwnerRegisterSerializer,
                           PaymentSerializer,CarwashTypeSerializer,CarwashSerializer,
                           EmployeeSerializer,TasksSerializer,ReviewSerializer,
                           LoginSerializer, CarWashServiceSerializer,
-                          CarWashBookingSerializer, CarWashPaymentSerializer)
+                          CarWashBookingSerializer, CarWashPaymentSerializer,
+                          ArchivedBookingSerializer, ArchivedPaymentSerializer)
 
 from .notification_utils import send_ws_notification
 
 
+def _transaction_id(prefix, booking_id):
+    """Payment transaction id; the random suffix keeps ids from the same second apart"""
+    import time
+    import uuid
+    return f'{prefix}-{booking_id}-{int(time.time())}-{uuid.uuid4().hex[:8].upper()}'
+
+
 # Custom Permission Classes
 class IsAdmin(BasePermission):
     """
@@ -126,6 +135,7 @@ class AuthViewSet(ViewSet):
                 "token":token.key,
                 "role":role_display,
                 "profile_id":profile.id if profile else None,
+                "user_id":auth_user.id,
                 "username":auth_user.username
             },status=status.HTTP_200_OK)
         return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)
@@ -438,18 +448,128 @@ class P_LotVIewSet(ModelViewSet):
         else:
             queryset = P_Lot.objects.filter(owner__verification_status="APPROVED")
         
-        # Add search functionality
+        # Ranked prefix search over name/street/locality/city/state/pincode
         search_query = self.request.query_params.get('q', '').strip()
         if search_query:
-            from django.db.models import Q
-            queryset = queryset.filter(
-                Q(lot_name__icontains=search_query) |
-                Q(street_name__icontains=search_query) |
-                Q(locality__icontains=search_query) |
-                Q(city__icontains=search_query)
-            )
+            from parking.search import search_lots
+            queryset = search_lots(queryset, search_query)
         
-        return queryset
+        return queryset.select_related('rating_summary')
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def search(self, request):
+        """
+        Ranked lot search with per-city facet counts.
+
+        Query params:
+        - q: search text, prefix-matched per word (required)
+        - city: restrict results to one city (facets still cover all cities)
+        - limit: max results (default 50)
+        """
+        from parking.search import search_lots, city_facets
+
+        search_query = request.query_params.get('q', '').strip()
+        if not search_query:
+            return Response({'error': 'q parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', 50)), 200)
+        except (ValueError, TypeError):
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Visibility rules without the ?q= handling of get_queryset
+        if request.user.role == "Owner":
+            base = P_Lot.objects.filter(owner__auth_user=request.user)
+        else:
+            base = P_Lot.objects.filter(owner__verification_status="APPROVED")
+
+        facets = city_facets(base, search_query)
+        city = request.query_params.get('city')
+        results = search_lots(base.filter(city__iexact=city) if city else base, search_query)
+        results = list(results[:limit])
+
+        serializer = self.get_serializer(results, many=True)
+        return Response({
+            'query': search_query,
+            'count': sum(facet['count'] for facet in facets),
+            'results': serializer.data,
+            'facets': {'city': facets},
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def nearby(self, request):
+        """
+        Nearest approved lots to a point, closest first.
+
+        Query params:
+        - lat, lng: search point (required)
+        - radius: max distance in km (default 10, max 200)
+        - k: max results (default 20, max 100)
+        """
+        import math
+        from parking.geo import nearby_lots
+
+        try:
+            lat = float(request.query_params['lat'])
+            lng = float(request.query_params['lng'])
+        except KeyError:
+            return Response({'error': 'lat and lng parameters are required'}, status=status.HTTP_400_BAD_REQUEST)
+        except (ValueError, TypeError):
+            return Response({'error': 'lat and lng must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return Response({'error': 'lat/lng out of range'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            radius = min(float(request.query_params.get('radius', 10)), 200.0)
+            k = min(int(request.query_params.get('k', 20)), 100)
+        except (ValueError, TypeError):
+            return Response({'error': 'radius and k must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        if math.isnan(radius) or radius <= 0 or k <= 0:
+            return Response({'error': 'radius and k must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+
+        lots = nearby_lots(lat, lng, k=k, radius_km=radius)
+        results = []
+        for lot, data in zip(lots, self.get_serializer(lots, many=True).data):
+            data['distance_km'] = lot.distance_km
+            results.append(data)
+        return Response({
+            'count': len(results),
+            'radius_km': radius,
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def tiles(self, request):
+        """
+        Lot pin clusters for a map viewport.
+
+        Query params:
+        - bbox: min_lng,min_lat,max_lng,max_lat (required)
+        - zoom: map zoom level (required)
+
+        Each cluster has its centroid, lot count, total free slots and the
+        lowest slot price; single-lot clusters also carry the lot_id.
+        """
+        import math
+        from parking.tiles import get_lot_tile_grid, cell_degrees
+
+        try:
+            min_lng, min_lat, max_lng, max_lat = [float(part) for part in request.query_params['bbox'].split(',')]
+            zoom = int(request.query_params['zoom'])
+        except KeyError:
+            return Response({'error': 'bbox and zoom parameters are required'}, status=status.HTTP_400_BAD_REQUEST)
+        except (ValueError, TypeError):
+            return Response({'error': 'bbox must be min_lng,min_lat,max_lng,max_lat and zoom an integer'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not all(math.isfinite(value) for value in (min_lng, min_lat, max_lng, max_lat)):
+            return Response({'error': 'bbox values must be finite numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        if min_lng > max_lng or min_lat > max_lat:
+            return Response({'error': 'bbox min values must not exceed max values'}, status=status.HTTP_400_BAD_REQUEST)
+
+        zoom, clusters = get_lot_tile_grid().clusters(min_lng, min_lat, max_lng, max_lat, zoom)
+        return Response({
+            'zoom': zoom,
+            'cell_degrees': cell_degrees(zoom),
+            'clusters': clusters,
+        }, status=status.HTTP_200_OK)
     
     def create(self, request, *args, **kwargs):
         """Override create to add debugging for image upload"""
@@ -533,66 +653,15 @@ class P_SlotViewSet(ModelViewSet):
     
     def list(self, request, *args, **kwargs):
         """Auto-complete expired bookings and free up slots before returning list"""
-        from django.utils import timezone
-        
         print(f"\n{'='*60}")
         print(f"📊 SLOTS LIST ENDPOINT - Auto-completing expired bookings")
         print(f"{'='*60}")
         
-        # Auto-complete any expired bookings with 'booked' status
-        expired_bookings = Booking.objects.filter(
-            status='booked',
-            end_time__lt=timezone.now()
-        )
-        
-        print(f"🔍 Found {expired_bookings.count()} expired bookings to complete")
-        
-        for booking in expired_bookings:
-            print(f"⏰ Auto-completing expired booking {booking.booking_id}")
-            print(f"   Status: {booking.status} → completed")
-            print(f"   Slot: {booking.slot.slot_id} → is_available = True")
-            
-            booking.status = 'completed'
-            
-            # Auto-clear carwash when booking completes and release employees
-            carwash_services = booking.booking_by_user.all()
-            if carwash_services.exists():
-                print(f"🧼 Auto-clearing {carwash_services.count()} add-on carwash service(s)")
-                for carwash in carwash_services:
-                    # Release employee assigned to this add-on carwash
-                    if carwash.employee:
-                        employee = carwash.employee
-                        print(f"   🔄 Releasing employee: {employee.firstname} {employee.lastname} (ID: {employee.employee_id})")
-                        old_assignments = employee.current_assignments
-                        employee.current_assignments = max(0, employee.current_assignments - 1)
-                        if employee.current_assignments < 3:
-                            employee.availability_status = 'available'
-                        employee.save()
-                        print(f"   ✅ Employee released: {old_assignments} → {employee.current_assignments}, Status: {employee.availability_status}")
-                carwash_services.delete()
-            
-            booking.save()
-            
-            # Free up the slot
-            booking.slot.is_available = True
-            booking.slot.save()
-            print(f"✅ Booking {booking.booking_id} completed and slot freed\n")
-        
-        # Also free up slots for cancelled bookings that still have is_available=False
-        cancelled_bookings = Booking.objects.filter(
-            status='cancelled',
-            slot__is_available=False
-        )
-        
-        print(f"🔍 Found {cancelled_bookings.count()} cancelled bookings with unavailable slots to free")
-        
-        for booking in cancelled_bookings:
-            print(f"🗑️  Freeing slot for cancelled booking {booking.booking_id}")
-            print(f"   Slot: {booking.slot.slot_id} → is_available = True")
-            
-            booking.slot.is_available = True
-            booking.slot.save()
-            print(f"✅ Slot {booking.slot.slot_id} freed for cancelled booking {booking.booking_id}\n")
+        # Auto-complete any expired bookings with 'booked' status and free
+        # slots still held by cancelled bookings (publishes the freed slots)
+        from parking.lot_availability import expire_bookings
+        completed = expire_bookings()
+        print(f"✅ Auto-completed {completed} expired booking(s)\n")
         
         return super().list(request, *args, **kwargs)
     
@@ -653,8 +722,8 @@ class BookingViewSet(ModelViewSet):
         user=self.request.user
 
         if user.role=="User":
-            profile=UserProfile.objects.get(auth_user=user)
-            return Booking.objects.filter(user=profile)
+            # Empty (rather than an error) for an account without a profile yet
+            return Booking.objects.filter(user__auth_user=user)
         
         if user.role=="Owner":
             owner=OwnerProfile.objects.get(auth_user=user)
@@ -685,16 +754,9 @@ class BookingViewSet(ModelViewSet):
             if carwash_services.exists():
                 print(f"🧼 Auto-clearing {carwash_services.count()} add-on carwash service(s) for booking {booking.booking_id}")
                 for carwash in carwash_services:
-                    # Release employee assigned to this add-on carwash
-                    if carwash.employee:
-                        employee = carwash.employee
-                        print(f"   🔄 Releasing employee: {employee.firstname} {employee.lastname} (ID: {employee.employee_id})")
-                        old_assignments = employee.current_assignments
-                        employee.current_assignments = max(0, employee.current_assignments - 1)
-                        if employee.current_assignments < 3:
-                            employee.availability_status = 'available'
-                        employee.save()
-                        print(f"   ✅ Employee released: {old_assignments} → {employee.current_assignments}, Status: {employee.availability_status}")
+                    # The workload signals release the assigned employee on delete
+                    if carwash.employee_id:
+                        print(f"   🔄 Releasing employee ID: {carwash.employee_id}")
                 carwash_services.delete()
             
             booking.slot.save()
@@ -783,7 +845,18 @@ class BookingViewSet(ModelViewSet):
             booking.slot.save()
             booking.save()
         
-        return super().list(request, *args, **kwargs)
+        response = super().list(request, *args, **kwargs)
+        profile = UserProfile.objects.filter(auth_user=request.user).first() \
+            if request.user.role == "User" else None
+        if profile is not None:
+            # Users also see their most recent bookings that were moved to the
+            # archive tables; /api/bookings/history/ pages through all of them
+            from parking.archive import archived_bookings, get_list_archived_limit
+            archived = archived_bookings(user=profile)[:get_list_archived_limit()]
+            response.data = list(response.data) + list(
+                ArchivedBookingSerializer(archived, many=True).data
+            )
+        return response
         
     def perform_create(self, serializer):
         """Create a new instant booking with proper timing and status"""
@@ -825,7 +898,6 @@ class BookingViewSet(ModelViewSet):
         
         # Create the instant booking with payment
         from django.db import transaction
-        import time
         
         with transaction.atomic():
             booking = Booking.objects.create(
@@ -854,7 +926,7 @@ class BookingViewSet(ModelViewSet):
             payment_status = 'PENDING' if payment_method == 'Cash' else 'SUCCESS'
             
             # Generate transaction ID
-            transaction_id = f'PM-{booking.booking_id}-{int(time.time())}'
+            transaction_id = _transaction_id('PM', booking.booking_id)
             
             from parking.models import Payment
             payment = Payment.objects.create(
@@ -949,15 +1021,9 @@ class BookingViewSet(ModelViewSet):
                 print(f"🧼 Cancelling {carwash_services.count()} linked carwash service(s)")
                 for carwash in carwash_services:
                     carwash.status = 'cancelled'
-                    # Release employee if assigned
-                    if carwash.employee:
-                        employee = carwash.employee
-                        print(f"   🔄 Releasing employee: {employee.firstname} {employee.lastname}")
-                        employee.current_assignments = max(0, employee.current_assignments - 1)
-                        if employee.current_assignments < 3:
-                            employee.availability_status = 'available'
-                        employee.save()
-                        print(f"   ✅ Employee released, assignments: {employee.current_assignments}")
+                    # The workload signals release the assigned employee on save
+                    if carwash.employee_id:
+                        print(f"   🔄 Releasing employee ID: {carwash.employee_id}")
                     carwash.save()
             
             # TODO: Send WebSocket notification (implement later)
@@ -1034,6 +1100,57 @@ class BookingViewSet(ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def history(self, request):
+        """
+        Booking history including bookings moved to the archive tables.
+        Users get their own history; owners get the history of one of their lots.
+
+        Query params:
+        - lot_id: restrict to one lot (required for owners)
+        - limit: max rows to return (default 100)
+        """
+        from parking.archive import get_booking_history
+
+        try:
+            limit = min(int(request.query_params.get('limit', 100)), 500)
+        except (ValueError, TypeError):
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        lot = None
+        lot_id = request.query_params.get('lot_id')
+        if lot_id:
+            try:
+                lot = P_Lot.objects.get(lot_id=lot_id)
+            except (P_Lot.DoesNotExist, ValueError):
+                return Response({'error': 'Parking lot not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        user = request.user
+        if user.role == "User":
+            profile = UserProfile.objects.get(auth_user=user)
+            history = get_booking_history(user=profile, lot=lot, limit=limit)
+        elif user.role == "Owner":
+            owner = OwnerProfile.objects.get(auth_user=user)
+            if lot is None or lot.owner_id != owner.id:
+                return Response(
+                    {'error': 'Owners must pass the lot_id of one of their own lots'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            history = get_booking_history(lot=lot, limit=limit)
+        else:
+            history = get_booking_history(lot=lot, limit=limit)
+
+        results = []
+        for booking in history:
+            if isinstance(booking, Booking):
+                data = dict(self.get_serializer(booking).data)
+                data['is_archived'] = False
+            else:
+                data = ArchivedBookingSerializer(booking).data
+            results.append(data)
+
+        return Response({'count': len(results), 'results': results}, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def renew(self, request, pk=None):
@@ -1154,7 +1271,7 @@ class BookingViewSet(ModelViewSet):
             payment_method = request.data.get('payment_method', 'UPI')
             amount = request.data.get('amount', float(new_booking.price))
             payment_status = 'PENDING' if payment_method == 'Cash' else 'SUCCESS'
-            transaction_id = f'PM-RENEWAL-{new_booking.booking_id}-{int(__import__("time").time())}'
+            transaction_id = _transaction_id('PM-RENEWAL', new_booking.booking_id)
             
             payment = Payment.objects.create(
                 booking=new_booking,
@@ -1199,7 +1316,7 @@ class BookingViewSet(ModelViewSet):
             # Event 4: Send "Renew Failure" notification to user
             try:
                 send_ws_notification(
-                    user.userprofile.id if hasattr(user, 'userprofile') else user.id,
+                    user.id,
                     "error",
                     f"Renewal failed: {str(e)}. Please try again."
                 )
@@ -1267,20 +1384,11 @@ class CarwashViewSet(ModelViewSet):
                 print(f"   Status: {old_status} → {new_status}")
                 print(f"   Employee: {employee.firstname} {employee.lastname} (ID: {employee.employee_id})")
                 
-                # Decrease employee's workload
-                old_assignments = employee.current_assignments
-                employee.current_assignments = max(0, employee.current_assignments - 1)
-                
-                # Mark employee as available if they have capacity
-                old_availability = employee.availability_status
-                if employee.current_assignments < 3:
-                    employee.availability_status = 'available'
-                
-                employee.save()
-                
+                # The workload signals already applied the -1 on save
+                employee.refresh_from_db(fields=['current_assignments', 'availability_status'])
                 print(f"✅ Employee released:")
-                print(f"   Assignments: {old_assignments} → {employee.current_assignments}")
-                print(f"   Availability: {old_availability} → {employee.availability_status}")
+                print(f"   Assignments: {employee.current_assignments}")
+                print(f"   Availability: {employee.availability_status}")
                 print(f"{'='*60}\n")
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
@@ -1348,16 +1456,9 @@ class CarwashViewSet(ModelViewSet):
             for carwash in expired_carwashes:
                 print(f"⏰ Auto-completing add-on carwash {carwash.carwash_id} with expired booking {carwash.booking.booking_id}")
                 
-                # Release employee if assigned
-                if carwash.employee:
-                    employee = carwash.employee
-                    print(f"   🔄 Releasing employee: {employee.firstname} {employee.lastname} (ID: {employee.employee_id})")
-                    old_assignments = employee.current_assignments
-                    employee.current_assignments = max(0, employee.current_assignments - 1)
-                    if employee.current_assignments < 3:
-                        employee.availability_status = 'available'
-                    employee.save()
-                    print(f"   ✅ Employee released: {old_assignments} → {employee.current_assignments}, Status: {employee.availability_status}")
+                # Completing the booking releases the assigned employee via the workload signals
+                if carwash.employee_id:
+                    print(f"   🔄 Releasing employee ID: {carwash.employee_id}")
                 
                 carwash.booking.status = 'completed'
                 carwash.booking.save()
@@ -1472,8 +1573,7 @@ class CarwashViewSet(ModelViewSet):
                 payment_status = 'PENDING' if payment_method == 'Cash' else 'SUCCESS'
                 
                 # Generate transaction ID
-                import time
-                transaction_id = f'CW-{booking.booking_id}-{int(time.time())}'
+                transaction_id = _transaction_id('CW', booking.booking_id)
                 
                 # Create payment record
                 payment = Payment.objects.create(
@@ -1505,26 +1605,9 @@ class CarwashViewSet(ModelViewSet):
                         print(f"   Owner: {booking.lot.owner.firstname} {booking.lot.owner.lastname} ({booking.lot.owner.id})")
                         print(f"   Service Type: {carwash_type.name}")
                         
-                        # Smart employee assignment: Find available employee with least workload
-                        available_employees = Employee.objects.filter(
-                            owner=booking.lot.owner,
-                            availability_status='available'
-                        ).order_by('current_assignments')
-                        
-                        print(f"   Available employees: {available_employees.count()}")
-                        
-                        employee = available_employees.first()
-                        
-                        # Set carwash status based on payment status
-                        # If no employee available, set to 'pending' so owner can assign later
-                        if employee:
-                            carwash_status = 'pending' if payment_status == 'PENDING' else 'active'
-                        else:
-                            carwash_status = 'pending'  # Pending until owner assigns employee
-                            print(f"⚠️ No employees available - creating carwash as 'pending' for later assignment")
-                        
                         # Final check: Query with lock to ensure no concurrent creation
-                        # Using select_for_update() locks matching rows, preventing race conditions
+                        # Using select_for_update() locks matching rows, preventing race conditions.
+                        # Runs before dispatch so a refused request never claims an employee.
                         locked_existing = Carwash.objects.select_for_update().filter(
                             booking=booking,
                             status__in=['active', 'pending']
@@ -1532,18 +1615,20 @@ class CarwashViewSet(ModelViewSet):
                         
                         if locked_existing.count() > 0:
                             print(f"❌ Race condition detected: Another carwash was created concurrently")
+                            transaction.set_rollback(True)
                             return Response(
                                 {'error': 'A car wash service is already being processed for this booking.'},
                                 status=status.HTTP_409_CONFLICT
                             )
                         
-                        # Use serializer for validation and creation (instead of direct create)
+                        # Use serializer for validation and creation (instead of direct create);
+                        # the employee and status are filled in once dispatch has run
                         from parking.serializers import CarwashSerializer
                         carwash_data = {
                             'booking': booking.booking_id,
                             'carwash_type': carwash_type.carwash_type_id,
-                            'employee': employee.employee_id if employee else None,
-                            'status': carwash_status
+                            'employee': None,
+                            'status': 'pending'
                         }
                         
                         print(f"🔍 Creating carwash via serializer with data: {carwash_data}")
@@ -1552,17 +1637,39 @@ class CarwashViewSet(ModelViewSet):
                         if not carwash_serializer.is_valid():
                             print(f"❌ Carwash serializer validation failed: {carwash_serializer.errors}")
                             error_msg = carwash_serializer.errors.get('booking', ['Validation error'])[0]
+                            transaction.set_rollback(True)
                             return Response(
                                 {'error': str(error_msg)},
                                 status=status.HTTP_400_BAD_REQUEST
                             )
                         
+                        # Proximity-aware employee assignment: nearest employee with spare capacity.
+                        # The claim is an atomic conditional UPDATE inside this transaction,
+                        # so it rolls back with everything else if the carwash isn't created.
+                        from parking.dispatch import dispatch_employee
+                        from parking.workload import claimed_assignment
+                        decision = dispatch_employee(booking.lot)
+                        employee = decision.employee
+                        
+                        print(f"   Dispatch decision: {decision.attempts} attempt(s) in {decision.elapsed_ms:.2f} ms")
+                        
+                        # Set carwash status based on payment status
+                        # If no employee available, set to 'pending' so owner can assign later
+                        if employee:
+                            carwash_status = 'pending' if payment_status == 'PENDING' else 'active'
+                        else:
+                            carwash_status = 'pending'  # Pending until owner assigns employee
+                            print(f"⚠️ No employees available - creating carwash as 'pending' for later assignment")
+                        
                         try:
-                            carwash = carwash_serializer.save()
+                            # The dispatch claim already counted this assignment
+                            with claimed_assignment(employee.employee_id if employee else None):
+                                carwash = carwash_serializer.save(employee=employee, status=carwash_status)
                         except Exception as db_error:
                             # Catch database constraint violation (unique constraint on active/pending carwash per booking)
                             if 'unique_active_carwash_per_booking' in str(db_error):
                                 print(f"❌ Database constraint violation: Duplicate carwash prevented by DB")
+                                transaction.set_rollback(True)
                                 return Response(
                                     {'error': 'A car wash service is already active for this booking.'},
                                     status=status.HTTP_409_CONFLICT
@@ -1571,12 +1678,8 @@ class CarwashViewSet(ModelViewSet):
                                 # Re-raise if it's a different error
                                 raise
                         
-                        # Update employee workload if employee was assigned
                         if employee:
-                            employee.current_assignments += 1
-                            if employee.current_assignments >= 3:  # Max 3 concurrent assignments
-                                employee.availability_status = 'busy'
-                            employee.save()
+                            employee.refresh_from_db()
                             
                             print(f"✅ Employee assigned: {employee.firstname} {employee.lastname}")
                             print(f"   Employee ID: {employee.employee_id}")
@@ -1828,17 +1931,94 @@ class EmployeeViewSet(ModelViewSet):
         print(f"   Total: {total_count} | Assigned: {assigned_count} | Unassigned: {unassigned_count}")
         print(f"   Returning: {queryset.count()} employees\n")
         
-        # Serialize
-        serializer = EmployeeListSerializer(queryset, many=True)
+        # Serialize, with each employee's rostered utilisation for the requested day
+        from parking.roster import employees_utilisation
+        from datetime import datetime
+        try:
+            day = datetime.strptime(request.query_params['date'], '%Y-%m-%d').date() \
+                if request.query_params.get('date') else timezone.localdate()
+        except ValueError:
+            return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        employees = list(queryset)
+        serializer = EmployeeListSerializer(employees, many=True)
+        rows = serializer.data
+        utilisation = employees_utilisation(employees, day)
+        for employee, row in zip(employees, rows):
+            row['utilisation'] = utilisation[employee.pk]
         
         return Response({
-            'employees': serializer.data,
+            'employees': rows,
+            'date': day.isoformat(),
             'stats': {
                 'total': total_count,
                 'assigned': assigned_count,
                 'unassigned': unassigned_count,
             }
         }, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def schedule(self, request, pk=None):
+        """
+        An employee's rostered car washes and utilisation for one day.
+
+        Query params:
+        - date: YYYY-MM-DD (default today)
+        """
+        from parking.roster import day_schedule, employee_utilisation, workday_window
+        from datetime import datetime
+
+        employee = self.get_object()
+        try:
+            day = datetime.strptime(request.query_params['date'], '%Y-%m-%d').date() \
+                if request.query_params.get('date') else timezone.localdate()
+        except ValueError:
+            return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+
+        intervals = []
+        schedule = day_schedule(employee, day)
+        if employee.owner_id is not None:
+            day_start, _ = workday_window(day)
+            day_start = day_start.replace(hour=0)
+            day_end = day_start + timedelta(days=1)
+            for start, end, booking_id in schedule:
+                if start < day_end and end > day_start:
+                    intervals.append({'carwash_booking_id': booking_id, 'start': start.isoformat(), 'end': end.isoformat()})
+
+        return Response({
+            'employee_id': employee.employee_id,
+            'bookings': intervals,
+            'utilisation': employee_utilisation(employee, day, schedule),
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def rebalance(self, request):
+        """
+        Owner: re-plan one day's car wash roster across all of their employees.
+
+        Body: {"date": "YYYY-MM-DD"}
+        """
+        from parking.roster import rebalance_day
+        from datetime import datetime
+
+        if getattr(request.user, 'role', '') != 'Owner':
+            return Response({'error': 'Only owners can rebalance their roster'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            owner = OwnerProfile.objects.get(auth_user=request.user)
+            day = datetime.strptime(request.data.get('date', ''), '%Y-%m-%d').date()
+        except OwnerProfile.DoesNotExist:
+            return Response({'error': 'Owner profile not found'}, status=status.HTTP_404_NOT_FOUND)
+        except ValueError:
+            return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+
+        plan, changed = rebalance_day(owner.id, day)
+        unassigned = [booking_id for booking_id, employee_id in plan.items() if employee_id is None]
+        return Response({
+            'date': day.isoformat(),
+            'bookings': len(plan),
+            'reassigned': changed,
+            'unassigned': unassigned,
+            'plan': {str(booking_id): employee_id for booking_id, employee_id in plan.items()},
+        }, status=status.HTTP_200_OK)
                 
 
 
@@ -1859,6 +2039,13 @@ class TasksViewSet(viewsets.ModelViewSet):
         return Tasks.objects.none()
 
     
+class ReviewFeedPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-rev_id')
+
+
 class ReviewViewSet(viewsets.ModelViewSet):
     serializer_class=ReviewSerializer
     permission_classes=[IsAuthenticated]
@@ -1868,91 +2055,47 @@ class ReviewViewSet(viewsets.ModelViewSet):
         Allow any user to read reviews (list, retrieve).
         Require authentication for create, update, delete.
         """
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'feed']:
             return [AllowAny()]
         return [IsAuthenticated()]       
 
     def get_queryset(self):
+        # user_detail and lot_detail are nested in every review
+        queryset = Review.objects.select_related('user', 'lot')
+        user = self.request.user
+        if user and user.is_authenticated and user.role == 'Owner':
+            # Owners only see reviews of their own lots
+            queryset = queryset.filter(lot__owner__auth_user=user)
+
+        lot_id = self.request.query_params.get("lot_id")
+        user_id = self.request.query_params.get("user_id")
+        review_type = self.request.query_params.get("type")  # SLOT or CARWASH
         try:
-            # Check if user is authenticated
-            if not self.request.user or not self.request.user.is_authenticated:
-                # Unauthenticated users can see all reviews
-                return Review.objects.all().order_by('-created_at')
-            
-            user_role = self.request.user.role
-            lot_id = self.request.query_params.get("lot_id")  # Changed from "lot" to "lot_id"
-            user_id = self.request.query_params.get("user_id")  # Also changed to "user_id" for consistency
-            review_type = self.request.query_params.get("type")  # NEW: Filter by review type (SLOT or CARWASH)
-            
-            # Convert to integer if provided
-            if lot_id:
-                try:
-                    lot_id = int(lot_id)
-                except (ValueError, TypeError):
-                    lot_id = None
-            
-            if user_id:
-                try:
-                    user_id = int(user_id)
-                except (ValueError, TypeError):
-                    user_id = None
-            
-            print(f"DEBUG: get_queryset called for user: {self.request.user.username}, role: {user_role}")
-            print(f"DEBUG: Query params - lot_id: {lot_id} (type: {type(lot_id).__name__}), user_id: {user_id} (type: {type(user_id).__name__}), review_type: {review_type}")
-            print(f"DEBUG: Total reviews in DB: {Review.objects.count()}")
-            
-            # For users - show all reviews, they can only edit/delete their own
-            # For owners - show only reviews for their lots
-            # For admins - show all reviews
-            
-            if user_role == 'Owner':
-                # User is an owner - filter by their lots
-                try:
-                    owner_profile = OwnerProfile.objects.get(auth_user=self.request.user)
-                    print(f"DEBUG: Found owner profile ID: {owner_profile.id}, name: {owner_profile.firstname} {owner_profile.lastname}")
-                    
-                    # Filter lots where owner field equals this owner_profile
-                    owned_lots = P_Lot.objects.filter(owner=owner_profile)
-                    owned_lots_list = list(owned_lots.values_list('lot_id', 'lot_name'))
-                    print(f"DEBUG: Owner's lots: {owned_lots_list}")
-                    
-                    # Get all reviews for these lots
-                    queryset = Review.objects.filter(lot__in=owned_lots)
-                    print(f"DEBUG: Reviews found for owner's lots: {queryset.count()}")
-                    
-                    # Debug: Show all reviews with their lot_id
-                    all_reviews = Review.objects.all().values_list('rev_id', 'lot_id', 'rating', 'review_desc')
-                    print(f"DEBUG: All reviews in DB: {list(all_reviews)}")
-                    
-                except OwnerProfile.DoesNotExist:
-                    print(f"DEBUG: OwnerProfile not found for auth_user {self.request.user.id}")
-                    queryset = Review.objects.none()
-            elif user_role == 'Admin':
-                # User is an admin - show all reviews
-                queryset = Review.objects.all()
-                print(f"DEBUG: Admin user - showing all {queryset.count()} reviews")
-            else:
-                # Regular user - show all reviews (for reading), they can only edit their own
-                queryset = Review.objects.all()
-                print(f"DEBUG: Regular user - showing all {queryset.count()} reviews")
-            
-            # Apply filters
             if lot_id:
-                queryset = queryset.filter(lot_id=lot_id)
-                print(f"DEBUG: Filtered by lot_id={lot_id}, results: {queryset.count()}")
+                queryset = queryset.filter(lot_id=int(lot_id))
+        except (ValueError, TypeError):
+            pass
+        try:
             if user_id:
-                queryset = queryset.filter(user_id=user_id)
-                print(f"DEBUG: Filtered by user_id={user_id}, results: {queryset.count()}")
-            
-            # NEW: Filter by review type
-            if review_type and review_type.upper() in ['SLOT', 'CARWASH']:
-                queryset = queryset.filter(review_type=review_type.upper())
-                print(f"DEBUG: Filtered by review_type={review_type.upper()}, results: {queryset.count()}")
-                
-            return queryset.order_by('-created_at')
-        except Exception as e:
-            print(f"DEBUG: Exception in get_queryset: {str(e)}")
-            return Review.objects.none()
+                queryset = queryset.filter(user_id=int(user_id))
+        except (ValueError, TypeError):
+            pass
+        if review_type and review_type.upper() in ['SLOT', 'CARWASH']:
+            queryset = queryset.filter(review_type=review_type.upper())
+        return queryset.order_by('-created_at', '-rev_id')
+
+    @action(detail=False, methods=['get'], url_path='feed')
+    def feed(self, request):
+        """
+        Cursor-paginated review feed, newest first.
+        GET /api/reviews/feed/?lot_id=<id>&type=SLOT|CARWASH&page_size=<n>&cursor=<next>
+
+        Takes the same filters as the list; each page is one indexed range
+        read, however deep the client scrolls.
+        """
+        paginator = ReviewFeedPagination()
+        page = paginator.paginate_queryset(self.get_queryset(), request, view=self)
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
 
     def perform_create(self, serializer):
         try:
@@ -2123,6 +2266,192 @@ class VerifyCashPaymentView(APIView):
             )
 
 
+class VerifyCashPaymentBatchView(APIView):
+    """
+    Endpoint to verify many cash payments at once (e.g. at the end of a shift).
+    Only parking lot owners can verify payments for their lots.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Verify a list of cash payments and activate their bookings/carwash services.
+        
+        Payload:
+        {
+            "payment_ids": [12, 13, 14]
+        }
+        
+        Returns:
+        {
+            "message": "...",
+            "verified": [...],
+            "already_verified": [...],
+            "failed": [{"payment_id": ..., "error": "..."}],
+            "bookings_activated": [...],
+            "carwashes_activated": [...],
+            "verified_at": "..."
+        }
+        """
+        from parking.payment_verification import MAX_BATCH, verify_cash_payments
+        
+        try:
+            current_owner = OwnerProfile.objects.get(auth_user=request.user)
+        except OwnerProfile.DoesNotExist:
+            return Response(
+                {'error': 'Only parking lot owners can verify payments'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        payment_ids = request.data.get('payment_ids')
+        if not isinstance(payment_ids, list) or not payment_ids:
+            return Response({'error': 'payment_ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(payment_ids) > MAX_BATCH:
+            return Response({'error': f'At most {MAX_BATCH} payments per request'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            payment_ids = list(dict.fromkeys(int(pay_id) for pay_id in payment_ids))
+        except (TypeError, ValueError):
+            return Response({'error': 'payment_ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        print(f"🔍 Batch verification of {len(payment_ids)} payment(s) by owner {current_owner.id}")
+        result = verify_cash_payments(current_owner, request.user, payment_ids)
+        print(f"✅ Verified {len(result['verified'])}, already verified {len(result['already_verified'])}, "
+              f"failed {len(result['failed'])}")
+        
+        return Response({
+            'message': f"✓ {len(result['verified'])} payment(s) verified successfully",
+            **result,
+        }, status=status.HTTP_200_OK)
+
+
+class NotificationMetricsView(APIView):
+    """
+    Queue depth, counters and delivery lag of this process's notification
+    dispatcher (parking/notification_outbox.py). Admins only.
+    """
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        from parking.notification_outbox import metrics
+        return Response(metrics(), status=status.HTTP_200_OK)
+
+
+class WebSocketMetricsView(APIView):
+    """
+    Live sockets per kind, largest groups and heartbeat reap/evict counters
+    of this process (parking/socket_health.py), and its WebSocket token
+    cache (parking/ws_auth.py). Admins only.
+    """
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        from parking.socket_health import metrics
+        from parking.ws_auth import token_cache
+        return Response({**metrics(), 'token_cache': token_cache.metrics()}, status=status.HTTP_200_OK)
+
+
+class NotificationInboxView(APIView):
+    """
+    Notifications the signed-in user missed, from the notification inbox
+    (parking/notification_inbox.py). REST fallback for the replay that
+    ws/notifications/<id>/?since=<seq> does on connect.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Query params:
+        - since: last seq the client has seen (default 0)
+        - limit: most notifications returned, newest kept (default NOTIFICATION_REPLAY_LIMIT)
+        """
+        from parking.notification_inbox import frame, get_replay_limit, latest_seq, replay
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', get_replay_limit()))
+        except ValueError:
+            return Response({'error': 'since and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if since < 0 or limit < 1:
+            return Response({'error': 'since must be >= 0 and limit >= 1'}, status=status.HTTP_400_BAD_REQUEST)
+
+        recipient = str(request.user.id)
+        notifications = [
+            {**frame(row), 'created_at': row['created_at']}
+            for row in replay(recipient, since, min(limit, get_replay_limit()))
+        ]
+        return Response({
+            'latest_seq': latest_seq(recipient),
+            'notifications': notifications,
+        }, status=status.HTTP_200_OK)
+
+
+class OwnerSettlementStatementView(APIView):
+    """
+    Endpoint for owner settlement statements, read from the settlement ledger
+    (never from the raw payments).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Settlement totals per period, lot and payment method.
+        
+        Query params:
+        - from: YYYY-MM-DD first day (default first day of this month)
+        - to: YYYY-MM-DD last day (default today)
+        - period: day or month (default day)
+        - lot_id: only this lot (optional)
+        
+        Returns:
+        {
+            "from": "2025-11-01", "to": "2025-11-30", "period": "day",
+            "rows": [
+                {
+                    "period": "2025-11-29", "lot_id": 1, "lot_name": "Premium Lot",
+                    "payment_method": "Cash",
+                    "success_amount": "500.00", "success_count": 4,
+                    "pending_amount": "100.00", "pending_count": 1,
+                    "failed_amount": "0.00", "failed_count": 0
+                }
+            ],
+            "totals": {...}
+        }
+        """
+        from datetime import datetime
+        from parking.settlement import statement
+        
+        try:
+            owner = OwnerProfile.objects.get(auth_user=request.user)
+        except OwnerProfile.DoesNotExist:
+            return Response(
+                {'error': 'Only parking lot owners can access settlement statements'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        period = request.query_params.get('period', 'day')
+        if period not in ('day', 'month'):
+            return Response({'error': 'period must be day or month'}, status=status.HTTP_400_BAD_REQUEST)
+        from_str = request.query_params.get('from')
+        to_str = request.query_params.get('to')
+        try:
+            last_day = datetime.strptime(to_str, '%Y-%m-%d').date() if to_str else timezone.localdate()
+            first_day = (datetime.strptime(from_str, '%Y-%m-%d').date() if from_str
+                         else last_day.replace(day=1))
+            lot_id = int(request.query_params['lot_id']) if request.query_params.get('lot_id') else None
+        except ValueError:
+            return Response({'error': 'Invalid from/to date (YYYY-MM-DD) or lot_id'}, status=status.HTTP_400_BAD_REQUEST)
+        if first_day > last_day:
+            return Response({'error': 'from must not be after to'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        rows, totals = statement(owner, first_day, last_day, lot_id=lot_id, period=period)
+        return Response({
+            'from': first_day.isoformat(),
+            'to': last_day.isoformat(),
+            'period': period,
+            'rows': rows,
+            'totals': totals,
+        }, status=status.HTTP_200_OK)
+
+
 class OwnerPaymentsView(APIView):
     """
     Endpoint to fetch all payment receipts for owner's parking lots.
@@ -2162,14 +2491,7 @@ class OwnerPaymentsView(APIView):
             if user.is_superuser or user_role == 'admin':
                 # Admin can see all payments from all lots
                 print(f"📋 Admin user fetching all payments")
-                
-                # Get all bookings
-                bookings = Booking.objects.all()
-                
-                # Get all payments
-                payments = Payment.objects.filter(
-                    booking__in=bookings
-                ).select_related('booking__user', 'booking__lot', 'booking__slot').order_by('-created_at')
+                lot_ids = None
                 
             else:
                 # Check if user is owner
@@ -2188,40 +2510,29 @@ class OwnerPaymentsView(APIView):
                 lot_ids = list(owner_lots.values_list('lot_id', flat=True))
                 
                 print(f"   Owner has {len(lot_ids)} lots")
-                
-                # Get all bookings in owner's lots
-                bookings = Booking.objects.filter(lot_id__in=lot_ids)
-                
-                # Get all payments for these bookings
-                payments = Payment.objects.filter(
-                    booking__in=bookings
-                ).select_related('booking__user', 'booking__lot', 'booking__slot').order_by('-created_at')
-            
-            # Apply optional filters
-            status_filter = request.query_params.get('status')
-            if status_filter:
-                payments = payments.filter(status=status_filter)
             
-            method_filter = request.query_params.get('payment_method')
-            if method_filter:
-                payments = payments.filter(payment_method=method_filter)
+            # Payments of the bookings in those lots, archived ones included,
+            # with the optional status / payment_method filters
+            from parking.archive import get_payment_history
+            history = get_payment_history(
+                lot_ids=lot_ids,
+                status=request.query_params.get('status'),
+                payment_method=request.query_params.get('payment_method'),
+            )
             
-            print(f"   Found {payments.count()} payments")
+            print(f"   Found {len(history)} payments")
             
             # Format response data
-            serializer = PaymentSerializer(payments, many=True)
             response_data = []
             
-            for payment_data in serializer.data:
-                booking = Payment.objects.get(pay_id=payment_data['pay_id']).booking
+            for payment, is_first in history:
+                booking = payment.booking
                 user_profile = booking.user
+                serializer_class = PaymentSerializer if isinstance(payment, Payment) else ArchivedPaymentSerializer
+                payment_data = serializer_class(payment).data
                 
-                # Determine payment type based on order
-                all_booking_payments = booking.payments.all().order_by('created_at')
-                payment_list = list(all_booking_payments)
-                payment_obj = Payment.objects.get(pay_id=payment_data['pay_id'])
-                payment_index = list(all_booking_payments).index(payment_obj)
-                payment_type = "Slot Payment" if payment_index == 0 else "Car Wash Payment"
+                # The first payment of a booking is its slot payment
+                payment_type = "Slot Payment" if is_first else "Car Wash Payment"
                 
                 response_data.append({
                     'pay_id': payment_data['pay_id'],
@@ -2234,7 +2545,8 @@ class OwnerPaymentsView(APIView):
                     'amount': str(payment_data['amount']),
                     'status': payment_data['status'],
                     'transaction_id': payment_data['transaction_id'] or 'N/A',
-                    'created_at': payment_data['created_at']
+                    'created_at': payment_data['created_at'],
+                    'is_archived': not isinstance(payment, Payment),
                 })
             
             return Response({
@@ -2393,39 +2705,6 @@ class CarWashBookingViewSet(ModelViewSet):
                         status=status.HTTP_404_NOT_FOUND
                     )
             
-            # Validation Rule 5: Check capacity limit (max 2 cars per time slot)
-            # Time slot is defined as the hour in which the booking starts
-            if lot_id:
-                # Round down to nearest hour to get time slot
-                slot_start = scheduled_dt.replace(minute=0, second=0, microsecond=0)
-                slot_end = slot_start + timedelta(hours=1)
-                
-                # Count active bookings in this time slot
-                capacity_per_slot = 2
-                bookings_in_slot = CarWashBooking.objects.filter(
-                    lot_id=lot_id,
-                    scheduled_time__gte=slot_start,
-                    scheduled_time__lt=slot_end,
-                    status__in=['pending', 'confirmed', 'in_progress']
-                ).exclude(status='cancelled').count()
-                
-                if bookings_in_slot >= capacity_per_slot:
-                    print(f"❌ Validation failed: Time slot at capacity ({bookings_in_slot}/{capacity_per_slot})")
-                    print(f"   Slot: {slot_start} to {slot_end}")
-                    print(f"{'='*60}\n")
-                    return Response(
-                        {
-                            'error': f'Time slot is full ({bookings_in_slot}/{capacity_per_slot} booked)',
-                            'slot_time': slot_start.isoformat(),
-                            'booked_count': bookings_in_slot,
-                            'capacity': capacity_per_slot
-                        },
-                        status=status.HTTP_409_CONFLICT
-                    )
-                
-                print(f"✅ Capacity check passed: {bookings_in_slot + 1}/{capacity_per_slot} slots")
-
-            
             # All validations passed, proceed with creation
             data = dict(request.data)
             data['user'] = user_profile.id
@@ -2464,7 +2743,31 @@ class CarWashBookingViewSet(ModelViewSet):
                 print(f"{'='*60}\n")
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             
-            self.perform_create(serializer)
+            # Validation Rule 5: Reserve capacity in the lot's time slot.
+            # The reservation is one conditional UPDATE (booked < capacity), so
+            # concurrent requests cannot overbook; it rolls back if the insert fails.
+            from django.db import transaction
+            from parking.carwash_capacity import reserve
+            with transaction.atomic():
+                if lot_id:
+                    slot, reserved = reserve(lot, scheduled_dt)
+                    if not reserved:
+                        print(f"❌ Validation failed: Time slot at capacity ({slot.booked}/{slot.capacity})")
+                        print(f"   Slot: {slot.slot_start} to {slot.slot_end}")
+                        print(f"{'='*60}\n")
+                        return Response(
+                            {
+                                'error': f'Time slot is full ({slot.booked}/{slot.capacity} booked)',
+                                'slot_time': slot.slot_start.isoformat(),
+                                'booked_count': slot.booked,
+                                'capacity': slot.capacity
+                            },
+                            status=status.HTTP_409_CONFLICT
+                        )
+                    print(f"✅ Capacity reserved: {slot.booked}/{slot.capacity} in slot {slot.slot_start}")
+                    serializer.validated_data['capacity_slot'] = slot
+                
+                self.perform_create(serializer)
             
             print(f"✅ Car wash booking created: ID={serializer.data['carwash_booking_id']}")
             print(f"✅ Validations passed: time={scheduled_dt}, lot={lot_id}")
@@ -2497,39 +2800,23 @@ class CarWashBookingViewSet(ModelViewSet):
         
         booking = serializer.save()
         
-        # Smart employee assignment: Find available employee with least workload
+        # Employee assignment from the car wash roster
         try:
             print(f"\n🔍 EMPLOYEE ASSIGNMENT FOR BOOKING {booking.carwash_booking_id}")
             print(f"   Lot: {booking.lot.lot_name}")
             print(f"   Owner: {booking.lot.owner}")
             
-            available_employees = Employee.objects.filter(
-                owner=booking.lot.owner,
-                availability_status='available'
-            ).order_by('current_assignments')
-            
-            print(f"   Available employees: {available_employees.count()}")
-            
-            employee = available_employees.first()
-            
+            # create() requires a scheduled time, so washes are rostered by time:
+            # any washer free for the booking's interval with spare capacity
+            from parking.roster import assign_booking
+            employee = assign_booking(booking)
             if employee:
-                # Assign employee to booking
-                booking.employee = employee
-                booking.save()
-                
-                # Update employee workload
-                employee.current_assignments += 1
-                if employee.current_assignments >= 3:  # Max 3 concurrent assignments
-                    employee.availability_status = 'busy'
-                employee.save()
-                
                 print(f"✅ Employee assigned: {employee.firstname} {employee.lastname}")
                 print(f"   Employee ID: {employee.employee_id}")
                 print(f"   Current assignments: {employee.current_assignments}")
                 print(f"   Status: {employee.availability_status}")
             else:
-                print(f"⚠️ No available employees found")
-                print(f"   All employees are busy or offline")
+                print(f"⚠️ No employee free for {booking.scheduled_time} - owner needs to assign manually")
         except Exception as e:
             print(f"❌ Employee assignment failed: {str(e)}")
             import traceback
@@ -2641,13 +2928,9 @@ class CarWashBookingViewSet(ModelViewSet):
                 print(f"\n🔄 RELEASING EMPLOYEE {employee.employee_id}")
                 print(f"   Booking: {updated_booking.carwash_booking_id}")
                 print(f"   Status change: {old_status} → {new_status}")
-                print(f"   Current assignments: {employee.current_assignments}")
-                
-                employee.current_assignments = max(0, employee.current_assignments - 1)
-                if employee.current_assignments < 3:
-                    employee.availability_status = 'available'
-                employee.save()
                 
+                # The workload signals already applied the -1 on save
+                employee.refresh_from_db(fields=['current_assignments', 'availability_status'])
                 print(f"✅ Employee released")
                 print(f"   New assignments: {employee.current_assignments}")
                 print(f"   New status: {employee.availability_status}\n")
@@ -2656,7 +2939,8 @@ class CarWashBookingViewSet(ModelViewSet):
     def available_time_slots(self, request):
         """
         Get available time slots for a specific date and lot.
-        Returns hourly slots from 9 AM to 8 PM with availability information.
+        Returns the lot's car wash slots (carwash_slot_minutes long) from 9 AM
+        to 9 PM with availability information from the capacity ledger.
         
         Query Parameters:
         - date: YYYY-MM-DD format (required)
@@ -2664,7 +2948,7 @@ class CarWashBookingViewSet(ModelViewSet):
         """
         try:
             from django.utils import timezone
-            from datetime import datetime, time, timedelta
+            from datetime import datetime
             
             # Get query parameters
             date_str = request.query_params.get('date')
@@ -2689,50 +2973,16 @@ class CarWashBookingViewSet(ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Define time slots (9 AM to 8 PM, hourly)
-            time_slots = []
-            for hour in range(9, 21):  # 9 AM to 8 PM (20:00)
-                time_slots.append(time(hour, 0))
-            
-            print(f"✅ Created {len(time_slots)} time slots")
-            
-            # Build response
-            slots_data = []
-            capacity_per_slot = 2  # Max 2 cars per time slot
+            try:
+                lot_filter = int(lot_id) if lot_id else None
+            except (ValueError, TypeError) as e:
+                print(f"⚠️ Invalid lot_id: {lot_id}, error: {e}")
+                lot_filter = None
             
-            for slot_time in time_slots:
-                try:
-                    # Combine date and time
-                    slot_datetime = timezone.make_aware(datetime.combine(target_date, slot_time))
-                    slot_end = slot_datetime + timedelta(hours=1)
-                    
-                    # Count bookings for this time slot
-                    query = CarWashBooking.objects.filter(
-                        scheduled_time__gte=slot_datetime,
-                        scheduled_time__lt=slot_end,
-                        status__in=['pending', 'confirmed', 'in_progress']
-                    ).exclude(status='cancelled')
-                    
-                    if lot_id:
-                        try:
-                            query = query.filter(lot_id=int(lot_id))
-                        except (ValueError, TypeError) as e:
-                            print(f"⚠️ Invalid lot_id: {lot_id}, error: {e}")
-                    
-                    booked_count = query.count()
-                    available = booked_count < capacity_per_slot
-                    
-                    slots_data.append({
-                        'time': slot_time.strftime('%H:%M'),
-                        'available': available,
-                        'booked_count': booked_count,
-                        'capacity': capacity_per_slot,
-                        'datetime': slot_datetime.isoformat()
-                    })
-                except Exception as slot_error:
-                    print(f"❌ Error processing slot {slot_time}: {slot_error}")
-                    import traceback
-                    traceback.print_exc()
+            # The lot's slots (9 AM to 9 PM) from the capacity ledger, cached per day
+            from parking.carwash_calendar import calendar_days
+            [day] = calendar_days(lot_filter, target_date, 1)
+            slots_data = day['slots']
             
             print(f"✅ Returning {len(slots_data)} time slots")
             
@@ -2752,6 +3002,40 @@ class CarWashBookingViewSet(ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    @action(detail=False, methods=['get'], url_path='calendar', permission_classes=[permissions.AllowAny])
+    def calendar(self, request):
+        """
+        Slot availability for several days of a lot in one call.
+        
+        Query Parameters:
+        - lot_id: P_Lot ID (optional, if not provided counts all lots)
+        - from: YYYY-MM-DD first day (default today)
+        - days: number of days (default 7, max 14)
+        """
+        from datetime import datetime
+        from django.utils import timezone
+        from parking.carwash_calendar import MAX_DAYS, calendar_days
+        
+        lot_id = request.query_params.get('lot_id')
+        from_str = request.query_params.get('from')
+        try:
+            lot_filter = int(lot_id) if lot_id else None
+            days = int(request.query_params.get('days', 7))
+        except (TypeError, ValueError):
+            return Response({'error': 'lot_id and days must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= days <= MAX_DAYS:
+            return Response({'error': f'days must be between 1 and {MAX_DAYS}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            first_day = datetime.strptime(from_str, '%Y-%m-%d').date() if from_str else timezone.localdate()
+        except ValueError:
+            return Response({'error': 'Invalid from date. Use YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'lot_id': lot_filter,
+            'from': first_day.isoformat(),
+            'days': calendar_days(lot_filter, first_day, days),
+        }, status=status.HTTP_200_OK)
+    
     def update(self, request, *args, **kwargs):
         """
         Update a car wash booking with status transition validation.
@@ -2933,13 +3217,9 @@ class OwnerCarWashBookingViewSet(ModelViewSet):
                 print(f"\n🔄 RELEASING EMPLOYEE {employee.employee_id}")
                 print(f"   Booking: {updated_booking.carwash_booking_id}")
                 print(f"   Status change: {old_status} → {new_status}")
-                print(f"   Current assignments: {employee.current_assignments}")
-                
-                employee.current_assignments = max(0, employee.current_assignments - 1)
-                if employee.current_assignments < 3:
-                    employee.availability_status = 'available'
-                employee.save()
                 
+                # The workload signals already applied the -1 on save
+                employee.refresh_from_db(fields=['current_assignments', 'availability_status'])
                 print(f"✅ Employee released")
                 print(f"   New assignments: {employee.current_assignments}")
                 print(f"   New status: {employee.availability_status}\n")
@@ -2951,24 +3231,28 @@ class OwnerCarWashBookingViewSet(ModelViewSet):
         Includes total bookings, revenue, pending verifications, etc.
         """
         try:
-            owner_profile = OwnerProfile.objects.get(auth_user=request.user)
-            owner_lots = P_Lot.objects.filter(owner=owner_profile)
+            from decimal import Decimal
+            from django.db.models import Count, DecimalField, Q, Sum, Value
+            from django.db.models.functions import Coalesce
             
-            bookings = CarWashBooking.objects.filter(lot__in=owner_lots)
-            total_bookings = bookings.count()
-            completed_bookings = bookings.filter(status='completed').count()
-            pending_payments = bookings.filter(payment_status='pending').count()
+            owner_profile = OwnerProfile.objects.get(auth_user=request.user)
             
-            # Calculate total revenue
-            total_revenue = 0
-            for booking in bookings.filter(status='completed', payment_status='verified'):
-                total_revenue += float(booking.price)
+            # One conditional-aggregate query; revenue is summed exactly in SQL
+            stats = CarWashBooking.objects.filter(lot__owner=owner_profile).aggregate(
+                total_bookings=Count('pk'),
+                completed_bookings=Count('pk', filter=Q(status='completed')),
+                pending_payments=Count('pk', filter=Q(payment_status='pending')),
+                total_revenue=Coalesce(
+                    Sum('price', filter=Q(status='completed', payment_status='verified')),
+                    Value(Decimal('0')), output_field=DecimalField(max_digits=12, decimal_places=2),
+                ),
+            )
             
             return Response({
-                'total_bookings': total_bookings,
-                'completed_bookings': completed_bookings,
-                'pending_payments': pending_payments,
-                'total_revenue': total_revenue,
+                'total_bookings': stats['total_bookings'],
+                'completed_bookings': stats['completed_bookings'],
+                'pending_payments': stats['pending_payments'],
+                'total_revenue': float(stats['total_revenue']),
             }, status=status.HTTP_200_OK)
         except OwnerProfile.DoesNotExist:
             return Response(
@@ -2976,6 +3260,55 @@ class OwnerCarWashBookingViewSet(ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
     
+    @action(detail=False, methods=['get'], url_path='revenue-series', permission_classes=[permissions.IsAuthenticated])
+    def revenue_series(self, request):
+        """
+        Car wash bookings, completions and verified revenue per day per lot,
+        read from the DailyOwnerRevenue rollup.
+        
+        Query Parameters:
+        - from: YYYY-MM-DD first day (default 29 days before `to`)
+        - to: YYYY-MM-DD last day (default today)
+        - lot_id: only this lot (optional)
+        """
+        from datetime import datetime
+        from parking.revenue_rollup import MAX_SERIES_DAYS, series
+        
+        try:
+            owner_profile = OwnerProfile.objects.get(auth_user=request.user)
+        except OwnerProfile.DoesNotExist:
+            return Response(
+                {'error': 'Owner profile not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        from_str = request.query_params.get('from')
+        to_str = request.query_params.get('to')
+        try:
+            last_day = datetime.strptime(to_str, '%Y-%m-%d').date() if to_str else timezone.localdate()
+            first_day = (datetime.strptime(from_str, '%Y-%m-%d').date() if from_str
+                         else last_day - timedelta(days=29))
+        except ValueError:
+            return Response({'error': 'Invalid date. Use YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        if first_day > last_day:
+            return Response({'error': 'from must not be after to'}, status=status.HTTP_400_BAD_REQUEST)
+        if (last_day - first_day).days + 1 > MAX_SERIES_DAYS:
+            return Response({'error': f'At most {MAX_SERIES_DAYS} days per request'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        lots = P_Lot.objects.filter(owner=owner_profile).order_by('lot_id')
+        lot_id = request.query_params.get('lot_id')
+        if lot_id:
+            try:
+                lots = lots.filter(lot_id=int(lot_id))
+            except ValueError:
+                return Response({'error': 'lot_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'from': first_day.isoformat(),
+            'to': last_day.isoformat(),
+            'lots': series(lots, first_day, last_day),
+        }, status=status.HTTP_200_OK)
+    
     @action(detail=True, methods=['patch'], url_path='verify-payment', permission_classes=[permissions.IsAuthenticated])
     def verify_payment(self, request, pk=None):
         """
@@ -3175,49 +3508,16 @@ def user_booked_lots(request):
         user = request.user
         print(f"📍 Fetching completed bookings for user: {user.username}")
         
-        # Get user profile
-        try:
-            user_profile = UserProfile.objects.get(auth_user=user)
-        except UserProfile.DoesNotExist:
+        # Cached per user; one UNION query on a miss
+        from parking.reviewable_lots import reviewable_lots
+        data = reviewable_lots(user.id)
+        if data is None:
             return Response(
                 {'error': 'User profile not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
-        
-        # Get lots from completed SLOT bookings
-        slot_bookings = Booking.objects.filter(
-            user=user_profile,
-            status__iexact='completed'
-        ).select_related('lot')
-        
-        slot_lot_ids = set(slot_bookings.values_list('lot_id', flat=True))
-        print(f"   Slot bookings: {slot_bookings.count()} completed bookings")
-        print(f"   Slot lots: {len(slot_lot_ids)} unique lots - {list(slot_lot_ids)}")
-        
-        # Get lots from completed CARWASH bookings
-        carwash_bookings = CarWashBooking.objects.filter(
-            user=user_profile,
-            status='completed',
-            lot__isnull=False  # Only include carwash bookings that have a lot assigned
-        ).select_related('lot')
-        
-        carwash_lot_ids = set(carwash_bookings.values_list('lot_id', flat=True))
-        print(f"   Carwash bookings: {carwash_bookings.count()} completed bookings")
-        print(f"   Carwash lots: {len(carwash_lot_ids)} unique lots - {list(carwash_lot_ids)}")
-        
-        # Combine both sets (union) to get unique lot IDs
-        combined_lot_ids = slot_lot_ids | carwash_lot_ids
-        print(f"   ✅ Total unique reviewable lots: {len(combined_lot_ids)} - {list(combined_lot_ids)}")
-        
-        # Get lot details
-        lots = P_Lot.objects.filter(lot_id__in=list(combined_lot_ids))
-        print(f"   P_Lot query results: {lots.count()} lots")
-        for lot in lots:
-            print(f"     - Lot {lot.lot_id}: {lot.lot_name}")
-        
-        serializer = P_LotSerializer(lots, many=True)
-        
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        print(f"   ✅ Total unique reviewable lots: {len(data)}")
+        return Response(data, status=status.HTTP_200_OK)
         
     except Exception as e:
         print(f"❌ Error fetching user booked lots: {str(e)}")
@@ -3226,4 +3526,65 @@ def user_booked_lots(request):
         return Response(
             {'error': str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+# ===== OWNER EVENT STREAM (Long poll) =====
+from django.http import JsonResponse
+
+
+def _request_owner_id(request):
+    """(owner_id, error JsonResponse) for a DRF token-authenticated request"""
+    from rest_framework.authentication import TokenAuthentication
+    from rest_framework.exceptions import AuthenticationFailed
+    try:
+        authenticated = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed as e:
+        return None, JsonResponse({'detail': str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+    if authenticated is None:
+        return None, JsonResponse({'detail': 'Authentication credentials were not provided.'},
+                                  status=status.HTTP_401_UNAUTHORIZED)
+    user = authenticated[0]
+    owner_id = OwnerProfile.objects.filter(auth_user=user).values_list('id', flat=True).first()
+    if user.role != 'Owner' or owner_id is None:
+        return None, JsonResponse({'error': 'Only owners have an event stream'}, status=status.HTTP_403_FORBIDDEN)
+    return owner_id, None
+
+
+async def owner_events(request):
+    """
+    Long poll of the signed-in owner's event stream (parking/owner_events.py).
+    Async, so a waiting request holds no worker thread.
+    
+    Query params:
+    - since: last seq the client has applied (omit to get just latest_seq)
+    - timeout: seconds to wait when nothing is newer (default 25, max OWNER_EVENT_LONG_POLL_MAX)
+    """
+    from asgiref.sync import sync_to_async
+    from parking.owner_events import events_since, get_long_poll_max, latest_seq, wait_for_events
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'},
+                            status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    owner_id, error = await sync_to_async(_request_owner_id)(request)
+    if error is not None:
+        return error
+    try:
+        since = request.GET.get('since')
+        since = int(since) if since not in (None, '') else None
+        timeout = min(float(request.GET.get('timeout', 25)), get_long_poll_max())
+    except ValueError:
+        return JsonResponse({'error': 'since must be an integer and timeout a number'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    if since is None:
+        events = []
+    elif timeout > 0:
+        events = await wait_for_events(owner_id, since, timeout)
+    else:
+        events = await sync_to_async(events_since)(owner_id, since)
+    latest = await sync_to_async(latest_seq)(owner_id)
+    return JsonResponse({
+        'latest_seq': latest,
+        'events': events,
+        'next_since': events[-1]['seq'] if events else (latest if since is None else since),
+    })
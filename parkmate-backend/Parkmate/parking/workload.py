@@ -0,0 +1,161 @@
+"""
+Employee workload counters (Employee.current_assignments).
+
+A car wash counts against its employee while it is active:
+- standalone CarWashBooking: status is pending / confirmed / in_progress
+- add-on Carwash: its own status is active / pending and the parent slot
+  Booking is still booked / active
+
+Instead of recounting on every save, the signals in parking/signals.py
+remember each row's (employee, status) when it is loaded and, after a save or
+delete, apply a single atomic `current_assignments = current_assignments ± 1`
+UPDATE only when the row actually moved into or out of an active assignment
+(or to another employee). Booking status transitions do the same for their
+add-on car washes. Availability follows the counter: 'busy' at
+CARWASH_MAX_ASSIGNMENTS, 'available' below it, and 'offline' is never touched.
+
+`reconcile_workloads()` (run by `manage.py reconcile_workload`) recounts every
+employee in a single query and fixes any drift, e.g. from bulk
+`.update()` calls that bypass signals.
+"""
+import contextvars
+import logging
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+logger = logging.getLogger(__name__)
+
+STANDALONE_ACTIVE_STATUSES = ('pending', 'confirmed', 'in_progress')
+ADDON_ACTIVE_STATUSES = ('active', 'pending')
+BOOKING_ACTIVE_STATUSES = ('booked', 'active')
+
+# Employees whose +1 was already taken by an atomic dispatch claim in this context
+_claimed = contextvars.ContextVar('parking_workload_claimed', default=None)
+
+
+def booking_is_active(status):
+    return (status or '').lower() in BOOKING_ACTIVE_STATUSES
+
+
+def standalone_counts(employee_id, status):
+    return employee_id is not None and status in STANDALONE_ACTIVE_STATUSES
+
+
+def addon_counts(employee_id, status, parent_active):
+    return employee_id is not None and status in ADDON_ACTIVE_STATUSES and parent_active
+
+
+def _max_assignments():
+    from parking.dispatch import get_max_assignments
+    return get_max_assignments()
+
+
+def apply_delta(employee_id, delta):
+    """Atomically add `delta` to an employee's workload and refresh their availability"""
+    from parking.models import Employee
+    if not delta or employee_id is None:
+        return
+    if delta > 0:
+        claimed = _claimed.get()
+        if claimed and claimed.get(employee_id):
+            # dispatch_employee already counted this assignment
+            claimed[employee_id] -= 1
+            delta -= 1
+            if not delta:
+                return
+    cap = _max_assignments()
+    # SET expressions read the pre-update value, so compare against cap - delta
+    Employee.objects.filter(employee_id=employee_id).update(
+        current_assignments=Greatest(F('current_assignments') + delta, Value(0)),
+        availability_status=Case(
+            When(availability_status='offline', then=Value('offline')),
+            When(current_assignments__gte=cap - delta, then=Value('busy')),
+            default=Value('available'),
+        ),
+    )
+
+
+def apply_transition(old, new):
+    """
+    Apply the deltas for one row going from `old` to `new`, each an
+    (employee_id, counts) pair.
+    """
+    old_employee, old_counts = old
+    new_employee, new_counts = new
+    if old_employee == new_employee and old_counts == new_counts:
+        return
+    if old_counts:
+        apply_delta(old_employee, -1)
+    if new_counts:
+        apply_delta(new_employee, +1)
+
+
+@contextmanager
+def claimed_assignment(employee_id):
+    """
+    Mark an assignment whose workload was already taken by an atomic dispatch
+    claim, so saving it inside this block does not count it twice. A claim
+    that no counted save consumed (the save failed, or the row is not active)
+    is given back on exit.
+    """
+    claimed = dict(_claimed.get() or {})
+    if employee_id is not None:
+        claimed[employee_id] = claimed.get(employee_id, 0) + 1
+    token = _claimed.set(claimed)
+    try:
+        yield
+    finally:
+        _claimed.reset(token)
+        if employee_id is not None and claimed.get(employee_id):
+            apply_delta(employee_id, -1)
+
+
+def reconcile_workloads(dry_run=False, employee_ids=None):
+    """
+    Recount every employee's active assignments in a single query and fix
+    counters that drifted. Each fix is a compare-and-set on the value that was
+    read, so a delta applied concurrently is never overwritten (the employee
+    is simply re-checked on the next run). `employee_ids` limits the recount
+    to some employees. Returns [(employee_id, old, new)].
+    """
+    from parking.models import Carwash, CarWashBooking, Employee
+    cap = _max_assignments()
+    booking_active = Q()
+    for status in BOOKING_ACTIVE_STATUSES:
+        booking_active |= Q(booking__status__iexact=status)
+    # Correlated COUNT subqueries rather than two joins, which would multiply
+    # each employee's standalone rows by their add-on rows
+    standalone = CarWashBooking.objects.filter(
+        employee=OuterRef('pk'), status__in=STANDALONE_ACTIVE_STATUSES,
+    ).order_by().values('employee').annotate(n=Count('pk')).values('n')
+    addon = Carwash.objects.filter(
+        booking_active, employee=OuterRef('pk'), status__in=ADDON_ACTIVE_STATUSES,
+    ).order_by().values('employee').annotate(n=Count('pk')).values('n')
+    employees = Employee.objects.all()
+    if employee_ids is not None:
+        employees = employees.filter(employee_id__in=employee_ids)
+    rows = employees.annotate(
+        standalone=Coalesce(Subquery(standalone), 0),
+        addon=Coalesce(Subquery(addon), 0),
+    ).values_list('employee_id', 'current_assignments', 'availability_status', 'standalone', 'addon')
+
+    fixes = []
+    for employee_id, current, availability, standalone, addon in rows:
+        actual = standalone + addon
+        expected_availability = availability if availability == 'offline' else (
+            'busy' if actual >= cap else 'available'
+        )
+        if current == actual and availability == expected_availability:
+            continue
+        fixes.append((employee_id, current, actual))
+        if dry_run:
+            continue
+        with transaction.atomic():
+            Employee.objects.filter(
+                employee_id=employee_id, current_assignments=current, availability_status=availability,
+            ).update(current_assignments=actual, availability_status=expected_availability)
+        logger.info(f"🔄 Reconciled workload for employee {employee_id}: {current} → {actual}")
+    return fixes
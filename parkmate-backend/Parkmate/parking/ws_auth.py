@@ -0,0 +1,168 @@
+"""
+DRF token authentication for the WebSocket routes.
+
+channels.auth.AuthMiddlewareStack only reads the Django session cookie, but
+the frontend signs in with DRF tokens (localStorage 'authToken'), so every
+socket arrived anonymous and ws/notifications/<id>/ simply trusted the id
+in its URL. TokenAuthMiddleware reads the token from
+
+    ?token=<key>                      (browsers cannot set WebSocket headers)
+    Authorization: Token <key>        (other clients)
+
+and puts the user into scope["user"] (AnonymousUser for an unknown key).
+Without a token the session user from AuthMiddlewareStack is kept.
+Notifications are addressed by auth user id, so ws/notifications/<id>/
+only accepts the caller's own pk.
+
+Lookups go through `token_cache`, an in-process TTL cache, so a reconnect
+storm after a deploy or a network blip costs one query per distinct token
+per process instead of one per socket: concurrent misses for the same key
+share a single query, and unknown keys are remembered briefly too. A
+deleted token (logout) is dropped from this process's cache at once; other
+worker processes forget it within WS_TOKEN_CACHE_TTL.
+
+Settings:
+    WS_TOKEN_CACHE_TTL           - seconds a resolved token is reused (default 60)
+    WS_TOKEN_CACHE_NEGATIVE_TTL  - seconds an unknown token is remembered (default 5)
+    WS_TOKEN_CACHE_SIZE          - most tokens kept per process (default 10000)
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from urllib.parse import parse_qs
+
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 60
+DEFAULT_NEGATIVE_TTL = 5
+DEFAULT_SIZE = 10000
+
+def get_ttl():
+    return getattr(settings, 'WS_TOKEN_CACHE_TTL', DEFAULT_TTL)
+
+
+def get_negative_ttl():
+    return getattr(settings, 'WS_TOKEN_CACHE_NEGATIVE_TTL', DEFAULT_NEGATIVE_TTL)
+
+
+def get_size():
+    return getattr(settings, 'WS_TOKEN_CACHE_SIZE', DEFAULT_SIZE)
+
+
+def load_user(key):
+    """User of a token key, or None if unknown or the user is inactive"""
+    from rest_framework.authtoken.models import Token
+    token = Token.objects.select_related('user').filter(key=key).first()
+    if token is None or not token.user.is_active:
+        return None
+    return token.user
+
+
+class TokenCache:
+    """Token key -> user (or None) with a TTL, shared by all sockets of the process"""
+
+    def __init__(self):
+        self.entries = {}  # key -> (expires at, user or None), oldest first
+        self.pending = {}  # key -> Future of the lookup in flight
+        self.counters = Counter()
+
+    async def resolve(self, key):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.counters['hits'] += 1
+            return entry[1]
+
+        pending = self.pending.get(key)
+        if pending is not None and pending.get_loop() is asyncio.get_running_loop():
+            # The same token is being looked up for another socket right now
+            self.counters['shared'] += 1
+            return await asyncio.shield(pending)
+
+        self.counters['misses'] += 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending[key] = future
+        try:
+            user = await database_sync_to_async(load_user)(key)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # retrieved: waiters get it, no "never retrieved" warning
+            raise
+        finally:
+            if self.pending.get(key) is future:
+                del self.pending[key]
+        self.store(key, user)
+        future.set_result(user)
+        return user
+
+    def store(self, key, user):
+        ttl = get_ttl() if user is not None else get_negative_ttl()
+        self.entries.pop(key, None)
+        self.entries[key] = (time.monotonic() + ttl, user)
+        if len(self.entries) > get_size():
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the oldest ones, down to the size limit"""
+        now = time.monotonic()
+        for key in [key for key, (expires, _) in self.entries.items() if expires <= now]:
+            del self.entries[key]
+        while len(self.entries) > get_size():
+            del self.entries[next(iter(self.entries))]
+
+    def forget(self, key):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def metrics(self):
+        lookups = self.counters['hits'] + self.counters['shared'] + self.counters['misses']
+        return {
+            'entries': len(self.entries),
+            'hits': self.counters['hits'],
+            'shared_lookups': self.counters['shared'],
+            'misses': self.counters['misses'],
+            'hit_ratio': round((lookups - self.counters['misses']) / lookups, 3) if lookups else None,
+            'ttl': get_ttl(),
+        }
+
+
+token_cache = TokenCache()
+
+
+def token_from_scope(scope):
+    query = parse_qs(scope.get('query_string', b'').decode())
+    key = query.get('token', [''])[0]
+    if key:
+        return key
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            scheme, _, credentials = value.decode('latin1').partition(' ')
+            if scheme.lower() == 'token' and credentials:
+                return credentials.strip()
+    return None
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    """Sets scope["user"] from a DRF token, if the socket sent one"""
+
+    async def __call__(self, scope, receive, send):
+        from django.contrib.auth.models import AnonymousUser
+        key = token_from_scope(scope)
+        if key:
+            user = await token_cache.resolve(key)
+            if user is None:
+                logger.info("🔒 WebSocket with an unknown token")
+            scope = dict(scope, user=user or AnonymousUser())
+        return await super().__call__(scope, receive, send)
+
+
+def TokenAuthMiddlewareStack(inner):
+    """Session auth (AuthMiddlewareStack) with DRF tokens taking precedence"""
+    return AuthMiddlewareStack(TokenAuthMiddleware(inner))